@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import LogAuditoria, Respaldo
+from .models import LogAuditoria, Respaldo, Secuencia
 
 @admin.register(LogAuditoria)
 class LogAuditoriaAdmin(admin.ModelAdmin):
@@ -10,3 +10,8 @@ class LogAuditoriaAdmin(admin.ModelAdmin):
 @admin.register(Respaldo)
 class RespaldoAdmin(admin.ModelAdmin):
     list_display = ('fecha_respaldo', 'archivo', 'tamano_mb', 'exitoso')
+
+@admin.register(Secuencia)
+class SecuenciaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'ultimo')
+    readonly_fields = ('nombre', 'ultimo')
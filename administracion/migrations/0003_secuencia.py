@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:47
+
+from django.db import migrations, models
+
+
+def crear_secuencias(apps, schema_editor):
+    # Las facturas y certificados anteriores tienen números aleatorios de 8
+    # caracteres (FACT-1A2B3C4D); los nuevos usan 10 dígitos y no chocan
+    Secuencia = apps.get_model('administracion', 'Secuencia')
+    Secuencia.objects.bulk_create(
+        [Secuencia(nombre='factura'), Secuencia(nombre='certificado')], ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(help_text='Tipo de documento numerado (factura, certificado...)', max_length=50, unique=True, verbose_name='Nombre')),
+                ('ultimo', models.BigIntegerField(default=0, verbose_name='Último número asignado')),
+            ],
+            options={
+                'verbose_name': 'Secuencia',
+                'verbose_name_plural': 'Secuencias',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.RunPython(crear_secuencias, migrations.RunPython.noop),
+    ]
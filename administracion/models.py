@@ -122,3 +122,33 @@ class LogAuditoria(models.Model):
     
     def __str__(self):
         return f"{self.usuario.get_full_name()} - {self.accion} {self.modelo} #{self.objeto_id} - {self.fecha.strftime('%d/%m/%Y %H:%M:%S')}"
+
+
+class Secuencia(models.Model):
+    """
+    Consecutivo de documentos (facturas, certificados).
+
+    Los números se asignan con ``administracion.secuencias`` dentro de la
+    transacción que crea el documento, así una transacción revertida
+    devuelve su número y la numeración no tiene huecos.
+    """
+    
+    nombre = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name='Nombre',
+        help_text='Tipo de documento numerado (factura, certificado...)'
+    )
+    
+    ultimo = models.BigIntegerField(
+        default=0,
+        verbose_name='Último número asignado'
+    )
+    
+    class Meta:
+        verbose_name = 'Secuencia'
+        verbose_name_plural = 'Secuencias'
+        ordering = ['nombre']
+    
+    def __str__(self):
+        return f"{self.nombre}: {self.ultimo}"
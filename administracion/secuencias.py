@@ -0,0 +1,66 @@
+"""
+Numeración consecutiva y sin huecos de documentos.
+
+Cada tipo de documento tiene una fila en ``Secuencia``. Un número se toma
+con un único ``UPDATE ... RETURNING`` sobre esa fila, dentro de la
+transacción que guarda el documento: si la transacción se revierte, el
+contador también, así que no quedan huecos ni duplicados.
+
+El precio es que dos transacciones que numeran el mismo tipo de documento
+se turnan la fila hasta confirmar (en SQLite con transacciones IMMEDIATE el
+bloqueo de escritura ya las serializa). Por eso el número se pide al final
+de la transacción, justo antes de guardar el documento, y los procesos que
+generan muchos documentos reservan un bloque con una sola sentencia
+(``reservar_numeros``) en lugar de uno por documento.
+"""
+
+from django.db import connection, transaction
+
+from .models import Secuencia
+
+FORMATOS = {
+    'factura': 'FACT-{:010d}',
+    'certificado': 'CERT-{:010d}',
+}
+
+
+def _avanzar(nombre, cantidad):
+    """Suma ``cantidad`` al contador y devuelve el nuevo último número."""
+    tabla = connection.ops.quote_name(Secuencia._meta.db_table)
+    sql = f'UPDATE {tabla} SET ultimo = ultimo + %s WHERE nombre = %s RETURNING ultimo'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [cantidad, nombre])
+        fila = cursor.fetchone()
+        if fila is None:
+            # Primera vez que se numera este tipo de documento
+            Secuencia.objects.bulk_create([Secuencia(nombre=nombre)], ignore_conflicts=True)
+            cursor.execute(sql, [cantidad, nombre])
+            fila = cursor.fetchone()
+    return fila[0]
+
+
+def reservar_numeros(nombre, cantidad):
+    """
+    Reserva ``cantidad`` números consecutivos de la secuencia ``nombre``.
+
+    Debe llamarse dentro de la transacción que guarda los documentos (con
+    ``transaction.atomic()``): los números no usados al confirmar quedarían
+    como huecos.
+
+    Returns:
+        list: Números ya formateados (p. ej. ``FACT-0000000042``), en orden
+    """
+    if cantidad < 1:
+        return []
+    if not connection.in_atomic_block:
+        raise transaction.TransactionManagementError(
+            'Los números de documento se reservan dentro de la transacción que los guarda'
+        )
+    ultimo = _avanzar(nombre, cantidad)
+    formato = FORMATOS[nombre]
+    return [formato.format(numero) for numero in range(ultimo - cantidad + 1, ultimo + 1)]
+
+
+def siguiente_numero(nombre):
+    """Siguiente número formateado de la secuencia ``nombre`` (ver ``reservar_numeros``)."""
+    return reservar_numeros(nombre, 1)[0]
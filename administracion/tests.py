@@ -1,3 +1,112 @@
-from django.test import TestCase
+import threading
 
-# Create your tests here.
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+
+from autenticacion.models import Usuario
+from pagos.models import Factura, Pago
+from propietarios.models import Propietario
+from .models import Secuencia
+from .secuencias import reservar_numeros, siguiente_numero
+
+
+def crear_pago():
+    staff = Usuario.objects.create_user(username='recepcion', password='Rec*12345', rol='ADMINISTRATIVO')
+    usuario = Usuario.objects.create_user(username='prop', password='Prop*12345', rol='PROPIETARIO')
+    propietario = Propietario.objects.create(
+        usuario=usuario, nombre='Propietario Uno', documento='123456789',
+        telefono='3001234567', correo='prop@example.com',
+    )
+    return Pago.objects.create(
+        propietario=propietario, monto=50000, tipo_pago='EFECTIVO', estado='COMPLETADO', usuario_registro=staff,
+    )
+
+
+def facturar(pago):
+    return Factura.objects.create(pago=pago, propietario=pago.propietario, subtotal=50000, total=50000)
+
+
+class SecuenciasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pago = crear_pago()
+
+    def test_numeros_consecutivos_y_sin_huecos_al_revertir(self):
+        self.assertEqual(facturar(self.pago).numero_factura, 'FACT-0000000001')
+
+        factura = Factura(pago=self.pago, propietario=self.pago.propietario, subtotal=1, total=1)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                factura.save()
+                raise RuntimeError('Pago rechazado')
+        self.assertEqual(Secuencia.objects.get(nombre='factura').ultimo, 1)
+
+        self.assertEqual(facturar(self.pago).numero_factura, 'FACT-0000000002')
+        with transaction.atomic():
+            self.assertEqual(siguiente_numero('certificado'), 'CERT-0000000001')
+
+    def test_reservar_bloque(self):
+        with transaction.atomic():
+            bloque = reservar_numeros('factura', 3)
+        self.assertEqual(bloque, ['FACT-0000000001', 'FACT-0000000002', 'FACT-0000000003'])
+        self.assertEqual(facturar(self.pago).numero_factura, 'FACT-0000000004')
+        with transaction.atomic():
+            self.assertEqual(reservar_numeros('nueva', 0), [])
+
+    def test_exige_transaccion(self):
+        # TestCase envuelve cada prueba en una transacción: se simula el modo autocommit
+        atomic = connection.in_atomic_block
+        connection.in_atomic_block = False
+        try:
+            with self.assertRaises(transaction.TransactionManagementError):
+                reservar_numeros('factura', 1)
+        finally:
+            connection.in_atomic_block = atomic
+
+
+class SecuenciasConcurrenciaTests(TransactionTestCase):
+
+    def test_hilos_concurrentes_sin_huecos_ni_duplicados(self):
+        pago = crear_pago()
+        hilos, por_hilo = 8, 15
+        errores = []
+        barrera = threading.Barrier(hilos)
+
+        def trabajar(indice):
+            try:
+                barrera.wait()
+                for numero in range(por_hilo):
+                    if indice % 2:
+                        facturar(pago)
+                    else:
+                        # Transacciones revertidas y reservas de bloques mezcladas
+                        try:
+                            with transaction.atomic():
+                                reservar_numeros('factura', 3)
+                                raise ValueError
+                        except ValueError:
+                            pass
+                        with transaction.atomic():
+                            numeros = reservar_numeros('factura', 2)
+                            Factura.objects.bulk_create([
+                                Factura(numero_factura=n, pago=pago, propietario_id=pago.propietario_id,
+                                        subtotal=1, total=1)
+                                for n in numeros
+                            ])
+            except Exception as error:
+                errores.append(error)
+            finally:
+                connections.close_all()
+
+        trabajadores = [threading.Thread(target=trabajar, args=(i,)) for i in range(hilos)]
+        for hilo in trabajadores:
+            hilo.start()
+        for hilo in trabajadores:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        numeros = sorted(int(n[5:]) for n in Factura.objects.values_list('numero_factura', flat=True))
+        esperadas = hilos // 2 * por_hilo * (1 + 2)
+        self.assertEqual(numeros, list(range(1, esperadas + 1)))
+        self.assertEqual(Secuencia.objects.get(nombre='factura').ultimo, esperadas)
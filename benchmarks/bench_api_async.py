@@ -0,0 +1,100 @@
+"""
+Benchmark de la API de notificaciones: vista síncrona vs. async bajo ASGI.
+
+Simula clientes que sondean ``api/mis/`` al mismo tiempo (200 por
+defecto), cada uno con su sesión, contra el manejador ASGI de Django en el
+mismo proceso (``AsyncClient``). La vista síncrona es la versión anterior
+de ``api_mis_notificaciones`` (pasa por ``sync_to_async`` en el hilo
+compartido de las vistas síncronas); la async es la actual. Mide
+peticiones por segundo y latencia p50/p95.
+
+Uso:
+    python benchmarks/bench_api_async.py [--clientes 200] [--peticiones 10] [--notificaciones 50]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from types import ModuleType
+
+from entorno import preparar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clientes', type=int, default=200)
+    parser.add_argument('--peticiones', type=int, default=10, help='Peticiones por cliente')
+    parser.add_argument('--notificaciones', type=int, default=50, help='Notificaciones por usuario')
+    args = parser.parse_args()
+
+    preparar(en_archivo=True)
+    from django.conf import settings
+    from django.contrib.auth.decorators import login_required
+    from django.http import JsonResponse
+    from django.test import AsyncClient
+    from django.urls import path
+    from autenticacion.models import Usuario
+    from notificaciones import views
+    from notificaciones.contadores import contar_no_leidas
+    from notificaciones.models import Notificacion
+    from notificaciones.paginacion import pagina
+
+    @login_required
+    def api_mis_sync(request):
+        filas, siguiente = pagina(Notificacion.objects.filter(usuario=request.user), None, 20)
+        datos = [{
+            'id': n.id, 'tipo': n.tipo, 'asunto': n.asunto, 'mensaje': n.mensaje, 'leida': n.leida,
+            'fecha_envio': n.fecha_envio.isoformat(), 'cita_id': n.cita_id, 'detalle': n.detalle,
+        } for n in filas]
+        return JsonResponse({'unread': contar_no_leidas(request.user.id), 'items': datos, 'siguiente': siguiente})
+
+    urls = ModuleType('urls_bench')
+    urls.urlpatterns = [
+        path('sync/', api_mis_sync),
+        path('async/', views.api_mis_notificaciones),
+    ]
+    settings.ROOT_URLCONF = urls
+
+    usuarios = Usuario.objects.bulk_create([
+        Usuario(username=f'usuario{i}', rol='PROPIETARIO', password='!') for i in range(args.clientes)
+    ])
+    Notificacion.objects.bulk_create([
+        Notificacion(usuario=u, tipo='SISTEMA', asunto=f'Aviso {i}', mensaje='Mensaje', canal_enviado='EMAIL')
+        for u in usuarios for i in range(args.notificaciones)
+    ], batch_size=2000)
+
+    async def sondear(cliente, url, latencias):
+        for _ in range(args.peticiones):
+            inicio = time.perf_counter()
+            respuesta = await cliente.get(url, {'limite': 20})
+            assert respuesta.status_code == 200
+            latencias.append(time.perf_counter() - inicio)
+
+    async def escenario(url):
+        clientes = []
+        for usuario in usuarios:
+            cliente = AsyncClient()
+            await cliente.aforce_login(usuario)
+            clientes.append(cliente)
+        # Calentamiento: inicializa los contadores y las sesiones
+        await asyncio.gather(*(cliente.get(url) for cliente in clientes))
+
+        latencias = []
+        inicio = time.perf_counter()
+        await asyncio.gather(*(sondear(cliente, url, latencias) for cliente in clientes))
+        return time.perf_counter() - inicio, sorted(latencias)
+
+    print(f'{args.clientes} clientes x {args.peticiones} peticiones')
+    print(f"{'Vista':<12}{'pet/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for nombre, url in (('Síncrona', '/sync/'), ('Async', '/async/')):
+        duracion, latencias = asyncio.run(escenario(url))
+        p95 = latencias[int(len(latencias) * 0.95)]
+        print(
+            f'{nombre:<12}{len(latencias) / duracion:>10.0f}'
+            f'{statistics.median(latencias) * 1000:>10.1f}{p95 * 1000:>10.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
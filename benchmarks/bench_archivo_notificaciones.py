@@ -0,0 +1,88 @@
+"""
+Benchmark del archivo de notificaciones.
+
+Carga notificaciones antiguas con sus logs, las archiva con
+``archivar_notificaciones`` y mide el rendimiento, el tiempo máximo que
+tarda cada lote (cota de lo que puede esperar una escritura de la
+aplicación) y el tamaño del archivo frente a la tabla.
+
+Uso:
+    python benchmarks/bench_archivo_notificaciones.py [--notificaciones 50000] [--lote 500]
+"""
+
+import argparse
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+
+from entorno import crear_datos, imprimir, medir, preparar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--notificaciones', type=int, default=50000)
+    parser.add_argument('--lote', type=int, default=500)
+    args = parser.parse_args()
+
+    preparar()
+    from django.conf import settings
+    from django.db import connection
+    from autenticacion.models import Usuario
+    from django.utils import timezone
+    from notificaciones import archivo
+    from notificaciones.models import Notificacion, NotificacionLog
+
+    settings.MEDIA_ROOT = tempfile.mkdtemp()
+    crear_datos(num_citas=100)
+    usuarios = list(Usuario.objects.filter(rol='PROPIETARIO').values_list('pk', flat=True))
+    hace_dos_anios = timezone.now() - timedelta(days=730)
+    notificaciones = Notificacion.objects.bulk_create([
+        Notificacion(usuario_id=usuarios[i % len(usuarios)], tipo='SISTEMA', asunto=f'Aviso {i}',
+                     mensaje='Mensaje de prueba ' * 10, canal_enviado='EMAIL', leida=i % 3 == 0)
+        for i in range(args.notificaciones)
+    ], batch_size=2000)
+    # Repartidas en 12 meses hace dos años
+    for mes in range(12):
+        Notificacion.objects.filter(id__gt=notificaciones[0].id + mes * args.notificaciones // 12 - 1).update(
+            fecha_envio=hace_dos_anios + timedelta(days=30 * mes)
+        )
+    NotificacionLog.objects.bulk_create([
+        NotificacionLog(notificacion=n, accion=accion, detalles={'cita_id': None})
+        for n in notificaciones for accion in ('CREADA', 'LEIDA')
+    ], batch_size=2000)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name LIKE %s', ['notificaciones_notificacion%'])
+        tamano_tablas = cursor.fetchone()[0] or 0
+
+    resultados = []
+    lotes = []
+    archivadas = Counter()
+    corte = archivo.fecha_corte(12)
+    inicio = time.perf_counter()
+    with medir(f'Archivar {args.notificaciones} notificaciones (lote {args.lote})', resultados):
+        while True:
+            antes = time.perf_counter()
+            lote = archivo.archivar_lote(corte, args.lote)
+            if not lote:
+                break
+            lotes.append(time.perf_counter() - antes)
+            archivadas.update(lote)
+    duracion = time.perf_counter() - inicio
+
+    with medir('Leer un mes archivado', resultados):
+        anio, mes = archivo.meses_archivados()[0]
+        leidas = sum(1 for _ in archivo.leer_mes(anio, mes))
+    imprimir(resultados)
+
+    tamano_archivo = sum(ruta.stat().st_size for ruta in Path(settings.MEDIA_ROOT).rglob('*.gz'))
+    print(f'Archivadas: {sum(archivadas.values())} en {len(archivadas)} meses; {sum(archivadas.values()) / duracion:.0f}/s')
+    # Cota superior del tiempo que un lote retiene la escritura (incluye leer y comprimir)
+    print(f'Tiempo por lote: máx {max(lotes) * 1000:.1f} ms, media {sum(lotes) / len(lotes) * 1000:.1f} ms')
+    print(f'Tablas antes: {tamano_tablas / 1e6:.1f} MB; archivo gzip: {tamano_archivo / 1e6:.1f} MB; '
+          f'filas leídas del mes {anio}-{mes:02d}: {leidas}')
+
+
+if __name__ == '__main__':
+    main()
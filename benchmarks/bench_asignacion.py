@@ -0,0 +1,60 @@
+"""
+Benchmark de la asignación automática de veterinario
+(citas.disponibilidad.asignar_veterinario).
+
+Carga 50 veterinarios y 20.000 citas y verifica que la asignación usa un
+número constante de consultas, comparándola con un conteo por veterinario.
+
+Uso:
+    python benchmarks/bench_asignacion.py [--veterinarios 50] [--citas 20000]
+"""
+
+import argparse
+from datetime import time
+
+from entorno import crear_datos, imprimir, medir, preparar
+
+
+def asignacion_por_veterinario(fecha, hora, duracion):
+    """Alternativa ingenua: una consulta de carga y otra de cruce por veterinario."""
+    from autenticacion.models import Usuario
+    from citas.disponibilidad import esta_disponible
+
+    candidatos = []
+    for vet in Usuario.objects.filter(rol='VETERINARIO', activo=True):
+        if esta_disponible(vet.id, fecha, hora, duracion):
+            carga = vet.citas_asignadas.filter(fecha=fecha).exclude(estado='CANCELADA').count()
+            candidatos.append((carga, vet.id, vet))
+    return min(candidatos)[2] if candidatos else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--veterinarios', type=int, default=50)
+    parser.add_argument('--citas', type=int, default=20000)
+    args = parser.parse_args()
+
+    preparar()
+    from citas.disponibilidad import asignar_veterinario
+    from citas.models import Cita
+    from citas.resumen import reconstruir_resumen
+
+    datos = crear_datos(num_veterinarios=args.veterinarios, num_citas=args.citas)
+    fecha = datos['dias'][0]
+    # Liberar algunas franjas de las 11:00 para que haya candidatos
+    Cita.objects.filter(fecha=fecha, hora=time(11, 0), veterinario__in=datos['veterinarios'][::7]).update(estado='CANCELADA')
+    reconstruir_resumen(fecha, fecha)
+
+    resultados = []
+    with medir(f'Conteo por veterinario ({args.veterinarios} vets)', resultados):
+        esperado = asignacion_por_veterinario(fecha, time(11, 0), 30)
+    with medir(f'asignar_veterinario ({args.citas} citas)', resultados):
+        asignado = asignar_veterinario(fecha, time(11, 0), 30)
+    with medir('asignar_veterinario (sin cupo)', resultados):
+        asignar_veterinario(fecha, time(9, 0), 30)
+    imprimir(resultados)
+    print(f'Asignado: {asignado} (esperado: {esperado})')
+
+
+if __name__ == '__main__':
+    main()
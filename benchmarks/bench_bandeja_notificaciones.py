@@ -0,0 +1,60 @@
+"""
+Benchmark de la paginación de las bandejas de notificaciones.
+
+Compara páginas cercanas y lejanas con ``OFFSET`` (paginación clásica)
+y con cursor (``notificaciones.paginacion``) sobre una bandeja grande.
+
+Uso:
+    python benchmarks/bench_bandeja_notificaciones.py [--notificaciones 200000]
+"""
+
+import argparse
+
+from entorno import imprimir, medir, preparar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--notificaciones', type=int, default=200000)
+    args = parser.parse_args()
+
+    preparar()
+    from autenticacion.models import Usuario
+    from notificaciones.models import Notificacion
+    from notificaciones.paginacion import ORDEN, TAMANO_PAGINA, codificar_cursor, despues_de, pagina, parsear_cursor
+
+    usuarios = Usuario.objects.bulk_create([
+        Usuario(username=f'u{i}', rol='PROPIETARIO', password='!') for i in range(4)
+    ])
+    tipos = ['CONFIRMACION', 'RECORDATORIO', 'CANCELACION', 'SISTEMA']
+    Notificacion.objects.bulk_create((
+        Notificacion(usuario=usuarios[i % len(usuarios)], tipo=tipos[i % len(tipos)],
+                     asunto='Aviso', mensaje='x', canal_enviado='EMAIL')
+        for i in range(args.notificaciones)
+    ), batch_size=5000)
+
+    usuario = usuarios[0]
+    propias = Notificacion.objects.filter(usuario=usuario)
+    total = propias.count()
+    profunda = (total // TAMANO_PAGINA) - 1
+    ultima = propias.order_by(*ORDEN)[profunda * TAMANO_PAGINA - 1]
+    cursor = parsear_cursor(codificar_cursor(ultima))
+
+    resultados = []
+    with medir('OFFSET página 1', resultados):
+        list(propias.order_by(*ORDEN)[:TAMANO_PAGINA])
+    with medir(f'OFFSET página {profunda + 1}', resultados):
+        list(propias.order_by(*ORDEN)[profunda * TAMANO_PAGINA:(profunda + 1) * TAMANO_PAGINA])
+    with medir('Cursor página 1', resultados):
+        pagina(propias)
+    with medir(f'Cursor página {profunda + 1}', resultados):
+        filas, _ = pagina(propias, cursor)
+    with medir('Admin por tipo, cursor página 1', resultados):
+        pagina(Notificacion.objects.filter(tipo='SISTEMA'))
+    imprimir(resultados)
+    print(f'Bandeja de {total} notificaciones; plan de la página profunda:')
+    print(despues_de(propias, cursor)[:TAMANO_PAGINA + 1].explain())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark de la bandeja de salida de notificaciones.
+
+Compara el costo dentro de la petición de encolar eventos de cita con el
+de crear sus notificaciones en línea (como antes de la bandeja), para
+distinta cantidad de eventos, y mide el rendimiento del despachador con y
+sin el modo resumen (filas, logs y envíos por websocket).
+
+Uso:
+    python benchmarks/bench_bandeja_salida.py [--eventos 5000] [--lote 200]
+"""
+
+import argparse
+import time
+from datetime import timedelta
+
+from entorno import crear_datos, imprimir, medir, preparar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--eventos', type=int, default=5000)
+    parser.add_argument('--lote', type=int, default=200)
+    args = parser.parse_args()
+
+    preparar()
+    from django.db import transaction
+    from citas.models import Cita
+    from django.utils import timezone
+    from autenticacion.models import Usuario
+    from notificaciones.models import EventoSalida, Notificacion, NotificacionLog, PreferenciaNotificacion
+    from notificaciones.presencia import estadisticas
+    from notificaciones.services import crear_eventos_cita, despachar_resumenes, despachar_salida
+
+    datos = crear_datos(num_citas=max(args.eventos, 100))
+    actor = datos['admin']
+    citas = list(Cita.objects.select_related('propietario').order_by('id')[:args.eventos])
+
+    def eventos(cantidad):
+        return [(cita, 'CONFIRMACION', 'Nueva cita', f'Cita #{cita.id}') for cita in citas[:cantidad]]
+
+    resultados = []
+    for cantidad in (1, 10, 100):
+        with medir(f'Petición en línea ({cantidad} eventos)', resultados):
+            with transaction.atomic():
+                crear_eventos_cita(actor, eventos(cantidad))
+                despachar_salida(cantidad)
+        with medir(f'Petición con bandeja ({cantidad} eventos)', resultados):
+            with transaction.atomic():
+                crear_eventos_cita(actor, eventos(cantidad))
+    despachar_salida(1000)
+
+    def volumen():
+        return Notificacion.objects.count(), NotificacionLog.objects.count(), sum(estadisticas.values())
+
+    crear_eventos_cita(actor, eventos(args.eventos))
+    antes = volumen()
+    inicio = time.perf_counter()
+    with medir(f'Despachador ({args.eventos} eventos, lote {args.lote})', resultados):
+        while despachar_salida(args.lote):
+            pass
+    duracion = time.perf_counter() - inicio
+    sin_resumen = [despues - previo for despues, previo in zip(volumen(), antes)]
+
+    # Los mismos eventos con todos los usuarios en modo resumen (ventana de una hora)
+    PreferenciaNotificacion.objects.bulk_create([
+        PreferenciaNotificacion(usuario_id=pk, resumen_minutos=60) for pk in Usuario.objects.values_list('pk', flat=True)
+    ])
+    crear_eventos_cita(actor, eventos(args.eventos))
+    antes = volumen()
+    with medir(f'Despachador en modo resumen ({args.eventos} eventos)', resultados):
+        while despachar_salida(args.lote):
+            pass
+        despachar_resumenes(timezone.now() + timedelta(minutes=61))
+    con_resumen = [despues - previo for despues, previo in zip(volumen(), antes)]
+
+    imprimir(resultados)
+    pendientes = EventoSalida.objects.filter(fecha_despacho__isnull=True).count()
+    print(f'Despachador: {args.eventos / duracion:.0f} eventos/s; pendientes: {pendientes}')
+    print(f"\n{'Modo':<20}{'Notificaciones':>16}{'Logs':>10}{'Envíos websocket':>18}")
+    for modo, (filas, logs, envios) in (('Una por evento', sin_resumen), ('Resumen', con_resumen)):
+        print(f'{modo:<20}{filas:>16}{logs:>10}{envios:>18}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark del feed del calendario (citas.views.api_citas).
+
+Carga 10.000 citas y compara el feed anterior (una consulta por relación
+y por cita) con el motor proyectado, incluyendo la respuesta 304.
+
+Uso:
+    python benchmarks/bench_calendario.py [--citas 10000]
+"""
+
+import argparse
+
+from entorno import crear_datos, imprimir, medir, preparar
+
+
+def feed_anterior(inicio, fin):
+    """Réplica del feed original: accede a las relaciones cita por cita."""
+    from citas.models import Cita
+
+    eventos = []
+    for cita in Cita.objects.filter(fecha__range=[inicio, fin], estado__in=['PROGRAMADA', 'CONFIRMADA', 'COMPLETADA']):
+        eventos.append({
+            'id': cita.id,
+            'title': f"{cita.mascota.nombre} - {cita.servicio.nombre}",
+            'start': f"{cita.fecha}T{cita.hora}",
+            'color': cita.servicio.color_calendario,
+            'extendedProps': {
+                'propietario': cita.propietario.nombre,
+                'veterinario': cita.veterinario.get_full_name(),
+                'estado': cita.get_estado_display(),
+            }
+        })
+    return eventos
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--citas', type=int, default=10000)
+    args = parser.parse_args()
+
+    preparar()
+    from django.test import Client
+    from citas.calendario import eventos_calendario
+
+    datos = crear_datos(num_veterinarios=10, num_citas=args.citas)
+    inicio, fin = datos['dias'][0], datos['dias'][-1]
+    params = {'start': f'{inicio}T00:00:00', 'end': f'{fin}T00:00:00'}
+
+    client = Client()
+    client.force_login(datos['admin'])
+    client.get('/citas/api/eventos/', params)  # Calentar sesión
+
+    resultados = []
+    with medir(f'Feed anterior ({args.citas} citas)', resultados):
+        feed_anterior(inicio, fin)
+    with medir(f'Motor proyectado ({args.citas} citas)', resultados):
+        eventos_calendario(inicio, fin)
+    with medir('GET api_citas 200', resultados):
+        response = client.get('/citas/api/eventos/', params)
+    with medir('GET api_citas 304 (If-None-Match)', resultados):
+        client.get('/citas/api/eventos/', params, HTTP_IF_NONE_MATCH=response['ETag'])
+    with medir('GET api_citas filtrado por veterinario', resultados):
+        client.get('/citas/api/eventos/', {**params, 'veterinario': datos['veterinarios'][0].id})
+    imprimir(resultados)
+
+
+if __name__ == '__main__':
+    main()
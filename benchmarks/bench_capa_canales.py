@@ -0,0 +1,177 @@
+"""
+Benchmark de la capa de canales multiproceso (``SQLiteChannelLayer``).
+
+Levanta varios procesos "worker" con sockets ``NotificationConsumer``
+conectados (1000 en total por defecto, un usuario por socket) y, desde el
+proceso principal, envía con ``push_usuarios`` una notificación por ronda
+a todos los usuarios, conectados o no (con una pausa entre rondas para
+que la latencia no incluya la cola de la ronda anterior). Mide el
+rendimiento del envío, el de la entrega de extremo a extremo, la latencia
+(p50/p95/p99) y los envíos que la presencia evita frente a un
+``group_send`` por usuario.
+
+Uso:
+    python benchmarks/bench_capa_canales.py [--sockets 1000] [--usuarios 5000] [--procesos 4] [--rondas 5]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from entorno import preparar
+
+
+def configurar(ruta, base_datos=None):
+    import django
+    from django.conf import settings
+
+    django.setup()
+    if base_datos:
+        settings.DATABASES['default']['NAME'] = base_datos
+    settings.CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'notificaciones.capa_sqlite.SQLiteChannelLayer',
+            'CONFIG': {'ruta': ruta},
+        }
+    }
+    from channels.layers import channel_layers
+    channel_layers.backends = {}
+
+
+def worker(ruta, base_datos, usuario_ids, rondas, listos, resultados):
+    configurar(ruta, base_datos)
+    from asgiref.testing import ApplicationCommunicator
+    from notificaciones.consumers import NotificationConsumer
+
+    async def principal():
+        sockets = []
+        for usuario_id in usuario_ids:
+            communicator = ApplicationCommunicator(NotificationConsumer.as_asgi(), {
+                'type': 'websocket', 'path': '/ws/notificaciones/',
+                'user': SimpleNamespace(id=usuario_id, is_authenticated=True),
+            })
+            await communicator.send_input({'type': 'websocket.connect'})
+            assert (await communicator.receive_output(10))['type'] == 'websocket.accept'
+            sockets.append(communicator)
+        listos.put(len(sockets))
+
+        async def recibir(communicator):
+            latencias = []
+            for _ in range(rondas):
+                mensaje = await communicator.receive_output(120)
+                datos = json.loads(mensaje['text'])
+                recibido = time.time()
+                latencias.append((datos['ronda'], recibido - datos['t'], recibido))
+            return latencias
+
+        por_socket = await asyncio.gather(*(recibir(c) for c in sockets))
+        for communicator in sockets:
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await communicator.wait()
+        return [dato for latencias in por_socket for dato in latencias]
+
+    resultados.put(asyncio.run(principal()))
+
+
+def percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sockets', type=int, default=1000)
+    parser.add_argument('--usuarios', type=int, default=5000)
+    parser.add_argument('--procesos', type=int, default=4)
+    parser.add_argument('--rondas', type=int, default=5)
+    parser.add_argument('--pausa', type=float, default=1.0)
+    args = parser.parse_args()
+
+    preparar(en_archivo=True)
+    from django.conf import settings
+    ruta = str(Path(tempfile.mkdtemp()) / 'channels.sqlite3')
+    base_datos = settings.DATABASES['default']['NAME']
+    configurar(ruta)
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+    from autenticacion.models import Usuario
+    from notificaciones.presencia import estadisticas
+    from notificaciones.services import push_usuarios
+
+    Usuario.objects.bulk_create([
+        Usuario(username=f'usuario{i}', rol='PROPIETARIO') for i in range(max(args.usuarios, args.sockets))
+    ])
+    usuario_ids = list(Usuario.objects.order_by('id').values_list('id', flat=True))
+    conectados_ids = usuario_ids[:args.sockets]
+
+    contexto = multiprocessing.get_context('spawn')
+    listos, resultados = contexto.Queue(), contexto.Queue()
+    procesos = [
+        contexto.Process(
+            target=worker,
+            args=(ruta, base_datos, conectados_ids[i::args.procesos], args.rondas, listos, resultados),
+        )
+        for i in range(args.procesos)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    conectados = sum(listos.get(timeout=120) for _ in procesos)
+
+    envios = []
+    inicios = []
+    for ronda in range(args.rondas):
+        if ronda:
+            time.sleep(args.pausa)
+        inicios.append(time.time())
+        antes = time.perf_counter()
+        push_usuarios([(usuario_id, {'ronda': ronda, 't': time.time()}) for usuario_id in usuario_ids])
+        envios.append(time.perf_counter() - antes)
+
+    entregas = [dato for _ in procesos for dato in resultados.get(timeout=300)]
+    for proceso in procesos:
+        proceso.join()
+
+    # Referencia: un group_send por usuario, sin consultar la presencia
+    capa = get_channel_layer()
+
+    async def sin_presencia():
+        await asyncio.gather(*(
+            capa.group_send(f'user_{usuario_id}', {'type': 'notify', 'data': {}}) for usuario_id in usuario_ids
+        ))
+
+    antes = time.perf_counter()
+    async_to_sync(sin_presencia)()
+    referencia = time.perf_counter() - antes
+
+    latencias = sorted(latencia * 1000 for _, latencia, _ in entregas)
+    # Rendimiento de entrega: mensajes de la ronda / tiempo hasta el último entregado
+    ultimas = {}
+    for ronda, _, recibido in entregas:
+        ultimas[ronda] = max(ultimas.get(ronda, 0), recibido)
+    duraciones = [ultimas[ronda] - inicios[ronda] for ronda in ultimas]
+    total = len(usuario_ids) * args.rondas
+
+    print(
+        f'Sockets conectados: {conectados} en {args.procesos} procesos; '
+        f'{len(usuario_ids)} usuarios notificados por ronda, {args.rondas} rondas'
+    )
+    print(f"{'Métrica':<45}{'Valor':>14}")
+    print(f"{'Mensajes entregados':<45}{len(entregas):>14}")
+    print(f"{'push_usuarios por ronda (ms, mediana)':<45}{statistics.median(envios) * 1000:>14.1f}")
+    print(f"{'Sin presencia por ronda (ms)':<45}{referencia * 1000:>14.1f}")
+    print(f"{'Envío (notificaciones/s)':<45}{total / sum(envios):>14.0f}")
+    print(f"{'group_send hechos':<45}{estadisticas['enviados']:>14}")
+    print(f"{'group_send omitidos (sin conexión)':<45}{estadisticas['omitidos']:>14}")
+    print(f"{'Entrega de extremo a extremo (mensajes/s)':<45}{args.sockets / statistics.median(duraciones):>14.0f}")
+    for p in (50, 95, 99):
+        print(f"{f'Latencia p{p} (ms)':<45}{percentil(latencias, p):>14.1f}")
+    print(f"{'Latencia máxima (ms)':<45}{latencias[-1]:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark de la generación de facturas en PDF.
+
+Carga facturas sin PDF (2000 por defecto) y mide:
+
+* la vista de impresión HTML, que se vuelve a renderizar en cada visita,
+  frente a servir el PDF ya generado;
+* dibujar una factura cargando fuentes y logo cada vez frente a cargarlos
+  una sola vez por proceso;
+* el relleno completo (``generar_pendientes``) en este proceso y con pools
+  de 1, 2 y 4 procesos, en páginas por segundo.
+
+Uso:
+    python benchmarks/bench_facturas_pdf.py [--facturas 2000] [--muestra 200] [--procesos 1 2 4]
+"""
+
+import argparse
+import tempfile
+import time
+
+from entorno import crear_datos, preparar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--facturas', type=int, default=2000)
+    parser.add_argument('--muestra', type=int, default=200, help='Visitas y dibujos individuales medidos')
+    parser.add_argument('--procesos', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--lote', type=int, default=200)
+    args = parser.parse_args()
+
+    preparar()
+    from django.conf import settings
+    from django.db import transaction
+    from django.test import Client
+    from django.urls import reverse
+    from administracion.secuencias import reservar_numeros
+    from pagos import pdf
+    from pagos.facturas import crear_ejecutor, datos_factura, generar_pendientes
+    from pagos.models import Factura, Pago
+
+    settings.MEDIA_ROOT = tempfile.mkdtemp()
+    datos = crear_datos(num_citas=args.facturas)
+    from citas.models import Cita
+    citas = list(Cita.objects.select_related('servicio').order_by('id'))
+    pagos = Pago.objects.bulk_create([
+        Pago(cita=cita, propietario_id=cita.propietario_id, monto=cita.servicio.precio, tipo_pago='EFECTIVO',
+             estado='COMPLETADO', usuario_registro=datos['admin'])
+        for cita in citas
+    ], batch_size=2000)
+    # bulk_create no pasa por Factura.save(): los números se reservan en bloque
+    with transaction.atomic():
+        numeros = reservar_numeros('factura', len(pagos))
+        Factura.objects.bulk_create([
+            Factura(numero_factura=numero, pago=pago, propietario_id=pago.propietario_id,
+                    subtotal=pago.monto, impuestos=0, total=pago.monto)
+            for numero, pago in zip(numeros, pagos)
+        ], batch_size=2000)
+
+    filas = []
+
+    def fila(etiqueta, segundos, cantidad, unidad):
+        filas.append((etiqueta, segundos * 1000 / cantidad, cantidad / segundos, unidad))
+
+    # Visitas: HTML renderizado en cada una frente al PDF guardado
+    muestra = list(Factura.objects.order_by('id').values_list('id', flat=True)[:args.muestra])
+    cliente = Client()
+    cliente.force_login(datos['admin'])
+    inicio = time.perf_counter()
+    for pk in muestra:
+        assert cliente.get(reverse('pagos:factura_print', args=[pk])).status_code == 200
+    fila('Vista de impresión HTML', time.perf_counter() - inicio, len(muestra), 'visitas/s')
+
+    # Dibujo individual: recursos cargados cada vez frente a una vez
+    seleccion = [
+        datos_factura(f) for f in Factura.objects.filter(pk__in=muestra)
+        .select_related('propietario', 'pago__cita__servicio')
+    ]
+    inicio = time.perf_counter()
+    for d in seleccion:
+        pdf._recursos.clear()
+        pdf.renderizar_factura(d)
+    fila('PDF cargando fuentes y logo cada vez', time.perf_counter() - inicio, len(seleccion), 'páginas/s')
+    pdf.inicializar(seleccion[0]['ruta_logo'])
+    inicio = time.perf_counter()
+    for d in seleccion:
+        pdf.renderizar_factura(d)
+    fila('PDF con recursos cargados una vez', time.perf_counter() - inicio, len(seleccion), 'páginas/s')
+
+    # Relleno completo: en este proceso y con pools de procesos
+    total = Factura.objects.count()
+    escenarios = [(0, 'Relleno en este proceso')] + [(n, f'Relleno con pool de {n} procesos') for n in args.procesos]
+    for procesos, etiqueta in escenarios:
+        Factura.objects.update(pdf='')
+        ejecutor = crear_ejecutor(procesos) if procesos else None
+        if ejecutor is not None:
+            # Arranque de los procesos fuera de la medición
+            list(ejecutor.map(pdf.inicializar, [seleccion[0]['ruta_logo']] * procesos))
+        inicio = time.perf_counter()
+        resultado = generar_pendientes(ejecutor, args.lote)
+        duracion = time.perf_counter() - inicio
+        if ejecutor is not None:
+            ejecutor.shutdown()
+        assert resultado['facturas'] == total, resultado
+        fila(etiqueta, duracion, resultado['paginas'], 'páginas/s')
+
+    inicio = time.perf_counter()
+    for pk in muestra:
+        respuesta = cliente.get(reverse('pagos:factura_pdf', args=[pk]))
+        b''.join(respuesta.streaming_content)
+    fila('Descarga del PDF guardado', time.perf_counter() - inicio, len(muestra), 'visitas/s')
+
+    print(f'{total} facturas; muestra de {len(muestra)}')
+    print(f"{'Operación':<45}{'ms/unidad':>12}{'por segundo':>14}")
+    for etiqueta, ms, por_segundo, unidad in filas:
+        print(f'{etiqueta:<45}{ms:>12.2f}{por_segundo:>14.0f} {unidad}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark de la asignación de huecos a la lista de espera
+(citas.lista_espera.siguiente_en_espera / ocupar_hueco).
+
+Carga decenas de miles de entradas pendientes y compara la búsqueda por
+servicio sobre el índice (servicio, atendido, prioridad, fecha_solicitud)
+con una consulta única que ordena toda la lista.
+
+Uso:
+    python benchmarks/bench_lista_espera.py [--entradas 50000]
+"""
+
+import argparse
+import random
+from datetime import time
+
+from entorno import crear_datos, imprimir, medir, preparar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entradas', type=int, default=50000)
+    args = parser.parse_args()
+
+    preparar()
+    from django.db import connection
+    from citas.lista_espera import ocupar_hueco, siguiente_en_espera
+    from citas.models import ListaEspera
+
+    datos = crear_datos(num_veterinarios=5, num_citas=100, num_propietarios=500)
+    mascotas = datos['mascotas']
+    servicios = datos['servicios']
+    ListaEspera.objects.bulk_create([
+        ListaEspera(
+            paciente=random.choice(mascotas),
+            servicio=random.choice(servicios),
+            prioridad=random.randint(1, 5),
+            atendido=random.random() < 0.3,
+        )
+        for _ in range(args.entradas)
+    ], batch_size=5000)
+
+    ordenar_todo = ListaEspera.objects.filter(
+        atendido=False, servicio__activo=True, servicio__duracion_minutos__lte=30
+    ).order_by('prioridad', 'fecha_solicitud', 'id')
+
+    resultados = []
+    with medir('Ordenar toda la lista (una consulta)', resultados):
+        esperado = ordenar_todo.first()
+    with medir(f'siguiente_en_espera ({args.entradas} entradas)', resultados):
+        entrada = siguiente_en_espera(30)
+    # Hueco de las 08:00 del primer veterinario (cancelar su cita)
+    veterinario = datos['veterinarios'][0]
+    fecha = datos['dias'][0]
+    veterinario.citas_asignadas.filter(fecha=fecha, hora=time(8, 0)).update(estado='CANCELADA')
+    with medir('ocupar_hueco (asignación completa)', resultados):
+        asignada, cita = ocupar_hueco(veterinario.id, fecha, time(8, 0), datos['admin'])
+    imprimir(resultados)
+    print(f'Elegida: #{entrada.pk} (esperada: #{esperado.pk}); cita creada: {cita}')
+
+    consulta = ListaEspera.objects.filter(servicio_id=servicios[0].id, atendido__in=[False]).order_by(
+        'prioridad', 'fecha_solicitud', 'id').values_list('prioridad', 'fecha_solicitud', 'id')[:1]
+    sql, params = consulta.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        print('Plan:', ' | '.join(fila[-1] for fila in cursor.fetchall()))
+
+
+if __name__ == '__main__':
+    main()
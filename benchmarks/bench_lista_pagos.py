@@ -0,0 +1,101 @@
+"""
+Benchmark del historial de pagos (``pagos:lista`` y ``pagos:exportar_csv``).
+
+Carga pagos repartidos en dos años (100.000 por defecto) y compara la
+lista anterior (todos los pagos, con el propietario y la cita cargados por
+fila) con la paginada por cursor: primera página, una página profunda y
+con filtros, incluidos los totales del período. Luego exporta el CSV
+completo en streaming y mide filas por segundo y el pico de memoria de
+Python (``tracemalloc``) para la mitad y para todos los pagos: con
+lectura por bloques el pico no depende del número de filas.
+
+Uso:
+    python benchmarks/bench_lista_pagos.py [--pagos 100000] [--sin-anterior]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from asgiref.sync import async_to_sync
+
+from entorno import crear_datos, imprimir, medir, preparar
+
+
+async def contar_lineas(pagos):
+    from pagos import listado
+    lineas = 0
+    async for fragmento in listado.lineas_csv(pagos):
+        lineas += fragmento.count('\n')
+    return lineas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pagos', type=int, default=100000)
+    parser.add_argument('--sin-anterior', action='store_true', help='No medir la lista sin paginar')
+    args = parser.parse_args()
+
+    preparar()
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+    from pagos import listado
+    from pagos.models import Pago
+
+    datos = crear_datos(num_citas=0, num_propietarios=500)
+    propietarios = [m.propietario_id for m in datos['mascotas']]
+    tipos = ['EFECTIVO', 'TARJETA', 'TRANSFERENCIA']
+    estados = ['COMPLETADO', 'COMPLETADO', 'PENDIENTE', 'FALLIDO']
+    Pago.objects.bulk_create([
+        Pago(propietario_id=propietarios[i % len(propietarios)], monto=10000 + i % 90000,
+             tipo_pago=tipos[i % 3], estado=estados[i % 4], usuario_registro=datos['admin'])
+        for i in range(args.pagos)
+    ], batch_size=5000)
+    # bulk_create aplica auto_now_add: las fechas se reparten después
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE pagos_pago SET fecha_pago = datetime('2025-01-01', "
+            "'+' || (id % 730) || ' days', '+' || (id * 37 % 86400) || ' seconds')"
+        )
+
+    cliente = Client()
+    cliente.force_login(datos['admin'])
+    url = reverse('pagos:lista')
+    resultados = []
+
+    if not args.sin_anterior:
+        with medir('Lista anterior (todos los pagos)', resultados):
+            for pago in Pago.objects.all().order_by('-fecha_pago'):
+                pago.propietario.nombre
+                pago.cita
+
+    with medir('Primera página + totales', resultados):
+        respuesta = cliente.get(url)
+    cursor = respuesta.context['siguiente']
+    for _ in range(args.pagos // listado.TAMANO_PAGINA // 2):
+        filas, cursor = listado.pagina(Pago.objects.all(), listado.parsear_cursor(cursor))
+    with medir('Página en la mitad del historial', resultados):
+        cliente.get(url, {'cursor': cursor})
+    filtros = {'desde': '2025-06-01', 'hasta': '2025-06-30', 'estado': 'COMPLETADO', 'tipo_pago': 'TARJETA'}
+    with medir('Filtros de un mes + totales', resultados):
+        cliente.get(url, filtros)
+    with medir('Solo totales (una consulta)', resultados):
+        listado.totales(Pago.objects.all())
+    imprimir(resultados)
+
+    print()
+    print(f"{'Exportación CSV':<30}{'filas':>10}{'filas/s':>12}{'pico MB':>10}")
+    for etiqueta, limite in (('Mitad de los pagos', args.pagos // 2), ('Todos los pagos', args.pagos)):
+        pagos = Pago.objects.filter(id__lte=limite)
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        lineas = async_to_sync(contar_lineas)(pagos) - 1
+        duracion = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{etiqueta:<30}{lineas:>10}{lineas / duracion:>12.0f}{pico / 2 ** 20:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
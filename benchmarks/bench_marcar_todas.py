@@ -0,0 +1,52 @@
+"""
+Benchmark de "marcar todas como leídas" (notificaciones.api_marcar_todas).
+
+Compara el recorrido anterior (``marcar_como_leida`` + un log por
+notificación) con ``marcar_todas_leidas`` (un UPDATE y un bulk_create)
+para distinta cantidad de notificaciones sin leer.
+
+Uso:
+    python benchmarks/bench_marcar_todas.py [--maximo 1000]
+"""
+
+import argparse
+
+from entorno import imprimir, medir, preparar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--maximo', type=int, default=1000)
+    args = parser.parse_args()
+
+    preparar()
+    from autenticacion.models import Usuario
+    from notificaciones.models import Notificacion, NotificacionLog
+    from notificaciones.services import marcar_todas_leidas
+
+    usuario = Usuario.objects.create_user(username='bench_prop', password='x', rol='PROPIETARIO')
+
+    def sin_leer(cantidad):
+        Notificacion.objects.bulk_create([
+            Notificacion(usuario=usuario, tipo='SISTEMA', asunto='Aviso', mensaje='x', canal_enviado='EMAIL')
+            for _ in range(cantidad)
+        ])
+
+    resultados = []
+    cantidad = 10
+    while cantidad <= args.maximo:
+        sin_leer(cantidad)
+        with medir(f'Recorrido uno por uno ({cantidad})', resultados):
+            for n in Notificacion.objects.filter(usuario=usuario, leida=False):
+                n.marcar_como_leida()
+                NotificacionLog.objects.create(notificacion=n, accion='LEIDA', usuario=usuario)
+
+        sin_leer(cantidad)
+        with medir(f'UPDATE + bulk_create ({cantidad})', resultados):
+            marcar_todas_leidas(usuario)
+        cantidad *= 10
+    imprimir(resultados)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark del registro de pagos con clave de idempotencia.
+
+Paga citas atendidas (200 por defecto) por ``pagos:registrar_cita`` y
+mide, por solicitud, el registro completo frente a la repetición con la
+misma clave (respuesta guardada, sin pago ni factura). Luego varios hilos
+envían a la vez la misma clave para cada cita (doble clic bajo carga)
+sobre una base SQLite en archivo y verifica que cada cita tenga una sola
+factura.
+
+Uso:
+    python benchmarks/bench_pago_idempotente.py [--citas 200] [--hilos 8]
+"""
+
+import argparse
+import threading
+
+from entorno import crear_datos, imprimir, medir, preparar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--citas', type=int, default=200)
+    parser.add_argument('--hilos', type=int, default=8)
+    args = parser.parse_args()
+
+    preparar(en_archivo=True)
+    from django.db import connection, connections
+    from django.test import Client
+    from django.urls import reverse
+    from citas.models import Cita
+    from pagos.idempotencia import CAMPO_CLAVE
+    from pagos.models import Factura, Pago
+
+    datos = crear_datos(num_citas=args.citas * 2)
+    citas = list(Cita.objects.select_related('servicio').order_by('id'))
+    Cita.objects.update(estado='COMPLETADA')
+    Pago.objects.bulk_create([
+        Pago(cita=cita, propietario_id=cita.propietario_id, monto=cita.servicio.precio, tipo_pago='PENDIENTE',
+             usuario_registro=datos['admin'])
+        for cita in citas
+    ])
+    secuenciales, concurrentes = citas[:args.citas], citas[args.citas:]
+
+    def envio(cita):
+        url = reverse('pagos:registrar_cita', args=[cita.pk])
+        return url, {'monto': str(cita.servicio.precio), 'tipo_pago': 'EFECTIVO', CAMPO_CLAVE: f'bench-{cita.pk:08d}'}
+
+    cliente = Client()
+    cliente.force_login(datos['admin'])
+    resultados = []
+    with medir(f'Registrar {args.citas} pagos', resultados):
+        for cita in secuenciales:
+            assert cliente.post(*envio(cita)).status_code == 302
+    with medir(f'Repetir las {args.citas} claves', resultados):
+        for cita in secuenciales:
+            assert cliente.post(*envio(cita))['Idempotent-Replayed'] == 'true'
+    connection.close()
+
+    clientes = []
+    for _ in range(args.hilos):
+        otro = Client()
+        otro.force_login(datos['admin'])
+        clientes.append(otro)
+    connection.close()
+    barrera = threading.Barrier(args.hilos)
+
+    def trabajar(otro):
+        for cita in concurrentes:
+            barrera.wait()
+            otro.post(*envio(cita))
+        connections.close_all()
+
+    with medir(f'{args.hilos} hilos x {len(concurrentes)} claves repetidas', resultados):
+        hilos = [threading.Thread(target=trabajar, args=(otro,)) for otro in clientes]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+    imprimir(resultados)
+
+    facturas = Factura.objects.filter(pago__cita__in=concurrentes).count()
+    print(f'Facturas de las citas enviadas en paralelo: {facturas} (esperadas {len(concurrentes)})')
+    assert facturas == len(concurrentes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark del resumen diario de agenda (citas.resumen).
+
+Compara el reporte ``citas_mes`` y la carga por veterinario calculados
+recorriendo la tabla de citas con los mismos datos leídos de
+``CitaDiaResumen``, y mide el costo de mantener el resumen al guardar.
+
+Uso:
+    python benchmarks/bench_resumen.py [--citas 50000] [--veterinarios 20]
+"""
+
+import argparse
+from datetime import time
+
+from entorno import crear_datos, imprimir, medir, preparar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--citas', type=int, default=50000)
+    parser.add_argument('--veterinarios', type=int, default=20)
+    args = parser.parse_args()
+
+    preparar()
+    from django.db.models import Count
+    from citas.models import Cita
+    from citas.resumen import citas_por_dia, reconstruir_resumen
+
+    datos = crear_datos(num_veterinarios=args.veterinarios, num_citas=args.citas)
+    inicio, fin = datos['dias'][0], datos['dias'][-1]
+
+    resultados = []
+    with medir(f'citas_mes recorriendo citas ({args.citas})', resultados):
+        esperado = list(
+            Cita.objects.filter(fecha__range=[inicio, fin]).values('fecha')
+            .annotate(total=Count('id')).order_by('fecha')
+        )
+    with medir('citas_mes desde CitaDiaResumen', resultados):
+        obtenido = list(citas_por_dia(inicio, fin))
+    with medir('Reconstruir resumen completo', resultados):
+        filas = reconstruir_resumen()
+
+    cita = Cita.objects.filter(fecha=inicio, hora=time(8, 0)).first()
+    with medir('Cambio de estado (save + resumen)', resultados):
+        cita.estado = 'CONFIRMADA'
+        cita.save()
+    imprimir(resultados)
+    print(f'Filas de resumen: {filas}; reportes iguales: {esperado == obtenido}')
+
+
+if __name__ == '__main__':
+    main()
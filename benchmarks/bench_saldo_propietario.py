@@ -0,0 +1,82 @@
+"""
+Benchmark del saldo de pagos por propietario (``pagos.saldos``).
+
+Carga un propietario con un historial largo de pagos (20.000 por defecto,
+la mitad pendientes) y otros 500 propietarios con pocos pagos, y compara:
+
+* el detalle anterior (pendientes y completados completos, más el
+  ``count`` de la plantilla) frente a la vista actual, que lee el saldo y
+  lista solo los pagos más recientes;
+* el costo de mantener el saldo al registrar pagos (señales);
+* ``verificar_saldos`` sobre todos los propietarios (un solo agregado).
+
+Uso:
+    python benchmarks/bench_saldo_propietario.py [--pagos 20000] [--repeticiones 20]
+"""
+
+import argparse
+
+from entorno import crear_datos, imprimir, medir, preparar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pagos', type=int, default=20000, help='Pagos del propietario con historial largo')
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    preparar()
+    from django.test import Client
+    from django.urls import reverse
+    from citas.models import Cita
+    from pagos.models import Pago
+    from pagos.saldos import verificar_saldos
+
+    datos = crear_datos(num_citas=1, num_propietarios=500)
+    cita = Cita.objects.get()
+    propietario = cita.propietario
+    propietarios = [propietario] + [m.propietario for m in datos['mascotas'] if m.propietario_id != propietario.pk]
+    nuevos = [
+        # Los pagos pendientes siempre tienen cita (la plantilla enlaza a ella)
+        Pago(propietario=propietario, cita=cita if i % 2 else None, monto=10000 + i % 90000,
+             tipo_pago='EFECTIVO', estado='PENDIENTE' if i % 2 else 'COMPLETADO', usuario_registro=datos['admin'])
+        for i in range(args.pagos)
+    ] + [
+        Pago(propietario=otro, monto=50000, tipo_pago='EFECTIVO', estado='COMPLETADO',
+             usuario_registro=datos['admin'])
+        for otro in propietarios[1:] for _ in range(5)
+    ]
+    # bulk_create no pasa por las señales: el saldo se carga con la verificación
+    Pago.objects.bulk_create(nuevos, batch_size=5000)
+    verificar_saldos(aplicar=True)
+
+    cliente = Client()
+    cliente.force_login(datos['admin'])
+    url = reverse('propietarios:detalle', args=[propietario.pk])
+    resultados = []
+
+    with medir(f'Detalle anterior x{args.repeticiones}', resultados):
+        for _ in range(args.repeticiones):
+            pagos = propietario.pagos.select_related('cita', 'cita__mascota', 'cita__servicio').order_by('-fecha_pago')
+            pendientes = pagos.filter(estado='PENDIENTE')
+            list(pendientes)
+            list(pagos.filter(estado='COMPLETADO'))
+            pendientes.count()
+    with medir(f'Vista de detalle con saldo x{args.repeticiones}', resultados):
+        for _ in range(args.repeticiones):
+            assert cliente.get(url).status_code == 200
+
+    with medir('Registrar 200 pagos (con saldo)', resultados):
+        for i in range(200):
+            Pago.objects.create(
+                propietario=propietarios[i % len(propietarios)], monto=1000, tipo_pago='EFECTIVO',
+                estado='COMPLETADO', usuario_registro=datos['admin'],
+            )
+    with medir('verificar_saldos (todos)', resultados):
+        diferencias = verificar_saldos()
+    imprimir(resultados)
+    print(f'Saldos con diferencias: {len(diferencias)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark de la numeración consecutiva de facturas (``administracion.secuencias``).
+
+Varios hilos crean facturas a la vez sobre una base SQLite en archivo
+(cada hilo con su propia conexión), de tres formas:
+
+* número aleatorio ``FACT-<uuid>`` (la numeración anterior, como referencia);
+* ``Factura.save()`` con el siguiente número de la secuencia, una
+  transacción por factura;
+* un trabajador que reserva bloques de números y los guarda con
+  ``bulk_create``.
+
+Reporta facturas por segundo, latencia p95 por transacción y verifica que
+la secuencia no tenga huecos ni duplicados.
+
+Uso:
+    python benchmarks/bench_secuencias.py [--hilos 16] [--facturas 200] [--bloque 50]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+import uuid
+
+from entorno import crear_datos, preparar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hilos', type=int, default=16)
+    parser.add_argument('--facturas', type=int, default=200, help='Facturas por hilo')
+    parser.add_argument('--bloque', type=int, default=50)
+    args = parser.parse_args()
+
+    preparar(en_archivo=True)
+    from django.db import connection, connections, transaction
+    from administracion.secuencias import reservar_numeros
+    from pagos.models import Factura, Pago
+
+    datos = crear_datos(num_veterinarios=1, num_citas=0, num_propietarios=1)
+    propietario = datos['mascotas'][0].propietario
+    pago = Pago.objects.create(
+        propietario=propietario, monto=50000, tipo_pago='EFECTIVO', estado='COMPLETADO',
+        usuario_registro=datos['admin'],
+    )
+    connection.close()
+
+    def nueva(numero=''):
+        return Factura(numero_factura=numero, pago_id=pago.pk, propietario_id=propietario.pk, subtotal=1, total=1)
+
+    def aleatorio(cantidad):
+        for _ in range(cantidad):
+            with transaction.atomic():
+                nueva(f'FACT-{uuid.uuid4().hex[:8].upper()}').save()
+            yield 1
+
+    def consecutivo(cantidad):
+        for _ in range(cantidad):
+            nueva().save()
+            yield 1
+
+    def bloques(cantidad):
+        for inicio in range(0, cantidad, args.bloque):
+            tamano = min(args.bloque, cantidad - inicio)
+            with transaction.atomic():
+                Factura.objects.bulk_create([nueva(n) for n in reservar_numeros('factura', tamano)])
+            yield tamano
+
+    def escenario(modo):
+        latencias = []
+        barrera = threading.Barrier(args.hilos)
+
+        def trabajar():
+            barrera.wait()
+            pasos = modo(args.facturas)
+            while True:
+                inicio = time.perf_counter()
+                if next(pasos, None) is None:
+                    break
+                latencias.append(time.perf_counter() - inicio)
+            connections.close_all()
+
+        hilos = [threading.Thread(target=trabajar) for _ in range(args.hilos)]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return time.perf_counter() - inicio, sorted(latencias)
+
+    total = args.hilos * args.facturas
+    print(f'{args.hilos} hilos x {args.facturas} facturas (bloques de {args.bloque})')
+    print(f"{'Numeración':<36}{'facturas/s':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for nombre, modo in (('Aleatoria (anterior)', aleatorio), ('Secuencia, una por transacción', consecutivo),
+                         ('Secuencia, bloques reservados', bloques)):
+        Factura.objects.all().delete()
+        duracion, latencias = escenario(modo)
+        p95 = latencias[int(len(latencias) * 0.95)]
+        print(
+            f'{nombre:<36}{total / duracion:>12.0f}'
+            f'{statistics.median(latencias) * 1000:>10.2f}{p95 * 1000:>10.2f}'
+        )
+        if modo is not aleatorio:
+            numeros = sorted(int(n[5:]) for n in Factura.objects.values_list('numero_factura', flat=True))
+            assert len(numeros) == total and numeros[-1] - numeros[0] == total - 1, 'Huecos o duplicados'
+    print('Secuencia sin huecos ni duplicados')
+
+
+if __name__ == '__main__':
+    main()
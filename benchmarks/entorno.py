@@ -0,0 +1,149 @@
+"""
+Utilidades compartidas por los benchmarks de MyDOG.
+
+Cada benchmark crea una base de datos de pruebas desechable (nunca toca
+``db.sqlite3``), carga datos sintéticos con ``bulk_create`` y mide
+consultas SQL y latencia.
+
+Uso:
+    python benchmarks/bench_calendario.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import date, time as dt_time, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistema_veterinaria.settings')
+
+import django  # noqa: E402
+
+
+def preparar(en_archivo=False):
+    """
+    Inicializa Django y crea una base de datos de pruebas.
+
+    Args:
+        en_archivo (bool): Usa un archivo SQLite temporal en lugar de memoria
+            (necesario para pruebas con varios hilos o procesos).
+    """
+    django.setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    if en_archivo:
+        ruta = Path(tempfile.mkdtemp()) / 'bench.sqlite3'
+        settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = str(ruta)
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+@contextmanager
+def medir(etiqueta, resultados):
+    """Mide consultas SQL y tiempo de un bloque y los guarda en ``resultados``."""
+    from django.db import connections
+
+    consultas = [0]
+
+    def contar(execute, sql, params, many, context):
+        consultas[0] += 1
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for conexion in connections.all():
+            stack.enter_context(conexion.execute_wrapper(contar))
+        inicio = time.perf_counter()
+        yield
+        duracion = time.perf_counter() - inicio
+    resultados.append((etiqueta, consultas[0], duracion * 1000))
+
+
+def imprimir(resultados):
+    print(f"{'Operación':<45}{'Consultas':>10}{'ms':>12}")
+    for etiqueta, consultas, ms in resultados:
+        print(f"{etiqueta:<45}{consultas:>10}{ms:>12.1f}")
+
+
+def dias_laborales(desde, cantidad):
+    """Lista de ``cantidad`` fechas laborales (lunes a sábado) desde ``desde``."""
+    dias = []
+    dia = desde
+    while len(dias) < cantidad:
+        if dia.weekday() != 6:
+            dias.append(dia)
+        dia += timedelta(days=1)
+    return dias
+
+
+def crear_datos(num_veterinarios=10, num_citas=1000, num_propietarios=200, desde=None):
+    """
+    Carga datos sintéticos con ``bulk_create``.
+
+    Las citas se reparten por veterinario, día y franjas de 30 minutos
+    entre 08:00 y 17:30 respetando la restricción de horario único.
+
+    Returns:
+        dict: usuarios, servicios, mascotas y rango de fechas creados
+    """
+    from autenticacion.models import Usuario
+    from citas.models import Cita
+    from mascotas.models import Mascota
+    from propietarios.models import Propietario
+    from servicios.models import Servicio
+
+    admin = Usuario.objects.create_user(username='bench_admin', password='x', rol='ADMIN')
+    veterinarios = Usuario.objects.bulk_create([
+        Usuario(username=f'vet{i}', first_name='Vet', last_name=str(i), rol='VETERINARIO', password='!')
+        for i in range(num_veterinarios)
+    ])
+    usuarios_prop = Usuario.objects.bulk_create([
+        Usuario(username=f'prop{i}', first_name='Prop', last_name=str(i), rol='PROPIETARIO', password='!')
+        for i in range(num_propietarios)
+    ])
+    propietarios = Propietario.objects.bulk_create([
+        Propietario(usuario=u, nombre=f'Propietario {i}', documento=f'{10000 + i}',
+                    telefono='3001234567', correo=f'prop{i}@example.com')
+        for i, u in enumerate(usuarios_prop)
+    ])
+    mascotas = Mascota.objects.bulk_create([
+        Mascota(propietario=p, nombre=f'Mascota {i}', especie='PERRO', raza='Criollo', edad=3)
+        for i, p in enumerate(propietarios)
+    ])
+    servicios = Servicio.objects.bulk_create([
+        Servicio(nombre='CONSULTA', duracion_minutos=30, precio=50000),
+        Servicio(nombre='VACUNACION', duracion_minutos=30, precio=40000),
+        Servicio(nombre='PELUQUERIA', duracion_minutos=30, precio=35000),
+    ])
+
+    franjas = [dt_time(8 + m // 60, m % 60) for m in range(0, 600, 30)]
+    por_dia = num_veterinarios * len(franjas)
+    dias = dias_laborales(desde or date.today() + timedelta(days=1), num_citas // por_dia + 1)
+
+    citas = []
+    for i in range(num_citas):
+        dia, resto = divmod(i, por_dia)
+        vet, franja = divmod(resto, len(franjas))
+        mascota = mascotas[i % len(mascotas)]
+        citas.append(Cita(
+            propietario_id=mascota.propietario_id, mascota=mascota,
+            servicio=servicios[i % len(servicios)], veterinario=veterinarios[vet],
+            fecha=dias[dia], hora=franjas[franja], usuario_creador=admin,
+        ))
+    Cita.objects.bulk_create(citas, batch_size=2000)
+    # bulk_create no dispara las señales que mantienen el resumen diario
+    from citas.resumen import reconstruir_resumen
+    reconstruir_resumen()
+
+    return {
+        'admin': admin,
+        'veterinarios': veterinarios,
+        'servicios': servicios,
+        'mascotas': mascotas,
+        'dias': dias,
+    }
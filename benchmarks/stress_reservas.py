@@ -0,0 +1,119 @@
+"""
+Prueba de estrés de reservas concurrentes (citas.services.reservar_cita).
+
+Lanza cientos de solicitudes simultáneas contra ``citas:agendar`` y
+``citas:agendar_propietario`` compitiendo por pocos horarios, sobre una
+base SQLite en archivo (cada hilo usa su propia conexión). Al final
+verifica que no haya errores 500, citas cruzadas ni pagos huérfanos.
+
+Uso:
+    python benchmarks/stress_reservas.py [--solicitudes 300] [--hilos 50]
+"""
+
+import argparse
+import random
+import threading
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from entorno import crear_datos, preparar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--solicitudes', type=int, default=300)
+    parser.add_argument('--hilos', type=int, default=50)
+    args = parser.parse_args()
+
+    preparar(en_archivo=True)
+    from django.db import connection
+    from django.test import Client
+    from citas.disponibilidad import ESTADOS_OCUPAN_AGENDA, cargar_agendas
+    from citas.models import Cita
+    from pagos.models import Pago
+
+    datos = crear_datos(num_veterinarios=3, num_citas=0, num_propietarios=20)
+    fecha = datos['dias'][0]
+    servicio = datos['servicios'][0]
+    veterinarios = datos['veterinarios']
+    mascotas = datos['mascotas']
+    horas = ['09:00', '09:15', '09:30', '10:00']
+    connection.close()
+
+    estados = Counter()
+    inicio_barrera = threading.Barrier(args.hilos)
+    local = threading.local()
+
+    def cliente(usuario):
+        clientes = getattr(local, 'clientes', None)
+        if clientes is None:
+            clientes = local.clientes = {}
+        if usuario.pk not in clientes:
+            clientes[usuario.pk] = Client()
+            clientes[usuario.pk].force_login(usuario)
+        return clientes[usuario.pk]
+
+    def solicitud(i):
+        if i < args.hilos:
+            inicio_barrera.wait()
+        mascota = mascotas[i % len(mascotas)]
+        hora = random.choice(horas)
+        try:
+            if i % 2:
+                response = cliente(mascota.propietario.usuario).post('/citas/agendar/propietario/', {
+                    'mascota': mascota.id, 'servicio': servicio.id, 'veterinario': '',
+                    'fecha': fecha.isoformat(), 'hora': hora, 'observaciones': 'Estrés',
+                })
+            else:
+                response = cliente(datos['admin']).post('/citas/agendar/', {
+                    'propietario': mascota.propietario_id, 'mascota': mascota.id,
+                    'servicio': servicio.id, 'veterinario': random.choice(veterinarios).id,
+                    'fecha': fecha.isoformat(), 'hora': hora, 'observaciones': '',
+                })
+            estados[response.status_code] += 1
+        except Exception as error:  # noqa: BLE001 - se reporta como 500
+            estados[f'500 ({type(error).__name__}: {error})'] += 1
+            traceback.print_exc()
+        finally:
+            connection.close()
+
+    # Precargar relaciones usadas en los hilos
+    for mascota in mascotas:
+        mascota.propietario.usuario
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.hilos) as pool:
+        list(pool.map(solicitud, range(args.solicitudes)))
+    duracion = time.perf_counter() - inicio
+
+    citas = Cita.objects.filter(fecha=fecha, estado__in=ESTADOS_OCUPAN_AGENDA)
+    duplicadas = [k for k, v in Counter(citas.values_list('veterinario_id', 'hora')).items() if v > 1]
+    agendas = cargar_agendas([fecha])
+    cruces = sum(
+        1 for cita in citas.select_related('servicio')
+        if not _sin_cruce(agendas, cita, cargar_agendas)
+    )
+    pagos_huerfanos = Pago.objects.filter(cita__isnull=True).count()
+    pagos_por_cita = Pago.objects.filter(cita__in=citas).count()
+
+    print(f'Solicitudes: {args.solicitudes} en {duracion:.1f}s ({args.solicitudes / duracion:.0f} req/s)')
+    print(f'Códigos HTTP: {dict(estados)}')
+    print(f'Citas creadas: {citas.count()}, pagos: {pagos_por_cita}')
+    print(f'Duplicadas: {len(duplicadas)}, cruces: {cruces}, pagos huérfanos: {pagos_huerfanos}')
+
+    assert not [k for k in estados if str(k).startswith('500')], 'Hubo errores 500'
+    assert not duplicadas and not cruces, 'Hay citas duplicadas o cruzadas'
+    assert pagos_por_cita == citas.count() and not pagos_huerfanos, 'Pagos inconsistentes'
+    print('OK')
+
+
+def _sin_cruce(agendas, cita, cargar_agendas):
+    """La cita no se cruza con ninguna otra del mismo veterinario."""
+    otras = cargar_agendas([cita.fecha], veterinario_ids=[cita.veterinario_id], excluir_citas=[cita.pk])
+    return otras[(cita.veterinario_id, cita.fecha)].esta_libre(cita.hora, cita.servicio.duracion_minutos)
+
+
+if __name__ == '__main__':
+    main()
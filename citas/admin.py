@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cita, ListaEspera
+from .models import Cita, CitaDiaResumen, ListaEspera, TokenCalendario
 
 @admin.register(Cita)
 class CitaAdmin(admin.ModelAdmin):
@@ -11,3 +11,15 @@ class CitaAdmin(admin.ModelAdmin):
 class ListaEsperaAdmin(admin.ModelAdmin):
     list_display = ('paciente', 'servicio', 'fecha_solicitud', 'prioridad', 'atendido')
     list_filter = ('prioridad', 'atendido')
+
+@admin.register(CitaDiaResumen)
+class CitaDiaResumenAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'veterinario', 'programadas', 'confirmadas', 'completadas', 'canceladas', 'minutos_reservados', 'ingreso_esperado')
+    list_filter = ('veterinario',)
+    date_hierarchy = 'fecha'
+
+@admin.register(TokenCalendario)
+class TokenCalendarioAdmin(admin.ModelAdmin):
+    list_display = ('veterinario', 'activo', 'fecha_creacion', 'ultimo_uso')
+    list_filter = ('activo',)
+    readonly_fields = ('token',)
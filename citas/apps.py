@@ -5,3 +5,6 @@ class CitasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'citas'
     verbose_name = 'Gestión de Citas'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,207 @@
+"""
+Motor del feed de calendario de citas (HU-011).
+
+Construye los eventos de FullCalendar a partir de una única consulta
+proyectada y calcula un ETag con la versión de cambios de cada día de la
+ventana, de modo que una ventana sin cambios se responde con 304.
+
+Los calendarios abiertos reciben además los cambios en vivo por websocket
+(``publicar_cambios``) y se actualizan sin volver a pedir la ventana.
+"""
+
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.dateparse import parse_date
+
+from notificaciones.services import push_calendario
+from .models import Cita, VersionCalendarioDia
+
+# Estados que se muestran en el calendario
+ESTADOS_CALENDARIO = ['PROGRAMADA', 'CONFIRMADA', 'COMPLETADA']
+
+# Colores fijos por estado / tipo de cita
+COLOR_COMPLETADA = '#808080'  # Gris para completadas
+COLOR_EMERGENCIA = '#DC3545'  # Rojo para emergencias
+
+# Columnas necesarias para construir un evento (sin instanciar modelos)
+CAMPOS_EVENTO = (
+    'id', 'fecha', 'hora', 'estado', 'es_emergencia',
+    'veterinario_id', 'servicio_id', 'servicio__nombre', 'servicio__color_calendario',
+    'mascota__nombre', 'propietario__nombre',
+    'veterinario__first_name', 'veterinario__last_name',
+)
+
+_ESTADOS_DISPLAY = dict(Cita.ESTADO_CHOICES)
+
+
+def parsear_ventana(start, end):
+    """
+    Convierte los parámetros ``start``/``end`` de FullCalendar en fechas.
+
+    Returns:
+        tuple: (inicio, fin) como ``date`` o ``None`` si son inválidos
+    """
+    if not start or not end:
+        return None
+    try:
+        inicio = parse_date(start[:10])
+        fin = parse_date(end[:10])
+    except ValueError:
+        return None
+    if inicio is None or fin is None or fin < inicio:
+        return None
+    return inicio, fin
+
+
+def parsear_id(valor):
+    """Convierte un parámetro GET en entero o ``None`` si es inválido."""
+    try:
+        return int(valor) if valor else None
+    except (TypeError, ValueError):
+        return None
+
+
+def filtros_desde_request(request):
+    """
+    Extrae la ventana y los filtros opcionales del feed desde el request.
+
+    Returns:
+        dict | None: inicio, fin, veterinario_id y servicio_id, o None si la
+        ventana es inválida
+    """
+    ventana = parsear_ventana(request.GET.get('start'), request.GET.get('end'))
+    if ventana is None:
+        return None
+    return {
+        'inicio': ventana[0],
+        'fin': ventana[1],
+        'veterinario_id': parsear_id(request.GET.get('veterinario')),
+        'servicio_id': parsear_id(request.GET.get('servicio')),
+    }
+
+
+def evento_desde_valores(fila):
+    """Convierte una fila proyectada de Cita en un evento de FullCalendar."""
+    color = fila['servicio__color_calendario']
+    if fila['estado'] == 'COMPLETADA':
+        color = COLOR_COMPLETADA
+    elif fila['es_emergencia']:
+        color = COLOR_EMERGENCIA
+
+    veterinario = f"{fila['veterinario__first_name']} {fila['veterinario__last_name']}".strip()
+    return {
+        'id': fila['id'],
+        'title': f"{fila['mascota__nombre']} - {fila['servicio__nombre']}",
+        'start': f"{fila['fecha']}T{fila['hora']}",
+        'color': color,
+        'extendedProps': {
+            'propietario': fila['propietario__nombre'],
+            'veterinario': veterinario,
+            'estado': _ESTADOS_DISPLAY.get(fila['estado'], fila['estado']),
+            'veterinario_id': fila['veterinario_id'],
+            'servicio_id': fila['servicio_id'],
+        }
+    }
+
+
+def eventos_calendario(inicio, fin, veterinario_id=None, servicio_id=None):
+    """
+    Retorna los eventos del calendario entre ``inicio`` y ``fin`` (inclusive).
+
+    Ejecuta una sola consulta con los JOIN necesarios y proyecta únicamente
+    las columnas usadas por el evento.
+
+    Returns:
+        list: Eventos en el formato esperado por FullCalendar
+    """
+    citas = Cita.objects.filter(
+        fecha__range=[inicio, fin],
+        estado__in=ESTADOS_CALENDARIO
+    )
+    if veterinario_id:
+        citas = citas.filter(veterinario_id=veterinario_id)
+    if servicio_id:
+        citas = citas.filter(servicio_id=servicio_id)
+
+    filas = citas.order_by().values(*CAMPOS_EVENTO)
+    return [evento_desde_valores(fila) for fila in filas]
+
+
+def delta_calendario(accion, cita_ids):
+    """
+    Cambio de citas en el formato que aplican los calendarios abiertos.
+
+    El cliente quita los eventos de ``ids`` y agrega ``eventos`` (solo las
+    citas que siguen visibles; una cancelada no trae evento).
+    """
+    filas = Cita.objects.filter(
+        pk__in=cita_ids,
+        estado__in=ESTADOS_CALENDARIO
+    ).order_by().values(*CAMPOS_EVENTO)
+    return {
+        'accion': accion,
+        'ids': list(cita_ids),
+        'eventos': [evento_desde_valores(fila) for fila in filas],
+    }
+
+
+def publicar_cambios(accion, *citas):
+    """
+    Envía al grupo del calendario del staff el delta de las citas indicadas
+    cuando la transacción se confirme.
+
+    Args:
+        accion: 'crear', 'cancelar', 'confirmar' o 'reprogramar'
+        citas: Citas (o sus IDs) que cambiaron
+    """
+    cita_ids = [getattr(cita, 'pk', cita) for cita in citas]
+    transaction.on_commit(lambda: push_calendario(delta_calendario(accion, cita_ids)))
+
+
+def etag_calendario(inicio, fin, veterinario_id=None, servicio_id=None):
+    """
+    Calcula el ETag de una ventana del calendario.
+
+    Se deriva de las versiones de cambio de los días de la ventana (una
+    consulta indexada por fecha) y de los filtros aplicados.
+    """
+    versiones = VersionCalendarioDia.objects.filter(
+        fecha__range=[inicio, fin]
+    ).order_by('fecha').values_list('fecha', 'version')
+
+    base = f"{inicio}|{fin}|{veterinario_id or ''}|{servicio_id or ''}|"
+    base += ','.join(f"{fecha}:{version}" for fecha, version in versiones)
+    return hashlib.md5(base.encode('utf-8')).hexdigest()
+
+
+def registrar_cambio_dias(*fechas):
+    """
+    Incrementa la versión del calendario de los días indicados.
+
+    Debe llamarse cada vez que cambia una cita de esos días; las fechas
+    ``None`` se ignoran. Las operaciones en lote (``bulk_create``,
+    ``update``) no disparan señales y deben llamarla explícitamente.
+    """
+    fechas = {f for f in fechas if f}
+    if not fechas:
+        return
+    actualizados = VersionCalendarioDia.objects.filter(fecha__in=fechas).update(
+        version=F('version') + 1
+    )
+    if actualizados == len(fechas):
+        return
+
+    existentes = set(VersionCalendarioDia.objects.filter(fecha__in=fechas).values_list('fecha', flat=True))
+    nuevas = fechas - existentes
+    try:
+        with transaction.atomic():
+            VersionCalendarioDia.objects.bulk_create(
+                [VersionCalendarioDia(fecha=fecha, version=1) for fecha in nuevas]
+            )
+    except IntegrityError:
+        # Otro proceso creó alguna de las filas en paralelo
+        VersionCalendarioDia.objects.filter(fecha__in=nuevas).update(
+            version=F('version') + 1
+        )
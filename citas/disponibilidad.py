@@ -0,0 +1,284 @@
+"""
+Motor de disponibilidad de veterinarios (HU-012, HU-013).
+
+La ocupación de cada veterinario en un día se representa como un mapa de
+bits de 1.440 posiciones (un bit por minuto) guardado en un entero de
+Python. Verificar si un intervalo se cruza con otra cita es un AND de bits,
+por lo que el costo no depende de cuántas citas tenga el día.
+
+La duración de cada cita se toma de ``Servicio.duracion_minutos`` y la
+jornada de ``settings.HORARIO_LABORAL``.
+"""
+
+from datetime import time as dt_time
+
+from django.conf import settings
+from django.db.models import FilteredRelation, Q, Sum
+from django.db.models.functions import Coalesce
+
+from autenticacion.models import Usuario
+from .models import Cita
+
+MINUTOS_DIA = 24 * 60
+
+# Estados de cita que ocupan la agenda del veterinario
+ESTADOS_OCUPAN_AGENDA = ['PROGRAMADA', 'CONFIRMADA', 'COMPLETADA']
+
+# Separación entre horas sugeridas al propietario/staff
+PASO_MINUTOS = 15
+
+
+def a_minutos(hora):
+    """Convierte un ``time`` o un texto 'HH:MM' en minutos desde medianoche."""
+    if isinstance(hora, str):
+        horas, minutos = hora.split(':')[:2]
+        return int(horas) * 60 + int(minutos)
+    return hora.hour * 60 + hora.minute
+
+
+def a_hora(minutos):
+    """Convierte minutos desde medianoche en ``time``."""
+    return dt_time(minutos // 60, minutos % 60)
+
+
+def horario_laboral():
+    """
+    Lee la jornada laboral configurada en settings.
+
+    Returns:
+        tuple: (minuto_inicio, minuto_fin, dias_laborales)
+    """
+    config = settings.HORARIO_LABORAL
+    return (
+        a_minutos(config['hora_inicio']),
+        a_minutos(config['hora_fin']),
+        config['dias_laborales'],
+    )
+
+
+NOMBRES_DIAS = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+
+def describir_dias(dias):
+    """Texto de los días laborales, p. ej. 'Lunes a Sábado' o 'Lunes, Miércoles y Viernes'."""
+    dias = sorted(set(dias))
+    if not dias:
+        return 'ningún día'
+    if len(dias) > 2 and dias == list(range(dias[0], dias[-1] + 1)):
+        return f'{NOMBRES_DIAS[dias[0]]} a {NOMBRES_DIAS[dias[-1]]}'
+    nombres = [NOMBRES_DIAS[dia] for dia in dias]
+    return nombres[0] if len(nombres) == 1 else f"{', '.join(nombres[:-1])} y {nombres[-1]}"
+
+
+def cabe_en_jornada(hora, duracion):
+    """
+    Indica si un servicio de ``duracion`` minutos que inicia en ``hora``
+    empieza y termina dentro de la jornada (misma máscara de minutos que la
+    agenda).
+    """
+    inicio_jornada, fin_jornada, _ = horario_laboral()
+    inicio = a_minutos(hora)
+    if inicio + duracion > MINUTOS_DIA:
+        return False
+    return not (_mascara(inicio, max(duracion, 1)) & ~_mascara(inicio_jornada, fin_jornada - inicio_jornada))
+
+
+def _mascara(inicio, duracion):
+    """Bits encendidos para los minutos ``[inicio, inicio + duracion)``."""
+    inicio = max(0, min(inicio, MINUTOS_DIA))
+    fin = max(inicio, min(inicio + duracion, MINUTOS_DIA))
+    return ((1 << (fin - inicio)) - 1) << inicio
+
+
+class AgendaVeterinario:
+    """
+    Ocupación de un veterinario en un día como mapa de bits por minuto.
+    """
+
+    __slots__ = ('veterinario_id', 'fecha', 'ocupado')
+
+    def __init__(self, veterinario_id, fecha, ocupado=0):
+        self.veterinario_id = veterinario_id
+        self.fecha = fecha
+        self.ocupado = ocupado
+
+    def __repr__(self):
+        return f"<AgendaVeterinario vet={self.veterinario_id} fecha={self.fecha} minutos={self.minutos_ocupados()}>"
+
+    def ocupar(self, hora, duracion):
+        """Marca como ocupado el intervalo que inicia en ``hora``."""
+        self.ocupado |= _mascara(a_minutos(hora), duracion)
+
+    def liberar(self, hora, duracion):
+        """Libera el intervalo que inicia en ``hora``."""
+        self.ocupado &= ~_mascara(a_minutos(hora), duracion)
+
+    def esta_libre(self, hora, duracion):
+        """Indica si el intervalo no se cruza con ninguna cita del día."""
+        return not (self.ocupado & _mascara(a_minutos(hora), duracion))
+
+    def minutos_ocupados(self):
+        """Total de minutos reservados en el día."""
+        return bin(self.ocupado).count('1')
+
+    def intervalos_libres(self, desde=None, hasta=None):
+        """
+        Intervalos libres dentro de la jornada (o del rango indicado).
+
+        Returns:
+            list: Tuplas (inicio, fin) en minutos desde medianoche
+        """
+        if desde is None or hasta is None:
+            inicio_jornada, fin_jornada, _ = horario_laboral()
+            desde = inicio_jornada if desde is None else desde
+            hasta = fin_jornada if hasta is None else hasta
+
+        libre = ~self.ocupado & _mascara(desde, hasta - desde)
+        intervalos = []
+        while libre:
+            inicio = (libre & -libre).bit_length() - 1
+            resto = libre >> inicio
+            largo = (~resto & (resto + 1)).bit_length() - 1
+            intervalos.append((inicio, inicio + largo))
+            libre &= ~_mascara(inicio, largo)
+        return intervalos
+
+    def horas_disponibles(self, duracion, paso=PASO_MINUTOS):
+        """
+        Horas de inicio en las que cabe un servicio de ``duracion`` minutos
+        sin cruzarse con otra cita y terminando dentro de la jornada.
+
+        Returns:
+            list: Horas de inicio como ``time``
+        """
+        inicio_jornada, fin_jornada, dias_laborales = horario_laboral()
+        if self.fecha is not None and self.fecha.weekday() not in dias_laborales:
+            return []
+
+        horas = []
+        for inicio, fin in self.intervalos_libres(inicio_jornada, fin_jornada):
+            # Alinear al paso de la grilla
+            minuto = inicio + (-(inicio - inicio_jornada)) % paso
+            while minuto + duracion <= fin:
+                horas.append(a_hora(minuto))
+                minuto += paso
+        return horas
+
+
+class Agendas(dict):
+    """Agendas indexadas por (veterinario_id, fecha); crea agendas vacías al vuelo."""
+
+    def __missing__(self, clave):
+        agenda = self[clave] = AgendaVeterinario(*clave)
+        return agenda
+
+
+def cargar_agendas(fechas, veterinario_ids=None, excluir_citas=()):
+    """
+    Construye las agendas de los veterinarios para las fechas indicadas.
+
+    Ejecuta una sola consulta que proyecta veterinario, fecha, hora y
+    duración del servicio de las citas que ocupan agenda.
+
+    Args:
+        fechas: Fechas a cargar
+        veterinario_ids: Limitar a estos veterinarios (opcional)
+        excluir_citas: IDs de citas a ignorar (ej: la cita que se reprograma)
+
+    Returns:
+        Agendas: Diccionario (veterinario_id, fecha) -> AgendaVeterinario
+    """
+    citas = Cita.objects.filter(
+        fecha__in=list(fechas),
+        estado__in=ESTADOS_OCUPAN_AGENDA
+    )
+    if veterinario_ids is not None:
+        citas = citas.filter(veterinario_id__in=list(veterinario_ids))
+    if excluir_citas:
+        citas = citas.exclude(pk__in=list(excluir_citas))
+
+    agendas = Agendas()
+    filas = citas.order_by().values_list('veterinario_id', 'fecha', 'hora', 'servicio__duracion_minutos')
+    for veterinario_id, fecha, hora, duracion in filas:
+        agendas[(veterinario_id, fecha)].ocupar(hora, duracion)
+    return agendas
+
+
+def esta_disponible(veterinario_id, fecha, hora, duracion, excluir_cita_id=None):
+    """
+    Verifica que el veterinario no tenga otra cita que se cruce con el
+    intervalo [hora, hora + duracion).
+    """
+    excluir = [excluir_cita_id] if excluir_cita_id else ()
+    agendas = cargar_agendas([fecha], veterinario_ids=[veterinario_id], excluir_citas=excluir)
+    return agendas[(veterinario_id, fecha)].esta_libre(hora, duracion)
+
+
+def disponibilidad_del_dia(fecha, duracion, veterinarios, excluir_cita_id=None):
+    """
+    Calcula horas disponibles e intervalos libres de varios veterinarios.
+
+    Args:
+        fecha: Día a consultar
+        duracion: Duración del servicio en minutos
+        veterinarios: Iterable de usuarios veterinarios
+
+    Returns:
+        list: Un diccionario por veterinario con horas e intervalos libres
+    """
+    veterinarios = list(veterinarios)
+    excluir = [excluir_cita_id] if excluir_cita_id else ()
+    agendas = cargar_agendas([fecha], veterinario_ids=[v.id for v in veterinarios], excluir_citas=excluir)
+
+    resultado = []
+    for veterinario in veterinarios:
+        agenda = agendas[(veterinario.id, fecha)]
+        resultado.append({
+            'id': veterinario.id,
+            'nombre': veterinario.get_full_name(),
+            'horas': [h.strftime('%H:%M') for h in agenda.horas_disponibles(duracion)],
+            'libres': [
+                [a_hora(inicio).strftime('%H:%M'), a_hora(fin).strftime('%H:%M') if fin < MINUTOS_DIA else '24:00']
+                for inicio, fin in agenda.intervalos_libres()
+            ],
+        })
+    return resultado
+
+
+def veterinarios_por_carga(fecha):
+    """
+    Veterinarios activos ordenados de menor a mayor carga del día.
+
+    Los minutos reservados se leen del resumen diario de agenda
+    (``CitaDiaResumen``) con un LEFT JOIN filtrado por fecha, sin recorrer
+    las citas.
+
+    Returns:
+        QuerySet: Usuarios anotados con ``minutos_reservados``
+    """
+    return Usuario.objects.filter(rol='VETERINARIO', activo=True).annotate(
+        resumen_dia=FilteredRelation(
+            'resumenes_dia',
+            condition=Q(resumenes_dia__fecha=fecha),
+        ),
+    ).annotate(
+        minutos_reservados=Coalesce(Sum('resumen_dia__minutos_reservados'), 0),
+    ).order_by('minutos_reservados', 'id')
+
+
+def asignar_veterinario(fecha, hora, duracion):
+    """
+    Elige el veterinario con menos carga que tenga libre el horario pedido.
+
+    Usa dos consultas sin importar cuántos veterinarios o citas existan: el
+    agregado de minutos reservados y las agendas del día.
+
+    Returns:
+        Usuario | None: Veterinario asignado o None si ninguno está libre
+    """
+    veterinarios = list(veterinarios_por_carga(fecha))
+    agendas = cargar_agendas([fecha], veterinario_ids=[v.id for v in veterinarios])
+    for veterinario in veterinarios:
+        if agendas[(veterinario.id, fecha)].esta_libre(hora, duracion):
+            return veterinario
+    return None
@@ -1,4 +1,8 @@
+import copy
+from datetime import datetime
+
 from django import forms
+from django.utils import timezone
 from .models import Cita
 from mascotas.models import Mascota
 from propietarios.models import Propietario
@@ -47,6 +51,25 @@ class CitaForm(forms.ModelForm):
             self.fields['mascota'].queryset = Mascota.objects.none()
 
 
+class SerieCitaForm(CitaForm):
+    """Formulario para agendar una serie de citas recurrentes (Staff)."""
+
+    intervalo_dias = forms.IntegerField(
+        min_value=1, max_value=365, initial=21,
+        label='Días entre citas',
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+        help_text='Ej: 21 días entre dosis de vacuna'
+    )
+    dosis = forms.IntegerField(
+        min_value=2, max_value=24, initial=3,
+        label='Número de citas',
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
+    class Meta(CitaForm.Meta):
+        fields = ['propietario', 'mascota', 'servicio', 'veterinario', 'fecha', 'hora', 'observaciones']
+
+
 class CitaPropietarioForm(forms.ModelForm):
     """Formulario simplificado para que propietarios agenden citas para sus mascotas."""
     
@@ -101,3 +124,61 @@ class CitaPropietarioForm(forms.ModelForm):
         self.fields['fecha'].help_text = 'Selecciona la fecha en que deseas la cita'
         self.fields['hora'].help_text = 'Horario de atención: 8:00 AM - 6:00 PM'
         self.fields['veterinario'].help_text = 'Opcional: Si no seleccionas, asignaremos un veterinario disponible'
+
+
+class ReprogramarCitaForm(forms.Form):
+    """Nueva fecha y hora de una cita (HU-014)."""
+
+    fecha = forms.DateField(
+        label='Nueva Fecha',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    hora = forms.TimeField(
+        label='Nueva Hora',
+        widget=forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'})
+    )
+
+    def __init__(self, *args, cita, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cita = cita
+
+    def clean(self):
+        cleaned_data = super().clean()
+        fecha = cleaned_data.get('fecha')
+        hora = cleaned_data.get('hora')
+        if fecha and hora:
+            # Fecha y hora del formulario son locales (TIME_ZONE); now() está en UTC
+            if timezone.make_aware(datetime.combine(fecha, hora)) <= timezone.now():
+                raise forms.ValidationError('La nueva fecha y hora deben ser futuras.')
+            # Mismas reglas de la cita (jornada laboral y cruces) sobre una copia
+            propuesta = copy.copy(self.cita)
+            propuesta.fecha = fecha
+            propuesta.hora = hora
+            propuesta.clean()
+        return cleaned_data
+
+
+class ReprogramarDiaForm(forms.Form):
+    """Reprogramación masiva del día de un veterinario (Staff)."""
+
+    veterinario = forms.ModelChoiceField(
+        queryset=Usuario.objects.filter(rol='VETERINARIO', activo=True),
+        label='Veterinario ausente',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    fecha = forms.DateField(
+        label='Fecha',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    dias = forms.IntegerField(
+        min_value=1, max_value=14, initial=5,
+        label='Días siguientes a considerar',
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+        help_text='Si no hay cupo ese día, se buscan horarios en los siguientes días laborales'
+    )
+    motivo = forms.CharField(
+        required=False, max_length=200,
+        label='Motivo',
+        widget=forms.TextInput(attrs={'class': 'form-control'}),
+        help_text='Se incluye en la notificación a los propietarios'
+    )
@@ -0,0 +1,171 @@
+"""
+Calendario iCalendar (RFC 5545) de la agenda de cada veterinario.
+
+El feed se genera línea por línea a partir de una consulta proyectada que
+se recorre con ``.aiterator()``. El generador es asíncrono porque la
+aplicación se sirve por ASGI: con un generador síncrono Django lo consume
+entero con ``sync_to_async(list)`` antes de enviarlo, mientras que uno
+asíncrono se envía por bloques sin construir todo el historial en memoria.
+
+Sincronización incremental: cada respuesta incluye un token (cabecera
+``X-Sync-Token`` y propiedad ``X-MYDOG-SYNC-TOKEN``). Al enviarlo de vuelta
+en ``?desde=<token>`` solo se reciben las citas modificadas después
+(``Cita.fecha_modificacion``), incluidas las canceladas con
+``STATUS:CANCELLED``.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.utils import timezone
+
+from servicios.models import Servicio
+from .models import Cita
+
+PRODID = '-//MyDOG//Agenda veterinaria//ES'
+
+# Las citas que se guardan mientras se arma el feed pueden tener una fecha
+# de modificación anterior al token; se repite este margen en la siguiente
+# sincronización (los clientes deduplican por UID).
+MARGEN_SINCRONIZACION = timedelta(minutes=2)
+
+# Filas leídas de la base de datos por bloque
+TAMANO_BLOQUE = 500
+
+CAMPOS_ICS = (
+    'id', 'fecha', 'hora', 'estado', 'observaciones', 'es_emergencia', 'fecha_modificacion',
+    'servicio__nombre', 'servicio__duracion_minutos',
+    'mascota__nombre', 'propietario__nombre', 'propietario__telefono',
+)
+
+ESTADO_ICS = {
+    'PROGRAMADA': 'TENTATIVE',
+    'CONFIRMADA': 'CONFIRMED',
+    'COMPLETADA': 'CONFIRMED',
+    'CANCELADA': 'CANCELLED',
+    'INASISTENCIA': 'CANCELLED',
+}
+
+_SERVICIOS_DISPLAY = dict(Servicio._meta.get_field('nombre').choices)
+
+
+def token_sincronizacion(momento):
+    """Token opaco de sincronización (microsegundos desde epoch)."""
+    return str(int(momento.timestamp() * 1_000_000))
+
+
+def parsear_token_sincronizacion(token):
+    """
+    Convierte un token de sincronización en ``datetime``.
+
+    Returns:
+        datetime | None: None si el token es inválido
+    """
+    try:
+        microsegundos = int(token)
+    except (TypeError, ValueError):
+        return None
+    if microsegundos < 0:
+        return None
+    return datetime(1970, 1, 1, tzinfo=dt_timezone.utc) + timedelta(microseconds=microsegundos)
+
+
+def escapar(texto):
+    """Escapa un valor TEXT según RFC 5545 (barras, comas, punto y coma, saltos)."""
+    return (
+        str(texto).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def plegar(linea):
+    """Parte una línea en segmentos de 75 octetos (continuación con espacio)."""
+    datos = linea.encode('utf-8')
+    if len(datos) <= 75:
+        return linea + '\r\n'
+    partes = []
+    limite = 75
+    while datos:
+        corte = min(limite, len(datos))
+        # No partir un carácter UTF-8 de varios bytes
+        while corte < len(datos) and (datos[corte] & 0xC0) == 0x80:
+            corte -= 1
+        partes.append(datos[:corte].decode('utf-8'))
+        datos = datos[corte:]
+        limite = 74  # el espacio inicial ocupa un octeto
+    return '\r\n '.join(partes) + '\r\n'
+
+
+def _utc(momento):
+    return momento.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def evento_ics(fila, zona, dtstamp):
+    """Bloque VEVENT de una cita proyectada con ``CAMPOS_ICS``."""
+    inicio = datetime.combine(fila['fecha'], fila['hora']).replace(tzinfo=zona)
+    fin = inicio + timedelta(minutes=fila['servicio__duracion_minutos'])
+    servicio = _SERVICIOS_DISPLAY.get(fila['servicio__nombre'], fila['servicio__nombre'])
+    resumen = f"{fila['mascota__nombre']} - {servicio}"
+    if fila['es_emergencia']:
+        resumen = f'[Emergencia] {resumen}'
+    descripcion = f"Propietario: {fila['propietario__nombre']} ({fila['propietario__telefono']})"
+    if fila['observaciones']:
+        descripcion += f"\n{fila['observaciones']}"
+
+    lineas = [
+        'BEGIN:VEVENT',
+        f"UID:cita-{fila['id']}@mydog",
+        f'DTSTAMP:{dtstamp}',
+        f'DTSTART:{_utc(inicio)}',
+        f'DTEND:{_utc(fin)}',
+        f"LAST-MODIFIED:{_utc(fila['fecha_modificacion'])}",
+        f'SUMMARY:{escapar(resumen)}',
+        f'DESCRIPTION:{escapar(descripcion)}',
+        f"STATUS:{ESTADO_ICS.get(fila['estado'], 'TENTATIVE')}",
+        'END:VEVENT',
+    ]
+    return ''.join(plegar(linea) for linea in lineas)
+
+
+def citas_ics(veterinario_id, desde=None):
+    """Citas del veterinario para el feed (todas, o las modificadas desde ``desde``)."""
+    citas = Cita.objects.filter(veterinario_id=veterinario_id)
+    if desde is not None:
+        citas = citas.filter(fecha_modificacion__gt=desde)
+    return citas.order_by('fecha_modificacion', 'id').values(*CAMPOS_ICS)
+
+
+def generar_ics(veterinario, desde=None, momento=None):
+    """
+    Genera el calendario del veterinario como un iterable de fragmentos.
+
+    Args:
+        veterinario: Usuario veterinario
+        desde: Solo citas modificadas después de este momento (opcional)
+        momento: Hora de la consulta (por defecto ahora)
+
+    Returns:
+        tuple: (iterable asíncrono de str, token de sincronización para la
+        próxima consulta)
+    """
+    momento = momento or timezone.now()
+    token = token_sincronizacion(momento - MARGEN_SINCRONIZACION)
+
+    async def fragmentos():
+        zona = ZoneInfo(settings.TIME_ZONE)
+        dtstamp = _utc(momento)
+        yield ''.join(plegar(linea) for linea in (
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            f'PRODID:{PRODID}',
+            'CALSCALE:GREGORIAN',
+            'METHOD:PUBLISH',
+            f'X-WR-CALNAME:{escapar("MyDOG - " + veterinario.get_full_name())}',
+            f'X-MYDOG-SYNC-TOKEN:{token}',
+        ))
+        async for fila in citas_ics(veterinario.pk, desde).aiterator(chunk_size=TAMANO_BLOQUE):
+            yield evento_ics(fila, zona, dtstamp)
+        yield 'END:VCALENDAR\r\n'
+
+    return fragmentos(), token
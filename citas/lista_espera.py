@@ -0,0 +1,163 @@
+"""
+Asignación de huecos liberados a la lista de espera (HU-032).
+
+Cuando una cita se cancela o se reprograma, el horario que deja libre se
+asigna (u ofrece) a la entrada de lista de espera de mayor prioridad y más
+antigua cuyo servicio quepa en el hueco.
+
+La búsqueda recorre el índice (servicio, atendido, prioridad,
+fecha_solicitud): por cada servicio que cabe se lee solo la primera entrada
+del índice, así que el costo no crece con el tamaño de la lista.
+"""
+
+import logging
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from notificaciones.services import crear_evento_cita, crear_eventos_cita
+from servicios.models import Servicio
+from .disponibilidad import a_minutos, cargar_agendas
+from .models import Cita, ListaEspera
+from .services import reservar_cita
+
+logger = logging.getLogger('mydog')
+
+
+def autoagendar():
+    """
+    Indica si el hueco se agenda directamente (por defecto) o solo se
+    ofrece al propietario (``LISTA_ESPERA_AUTOAGENDAR = False``).
+    """
+    return getattr(settings, 'LISTA_ESPERA_AUTOAGENDAR', True)
+
+
+def duracion_hueco(agenda, hora):
+    """
+    Minutos libres desde ``hora`` hasta la siguiente cita o el fin de la jornada.
+
+    Returns:
+        int: 0 si ``hora`` está ocupada o fuera de la jornada
+    """
+    inicio = a_minutos(hora)
+    for desde, hasta in agenda.intervalos_libres():
+        if desde <= inicio < hasta:
+            return hasta - inicio
+    return 0
+
+
+def siguiente_en_espera(duracion_maxima, excluir_paciente_id=None):
+    """
+    Entrada pendiente de mayor prioridad y más antigua cuyo servicio dure
+    como máximo ``duracion_maxima`` minutos.
+
+    Hace una consulta por servicio candidato (cada una lee una sola fila del
+    índice) más una para cargar la entrada elegida.
+
+    Returns:
+        ListaEspera | None
+    """
+    servicios = Servicio.objects.filter(
+        activo=True, duracion_minutos__lte=duracion_maxima
+    ).values_list('id', flat=True)
+
+    mejor = None
+    for servicio_id in servicios:
+        # "atendido IN (0)" en vez de "NOT atendido" para que SQLite use el índice
+        entradas = ListaEspera.objects.filter(servicio_id=servicio_id, atendido__in=[False])
+        if excluir_paciente_id:
+            entradas = entradas.exclude(paciente_id=excluir_paciente_id)
+        candidata = entradas.order_by('prioridad', 'fecha_solicitud', 'id').values_list(
+            'prioridad', 'fecha_solicitud', 'id'
+        ).first()
+        if candidata and (mejor is None or candidata < mejor):
+            mejor = candidata
+
+    if mejor is None:
+        return None
+    return ListaEspera.objects.select_related('paciente__propietario', 'servicio').get(pk=mejor[2])
+
+
+def notificar_cita_desde_espera(cita, actor):
+    """Notificación de una cita asignada automáticamente desde la lista de espera."""
+    crear_evento_cita(
+        actor=actor,
+        cita=cita,
+        tipo='CONFIRMACION',
+        asunto='Cita asignada desde lista de espera',
+        mensaje=f"Se liberó un horario y se asignó la cita #{cita.id} para "
+                f"{cita.mascota.nombre} el {cita.fecha} a las {cita.hora}"
+    )
+
+
+def ocupar_hueco(veterinario_id, fecha, hora, actor, excluir_paciente_id=None):
+    """
+    Asigna u ofrece el horario liberado a la lista de espera.
+
+    Debe llamarse después de guardar la cancelación o reprogramación, dentro
+    de la misma transacción. Si la reserva automática falla (por ejemplo,
+    porque otro proceso tomó el horario) la cancelación no se ve afectada.
+
+    Args:
+        veterinario_id: Veterinario que quedó libre
+        fecha: Fecha del hueco
+        hora: Hora de inicio del hueco
+        actor: Usuario que canceló o reprogramó
+        excluir_paciente_id: Mascota de la cita liberada (no se le reasigna)
+
+    Returns:
+        tuple: (entrada, cita) con la cita creada, (entrada, None) si solo se
+        ofreció, o (None, None) si no hubo candidato
+    """
+    # Fecha y hora del hueco son locales (TIME_ZONE); now() está en UTC
+    if timezone.make_aware(datetime.combine(fecha, hora)) <= timezone.now():
+        return None, None
+
+    agendas = cargar_agendas([fecha], veterinario_ids=[veterinario_id])
+    duracion = duracion_hueco(agendas[(veterinario_id, fecha)], hora)
+    if not duracion:
+        return None, None
+
+    entrada = siguiente_en_espera(duracion, excluir_paciente_id)
+    if entrada is None:
+        return None, None
+
+    if not autoagendar():
+        _ofrecer_hueco(entrada, fecha, hora, actor)
+        return entrada, None
+
+    mascota = entrada.paciente
+    cita = Cita(
+        propietario=mascota.propietario,
+        mascota=mascota,
+        servicio=entrada.servicio,
+        veterinario_id=veterinario_id,
+        fecha=fecha,
+        hora=hora,
+        observaciones=entrada.observaciones or 'Asignada desde lista de espera',
+        usuario_creador=actor,
+    )
+    try:
+        reservar_cita(cita, actor, notificar=notificar_cita_desde_espera)
+    except ValidationError:
+        logger.info('No se pudo asignar el hueco %s %s a la lista de espera #%s', fecha, hora, entrada.pk)
+        return None, None
+
+    ListaEspera.objects.filter(pk=entrada.pk).update(atendido=True)
+    entrada.atendido = True
+    return entrada, cita
+
+
+def _ofrecer_hueco(entrada, fecha, hora, actor):
+    """
+    Avisa al propietario que hay un horario libre para el servicio que
+    espera (por la bandeja de salida, sin cita asociada).
+    """
+    crear_eventos_cita(actor, [(
+        None, 'SISTEMA', f'Horario disponible - {entrada.servicio.get_nombre_display()}',
+        f'Se liberó un horario el {fecha.strftime("%d/%m/%Y")} a las {hora.strftime("%H:%M")} '
+        f'para {entrada.paciente.nombre}. Agéndalo antes de que otro paciente lo tome.',
+        [entrada.paciente.propietario.usuario_id],
+    )])
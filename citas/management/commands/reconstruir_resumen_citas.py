@@ -0,0 +1,46 @@
+"""
+Comando de Django para reconstruir el resumen diario de agenda (CitaDiaResumen).
+
+Recalcula el resumen desde la tabla de citas con un único agregado. Sirve
+para la carga inicial y para corregir diferencias tras cambios hechos por
+fuera de la aplicación (ej: actualizaciones directas en la base de datos).
+
+Uso:
+    python manage.py reconstruir_resumen_citas
+    python manage.py reconstruir_resumen_citas --desde 2025-01-01 --hasta 2025-12-31
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from citas.resumen import reconstruir_resumen
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen diario de agenda por veterinario desde las citas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        desde = self._fecha(options['desde'], '--desde')
+        hasta = self._fecha(options['hasta'], '--hasta')
+
+        inicio = time.perf_counter()
+        filas = reconstruir_resumen(desde, hasta)
+        duracion = time.perf_counter() - inicio
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Resumen reconstruido: {filas} días-veterinario en {duracion:.2f}s')
+        )
+
+    def _fecha(self, valor, opcion):
+        if not valor:
+            return None
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise CommandError(f'{opcion} debe tener el formato AAAA-MM-DD')
+        return fecha
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0002_cita_pagado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionCalendarioDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True, verbose_name='Fecha')),
+                ('version', models.PositiveIntegerField(default=0, help_text='Contador de cambios de las citas del día', verbose_name='Versión')),
+            ],
+            options={
+                'verbose_name': 'Versión del calendario',
+                'verbose_name_plural': 'Versiones del calendario',
+            },
+        ),
+    ]
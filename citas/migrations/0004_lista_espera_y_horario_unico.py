@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0003_versioncalendariodia'),
+        ('mascotas', '0001_initial'),
+        ('propietarios', '0001_initial'),
+        ('servicios', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='cita',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='listaespera',
+            index=models.Index(fields=['servicio', 'atendido', 'prioridad', 'fecha_solicitud'], name='espera_servicio_prioridad_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cita',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'CANCELADA'), _negated=True), fields=('veterinario', 'fecha', 'hora'), name='cita_unica_por_horario'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0004_lista_espera_y_horario_unico'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CitaDiaResumen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('programadas', models.IntegerField(default=0, verbose_name='Programadas')),
+                ('confirmadas', models.IntegerField(default=0, verbose_name='Confirmadas')),
+                ('completadas', models.IntegerField(default=0, verbose_name='Completadas')),
+                ('canceladas', models.IntegerField(default=0, verbose_name='Canceladas')),
+                ('inasistencias', models.IntegerField(default=0, verbose_name='Inasistencias')),
+                ('minutos_reservados', models.IntegerField(default=0, help_text='Duración total de las citas que ocupan la agenda', verbose_name='Minutos reservados')),
+                ('ingreso_esperado', models.DecimalField(decimal_places=2, default=0, help_text='Precio de los servicios de las citas que ocupan la agenda', max_digits=12, verbose_name='Ingreso esperado')),
+                ('veterinario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_dia', to=settings.AUTH_USER_MODEL, verbose_name='Veterinario')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de agenda',
+                'verbose_name_plural': 'Resúmenes diarios de agenda',
+                'indexes': [models.Index(fields=['fecha'], name='citas_citad_fecha_a9b2bd_idx')],
+                'unique_together': {('veterinario', 'fecha')},
+            },
+        ),
+    ]
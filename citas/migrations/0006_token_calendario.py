@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0005_citadiaresumen'),
+        ('mascotas', '0001_initial'),
+        ('propietarios', '0001_initial'),
+        ('servicios', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenCalendario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True, verbose_name='Token')),
+                ('activo', models.BooleanField(default=True, help_text='Los tokens revocados dejan de dar acceso al calendario', verbose_name='Activo')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('ultimo_uso', models.DateTimeField(blank=True, null=True, verbose_name='Último uso')),
+            ],
+            options={
+                'verbose_name': 'Token de calendario',
+                'verbose_name_plural': 'Tokens de calendario',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['veterinario', 'fecha_modificacion'], name='citas_cita_veterin_37aa44_idx'),
+        ),
+        migrations.AddField(
+            model_name='tokencalendario',
+            name='veterinario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens_calendario', to=settings.AUTH_USER_MODEL, verbose_name='Veterinario'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+# Copia congelada de citas.resumen.CAMPO_POR_ESTADO y de
+# citas.disponibilidad.ESTADOS_OCUPAN_AGENDA al momento de esta migración
+CAMPO_POR_ESTADO = {
+    'PROGRAMADA': 'programadas',
+    'CONFIRMADA': 'confirmadas',
+    'COMPLETADA': 'completadas',
+    'CANCELADA': 'canceladas',
+    'INASISTENCIA': 'inasistencias',
+}
+ESTADOS_OCUPAN_AGENDA = ['PROGRAMADA', 'CONFIRMADA', 'COMPLETADA']
+
+
+def cargar_resumen(apps, schema_editor):
+    # La tabla se creó vacía en 0005: sin esta carga la asignación por carga
+    # y el reporte mensual leen ceros hasta reconstruir a mano
+    Cita = apps.get_model('citas', 'Cita')
+    CitaDiaResumen = apps.get_model('citas', 'CitaDiaResumen')
+    ocupan = Q(estado__in=ESTADOS_OCUPAN_AGENDA)
+    filas = Cita.objects.order_by().values('veterinario_id', 'fecha').annotate(
+        **{
+            campo: Count('id', filter=Q(estado=estado))
+            for estado, campo in CAMPO_POR_ESTADO.items()
+        },
+        minutos_reservados=Coalesce(Sum('servicio__duracion_minutos', filter=ocupan), 0),
+        ingreso_esperado=Coalesce(
+            Sum('servicio__precio', filter=ocupan),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+    CitaDiaResumen.objects.all().delete()
+    CitaDiaResumen.objects.bulk_create(
+        (CitaDiaResumen(**fila) for fila in filas.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0006_token_calendario'),
+        ('servicios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(cargar_resumen, migrations.RunPython.noop),
+    ]
@@ -5,10 +5,12 @@ Este módulo contiene los modelos Cita y ListaEspera para gestionar
 el agendamiento de citas y la lista de espera de pacientes.
 """
 
+import secrets
+
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from datetime import datetime, timedelta, time as dt_time
+from datetime import datetime, timedelta
 
 
 class Cita(models.Model):
@@ -136,12 +138,39 @@ class Cita(models.Model):
             models.Index(fields=['fecha', 'hora']),
             models.Index(fields=['veterinario', 'fecha']),
             models.Index(fields=['estado']),
+            # Sincronización incremental del calendario ICS por veterinario
+            models.Index(fields=['veterinario', 'fecha_modificacion']),
+        ]
+        constraints = [
+            # No permitir citas duplicadas; una cita cancelada libera el horario
+            models.UniqueConstraint(
+                fields=['veterinario', 'fecha', 'hora'],
+                condition=~models.Q(estado='CANCELADA'),
+                name='cita_unica_por_horario'
+            ),
         ]
-        unique_together = [['veterinario', 'fecha', 'hora']]  # No permitir citas duplicadas
     
     def __str__(self):
         return f"{self.mascota.nombre} - {self.servicio.get_nombre_display()} ({self.fecha} {self.hora})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Guarda la fecha y los datos del resumen diario y del saldo del
+        propietario cargados para detectar reprogramaciones y cambios de
+        estado o de pago al guardar.
+        """
+        instancia = super().from_db(db, field_names, values)
+        datos = instancia.__dict__
+        instancia._fecha_original = datos.get('fecha')
+        instancia._resumen_original = (
+            datos.get('veterinario_id'), datos.get('fecha'), datos.get('estado'), datos.get('servicio_id')
+        )
+        instancia._saldo_original = (
+            datos.get('propietario_id'), datos.get('estado'), datos.get('pagado')
+        )
+        return instancia
+    
     def clean(self):
         """
         Validaciones personalizadas del modelo.
@@ -161,20 +190,31 @@ class Cita(models.Model):
                 })
         
         # Validar horario laboral si no es emergencia
-        if not self.es_emergencia:
-            # Validar día laboral (lunes=0 a sábado=5)
-            if self.fecha.weekday() == 6:  # Domingo
+        if not self.es_emergencia and self.fecha and self.hora:
+            from .disponibilidad import a_hora, cabe_en_jornada, describir_dias, horario_laboral
+            inicio_jornada, fin_jornada, dias_laborales = horario_laboral()
+            horario = f'{describir_dias(dias_laborales)}, {a_hora(inicio_jornada):%H:%M} - {a_hora(fin_jornada):%H:%M}'
+            
+            # Validar día laboral
+            if self.fecha.weekday() not in dias_laborales:
                 raise ValidationError({
-                    'fecha': 'No se atiende los domingos. Horario: Lunes a Sábado'
+                    'fecha': f'No se atiende ese día. Horario: {horario}'
                 })
             
-            # Validar horario (8:00 - 18:00)
-            hora_inicio = dt_time(8, 0)
-            hora_fin = dt_time(18, 0)
-            
-            if not (hora_inicio <= self.hora <= hora_fin):
+            # Validar que el servicio empiece y termine dentro de la jornada
+            duracion = self.servicio.duracion_minutos if self.servicio_id else 0
+            if not cabe_en_jornada(self.hora, duracion):
+                raise ValidationError({
+                    'hora': f'El servicio debe empezar y terminar dentro del horario laboral ({horario})'
+                })
+        
+        # Validar que el veterinario no tenga otra cita que se cruce
+        if self.veterinario_id and self.servicio_id and self.fecha and self.hora:
+            from .disponibilidad import esta_disponible
+            if not esta_disponible(self.veterinario_id, self.fecha, self.hora,
+                                   self.servicio.duracion_minutos, excluir_cita_id=self.pk):
                 raise ValidationError({
-                    'hora': 'Horario laboral: 8:00 AM - 6:00 PM'
+                    'hora': 'El veterinario ya tiene una cita que se cruza con este horario'
                 })
     
     def puede_cancelar(self, usuario):
@@ -260,6 +300,91 @@ class Cita(models.Model):
         self.save(update_fields=['pagado'])
 
 
+class VersionCalendarioDia(models.Model):
+    """
+    Versión de cambios del calendario por día (HU-011).
+    
+    Se incrementa cada vez que se crea, modifica o elimina una cita del día,
+    lo que permite al feed del calendario responder 304 Not Modified.
+    """
+    
+    fecha = models.DateField(
+        unique=True,
+        verbose_name='Fecha'
+    )
+    
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Versión',
+        help_text='Contador de cambios de las citas del día'
+    )
+    
+    class Meta:
+        verbose_name = 'Versión del calendario'
+        verbose_name_plural = 'Versiones del calendario'
+    
+    def __str__(self):
+        return f"{self.fecha} (v{self.version})"
+
+
+class CitaDiaResumen(models.Model):
+    """
+    Resumen diario de la agenda de cada veterinario.
+    
+    Proyección de las citas por (veterinario, fecha) con el conteo por
+    estado, los minutos reservados y el ingreso esperado. Se mantiene de
+    forma incremental (ver ``citas/resumen.py``) y se puede reconstruir con
+    ``python manage.py reconstruir_resumen_citas``.
+    """
+    
+    veterinario = models.ForeignKey(
+        'autenticacion.Usuario',
+        on_delete=models.CASCADE,
+        related_name='resumenes_dia',
+        verbose_name='Veterinario'
+    )
+    
+    fecha = models.DateField(
+        verbose_name='Fecha'
+    )
+    
+    programadas = models.IntegerField(default=0, verbose_name='Programadas')
+    confirmadas = models.IntegerField(default=0, verbose_name='Confirmadas')
+    completadas = models.IntegerField(default=0, verbose_name='Completadas')
+    canceladas = models.IntegerField(default=0, verbose_name='Canceladas')
+    inasistencias = models.IntegerField(default=0, verbose_name='Inasistencias')
+    
+    minutos_reservados = models.IntegerField(
+        default=0,
+        verbose_name='Minutos reservados',
+        help_text='Duración total de las citas que ocupan la agenda'
+    )
+    
+    ingreso_esperado = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Ingreso esperado',
+        help_text='Precio de los servicios de las citas que ocupan la agenda'
+    )
+    
+    class Meta:
+        verbose_name = 'Resumen diario de agenda'
+        verbose_name_plural = 'Resúmenes diarios de agenda'
+        unique_together = [['veterinario', 'fecha']]
+        indexes = [
+            models.Index(fields=['fecha']),
+        ]
+    
+    def __str__(self):
+        return f"{self.veterinario} - {self.fecha}"
+    
+    @property
+    def total(self):
+        """Total de citas del día en cualquier estado."""
+        return self.programadas + self.confirmadas + self.completadas + self.canceladas + self.inasistencias
+
+
 class ListaEspera(models.Model):
     """
     Modelo de Lista de Espera (HU-032).
@@ -318,6 +443,67 @@ class ListaEspera(models.Model):
         verbose_name = 'Lista de espera'
         verbose_name_plural = 'Listas de espera'
         ordering = ['prioridad', 'fecha_solicitud']
+        indexes = [
+            # Siguiente entrada pendiente por servicio (ver citas/lista_espera.py)
+            models.Index(
+                fields=['servicio', 'atendido', 'prioridad', 'fecha_solicitud'],
+                name='espera_servicio_prioridad_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.paciente.nombre} - {self.servicio.get_nombre_display()} (Prioridad: {self.get_prioridad_display()})"
+
+
+class TokenCalendario(models.Model):
+    """
+    Token de acceso al calendario ICS de un veterinario.
+    
+    Permite suscribir la agenda desde el celular sin iniciar sesión. Al
+    generar un token nuevo los anteriores quedan revocados.
+    """
+    
+    veterinario = models.ForeignKey(
+        'autenticacion.Usuario',
+        on_delete=models.CASCADE,
+        related_name='tokens_calendario',
+        verbose_name='Veterinario'
+    )
+    
+    token = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name='Token'
+    )
+    
+    activo = models.BooleanField(
+        default=True,
+        verbose_name='Activo',
+        help_text='Los tokens revocados dejan de dar acceso al calendario'
+    )
+    
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de creación'
+    )
+    
+    ultimo_uso = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Último uso'
+    )
+    
+    class Meta:
+        verbose_name = 'Token de calendario'
+        verbose_name_plural = 'Tokens de calendario'
+        ordering = ['-fecha_creacion']
+    
+    def __str__(self):
+        estado = 'activo' if self.activo else 'revocado'
+        return f"{self.veterinario.get_full_name()} ({estado})"
+    
+    @classmethod
+    def generar(cls, veterinario):
+        """Revoca los tokens activos del veterinario y crea uno nuevo."""
+        cls.objects.filter(veterinario=veterinario, activo=True).update(activo=False)
+        return cls.objects.create(veterinario=veterinario, token=secrets.token_urlsafe(32))
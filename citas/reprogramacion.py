@@ -0,0 +1,216 @@
+"""
+Reprogramación masiva del día de un veterinario (HU-014).
+
+Cuando un veterinario no puede atender (incapacidad, una cirugía que se
+extiende) sus citas PROGRAMADA y CONFIRMADA del día se redistribuyen:
+
+1. El mismo día, a la misma hora, con el veterinario menos cargado.
+2. El mismo día, en la hora libre más cercana posterior.
+3. Los siguientes días laborales, primero con el mismo veterinario a la
+   misma hora y luego en el primer horario libre de cualquiera.
+
+Las agendas de todos los veterinarios se cargan una sola vez como mapas de
+bits (``citas.disponibilidad``) y se van ocupando en memoria a medida que
+se ubica cada cita. Todo se guarda en una sola transacción y las
+notificaciones se crean en un único lote.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from autenticacion.models import Usuario
+from notificaciones.services import crear_eventos_cita
+from .calendario import publicar_cambios, registrar_cambio_dias
+from .disponibilidad import a_minutos, cargar_agendas, horario_laboral
+from .models import Cita
+from .resumen import ajustar_resumen, huella
+from .services import bloquear_agendas, con_reintentos
+
+ESTADOS_REPROGRAMABLES = ['PROGRAMADA', 'CONFIRMADA']
+
+# Días laborales siguientes en los que se buscan horarios
+DIAS_BUSQUEDA = 5
+
+
+def dias_siguientes(fecha, cantidad):
+    """Los ``cantidad`` días laborales posteriores a ``fecha``."""
+    _, _, dias_laborales = horario_laboral()
+    dias = []
+    dia = fecha
+    while len(dias) < cantidad:
+        dia += timedelta(days=1)
+        if dia.weekday() in dias_laborales:
+            dias.append(dia)
+    return dias
+
+
+def _cabe(agenda, hora, duracion):
+    """La cita cabe a esa hora dentro de la jornada y sin cruces."""
+    inicio_jornada, fin_jornada, _ = horario_laboral()
+    inicio = a_minutos(hora)
+    return inicio_jornada <= inicio and inicio + duracion <= fin_jornada and agenda.esta_libre(hora, duracion)
+
+
+def _primer_horario(agendas, veterinario_ids, fecha, duracion, desde=None):
+    """
+    Primer horario libre de cualquiera de los veterinarios en ``fecha``
+    (desde la hora indicada); a igual hora gana el menos cargado.
+
+    Returns:
+        tuple | None: (veterinario_id, hora)
+    """
+    opciones = []
+    for veterinario_id in veterinario_ids:
+        agenda = agendas[(veterinario_id, fecha)]
+        for hora in agenda.horas_disponibles(duracion):
+            if desde is None or hora >= desde:
+                opciones.append((hora, agenda.minutos_ocupados(), veterinario_id))
+                break
+    if not opciones:
+        return None
+    hora, _, veterinario_id = min(opciones)
+    return veterinario_id, hora
+
+
+def planear_reprogramacion(citas, veterinario_id, fecha, veterinario_ids, agendas, dias):
+    """
+    Decide el nuevo veterinario, fecha y hora de cada cita (sin tocar la base).
+
+    Args:
+        citas: Citas a mover, en orden de hora
+        veterinario_id: Veterinario ausente
+        fecha: Día de la ausencia
+        veterinario_ids: Veterinarios activos
+        agendas: ``Agendas`` de los veterinarios para ``fecha`` y ``dias``,
+            sin las citas a mover; se actualizan en memoria
+        dias: Días siguientes donde buscar
+
+    Returns:
+        list: Tuplas (cita, veterinario_id, fecha, hora) o (cita, None, None, None)
+    """
+    otros = [v for v in veterinario_ids if v != veterinario_id]
+    plan = []
+    for cita in citas:
+        duracion = cita.servicio.duracion_minutos
+        destino = None
+
+        # 1. Mismo día y hora con el veterinario menos cargado
+        libres = [v for v in otros if _cabe(agendas[(v, fecha)], cita.hora, duracion)]
+        if libres:
+            elegido = min(libres, key=lambda v: (agendas[(v, fecha)].minutos_ocupados(), v))
+            destino = (elegido, fecha, cita.hora)
+
+        # 2. Mismo día, hora libre más cercana posterior
+        if destino is None:
+            horario = _primer_horario(agendas, otros, fecha, duracion, desde=cita.hora)
+            if horario:
+                destino = (horario[0], fecha, horario[1])
+
+        # 3. Días siguientes: mismo veterinario y hora, o el primer horario libre
+        for dia in dias:
+            if destino is not None:
+                break
+            if _cabe(agendas[(veterinario_id, dia)], cita.hora, duracion):
+                destino = (veterinario_id, dia, cita.hora)
+                break
+            horario = _primer_horario(agendas, veterinario_ids, dia, duracion)
+            if horario:
+                destino = (horario[0], dia, horario[1])
+
+        if destino is None:
+            plan.append((cita, None, None, None))
+            continue
+        nuevo_veterinario, nueva_fecha, nueva_hora = destino
+        agendas[(nuevo_veterinario, nueva_fecha)].ocupar(nueva_hora, duracion)
+        plan.append((cita, nuevo_veterinario, nueva_fecha, nueva_hora))
+    return plan
+
+
+def reprogramar_dia(veterinario, fecha, actor, dias=DIAS_BUSQUEDA, motivo=''):
+    """
+    Redistribuye las citas pendientes de un veterinario en un día.
+
+    Args:
+        veterinario: Veterinario que no puede atender
+        fecha: Día a liberar
+        actor: Usuario que reprograma
+        dias: Días laborales siguientes en los que se buscan horarios
+        motivo: Texto que se agrega a la notificación
+
+    Returns:
+        dict: ``movidas`` (lista de (cita, fecha_anterior, hora_anterior))
+        y ``sin_cupo`` (citas que no se pudieron ubicar y quedan igual)
+    """
+    return _reprogramar_dia(veterinario, fecha, actor, dias, motivo)
+
+
+@con_reintentos
+def _reprogramar_dia(veterinario, fecha, actor, dias, motivo):
+    with transaction.atomic():
+        veterinario_ids = list(
+            Usuario.objects.filter(rol='VETERINARIO', activo=True).order_by('pk').values_list('pk', flat=True)
+        )
+        bloquear_agendas(veterinario.pk, *veterinario_ids)
+
+        citas = list(
+            Cita.objects.filter(
+                veterinario=veterinario, fecha=fecha, estado__in=ESTADOS_REPROGRAMABLES
+            ).select_related('servicio', 'propietario', 'mascota').order_by('hora')
+        )
+        if not citas:
+            return {'movidas': [], 'sin_cupo': []}
+
+        siguientes = dias_siguientes(fecha, dias)
+        agendas = cargar_agendas(
+            [fecha, *siguientes], veterinario_ids=veterinario_ids, excluir_citas=[c.pk for c in citas]
+        )
+        plan = planear_reprogramacion(citas, veterinario.pk, fecha, veterinario_ids, agendas, siguientes)
+
+        movidas, sin_cupo, anteriores = [], [], []
+        for cita, nuevo_veterinario, nueva_fecha, nueva_hora in plan:
+            if nuevo_veterinario is None:
+                sin_cupo.append(cita)
+                continue
+            anteriores.append(huella(cita))
+            movidas.append((cita, cita.fecha, cita.hora))
+            cita.veterinario_id = nuevo_veterinario
+            cita.fecha = nueva_fecha
+            cita.hora = nueva_hora
+        if not movidas:
+            return {'movidas': [], 'sin_cupo': sin_cupo}
+
+        citas_movidas = [cita for cita, _, _ in movidas]
+        # bulk_update no aplica auto_now: se marca la modificación a mano
+        ahora = timezone.now()
+        for cita in citas_movidas:
+            cita.fecha_modificacion = ahora
+        Cita.objects.bulk_update(citas_movidas, ['veterinario', 'fecha', 'hora', 'fecha_modificacion'])
+
+        # bulk_update no dispara las señales del calendario ni del resumen
+        registrar_cambio_dias(fecha, *(cita.fecha for cita in citas_movidas))
+        for cita in citas_movidas:
+            cita._fecha_original = cita.fecha
+            cita._resumen_original = huella(cita)
+        ajustar_resumen(quitar=anteriores, agregar=[cita._resumen_original for cita in citas_movidas])
+
+        nombres = {
+            pk: f'{nombre} {apellido}'.strip()
+            for pk, nombre, apellido in Usuario.objects.filter(
+                pk__in={c.veterinario_id for c in citas_movidas}
+            ).values_list('pk', 'first_name', 'last_name')
+        }
+        detalle = f' Motivo: {motivo}' if motivo else ''
+        crear_eventos_cita(actor, [
+            (
+                cita,
+                'SISTEMA',
+                'Cita reprogramada',
+                f'La cita #{cita.id} de {cita.mascota.nombre} fue reprogramada para el {cita.fecha} '
+                f'a las {cita.hora:%H:%M} con Dr. {nombres[cita.veterinario_id]}.{detalle}'
+            )
+            for cita in citas_movidas
+        ])
+        publicar_cambios('reprogramar', *citas_movidas)
+    return {'movidas': movidas, 'sin_cupo': sin_cupo}
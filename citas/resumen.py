@@ -0,0 +1,242 @@
+"""
+Resumen diario de agenda por veterinario (CitaDiaResumen).
+
+Reportes y verificaciones de carga leen esta proyección (una fila por
+veterinario y día) en lugar de recontar la tabla de citas. Se mantiene de
+forma incremental:
+
+- Las señales de ``Cita`` ajustan el resumen en cada ``save``/``delete``
+  comparando la huella cargada de la base de datos con la nueva.
+- Las operaciones en lote (``bulk_create``, ``update``) no disparan señales
+  y deben llamar a ``ajustar_resumen`` explícitamente.
+- Editar la duración o el precio de un ``Servicio`` corrige los días con
+  citas de ese servicio (``ajustar_servicio``). Un ``update()`` sobre
+  servicios no pasa por las señales: después hay que reconstruir.
+
+``reconstruir_resumen`` lo recalcula desde cero con un único agregado
+(``filas_resumen``; la migración de carga inicial guarda su propia copia).
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from servicios.models import Servicio
+from .disponibilidad import ESTADOS_OCUPAN_AGENDA
+from .models import Cita, CitaDiaResumen
+
+# Columna del resumen que cuenta cada estado de cita
+CAMPO_POR_ESTADO = {
+    'PROGRAMADA': 'programadas',
+    'CONFIRMADA': 'confirmadas',
+    'COMPLETADA': 'completadas',
+    'CANCELADA': 'canceladas',
+    'INASISTENCIA': 'inasistencias',
+}
+CAMPOS_CONTEO = list(CAMPO_POR_ESTADO.values())
+CAMPOS_RESUMEN = CAMPOS_CONTEO + ['minutos_reservados', 'ingreso_esperado']
+
+
+def _como_fecha(valor):
+    """Normaliza fechas que llegan como texto (ej: desde request.POST)."""
+    return Cita._meta.get_field('fecha').to_python(valor)
+
+
+def huella(cita):
+    """
+    Datos de una cita que afectan el resumen.
+
+    Returns:
+        tuple: (veterinario_id, fecha, estado, servicio_id)
+    """
+    return (cita.veterinario_id, _como_fecha(cita.fecha), cita.estado, cita.servicio_id)
+
+
+def _deltas(quitar, agregar):
+    """Cambios por (veterinario_id, fecha) y columna del resumen."""
+    huellas = [h for h in (*quitar, *agregar) if h]
+    servicios = {
+        pk: (duracion, precio)
+        for pk, duracion, precio in Servicio.objects.filter(
+            pk__in={h[3] for h in huellas}
+        ).values_list('pk', 'duracion_minutos', 'precio')
+    }
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    for signo, grupo in ((-1, quitar), (1, agregar)):
+        for veterinario_id, fecha, estado, servicio_id in filter(None, grupo):
+            cambios = deltas[(veterinario_id, fecha)]
+            cambios[CAMPO_POR_ESTADO[estado]] += signo
+            if estado in ESTADOS_OCUPAN_AGENDA:
+                duracion, precio = servicios[servicio_id]
+                cambios['minutos_reservados'] += signo * duracion
+                cambios['ingreso_esperado'] += signo * precio
+
+    return {
+        clave: {campo: valor for campo, valor in cambios.items() if valor}
+        for clave, cambios in deltas.items()
+        if any(cambios.values())
+    }
+
+
+def ajustar_resumen(quitar=(), agregar=()):
+    """
+    Aplica al resumen diario el cambio de un grupo de citas.
+
+    El costo es constante sin importar cuántas citas o días cambien: una
+    consulta de servicios, una de filas existentes, un ``bulk_update`` con
+    expresiones ``F()`` y un ``bulk_create`` para los días nuevos. Si cambia
+    un solo día (el caso de las señales) basta con un ``UPDATE``.
+
+    Args:
+        quitar: Huellas que dejan de contar (estado/fecha anterior)
+        agregar: Huellas que pasan a contar
+    """
+    _aplicar_deltas(_deltas(quitar, agregar))
+
+
+def ajustar_servicio(servicio_id, minutos_antes, precio_antes, minutos_despues, precio_despues):
+    """
+    Aplica al resumen el cambio de duración o precio de un servicio.
+
+    El resumen guarda minutos e ingreso calculados con los valores del
+    servicio al momento de guardar cada cita; al editar el servicio se
+    corrigen los días con citas de ese servicio que ocupan la agenda (una
+    consulta agrupada y el mismo ajuste con ``F()`` de ``ajustar_resumen``).
+    """
+    diferencia_minutos = minutos_despues - minutos_antes
+    diferencia_precio = Decimal(precio_despues) - Decimal(precio_antes)
+    if not diferencia_minutos and not diferencia_precio:
+        return
+    grupos = Cita.objects.filter(
+        servicio_id=servicio_id, estado__in=ESTADOS_OCUPAN_AGENDA
+    ).order_by().values_list('veterinario_id', 'fecha').annotate(total=Count('id'))
+    deltas = {}
+    for veterinario_id, fecha, total in grupos:
+        cambios = {
+            'minutos_reservados': total * diferencia_minutos,
+            'ingreso_esperado': total * diferencia_precio,
+        }
+        deltas[(veterinario_id, fecha)] = {campo: valor for campo, valor in cambios.items() if valor}
+    _aplicar_deltas(deltas)
+
+
+def _aplicar_deltas(deltas):
+    """Suma los cambios por (veterinario_id, fecha), creando los días que falten."""
+    if not deltas:
+        return
+    if len(deltas) == 1:
+        _aplicar(*deltas.popitem())
+        return
+
+    existentes = {
+        (fila.veterinario_id, fila.fecha): fila
+        for fila in CitaDiaResumen.objects.filter(
+            veterinario_id__in={vet for vet, _ in deltas},
+            fecha__in={fecha for _, fecha in deltas},
+        ).only('pk', 'veterinario_id', 'fecha')
+    }
+
+    actualizar = []
+    for clave, fila in existentes.items():
+        if clave not in deltas:
+            continue
+        cambios = deltas[clave]
+        for campo in CAMPOS_RESUMEN:
+            setattr(fila, campo, F(campo) + cambios.get(campo, 0))
+        actualizar.append(fila)
+    if actualizar:
+        CitaDiaResumen.objects.bulk_update(actualizar, CAMPOS_RESUMEN)
+
+    nuevos = {clave: cambios for clave, cambios in deltas.items() if clave not in existentes}
+    if not nuevos:
+        return
+    try:
+        with transaction.atomic():
+            CitaDiaResumen.objects.bulk_create([
+                CitaDiaResumen(veterinario_id=veterinario_id, fecha=fecha, **cambios)
+                for (veterinario_id, fecha), cambios in nuevos.items()
+            ])
+    except IntegrityError:
+        # Otro proceso creó alguno de los días en paralelo
+        for clave, cambios in nuevos.items():
+            _aplicar(clave, cambios)
+
+
+def _aplicar(clave, cambios):
+    """Aplica los cambios de un solo día (UPDATE, o INSERT si no existe)."""
+    veterinario_id, fecha = clave
+    filas = CitaDiaResumen.objects.filter(veterinario_id=veterinario_id, fecha=fecha)
+    if filas.update(**{campo: F(campo) + valor for campo, valor in cambios.items()}):
+        return
+    try:
+        with transaction.atomic():
+            CitaDiaResumen.objects.create(veterinario_id=veterinario_id, fecha=fecha, **cambios)
+    except IntegrityError:
+        filas.update(**{campo: F(campo) + valor for campo, valor in cambios.items()})
+
+
+def filas_resumen(citas):
+    """
+    Agrega un QuerySet de citas por (veterinario, fecha) con las columnas
+    del resumen (una sola consulta con agregados condicionales).
+    """
+    ocupan = Q(estado__in=ESTADOS_OCUPAN_AGENDA)
+    return citas.order_by().values('veterinario_id', 'fecha').annotate(
+        **{
+            campo: Count('id', filter=Q(estado=estado))
+            for estado, campo in CAMPO_POR_ESTADO.items()
+        },
+        minutos_reservados=Coalesce(Sum('servicio__duracion_minutos', filter=ocupan), 0),
+        ingreso_esperado=Coalesce(
+            Sum('servicio__precio', filter=ocupan),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+
+
+def reconstruir_resumen(desde=None, hasta=None):
+    """
+    Recalcula el resumen desde la tabla de citas (carga inicial o corrección).
+
+    Args:
+        desde: Fecha inicial (opcional)
+        hasta: Fecha final (opcional)
+
+    Returns:
+        int: Filas de resumen creadas
+    """
+    citas = Cita.objects.all()
+    resumenes = CitaDiaResumen.objects.all()
+    if desde:
+        citas = citas.filter(fecha__gte=desde)
+        resumenes = resumenes.filter(fecha__gte=desde)
+    if hasta:
+        citas = citas.filter(fecha__lte=hasta)
+        resumenes = resumenes.filter(fecha__lte=hasta)
+
+    with transaction.atomic():
+        resumenes.delete()
+        creados = CitaDiaResumen.objects.bulk_create(
+            (CitaDiaResumen(**fila) for fila in filas_resumen(citas).iterator()),
+            batch_size=1000,
+        )
+    return len(creados)
+
+
+def citas_por_dia(inicio, fin):
+    """
+    Total de citas por día entre ``inicio`` y ``fin`` (todos los estados),
+    leyendo el resumen en lugar de la tabla de citas.
+
+    Returns:
+        QuerySet: Diccionarios con ``fecha`` y ``total``
+    """
+    total = sum((F(campo) for campo in CAMPOS_CONTEO[1:]), F(CAMPOS_CONTEO[0]))
+    return CitaDiaResumen.objects.filter(
+        fecha__range=[inicio, fin]
+    ).values('fecha').annotate(total=Sum(total)).filter(total__gt=0).order_by('fecha')
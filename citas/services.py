@@ -0,0 +1,328 @@
+"""
+Servicios de agendamiento de citas (HU-013).
+
+Centralizan la reserva de una cita para que el staff y los propietarios
+pasen por el mismo camino: la cita, su pago pendiente y las notificaciones
+se guardan en una sola transacción, con verificación de cruces bajo
+bloqueo y reintentos con espera exponencial cuando la base de datos está
+ocupada. Las series (planes de vacunación o desparasitación) se reservan
+en lote con el mismo esquema.
+"""
+
+import logging
+import random
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, transaction
+
+from autenticacion.models import Usuario
+from notificaciones.services import crear_evento_cita, crear_eventos_cita
+from pagos.models import Pago
+from pagos.saldos import ajustar_saldos, huella_pago
+from .calendario import publicar_cambios, registrar_cambio_dias
+from .disponibilidad import asignar_veterinario, cargar_agendas, esta_disponible, horario_laboral
+from .models import Cita
+from .resumen import ajustar_resumen, huella
+
+logger = logging.getLogger('mydog')
+
+# Reintentos ante bloqueos de la base de datos (SQLite: "database is locked")
+REINTENTOS_BLOQUEO = 6
+ESPERA_BASE_SEGUNDOS = 0.05
+
+MENSAJE_HORARIO_OCUPADO = 'El veterinario ya tiene una cita que se cruza con este horario. Elige otra hora.'
+MENSAJE_SIN_VETERINARIO = 'No hay veterinarios disponibles en ese horario. Elige otra hora o contacta a la clínica.'
+MENSAJE_SISTEMA_OCUPADO = 'El sistema está atendiendo muchas solicitudes. Intenta de nuevo en unos segundos.'
+MENSAJE_SERIE_OCUPADA = 'El veterinario no tiene libre ese horario en: {fechas}. Elige otra hora o veterinario.'
+
+# Campos que cada cita de una serie copia de la cita plantilla
+CAMPOS_SERIE = ['propietario', 'mascota', 'servicio', 'veterinario', 'hora', 'observaciones', 'usuario_creador']
+
+
+def _es_bloqueo(error):
+    return 'locked' in str(error).lower()
+
+
+def con_reintentos(funcion):
+    """
+    Reintenta ``funcion`` con espera exponencial (y jitter) si la base de
+    datos está bloqueada por otra escritura.
+
+    Si se agotan los reintentos se lanza ``ValidationError`` para que la
+    vista muestre un mensaje en lugar de un error 500. Dentro de una
+    transacción externa no se reintenta, pues el bloqueo es de esa transacción.
+    """
+    @wraps(funcion)
+    def wrapper(*args, **kwargs):
+        for intento in range(REINTENTOS_BLOQUEO):
+            try:
+                return funcion(*args, **kwargs)
+            except OperationalError as error:
+                if not _es_bloqueo(error) or connection.in_atomic_block:
+                    raise
+                espera = ESPERA_BASE_SEGUNDOS * (2 ** intento) * random.uniform(0.5, 1.5)
+                logger.warning('Base de datos ocupada (intento %s), reintentando en %.2fs', intento + 1, espera)
+                time.sleep(espera)
+        raise ValidationError(MENSAJE_SISTEMA_OCUPADO)
+    return wrapper
+
+
+def bloquear_agendas(*veterinario_ids):
+    """
+    Serializa las reservas de los veterinarios indicados.
+
+    En motores con ``SELECT ... FOR UPDATE`` bloquea las filas de los
+    veterinarios; en SQLite la transacción ya inicia con ``BEGIN IMMEDIATE``
+    (ver settings).
+    """
+    list(Usuario.objects.select_for_update().filter(pk__in=veterinario_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def notificar_cita_creada(cita, actor):
+    """Notificación estándar de cita creada (propietario y veterinario)."""
+    crear_evento_cita(
+        actor=actor,
+        cita=cita,
+        tipo='CONFIRMACION',
+        asunto='Nueva cita creada',
+        mensaje=f"Se creó la cita #{cita.id} para {cita.fecha} a las {cita.hora}"
+    )
+
+
+def notificar_cita_agendada_por_propietario(cita, actor):
+    """
+    Notificaciones de una cita agendada por el propio propietario: una para
+    el veterinario asignado y otra de confirmación para el propietario.
+    """
+    fecha = cita.fecha.strftime("%d/%m/%Y")
+    hora = cita.hora.strftime("%H:%M")
+    servicio = cita.servicio.get_nombre_display()
+    crear_eventos_cita(actor, [
+        (
+            cita, 'CONFIRMACION', f'Nueva cita agendada - {cita.mascota.nombre}',
+            f'{cita.propietario.nombre} ha agendado una cita para {cita.mascota.nombre}.\n\n'
+            f'Fecha: {fecha}\n'
+            f'Hora: {hora}\n'
+            f'Servicio: {servicio}\n'
+            f'Motivo: {cita.observaciones}',
+            [cita.veterinario_id],
+        ),
+        (
+            cita, 'CONFIRMACION', 'Cita agendada exitosamente',
+            f'Tu cita para {cita.mascota.nombre} ha sido agendada.\n\n'
+            f'Fecha: {fecha}\n'
+            f'Hora: {hora}\n'
+            f'Veterinario: Dr. {cita.veterinario.get_full_name()}\n'
+            f'Servicio: {servicio}\n\n'
+            f'Te enviaremos un recordatorio 24 horas antes.',
+            [actor.id],
+        ),
+    ])
+
+
+def reservar_cita(cita, actor, notificar=notificar_cita_creada):
+    """
+    Reserva una cita nueva de forma atómica.
+
+    Dentro de una transacción: asigna veterinario si no tiene, verifica
+    que el horario siga libre bajo bloqueo, guarda la cita, crea el pago
+    pendiente y las notificaciones. Si algo falla no queda nada a medias.
+
+    Args:
+        cita: Instancia de Cita sin guardar (ej: ``form.save(commit=False)``)
+        actor: Usuario que agenda
+        notificar: Función ``(cita, actor)`` que genera las notificaciones
+
+    Returns:
+        Cita: La cita guardada
+
+    Raises:
+        ValidationError: Si el horario ya no está disponible
+    """
+    return _reservar(cita, actor, notificar, asignar=not cita.veterinario_id)
+
+
+@con_reintentos
+def _reservar(cita, actor, notificar, asignar):
+    # Un intento previo pudo haber asignado pk antes de hacer rollback
+    cita.pk = None
+    cita._state.adding = True
+    duracion = cita.servicio.duracion_minutos
+
+    with transaction.atomic():
+        if asignar:
+            veterinario = asignar_veterinario(cita.fecha, cita.hora, duracion)
+            if veterinario is None:
+                raise ValidationError(MENSAJE_SIN_VETERINARIO)
+            cita.veterinario = veterinario
+        bloquear_agendas(cita.veterinario_id)
+
+        if not esta_disponible(cita.veterinario_id, cita.fecha, cita.hora, duracion):
+            raise ValidationError(MENSAJE_HORARIO_OCUPADO)
+        try:
+            with transaction.atomic():
+                cita.save()
+        except IntegrityError:
+            # Restricción única (veterinario, fecha, hora) como última barrera
+            raise ValidationError(MENSAJE_HORARIO_OCUPADO)
+
+        # Crear registro de pago pendiente automático
+        Pago.objects.create(
+            cita=cita,
+            propietario=cita.propietario,
+            monto=cita.servicio.precio,
+            tipo_pago='PENDIENTE',
+            estado='PENDIENTE',
+            usuario_registro=actor
+        )
+
+        if notificar:
+            notificar(cita, actor)
+        publicar_cambios('crear', cita)
+    return cita
+
+
+def mover_cita(cita, fecha, hora, actor):
+    """
+    Reprograma una cita a otra fecha/hora con el mismo veterinario (HU-014).
+
+    Verifica cruces bajo bloqueo y guarda la cita y la notificación en una
+    sola transacción.
+
+    Raises:
+        ValidationError: Si el nuevo horario ya no está disponible
+    """
+    return _mover(cita, fecha, hora, actor)
+
+
+@con_reintentos
+def _mover(cita, fecha, hora, actor):
+    with transaction.atomic():
+        bloquear_agendas(cita.veterinario_id)
+        if not esta_disponible(cita.veterinario_id, fecha, hora, cita.servicio.duracion_minutos,
+                               excluir_cita_id=cita.pk):
+            raise ValidationError(MENSAJE_HORARIO_OCUPADO)
+
+        cita.fecha = fecha
+        cita.hora = hora
+        try:
+            with transaction.atomic():
+                cita.save()
+        except IntegrityError:
+            raise ValidationError(MENSAJE_HORARIO_OCUPADO)
+
+        crear_evento_cita(
+            actor=actor,
+            cita=cita,
+            tipo='SISTEMA',
+            asunto='Cita reprogramada',
+            mensaje=f'La cita #{cita.id} fue reprogramada para {fecha} a las {hora:%H:%M}'
+        )
+        publicar_cambios('reprogramar', cita)
+    return cita
+
+
+def fechas_serie(fecha_inicial, intervalo_dias, dosis):
+    """
+    Fechas de una serie de ``dosis`` citas separadas ``intervalo_dias``.
+
+    Si una fecha cae en un día no laboral se corre al siguiente día laboral.
+    """
+    _, _, dias_laborales = horario_laboral()
+    fechas = []
+    for numero in range(dosis):
+        fecha = fecha_inicial + timedelta(days=intervalo_dias * numero)
+        while fecha.weekday() not in dias_laborales:
+            fecha += timedelta(days=1)
+        fechas.append(fecha)
+    return fechas
+
+
+def reservar_serie(plantilla, actor, intervalo_dias, dosis):
+    """
+    Reserva una serie de citas recurrentes (ej: 3 dosis de vacuna cada 21 días).
+
+    Verifica la disponibilidad de todas las fechas con una sola consulta de
+    agendas y, si todas están libres, crea en lote las citas, sus pagos
+    pendientes y las notificaciones en una sola transacción. Si alguna
+    fecha está ocupada no se reserva ninguna.
+
+    Args:
+        plantilla: Cita sin guardar con los datos de la primera dosis
+        actor: Usuario que agenda
+        intervalo_dias: Días entre una cita y la siguiente
+        dosis: Número de citas de la serie
+
+    Returns:
+        list: Citas creadas, en orden
+
+    Raises:
+        ValidationError: Si alguna fecha de la serie no está disponible
+    """
+    fechas = fechas_serie(plantilla.fecha, intervalo_dias, dosis)
+    if len(set(fechas)) < len(fechas):
+        raise ValidationError('El intervalo es muy corto: dos dosis caen el mismo día.')
+    return _reservar_serie(plantilla, actor, fechas)
+
+
+@con_reintentos
+def _reservar_serie(plantilla, actor, fechas):
+    duracion = plantilla.servicio.duracion_minutos
+    veterinario_id = plantilla.veterinario_id
+
+    with transaction.atomic():
+        bloquear_agendas(veterinario_id)
+
+        agendas = cargar_agendas(fechas, veterinario_ids=[veterinario_id])
+        ocupadas = [
+            fecha for fecha in fechas
+            if not agendas[(veterinario_id, fecha)].esta_libre(plantilla.hora, duracion)
+        ]
+        if ocupadas:
+            raise ValidationError(MENSAJE_SERIE_OCUPADA.format(
+                fechas=', '.join(fecha.strftime('%d/%m/%Y') for fecha in ocupadas)
+            ))
+
+        datos = {campo: getattr(plantilla, campo) for campo in CAMPOS_SERIE}
+        try:
+            with transaction.atomic():
+                citas = Cita.objects.bulk_create([Cita(fecha=fecha, **datos) for fecha in fechas])
+        except IntegrityError:
+            raise ValidationError(MENSAJE_HORARIO_OCUPADO)
+
+        pagos = Pago.objects.bulk_create([
+            Pago(
+                cita=cita,
+                propietario=cita.propietario,
+                monto=cita.servicio.precio,
+                tipo_pago='PENDIENTE',
+                estado='PENDIENTE',
+                usuario_registro=actor
+            )
+            for cita in citas
+        ])
+
+        total = len(citas)
+        crear_eventos_cita(actor, [
+            (
+                cita,
+                'CONFIRMACION',
+                'Nueva cita creada',
+                f"Se creó la cita #{cita.id} (dosis {numero} de {total}) para {cita.fecha} a las {cita.hora}",
+            )
+            for numero, cita in enumerate(citas, start=1)
+        ])
+
+        # bulk_create no dispara las señales del calendario, del resumen ni del saldo
+        registrar_cambio_dias(*fechas)
+        for cita in citas:
+            cita._resumen_original = huella(cita)
+        ajustar_resumen(agregar=[cita._resumen_original for cita in citas])
+        for pago in pagos:
+            pago._saldo_original = huella_pago(pago)
+        ajustar_saldos(agregar=[pago._saldo_original for pago in pagos])
+        publicar_cambios('crear', *citas)
+    return citas
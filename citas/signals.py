@@ -0,0 +1,109 @@
+"""
+Señales de la app de citas.
+
+Mantienen la versión por día del calendario y el resumen diario de agenda
+cada vez que una cita se guarda o se elimina, sin importar desde dónde se
+haga el cambio. El resumen también se corrige cuando cambia la duración o
+el precio de un servicio.
+
+El calendario muestra además datos del servicio, la mascota, el
+propietario y el veterinario; si cambia alguno de esos campos se sube la
+versión de los días con citas que lo usan, para que el ETag deje de
+responder 304 con títulos, colores u horas de fin viejos.
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from autenticacion.models import Usuario
+from mascotas.models import Mascota
+from propietarios.models import Propietario
+from servicios.models import Servicio
+from .calendario import registrar_cambio_dias
+from .models import Cita
+from .resumen import ajustar_resumen, ajustar_servicio, huella
+
+# Relación desde Cita y campos que el calendario muestra de otros modelos
+CAMPOS_CALENDARIO = {
+    Servicio: ('servicio', ('nombre', 'color_calendario', 'duracion_minutos')),
+    Mascota: ('mascota', ('nombre',)),
+    Propietario: ('propietario', ('nombre',)),
+    Usuario: ('veterinario', ('first_name', 'last_name')),
+}
+
+
+def _como_fecha(valor):
+    """Normaliza fechas que llegan como texto (ej: desde request.POST)."""
+    return Cita._meta.get_field('fecha').to_python(valor)
+
+
+@receiver(post_save, sender=Cita)
+def cita_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    fecha = _como_fecha(instance.fecha)
+    fecha_original = _como_fecha(getattr(instance, '_fecha_original', None))
+    registrar_cambio_dias(fecha, fecha_original)
+    instance._fecha_original = fecha
+
+    anterior = getattr(instance, '_resumen_original', None)
+    actual = huella(instance)
+    if anterior != actual:
+        ajustar_resumen(quitar=[anterior], agregar=[actual])
+    instance._resumen_original = actual
+
+
+@receiver(post_delete, sender=Cita)
+def cita_eliminada(sender, instance, **kwargs):
+    registrar_cambio_dias(_como_fecha(instance.fecha))
+    ajustar_resumen(quitar=[getattr(instance, '_resumen_original', None) or huella(instance)])
+
+
+@receiver(pre_save, sender=Servicio)
+def servicio_por_guardar(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    _, campos = CAMPOS_CALENDARIO[Servicio]
+    original = Servicio.objects.filter(pk=instance.pk).values_list('duracion_minutos', 'precio', *campos).first()
+    if original is not None:
+        instance._resumen_servicio = original[:2]
+        instance._calendario_original = original[2:]
+
+
+@receiver(post_save, sender=Servicio)
+def servicio_guardado(sender, instance, raw=False, **kwargs):
+    anterior = getattr(instance, '_resumen_servicio', None)
+    if raw or anterior is None:
+        return
+    instance._resumen_servicio = None
+    ajustar_servicio(instance.pk, *anterior, instance.duracion_minutos, instance.precio)
+    _registrar_cambio_relacionado(sender, instance)
+
+
+@receiver(pre_save, sender=Mascota)
+@receiver(pre_save, sender=Propietario)
+@receiver(pre_save, sender=Usuario)
+def relacionado_por_guardar(sender, instance, raw=False, update_fields=None, **kwargs):
+    _, campos = CAMPOS_CALENDARIO[sender]
+    # Ej: el login solo guarda last_login
+    if raw or instance.pk is None or (update_fields is not None and not set(update_fields) & set(campos)):
+        return
+    instance._calendario_original = sender.objects.filter(pk=instance.pk).values_list(*campos).first()
+
+
+@receiver(post_save, sender=Mascota)
+@receiver(post_save, sender=Propietario)
+@receiver(post_save, sender=Usuario)
+def relacionado_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _registrar_cambio_relacionado(sender, instance)
+
+
+def _registrar_cambio_relacionado(sender, instance):
+    """Sube la versión de los días con citas del objeto si cambió un campo que muestra el calendario."""
+    anterior = getattr(instance, '_calendario_original', None)
+    instance._calendario_original = None
+    relacion, campos = CAMPOS_CALENDARIO[sender]
+    if anterior is None or anterior == tuple(getattr(instance, campo) for campo in campos):
+        return
+    registrar_cambio_dias(*Cita.objects.filter(**{relacion: instance.pk}).order_by().values_list('fecha', flat=True).distinct())
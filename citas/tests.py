@@ -1,3 +1,735 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from autenticacion.models import Usuario
+from notificaciones.models import EventoSalida, Notificacion, NotificacionLog
+from notificaciones.services import GRUPO_CALENDARIO, despachar_salida
+from pagos.models import Pago
+from pagos.saldos import saldo_de
+from mascotas.models import Mascota
+from propietarios.models import Propietario
+from servicios.models import Servicio
+from .calendario import etag_calendario, eventos_calendario
+from .disponibilidad import AgendaVeterinario, asignar_veterinario, cargar_agendas
+from .forms import CitaForm, ReprogramarCitaForm
+from .ics import generar_ics, plegar, token_sincronizacion
+from .lista_espera import ocupar_hueco, siguiente_en_espera
+from .models import Cita, CitaDiaResumen, ListaEspera, TokenCalendario, VersionCalendarioDia
+from .reprogramacion import dias_siguientes, reprogramar_dia
+from .resumen import citas_por_dia, filas_resumen, reconstruir_resumen
+from .services import fechas_serie, reservar_cita, reservar_serie
+
+
+def proximo_dia_laboral(dias=7):
+    """Fecha futura que no cae en domingo."""
+    fecha = date.today() + timedelta(days=dias)
+    if fecha.weekday() == 6:
+        fecha += timedelta(days=1)
+    return fecha
+
+
+class CitasTestMixin:
+    """Datos base compartidos por las pruebas de citas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(
+            username='admin', password='Admin*12345', rol='ADMIN',
+            first_name='Ana', last_name='Admin'
+        )
+        cls.vet = Usuario.objects.create_user(
+            username='vet1', password='Vet*12345', rol='VETERINARIO',
+            first_name='Vet', last_name='Uno'
+        )
+        cls.vet2 = Usuario.objects.create_user(
+            username='vet2', password='Vet*12345', rol='VETERINARIO',
+            first_name='Vet', last_name='Dos'
+        )
+        cls.usuario_prop = Usuario.objects.create_user(
+            username='prop1', password='Prop*12345', rol='PROPIETARIO',
+            first_name='Prop', last_name='Uno'
+        )
+        cls.propietario = Propietario.objects.create(
+            usuario=cls.usuario_prop, nombre='Propietario Uno',
+            documento='123456789', telefono='3001234567',
+            correo='prop1@example.com'
+        )
+        cls.mascota = Mascota.objects.create(
+            propietario=cls.propietario, nombre='Firulais',
+            especie='PERRO', raza='Criollo', edad=3
+        )
+        cls.consulta = Servicio.objects.create(
+            nombre='CONSULTA', duracion_minutos=30, precio=50000,
+            color_calendario='#1E90FF'
+        )
+        cls.cirugia = Servicio.objects.create(
+            nombre='CIRUGIA', duracion_minutos=120, precio=300000,
+            color_calendario='#AA0000'
+        )
+        cls.fecha = proximo_dia_laboral()
+
+    def crear_cita(self, hora, veterinario=None, servicio=None, fecha=None, **extra):
+        return Cita.objects.create(
+            propietario=self.propietario,
+            mascota=self.mascota,
+            servicio=servicio or self.consulta,
+            veterinario=veterinario or self.vet,
+            fecha=fecha or self.fecha,
+            hora=hora,
+            usuario_creador=self.admin,
+            **extra
+        )
+
+
+class CalendarioFeedTests(CitasTestMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = reverse('citas:api_eventos')
+        self.params = {
+            'start': f'{self.fecha - timedelta(days=3)}T00:00:00',
+            'end': f'{self.fecha + timedelta(days=3)}T00:00:00',
+        }
+
+    def test_feed_una_sola_consulta(self):
+        for h in range(8, 14):
+            self.crear_cita(time(h, 0))
+        with self.assertNumQueries(1):
+            eventos = eventos_calendario(self.fecha, self.fecha)
+        self.assertEqual(len(eventos), 6)
+        evento = eventos[0]
+        self.assertEqual(evento['title'], 'Firulais - CONSULTA')
+        self.assertEqual(evento['color'], '#1E90FF')
+        self.assertEqual(evento['extendedProps']['veterinario'], 'Vet Uno')
+        self.assertEqual(evento['extendedProps']['estado'], 'Programada')
+
+    def test_filtros_veterinario_y_servicio(self):
+        self.crear_cita(time(9, 0))
+        self.crear_cita(time(9, 0), veterinario=self.vet2, servicio=self.cirugia)
+        response = self.client.get(self.url, {**self.params, 'veterinario': self.vet2.id})
+        self.assertEqual([e['title'] for e in response.json()], ['Firulais - CIRUGIA'])
+        response = self.client.get(self.url, {**self.params, 'servicio': self.consulta.id})
+        self.assertEqual(len(response.json()), 1)
+
+    def test_etag_devuelve_304_si_no_hay_cambios(self):
+        self.crear_cita(time(9, 0))
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_cambia_al_reprogramar(self):
+        otra_fecha = self.fecha + timedelta(days=30)
+        cita = self.crear_cita(time(9, 0), fecha=otra_fecha)
+        antes = etag_calendario(self.fecha, self.fecha)
+
+        cita = Cita.objects.get(pk=cita.pk)
+        cita.fecha = self.fecha
+        cita.save()
+        self.assertNotEqual(etag_calendario(self.fecha, self.fecha), antes)
+
+    def test_etag_cambia_con_los_datos_mostrados(self):
+        self.crear_cita(time(9, 0))
+        antes = etag_calendario(self.fecha, self.fecha)
+        # El login solo guarda last_login, que el calendario no muestra
+        self.client.force_login(self.vet)
+        self.assertEqual(etag_calendario(self.fecha, self.fecha), antes)
+
+        for objeto, campo, valor in (
+            (self.consulta, 'color_calendario', '#00AA00'),
+            (self.consulta, 'duracion_minutos', 45),
+            (self.mascota, 'nombre', 'Toby'),
+            (self.propietario, 'nombre', 'Otro Nombre'),
+            (self.vet, 'last_name', 'Cambiado'),
+        ):
+            setattr(objeto, campo, valor)
+            objeto.save()
+            etag = etag_calendario(self.fecha, self.fecha)
+            self.assertNotEqual(etag, antes, campo)
+            antes = etag
+
+    def test_ventana_invalida(self):
+        response = self.client.get(self.url, {'start': 'x', 'end': 'y'})
+        self.assertEqual(response.status_code, 400)
+
+
+class DisponibilidadTests(CitasTestMixin, TestCase):
+
+    def test_agenda_intervalos_libres(self):
+        agenda = AgendaVeterinario(self.vet.id, self.fecha)
+        agenda.ocupar(time(10, 0), 120)
+        agenda.ocupar(time(15, 0), 30)
+        self.assertFalse(agenda.esta_libre(time(10, 30), 30))
+        self.assertTrue(agenda.esta_libre(time(12, 0), 30))
+        self.assertEqual(agenda.minutos_ocupados(), 150)
+        self.assertEqual(
+            agenda.intervalos_libres(),
+            [(8 * 60, 10 * 60), (12 * 60, 15 * 60), (15 * 60 + 30, 18 * 60)]
+        )
+        horas = agenda.horas_disponibles(120)
+        self.assertIn(time(12, 0), horas)
+        self.assertIn(time(16, 0), horas)
+        self.assertNotIn(time(14, 0), horas)
+        self.assertNotIn(time(16, 15), horas)
+
+    def test_cargar_agendas_una_consulta(self):
+        self.crear_cita(time(10, 0), servicio=self.cirugia)
+        self.crear_cita(time(9, 0), veterinario=self.vet2)
+        with self.assertNumQueries(1):
+            agendas = cargar_agendas([self.fecha])
+        self.assertEqual(agendas[(self.vet.id, self.fecha)].minutos_ocupados(), 120)
+        self.assertEqual(agendas[(self.vet2.id, self.fecha)].minutos_ocupados(), 30)
+
+    def test_formulario_rechaza_cruce_con_cirugia(self):
+        self.crear_cita(time(10, 0), servicio=self.cirugia)
+        form = CitaForm(data={
+            'propietario': self.propietario.id, 'mascota': self.mascota.id,
+            'servicio': self.consulta.id, 'veterinario': self.vet.id,
+            'fecha': self.fecha, 'hora': '10:30', 'observaciones': '',
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('hora', form.errors)
+
+        form = CitaForm(data={
+            'propietario': self.propietario.id, 'mascota': self.mascota.id,
+            'servicio': self.consulta.id, 'veterinario': self.vet.id,
+            'fecha': self.fecha, 'hora': '12:00', 'observaciones': '',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_reprogramar_el_mismo_dia_en_la_tarde(self):
+        # 13:00 en Bogotá son las 18:00 UTC: las 15:00 del mismo día aún son futuras
+        cita = self.crear_cita(time(9, 0))
+        ahora = timezone.make_aware(datetime.combine(self.fecha, time(13, 0)))
+        with mock.patch('django.utils.timezone.now', return_value=ahora):
+            form = ReprogramarCitaForm({'fecha': self.fecha, 'hora': '15:00'}, cita=cita)
+            self.assertTrue(form.is_valid(), form.errors)
+            form = ReprogramarCitaForm({'fecha': self.fecha, 'hora': '12:30'}, cita=cita)
+            self.assertIn('La nueva fecha y hora deben ser futuras.', form.non_field_errors())
+
+    def test_el_servicio_debe_terminar_dentro_de_la_jornada(self):
+        datos = {
+            'propietario': self.propietario.id, 'mascota': self.mascota.id, 'veterinario': self.vet.id,
+            'fecha': self.fecha, 'observaciones': '',
+        }
+        for servicio, hora in ((self.cirugia, '17:30'), (self.consulta, '18:00'), (self.consulta, '07:45')):
+            form = CitaForm(data={**datos, 'servicio': servicio.id, 'hora': hora})
+            self.assertFalse(form.is_valid(), hora)
+            self.assertIn('Lunes a Sábado, 08:00 - 18:00', form.errors['hora'][0])
+        form = CitaForm(data={**datos, 'servicio': self.consulta.id, 'hora': '17:30'})
+        self.assertTrue(form.is_valid(), form.errors)
+
+        domingo = self.fecha + timedelta(days=(6 - self.fecha.weekday()) % 7)
+        with override_settings(HORARIO_LABORAL={
+            'hora_inicio': '08:00', 'hora_fin': '18:00', 'dias_laborales': [0, 2, 4],
+        }):
+            form = CitaForm(data={**datos, 'servicio': self.consulta.id, 'hora': '09:00', 'fecha': domingo})
+            self.assertFalse(form.is_valid())
+            self.assertIn('Lunes, Miércoles y Viernes', form.errors['fecha'][0])
+
+    def test_api_disponibilidad(self):
+        self.crear_cita(time(8, 0), servicio=self.cirugia)
+        self.client.force_login(self.usuario_prop)
+        response = self.client.get(reverse('citas:api_disponibilidad'), {
+            'fecha': self.fecha.isoformat(), 'servicio': self.consulta.id, 'veterinario': self.vet.id,
+        })
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()['veterinarios'][0]
+        self.assertEqual(datos['horas'][0], '10:00')
+        self.assertEqual(datos['libres'], [['10:00', '18:00']])
+
+        response = self.client.get(reverse('citas:api_disponibilidad'), {'fecha': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AsignacionVeterinarioTests(CitasTestMixin, TestCase):
+
+    def test_elige_el_menos_cargado(self):
+        self.crear_cita(time(8, 0), veterinario=self.vet)
+        self.crear_cita(time(9, 0), veterinario=self.vet)
+        self.crear_cita(time(8, 0), veterinario=self.vet2)
+        with self.assertNumQueries(2):
+            veterinario = asignar_veterinario(self.fecha, time(11, 0), 30)
+        self.assertEqual(veterinario, self.vet2)
+
+    def test_descarta_veterinario_ocupado_a_esa_hora(self):
+        self.crear_cita(time(10, 0), veterinario=self.vet2, servicio=self.cirugia)
+        self.crear_cita(time(8, 0), veterinario=self.vet)
+        self.crear_cita(time(9, 0), veterinario=self.vet)
+        self.crear_cita(time(15, 0), veterinario=self.vet)
+        self.crear_cita(time(16, 0), veterinario=self.vet)
+        self.crear_cita(time(17, 0), veterinario=self.vet)
+        self.assertEqual(asignar_veterinario(self.fecha, time(11, 0), 30), self.vet)
+        self.crear_cita(time(11, 0), veterinario=self.vet)
+        self.assertIsNone(asignar_veterinario(self.fecha, time(11, 0), 30))
+
+    def test_propietario_sin_preferencia_reparte_citas(self):
+        self.client.force_login(self.usuario_prop)
+        for hora in ['09:00', '09:00']:
+            self.client.post(reverse('citas:agendar_propietario'), {
+                'mascota': self.mascota.id, 'servicio': self.consulta.id,
+                'veterinario': '', 'fecha': self.fecha.isoformat(),
+                'hora': hora, 'observaciones': 'Control',
+            })
+        veterinarios = set(Cita.objects.values_list('veterinario_id', flat=True))
+        self.assertEqual(veterinarios, {self.vet.id, self.vet2.id})
+
+    def test_propietario_agenda_por_la_bandeja_de_salida(self):
+        self.client.force_login(self.usuario_prop)
+        self.client.post(reverse('citas:agendar_propietario'), {
+            'mascota': self.mascota.id, 'servicio': self.consulta.id,
+            'veterinario': self.vet.id, 'fecha': self.fecha.isoformat(),
+            'hora': '09:00', 'observaciones': 'Control',
+        })
+        cita = Cita.objects.get()
+        self.assertFalse(Notificacion.objects.exists())
+        self.assertEqual(EventoSalida.objects.filter(cita=cita).count(), 2)
+
+        despachar_salida()
+        recibidas = dict(Notificacion.objects.filter(cita=cita).values_list('usuario_id', 'asunto'))
+        self.assertEqual(recibidas, {
+            self.vet.id: f'Nueva cita agendada - {self.mascota.nombre}',
+            self.usuario_prop.id: 'Cita agendada exitosamente',
+        })
+        self.assertEqual(NotificacionLog.objects.filter(notificacion__cita=cita, accion='CREADA').count(), 2)
+
+
+class ReservaAtomicaTests(CitasTestMixin, TestCase):
+
+    def nueva_cita(self, hora, **extra):
+        return Cita(
+            propietario=self.propietario, mascota=self.mascota,
+            servicio=extra.pop('servicio', self.consulta),
+            veterinario=extra.pop('veterinario', self.vet),
+            fecha=self.fecha, hora=hora, usuario_creador=self.admin, **extra
+        )
+
+    def test_reserva_crea_cita_pago_y_notificaciones(self):
+        cita = reservar_cita(self.nueva_cita(time(9, 0)), self.admin)
+        self.assertTrue(Pago.objects.filter(cita=cita, estado='PENDIENTE').exists())
+        self.assertEqual(EventoSalida.objects.filter(cita=cita, fecha_despacho__isnull=True).count(), 1)
+        despachar_salida()
+        self.assertEqual(Notificacion.objects.filter(cita=cita).count(), 2)
+
+    def test_cruce_no_deja_registros_a_medias(self):
+        reservar_cita(self.nueva_cita(time(10, 0), servicio=self.cirugia), self.admin)
+        with self.assertRaises(ValidationError):
+            reservar_cita(self.nueva_cita(time(10, 30)), self.admin)
+        self.assertEqual(Cita.objects.count(), 1)
+        self.assertEqual(Pago.objects.count(), 1)
+
+    def test_error_en_notificaciones_revierte_la_reserva(self):
+        def notificar_con_error(cita, actor):
+            raise RuntimeError('fallo de notificación')
+
+        with self.assertRaises(RuntimeError):
+            reservar_cita(self.nueva_cita(time(9, 0)), self.admin, notificar=notificar_con_error)
+        self.assertFalse(Cita.objects.exists())
+        self.assertFalse(Pago.objects.exists())
+
+    def test_vista_muestra_error_en_lugar_de_500(self):
+        self.crear_cita(time(9, 0))
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('citas:agendar'), {
+            'propietario': self.propietario.id, 'mascota': self.mascota.id,
+            'servicio': self.consulta.id, 'veterinario': self.vet.id,
+            'fecha': self.fecha.isoformat(), 'hora': '09:00', 'observaciones': '',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Cita.objects.count(), 1)
+
+
+class SerieCitasTests(CitasTestMixin, TestCase):
+
+    def plantilla(self, hora=time(9, 0), **extra):
+        return Cita(
+            propietario=self.propietario, mascota=self.mascota,
+            servicio=self.consulta, veterinario=self.vet,
+            fecha=self.fecha, hora=hora, usuario_creador=self.admin, **extra
+        )
+
+    def test_fechas_serie_evita_domingos(self):
+        sabado = self.fecha + timedelta(days=(5 - self.fecha.weekday()) % 7)
+        fechas = fechas_serie(sabado, 1, 2)
+        self.assertEqual(fechas, [sabado, sabado + timedelta(days=2)])
+
+    def test_serie_de_12_citas_en_pocas_consultas(self):
+        saldo_de(self.propietario)
+        with CaptureQueriesContext(connection) as consultas:
+            citas = reservar_serie(self.plantilla(), self.admin, intervalo_dias=21, dosis=12)
+        sentencias = [q['sql'] for q in consultas.captured_queries if 'SAVEPOINT' not in q['sql']]
+        # Bloqueo, agendas, 1 INSERT por tabla (la bandeja de salida en vez de
+        # notificaciones y logs), versiones del calendario, resumen diario y
+        # saldo del propietario
+        self.assertLessEqual(len(sentencias), 12)
+        self.assertEqual(len(citas), 12)
+        self.assertEqual(Cita.objects.count(), 12)
+        self.assertEqual(Pago.objects.filter(estado='PENDIENTE').count(), 12)
+        self.assertEqual(despachar_salida(), 12)
+        self.assertEqual(Notificacion.objects.count(), 24)
+        self.assertEqual(Notificacion.objects.filter(usuario=self.usuario_prop).count(), 12)
+        self.assertEqual(
+            VersionCalendarioDia.objects.filter(fecha__in=[c.fecha for c in citas]).count(), 12
+        )
+        self.assertEqual(CitaDiaResumen.objects.filter(veterinario=self.vet, programadas=1).count(), 12)
+        self.assertEqual(self.propietario.saldo.pendientes, 12)
+
+    def test_fecha_ocupada_no_reserva_ninguna(self):
+        fechas = fechas_serie(self.fecha, 21, 3)
+        self.crear_cita(time(9, 15), fecha=fechas[2])
+        with self.assertRaisesMessage(ValidationError, fechas[2].strftime('%d/%m/%Y')):
+            reservar_serie(self.plantilla(), self.admin, intervalo_dias=21, dosis=3)
+        self.assertEqual(Cita.objects.count(), 1)
+        self.assertFalse(Pago.objects.exists())
+
+    def test_vista_agendar_serie(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('citas:agendar_serie'), {
+            'propietario': self.propietario.id, 'mascota': self.mascota.id,
+            'servicio': self.consulta.id, 'veterinario': self.vet.id,
+            'fecha': self.fecha.isoformat(), 'hora': '10:00', 'observaciones': 'Refuerzo',
+            'intervalo_dias': 21, 'dosis': 3,
+        })
+        self.assertRedirects(response, reverse('citas:calendario'))
+        self.assertEqual(Cita.objects.filter(observaciones='Refuerzo').count(), 3)
+
+
+class ListaEsperaTests(CitasTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.otra_mascota = Mascota.objects.create(
+            propietario=cls.propietario, nombre='Michi',
+            especie='GATO', raza='Criollo', edad=2
+        )
+        cls.tercera_mascota = Mascota.objects.create(
+            propietario=cls.propietario, nombre='Rocky',
+            especie='PERRO', raza='Criollo', edad=5
+        )
+
+    def esperar(self, mascota, servicio, prioridad):
+        return ListaEspera.objects.create(paciente=mascota, servicio=servicio, prioridad=prioridad)
+
+    def test_elige_mayor_prioridad_y_mas_antigua(self):
+        self.esperar(self.otra_mascota, self.consulta, 3)
+        primera_urgente = self.esperar(self.tercera_mascota, self.consulta, 1)
+        self.esperar(self.otra_mascota, self.consulta, 1)
+        # La cirugía no cabe en un hueco de 30 minutos
+        self.esperar(self.otra_mascota, self.cirugia, 1)
+        self.assertEqual(siguiente_en_espera(30), primera_urgente)
+        self.assertIsNone(siguiente_en_espera(15))
+
+    def test_cancelar_agenda_hueco_a_lista_de_espera(self):
+        cita = self.crear_cita(time(9, 0))
+        self.crear_cita(time(9, 30))
+        self.esperar(self.otra_mascota, self.cirugia, 2)
+        entrada = self.esperar(self.tercera_mascota, self.consulta, 3)
+
+        self.client.force_login(self.admin)
+        self.client.post(reverse('citas:cancelar', args=[cita.pk]), {'motivo': 'Viaje'})
+
+        entrada.refresh_from_db()
+        self.assertTrue(entrada.atendido)
+        nueva = Cita.objects.get(mascota=self.tercera_mascota)
+        self.assertEqual((nueva.veterinario, nueva.fecha, nueva.hora), (self.vet, self.fecha, time(9, 0)))
+        self.assertTrue(Pago.objects.filter(cita=nueva).exists())
+
+    @override_settings(LISTA_ESPERA_AUTOAGENDAR=False)
+    def test_modo_oferta_solo_notifica(self):
+        entrada = self.esperar(self.otra_mascota, self.consulta, 3)
+        resultado, cita = ocupar_hueco(self.vet.id, self.fecha, time(9, 0), self.admin)
+        self.assertEqual(resultado, entrada)
+        self.assertIsNone(cita)
+        self.assertFalse(ListaEspera.objects.get(pk=entrada.pk).atendido)
+        # La oferta sale por la bandeja de salida, como los demás avisos
+        self.assertFalse(Notificacion.objects.exists())
+        despachar_salida()
+        self.assertTrue(Notificacion.objects.filter(
+            usuario=self.usuario_prop, asunto__startswith='Horario disponible'
+        ).exists())
+
+    @override_settings(LISTA_ESPERA_AUTOAGENDAR=False)
+    def test_hueco_del_mismo_dia_en_la_tarde(self):
+        # 13:00 en Bogotá son las 18:00 UTC: un hueco a las 15:00 aún es futuro
+        entrada = self.esperar(self.otra_mascota, self.consulta, 3)
+        ahora = timezone.make_aware(datetime.combine(self.fecha, time(13, 0)))
+        with mock.patch('django.utils.timezone.now', return_value=ahora):
+            self.assertEqual(ocupar_hueco(self.vet.id, self.fecha, time(15, 0), self.admin), (entrada, None))
+            self.assertEqual(ocupar_hueco(self.vet.id, self.fecha, time(12, 30), self.admin), (None, None))
+
+    def test_busqueda_no_depende_del_tamano_de_la_lista(self):
+        ListaEspera.objects.bulk_create([
+            ListaEspera(paciente=self.otra_mascota, servicio=self.consulta, prioridad=1 + i % 5)
+            for i in range(500)
+        ])
+        # Servicios candidatos + una fila por servicio + carga de la entrada
+        with self.assertNumQueries(4):
+            entrada = siguiente_en_espera(180)
+        self.assertEqual(entrada.prioridad, 1)
+
+
+class CalendarioEnVivoTests(CitasTestMixin, TestCase):
+
+    def setUp(self):
+        self.layer = get_channel_layer()
+        self.canal = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(GRUPO_CALENDARIO, self.canal)
+
+    def tearDown(self):
+        async_to_sync(self.layer.group_discard)(GRUPO_CALENDARIO, self.canal)
+
+    def recibir(self):
+        return async_to_sync(self.layer.receive)(self.canal)['data']
+
+    def test_reserva_publica_evento_nuevo(self):
+        cita = Cita(
+            propietario=self.propietario, mascota=self.mascota, servicio=self.consulta,
+            veterinario=self.vet, fecha=self.fecha, hora=time(9, 0), usuario_creador=self.admin
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            reservar_cita(cita, self.admin)
+        delta = self.recibir()
+        self.assertEqual(delta['accion'], 'crear')
+        self.assertEqual(delta['ids'], [cita.id])
+        self.assertEqual(delta['eventos'][0]['extendedProps']['veterinario_id'], self.vet.id)
+
+    def test_cancelar_publica_delta_sin_evento(self):
+        cita = self.crear_cita(time(9, 0))
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('citas:cancelar', args=[cita.pk]), {'motivo': 'Viaje'})
+        delta = self.recibir()
+        self.assertEqual(delta, {'accion': 'cancelar', 'ids': [cita.id], 'eventos': []})
+
+    def test_reprogramar_publica_nueva_fecha(self):
+        cita = self.crear_cita(time(9, 0))
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('citas:reprogramar', args=[cita.pk]), {
+                'fecha': self.fecha.isoformat(), 'hora': '11:00',
+            })
+        delta = self.recibir()
+        self.assertEqual(delta['accion'], 'reprogramar')
+        self.assertEqual(delta['eventos'][0]['start'], f'{self.fecha}T11:00:00')
+
+
+class ResumenDiarioTests(CitasTestMixin, TestCase):
+
+    def resumen(self, veterinario=None, fecha=None):
+        return CitaDiaResumen.objects.get(veterinario=veterinario or self.vet, fecha=fecha or self.fecha)
+
+    def assertResumenCoincide(self):
+        """El resumen incremental coincide con el recalculado desde las citas."""
+        campos = ['veterinario_id', 'fecha', 'programadas', 'confirmadas', 'completadas',
+                  'canceladas', 'inasistencias', 'minutos_reservados', 'ingreso_esperado']
+        recalculado = sorted(
+            tuple(fila[c] for c in campos) for fila in filas_resumen(Cita.objects.all())
+        )
+        incremental = sorted(
+            CitaDiaResumen.objects.exclude(
+                programadas=0, confirmadas=0, completadas=0, canceladas=0, inasistencias=0
+            ).values_list(*campos)
+        )
+        self.assertEqual(incremental, recalculado)
+
+    def test_se_mantiene_en_cada_cambio(self):
+        consulta = self.crear_cita(time(9, 0))
+        cirugia = self.crear_cita(time(10, 0), servicio=self.cirugia)
+        resumen = self.resumen()
+        self.assertEqual((resumen.programadas, resumen.minutos_reservados), (2, 150))
+        self.assertEqual(resumen.ingreso_esperado, 350000)
+
+        consulta.estado = 'CONFIRMADA'
+        consulta.save()
+        cirugia.estado = 'CANCELADA'
+        cirugia.save()
+        resumen = self.resumen()
+        self.assertEqual((resumen.programadas, resumen.confirmadas, resumen.canceladas), (0, 1, 1))
+        self.assertEqual((resumen.minutos_reservados, resumen.ingreso_esperado), (30, 50000))
+        self.assertResumenCoincide()
+
+    def test_editar_servicio_corrige_minutos_e_ingreso(self):
+        self.crear_cita(time(9, 0))
+        self.crear_cita(time(9, 30))
+        cancelada = self.crear_cita(time(10, 0))
+        cancelada.estado = 'CANCELADA'
+        cancelada.save()
+        self.crear_cita(time(9, 0), veterinario=self.vet2, fecha=self.fecha + timedelta(days=1))
+
+        self.consulta.duracion_minutos = 45
+        self.consulta.precio = 60000
+        self.consulta.save()
+        resumen = self.resumen()
+        self.assertEqual((resumen.minutos_reservados, resumen.ingreso_esperado), (90, 120000))
+        otro = self.resumen(self.vet2, self.fecha + timedelta(days=1))
+        self.assertEqual((otro.minutos_reservados, otro.ingreso_esperado), (45, 60000))
+        self.assertResumenCoincide()
+
+    def test_reprogramar_mueve_la_cita_de_dia_y_veterinario(self):
+        cita = self.crear_cita(time(9, 0))
+        otro_dia = self.fecha + timedelta(days=1)
+        cita = Cita.objects.get(pk=cita.pk)
+        cita.fecha = otro_dia.isoformat()  # como llega desde request.POST
+        cita.veterinario = self.vet2
+        cita.save()
+        self.assertEqual(self.resumen().programadas, 0)
+        self.assertEqual(self.resumen(self.vet2, otro_dia).minutos_reservados, 30)
+
+        Cita.objects.get(pk=cita.pk).delete()
+        self.assertEqual(self.resumen(self.vet2, otro_dia).programadas, 0)
+        self.assertResumenCoincide()
+
+    def test_reconstruir_y_reporte_por_dia(self):
+        self.crear_cita(time(9, 0))
+        self.crear_cita(time(9, 0), veterinario=self.vet2, estado='CANCELADA')
+        CitaDiaResumen.objects.all().delete()
+        self.assertEqual(reconstruir_resumen(), 2)
+        self.assertResumenCoincide()
+        with self.assertNumQueries(1):
+            filas = list(citas_por_dia(self.fecha, self.fecha))
+        self.assertEqual(filas, [{'fecha': self.fecha, 'total': 2}])
+
+
+class ReprogramacionTests(CitasTestMixin, TestCase):
+
+    def test_reprogramar_rechaza_cruce(self):
+        cita = self.crear_cita(time(9, 0))
+        self.crear_cita(time(10, 0), servicio=self.cirugia)
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('citas:reprogramar', args=[cita.pk]), {
+            'fecha': self.fecha.isoformat(), 'hora': '11:00',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hora', response.context['form'].errors)
+        cita.refresh_from_db()
+        self.assertEqual(cita.hora, time(9, 0))
+
+    def test_reprogramar_rechaza_fuera_de_jornada(self):
+        cita = self.crear_cita(time(9, 0))
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('citas:reprogramar', args=[cita.pk]), {
+            'fecha': self.fecha.isoformat(), 'hora': '20:00',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['form'].is_valid())
+
+    def test_reprogramar_y_ocupar_hueco_en_una_transaccion(self):
+        cita = self.crear_cita(time(9, 0))
+        self.client.force_login(self.admin)
+        with mock.patch('citas.views.ocupar_hueco', side_effect=RuntimeError('caída')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('citas:reprogramar', args=[cita.pk]), {
+                    'fecha': self.fecha.isoformat(), 'hora': '11:00',
+                })
+        # Si falla la lista de espera, la cita no queda movida a medias
+        cita.refresh_from_db()
+        self.assertEqual(cita.hora, time(9, 0))
+        self.assertFalse(EventoSalida.objects.exists())
+
+    def test_reprogramar_dia_reparte_entre_veterinarios(self):
+        for hora in (time(9, 0), time(9, 30), time(10, 0)):
+            self.crear_cita(hora)
+        self.crear_cita(time(9, 30), veterinario=self.vet2)
+
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = reprogramar_dia(self.vet, self.fecha, self.admin, motivo='Incapacidad')
+        sentencias = [q for q in consultas.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertLessEqual(len(sentencias), 16)
+
+        self.assertEqual(len(resultado['movidas']), 3)
+        self.assertFalse(resultado['sin_cupo'])
+        horas = list(Cita.objects.filter(veterinario=self.vet2).order_by('hora').values_list('hora', flat=True))
+        self.assertEqual(horas, [time(9, 0), time(9, 30), time(10, 0), time(10, 30)])
+        self.assertFalse(Cita.objects.filter(veterinario=self.vet).exists())
+        despachar_salida()
+        self.assertEqual(Notificacion.objects.filter(asunto='Cita reprogramada').count(), 6)
+        resumen = CitaDiaResumen.objects.get(veterinario=self.vet2, fecha=self.fecha)
+        self.assertEqual((resumen.programadas, resumen.minutos_reservados), (4, 120))
+        self.assertEqual(CitaDiaResumen.objects.get(veterinario=self.vet, fecha=self.fecha).programadas, 0)
+
+    def test_sin_otro_veterinario_pasa_al_siguiente_dia(self):
+        Usuario.objects.filter(pk=self.vet2.pk).update(activo=False)
+        cita = self.crear_cita(time(9, 0), estado='CONFIRMADA')
+        self.client.force_login(self.admin)
+        self.client.post(reverse('citas:reprogramar_dia'), {
+            'veterinario': self.vet.id, 'fecha': self.fecha.isoformat(), 'dias': 3, 'motivo': '',
+        })
+        cita.refresh_from_db()
+        self.assertEqual((cita.veterinario, cita.fecha, cita.hora), (self.vet, dias_siguientes(self.fecha, 1)[0], time(9, 0)))
+
+
+class CalendarioIcsTests(CitasTestMixin, TestCase):
+
+    def leer(self, response):
+        # Bajo ASGI el feed se envía por bloques desde un iterador asíncrono
+        self.assertTrue(response.is_async)
+
+        async def consumir():
+            return b''.join([parte async for parte in response.streaming_content])
+        return async_to_sync(consumir)().decode('utf-8')
+
+    def test_feed_completo_con_un_evento_por_cita(self):
+        primera = self.crear_cita(time(9, 0))
+        self.crear_cita(time(10, 0), estado='CONFIRMADA')
+        self.crear_cita(time(11, 0), veterinario=self.vet2)
+        acceso = TokenCalendario.generar(self.vet)
+
+        response = self.client.get(reverse('citas:ics', args=[acceso.token]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Type'].startswith('text/calendar'))
+        contenido = self.leer(response)
+        self.assertTrue(contenido.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(contenido.count('BEGIN:VEVENT'), 2)
+        self.assertIn(f'UID:cita-{primera.pk}@mydog', contenido)
+        self.assertIn('STATUS:CONFIRMED', contenido)
+        self.assertIn(f"X-MYDOG-SYNC-TOKEN:{response['X-Sync-Token']}", contenido)
+        acceso.refresh_from_db()
+        self.assertIsNotNone(acceso.ultimo_uso)
+
+    def test_sincronizacion_incremental(self):
+        intacta = self.crear_cita(time(9, 0))
+        cancelada = self.crear_cita(time(10, 0))
+        _, token = generar_ics(self.vet, momento=timezone.now() + timedelta(minutes=5))
+        Cita.objects.filter(pk=cancelada.pk).update(
+            estado='CANCELADA', fecha_modificacion=timezone.now() + timedelta(minutes=10)
+        )
+        acceso = TokenCalendario.generar(self.vet)
+
+        contenido = self.leer(self.client.get(reverse('citas:ics', args=[acceso.token]), {'desde': token}))
+        self.assertEqual(contenido.count('BEGIN:VEVENT'), 1)
+        self.assertIn(f'UID:cita-{cancelada.pk}@mydog', contenido)
+        self.assertNotIn(f'UID:cita-{intacta.pk}@mydog', contenido)
+        self.assertIn('STATUS:CANCELLED', contenido)
+
+    def test_token_revocado_o_desde_invalido(self):
+        anterior = TokenCalendario.generar(self.vet)
+        actual = TokenCalendario.generar(self.vet)
+        self.assertEqual(self.client.get(reverse('citas:ics', args=[anterior.token])).status_code, 404)
+        response = self.client.get(reverse('citas:ics', args=[actual.token]), {'desde': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_login(self.vet)
+        self.client.post(reverse('citas:mi_calendario'), {'accion': 'revocar'})
+        self.assertEqual(self.client.get(reverse('citas:ics', args=[actual.token])).status_code, 404)
+
+    def test_plegado_de_lineas_largas(self):
+        linea = 'DESCRIPTION:' + 'ñ' * 80
+        plegada = plegar(linea)
+        for segmento in plegada.rstrip('\r\n').split('\r\n'):
+            self.assertLessEqual(len(segmento.encode('utf-8')), 75)
+        self.assertEqual(plegada.replace('\r\n ', '').rstrip('\r\n'), linea)
+        self.assertTrue(token_sincronizacion(timezone.now()).isdigit())
@@ -7,10 +7,15 @@ urlpatterns = [
     path('', views.calendario_citas, name='calendario'),
     path('api/eventos/', views.api_citas, name='api_eventos'),
     path('agendar/', views.agendar_cita, name='agendar'),
+    path('agendar/serie/', views.agendar_serie, name='agendar_serie'),
     path('agendar/propietario/', views.agendar_cita_propietario, name='agendar_propietario'),
     path('<int:pk>/', views.detalle_cita, name='detalle'),
     path('<int:pk>/cancelar/', views.cancelar_cita, name='cancelar'),
     path('<int:pk>/confirmar/', views.confirmar_cita, name='confirmar'),
     path('<int:pk>/reprogramar/', views.reprogramar_cita, name='reprogramar'),
+    path('reprogramar-dia/', views.reprogramar_dia_veterinario, name='reprogramar_dia'),
     path('ajax/cargar-mascotas/', views.cargar_mascotas, name='cargar_mascotas'),
+    path('api/disponibilidad/', views.api_disponibilidad, name='api_disponibilidad'),
+    path('ics/<str:token>/', views.calendario_ics, name='ics'),
+    path('mi-calendario/', views.mi_calendario, name='mi_calendario'),
 ]
@@ -1,55 +1,59 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from .models import Cita
-from .forms import CitaForm, CitaPropietarioForm
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from .models import Cita, TokenCalendario
+from .forms import CitaForm, CitaPropietarioForm, ReprogramarCitaForm, ReprogramarDiaForm, SerieCitaForm
+from .calendario import eventos_calendario, etag_calendario, filtros_desde_request, parsear_id, publicar_cambios
+from .disponibilidad import disponibilidad_del_dia
+from .ics import generar_ics, parsear_token_sincronizacion
+from .lista_espera import ocupar_hueco
+from .reprogramacion import reprogramar_dia
+from .services import mover_cita, notificar_cita_agendada_por_propietario, reservar_cita, reservar_serie
 from mascotas.models import Mascota
+from servicios.models import Servicio
 from datetime import datetime
+from django.utils.dateparse import parse_date
 from autenticacion.decorators import staff_required
 from autenticacion.models import Usuario
 from notificaciones.services import crear_evento_cita
-from notificaciones.models import Notificacion
-from pagos.models import Pago
 
 @login_required
 @staff_required
 def calendario_citas(request):
     """Vista principal del calendario de citas (HU-011)."""
-    return render(request, 'citas/calendario.html')
+    return render(request, 'citas/calendario.html', {
+        'veterinarios': Usuario.objects.filter(rol='VETERINARIO', activo=True),
+        'servicios': Servicio.objects.filter(activo=True),
+    })
+
+def _etag_api_citas(request):
+    filtros = filtros_desde_request(request)
+    if filtros is None:
+        return None
+    return etag_calendario(**filtros)
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_api_citas)
 def api_citas(request):
-    """API para obtener citas en formato JSON para FullCalendar."""
-    start = request.GET.get('start')
-    end = request.GET.get('end')
+    """
+    API para obtener citas en formato JSON para FullCalendar.
     
-    citas = Cita.objects.filter(
-        fecha__range=[start[:10], end[:10]],
-        estado__in=['PROGRAMADA', 'CONFIRMADA', 'COMPLETADA']
-    )
-    
-    eventos = []
-    for cita in citas:
-        color = cita.servicio.color_calendario
-        if cita.estado == 'COMPLETADA':
-            color = '#808080'  # Gris para completadas
-        elif cita.es_emergencia:
-            color = '#DC3545'  # Rojo para emergencias
-            
-        eventos.append({
-            'id': cita.id,
-            'title': f"{cita.mascota.nombre} - {cita.servicio.nombre}",
-            'start': f"{cita.fecha}T{cita.hora}",
-            'color': color,
-            'extendedProps': {
-                'propietario': cita.propietario.nombre,
-                'veterinario': cita.veterinario.get_full_name(),
-                'estado': cita.get_estado_display()
-            }
-        })
+    Acepta filtros opcionales ``veterinario`` y ``servicio`` y responde
+    304 Not Modified si la ventana no ha cambiado (ETag por día).
+    """
+    filtros = filtros_desde_request(request)
+    if filtros is None:
+        return JsonResponse({'error': 'Parámetros start/end inválidos'}, status=400)
     
-    return JsonResponse(eventos, safe=False)
+    return JsonResponse(eventos_calendario(**filtros), safe=False)
 
 @login_required
 @staff_required
@@ -60,32 +64,44 @@ def agendar_cita(request):
         if form.is_valid():
             cita = form.save(commit=False)
             cita.usuario_creador = request.user
-            cita.save()
-            
-            # Crear registro de pago pendiente automático
-            Pago.objects.create(
-                cita=cita,
-                propietario=cita.propietario,
-                monto=cita.servicio.precio,
-                tipo_pago='PENDIENTE',
-                estado='PENDIENTE',
-                usuario_registro=request.user
-            )
-
-            crear_evento_cita(
-                actor=request.user,
-                cita=cita,
-                tipo='CONFIRMACION',
-                asunto='Nueva cita creada',
-                mensaje=f"Se creó la cita #{cita.id} para {cita.fecha} a las {cita.hora}"
-            )
-            messages.success(request, 'Cita agendada exitosamente.')
-            return redirect('citas:calendario')
+            try:
+                # Cita, pago pendiente y notificaciones en una sola transacción
+                reservar_cita(cita, request.user)
+            except ValidationError as error:
+                form.add_error(None, error)
+            else:
+                messages.success(request, 'Cita agendada exitosamente.')
+                return redirect('citas:calendario')
     else:
         form = CitaForm()
     
     return render(request, 'citas/formulario.html', {'form': form, 'titulo': 'Agendar Cita'})
 
+@login_required
+@staff_required
+def agendar_serie(request):
+    """Vista para agendar una serie de citas (planes de vacunación/desparasitación) - Solo staff."""
+    if request.method == 'POST':
+        form = SerieCitaForm(request.POST)
+        if form.is_valid():
+            plantilla = form.save(commit=False)
+            plantilla.usuario_creador = request.user
+            try:
+                citas = reservar_serie(
+                    plantilla, request.user,
+                    intervalo_dias=form.cleaned_data['intervalo_dias'],
+                    dosis=form.cleaned_data['dosis'],
+                )
+            except ValidationError as error:
+                form.add_error(None, error)
+            else:
+                messages.success(request, f'Serie de {len(citas)} citas agendada exitosamente.')
+                return redirect('citas:calendario')
+    else:
+        form = SerieCitaForm()
+
+    return render(request, 'citas/formulario.html', {'form': form, 'titulo': 'Agendar Serie de Citas'})
+
 @login_required
 def agendar_cita_propietario(request):
     """Vista para que propietarios agenden citas para sus mascotas."""
@@ -112,68 +128,18 @@ def agendar_cita_propietario(request):
             cita.propietario = propietario
             cita.usuario_creador = request.user
             
-            # Si no seleccionó veterinario, asignar uno disponible
-            if not cita.veterinario:
-                # Buscar veterinario con menos citas en esa fecha
-                veterinarios = Usuario.objects.filter(rol='VETERINARIO', activo=True)
-                if veterinarios.exists():
-                    cita.veterinario = veterinarios.first()  # Simplificado: asignar el primero
-                else:
-                    messages.error(request, 'No hay veterinarios disponibles. Contacta a la clínica.')
-                    return render(request, 'citas/formulario_propietario.html', {
-                        'form': form,
-                        'titulo': 'Agendar Cita'
-                    })
-            
-            cita.save()
-            
-            # Crear registro de pago pendiente automático
-            Pago.objects.create(
-                cita=cita,
-                propietario=propietario,
-                monto=cita.servicio.precio,
-                tipo_pago='PENDIENTE',
-                estado='PENDIENTE',
-                usuario_registro=request.user
-            )
-            
-            # Crear notificación para el veterinario asignado
-            Notificacion.objects.create(
-                usuario=cita.veterinario,
-                actor=request.user,
-                tipo='CONFIRMACION',
-                asunto=f'Nueva cita agendada - {cita.mascota.nombre}',
-                mensaje=f'{propietario.nombre} ha agendado una cita para {cita.mascota.nombre}.\n\n'
-                        f'Fecha: {cita.fecha.strftime("%d/%m/%Y")}\n'
-                        f'Hora: {cita.hora.strftime("%H:%M")}\n'
-                        f'Servicio: {cita.servicio.get_nombre_display()}\n'
-                        f'Motivo: {cita.observaciones}',
-                cita=cita,
-                canal_enviado='SISTEMA'
-            )
-            
-            # También notificar al propietario
-            Notificacion.objects.create(
-                usuario=request.user,
-                actor=request.user,
-                tipo='CONFIRMACION',
-                asunto='Cita agendada exitosamente',
-                mensaje=f'Tu cita para {cita.mascota.nombre} ha sido agendada.\n\n'
-                        f'Fecha: {cita.fecha.strftime("%d/%m/%Y")}\n'
-                        f'Hora: {cita.hora.strftime("%H:%M")}\n'
-                        f'Veterinario: Dr. {cita.veterinario.get_full_name()}\n'
-                        f'Servicio: {cita.servicio.get_nombre_display()}\n\n'
-                        f'Te enviaremos un recordatorio 24 horas antes.',
-                cita=cita,
-                canal_enviado='SISTEMA'
-            )
-            
-            messages.success(
-                request, 
-                f'¡Cita agendada exitosamente! Dr. {cita.veterinario.get_full_name()} '
-                f'te atenderá el {cita.fecha.strftime("%d/%m/%Y")} a las {cita.hora.strftime("%H:%M")}.'
-            )
-            return redirect('propietarios:detalle', pk=propietario.id)
+            try:
+                # Si no seleccionó veterinario, el servicio asigna el menos ocupado que esté libre
+                reservar_cita(cita, request.user, notificar=notificar_cita_agendada_por_propietario)
+            except ValidationError as error:
+                form.add_error(None, error)
+            else:
+                messages.success(
+                    request, 
+                    f'¡Cita agendada exitosamente! Dr. {cita.veterinario.get_full_name()} '
+                    f'te atenderá el {cita.fecha.strftime("%d/%m/%Y")} a las {cita.hora.strftime("%H:%M")}.'
+                )
+                return redirect('propietarios:detalle', pk=propietario.id)
     else:
         form = CitaPropietarioForm(propietario=propietario)
     
@@ -201,6 +167,36 @@ def cargar_mascotas(request):
     mascotas = Mascota.objects.filter(propietario_id=propietario_id, activo=True).values('id', 'nombre')
     return JsonResponse(list(mascotas), safe=False)
 
+@login_required
+def api_disponibilidad(request):
+    """
+    AJAX con las horas disponibles de un día para un servicio (HU-012).
+    
+    Parámetros GET: ``fecha``, ``servicio``, ``veterinario`` (opcional) y
+    ``excluir`` (opcional, cita que se está reprogramando).
+    """
+    try:
+        fecha = parse_date(request.GET.get('fecha') or '')
+    except ValueError:
+        fecha = None
+    servicio = Servicio.objects.filter(pk=parsear_id(request.GET.get('servicio')), activo=True).first()
+    if fecha is None or servicio is None:
+        return JsonResponse({'error': 'Debe indicar una fecha y un servicio válidos'}, status=400)
+    
+    veterinarios = Usuario.objects.filter(rol='VETERINARIO', activo=True)
+    veterinario_id = parsear_id(request.GET.get('veterinario'))
+    if veterinario_id:
+        veterinarios = veterinarios.filter(pk=veterinario_id)
+    
+    return JsonResponse({
+        'fecha': fecha.isoformat(),
+        'duracion': servicio.duracion_minutos,
+        'veterinarios': disponibilidad_del_dia(
+            fecha, servicio.duracion_minutos, veterinarios,
+            excluir_cita_id=parsear_id(request.GET.get('excluir'))
+        ),
+    })
+
 @login_required
 def cancelar_cita(request, pk):
     """Cancelar una cita (HU-015)."""
@@ -214,17 +210,25 @@ def cancelar_cita(request, pk):
     if request.method == 'POST':
         if puede_cancelar:
             motivo = request.POST.get('motivo', '')
-            cita.estado = 'CANCELADA'
-            cita.motivo_cancelacion = motivo
-            cita.save()
-            crear_evento_cita(
-                actor=request.user,
-                cita=cita,
-                tipo='CANCELACION',
-                asunto='Cita cancelada',
-                mensaje=f'La cita #{cita.id} fue cancelada. Motivo: {motivo}'
-            )
+            with transaction.atomic():
+                cita.estado = 'CANCELADA'
+                cita.motivo_cancelacion = motivo
+                cita.save()
+                crear_evento_cita(
+                    actor=request.user,
+                    cita=cita,
+                    tipo='CANCELACION',
+                    asunto='Cita cancelada',
+                    mensaje=f'La cita #{cita.id} fue cancelada. Motivo: {motivo}'
+                )
+                publicar_cambios('cancelar', cita)
+                # El horario liberado pasa a la lista de espera
+                entrada, _ = ocupar_hueco(
+                    cita.veterinario_id, cita.fecha, cita.hora, request.user,
+                    excluir_paciente_id=cita.mascota_id
+                )
             messages.success(request, 'Cita cancelada exitosamente.')
+            _avisar_lista_espera(request, entrada)
             return redirect('citas:detalle', pk=pk)
         else:
             messages.error(request, mensaje)
@@ -237,6 +241,15 @@ def cancelar_cita(request, pk):
         'mensaje': mensaje
     })
 
+def _avisar_lista_espera(request, entrada):
+    """Informa al staff qué paciente de la lista de espera recibió el horario."""
+    if entrada is None or request.user.rol == 'PROPIETARIO':
+        return
+    if entrada.atendido:
+        messages.info(request, f'El horario liberado se asignó a {entrada.paciente.nombre} (lista de espera).')
+    else:
+        messages.info(request, f'Se ofreció el horario liberado a {entrada.paciente.nombre} (lista de espera).')
+
 @login_required
 def confirmar_cita(request, pk):
     """Confirmar asistencia a una cita."""
@@ -245,6 +258,7 @@ def confirmar_cita(request, pk):
     if cita.estado == 'PROGRAMADA':
         cita.estado = 'CONFIRMADA'
         cita.save()
+        publicar_cambios('confirmar', cita)
         messages.success(request, 'Asistencia confirmada exitosamente.')
     else:
         messages.warning(request, 'Solo se pueden confirmar citas programadas.')
@@ -266,21 +280,105 @@ def reprogramar_cita(request, pk):
         return redirect('citas:detalle', pk=pk)
     
     if request.method == 'POST':
-        nueva_fecha = request.POST.get('fecha')
-        nueva_hora = request.POST.get('hora')
-        
-        cita.fecha = nueva_fecha
-        cita.hora = nueva_hora
-        cita.save()
-        crear_evento_cita(
-            actor=request.user,
-            cita=cita,
-            tipo='SISTEMA',
-            asunto='Cita reprogramada',
-            mensaje=f'La cita #{cita.id} fue reprogramada para {nueva_fecha} a las {nueva_hora}'
-        )
-        
-        messages.success(request, 'Cita reprogramada exitosamente.')
-        return redirect('citas:detalle', pk=pk)
+        form = ReprogramarCitaForm(request.POST, cita=cita)
+        if form.is_valid():
+            fecha_anterior, hora_anterior = cita.fecha, cita.hora
+            try:
+                with transaction.atomic():
+                    # Verifica cruces bajo bloqueo y notifica en la misma transacción
+                    mover_cita(cita, form.cleaned_data['fecha'], form.cleaned_data['hora'], request.user)
+                    # El horario anterior pasa a la lista de espera
+                    entrada, _ = ocupar_hueco(
+                        cita.veterinario_id, fecha_anterior, hora_anterior, request.user,
+                        excluir_paciente_id=cita.mascota_id
+                    )
+            except ValidationError as error:
+                cita.fecha, cita.hora = fecha_anterior, hora_anterior
+                form.add_error(None, error)
+            else:
+                messages.success(request, 'Cita reprogramada exitosamente.')
+                _avisar_lista_espera(request, entrada)
+                return redirect('citas:detalle', pk=pk)
+    else:
+        form = ReprogramarCitaForm(cita=cita, initial={'fecha': cita.fecha, 'hora': cita.hora})
     
-    return render(request, 'citas/reprogramar.html', {'cita': cita})
+    return render(request, 'citas/reprogramar.html', {'cita': cita, 'form': form})
+
+@login_required
+@staff_required
+def reprogramar_dia_veterinario(request):
+    """Reprogramar todas las citas pendientes de un veterinario en un día (HU-014) - Solo staff."""
+    resultado = None
+    if request.method == 'POST':
+        form = ReprogramarDiaForm(request.POST)
+        if form.is_valid():
+            try:
+                resultado = reprogramar_dia(
+                    form.cleaned_data['veterinario'],
+                    form.cleaned_data['fecha'],
+                    request.user,
+                    dias=form.cleaned_data['dias'],
+                    motivo=form.cleaned_data['motivo'],
+                )
+            except ValidationError as error:
+                form.add_error(None, error)
+            else:
+                if resultado['movidas']:
+                    messages.success(request, f"{len(resultado['movidas'])} citas reprogramadas.")
+                if resultado['sin_cupo']:
+                    messages.warning(request, f"{len(resultado['sin_cupo'])} citas no encontraron horario y siguen sin cambios.")
+                if not resultado['movidas'] and not resultado['sin_cupo']:
+                    messages.info(request, 'El veterinario no tiene citas pendientes ese día.')
+    else:
+        form = ReprogramarDiaForm()
+
+    return render(request, 'citas/reprogramar_dia.html', {'form': form, 'resultado': resultado})
+
+
+def calendario_ics(request, token):
+    """
+    Agenda del veterinario en formato iCalendar, autenticada por token.
+
+    Con ``?desde=<token de sincronización>`` solo devuelve las citas
+    modificadas desde la consulta anterior.
+    """
+    acceso = TokenCalendario.objects.select_related('veterinario').filter(token=token, activo=True).first()
+    if acceso is None:
+        raise Http404
+
+    desde = None
+    if 'desde' in request.GET:
+        desde = parsear_token_sincronizacion(request.GET['desde'])
+        if desde is None:
+            return HttpResponseBadRequest('Token de sincronización inválido')
+
+    TokenCalendario.objects.filter(pk=acceso.pk).update(ultimo_uso=timezone.now())
+    fragmentos, token_sincronizacion = generar_ics(acceso.veterinario, desde)
+
+    # Iterador asíncrono: bajo ASGI se envía a medida que se leen las citas,
+    # sin armar el historial en memoria
+    response = StreamingHttpResponse(fragmentos, content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'inline; filename="agenda-mydog.ics"'
+    response['Cache-Control'] = 'private, no-cache'
+    response['X-Sync-Token'] = token_sincronizacion
+    return response
+
+@login_required
+def mi_calendario(request):
+    """Enlace de suscripción ICS del veterinario; permite regenerarlo o revocarlo."""
+    if request.user.rol != 'VETERINARIO':
+        messages.error(request, 'Solo los veterinarios tienen calendario ICS.')
+        return redirect('home')
+
+    if request.method == 'POST':
+        if request.POST.get('accion') == 'revocar':
+            TokenCalendario.objects.filter(veterinario=request.user, activo=True).update(activo=False)
+            messages.success(request, 'El enlace del calendario fue revocado.')
+        else:
+            TokenCalendario.generar(request.user)
+            messages.success(request, 'Se generó un enlace nuevo. El anterior dejó de funcionar.')
+        return redirect('citas:mi_calendario')
+
+    acceso = TokenCalendario.objects.filter(veterinario=request.user, activo=True).first()
+    url = request.build_absolute_uri(reverse('citas:ics', args=[acceso.token])) if acceso else None
+    return render(request, 'citas/mi_calendario.html', {'acceso': acceso, 'url': url})
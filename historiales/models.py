@@ -5,9 +5,10 @@ Este módulo contiene los modelos para registrar y gestionar
 historiales clínicos de las mascotas.
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import FileExtensionValidator, MinValueValidator
-import uuid
+
+from administracion.secuencias import siguiente_numero
 
 
 class HistorialClinico(models.Model):
@@ -208,7 +209,18 @@ class CertificadoVacunacion(models.Model):
         return f"Certificado {self.numero_certificado} - {self.mascota.nombre}"
     
     def save(self, *args, **kwargs):
-        """Genera número único si no existe."""
-        if not self.numero_certificado:
-            self.numero_certificado = f"CERT-{uuid.uuid4().hex[:8].upper()}"
-        super().save(*args, **kwargs)
+        """
+        Asigna el siguiente número de certificado si no existe.
+
+        El número se toma en la misma transacción del guardado (ver
+        administracion/secuencias.py): si falla, se devuelve.
+        """
+        if self.numero_certificado:
+            return super().save(*args, **kwargs)
+        try:
+            with transaction.atomic():
+                self.numero_certificado = siguiente_numero('certificado')
+                super().save(*args, **kwargs)
+        except Exception:
+            self.numero_certificado = ''
+            raise
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Notificacion, PreferenciaNotificacion, NotificacionLog
+from .models import (
+    ContadorNoLeidas, EjecucionRecordatorios, EventoResumen, EventoSalida, Notificacion, NotificacionLog,
+    PreferenciaNotificacion, PresenciaUsuario, RecordatorioEnviado,
+)
 
 @admin.register(Notificacion)
 class NotificacionAdmin(admin.ModelAdmin):
@@ -8,9 +11,39 @@ class NotificacionAdmin(admin.ModelAdmin):
 
 @admin.register(PreferenciaNotificacion)
 class PreferenciaNotificacionAdmin(admin.ModelAdmin):
-    list_display = ('usuario', 'canal_preferido', 'recordatorios')
+    list_display = ('usuario', 'canal_preferido', 'recordatorios', 'resumen_minutos')
 
 @admin.register(NotificacionLog)
 class NotificacionLogAdmin(admin.ModelAdmin):
     list_display = ('fecha', 'notificacion', 'accion', 'usuario')
     list_filter = ('accion',)
+
+@admin.register(EventoSalida)
+class EventoSalidaAdmin(admin.ModelAdmin):
+    list_display = ('fecha_creacion', 'asunto', 'tipo', 'fecha_despacho', 'intentos')
+    list_filter = ('tipo', 'fecha_despacho')
+    readonly_fields = ('fecha_creacion',)
+
+@admin.register(ContadorNoLeidas)
+class ContadorNoLeidasAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'no_leidas')
+    readonly_fields = ('usuario', 'no_leidas')
+
+@admin.register(RecordatorioEnviado)
+class RecordatorioEnviadoAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'cita', 'horizonte_horas')
+    list_filter = ('horizonte_horas',)
+
+@admin.register(EjecucionRecordatorios)
+class EjecucionRecordatoriosAdmin(admin.ModelAdmin):
+    list_display = ('fecha_inicio', 'fecha_referencia', 'ultima_cita_id', 'enviados', 'omitidos', 'fecha_fin')
+
+@admin.register(PresenciaUsuario)
+class PresenciaUsuarioAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'proceso', 'conexiones', 'expira')
+    readonly_fields = ('usuario', 'proceso', 'conexiones', 'expira')
+
+@admin.register(EventoResumen)
+class EventoResumenAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'usuario', 'tipo', 'asunto')
+    list_filter = ('tipo',)
@@ -0,0 +1,254 @@
+"""
+Retención y archivo mensual de notificaciones.
+
+Las notificaciones con más de ``NOTIFICACIONES_RETENCION_MESES`` meses
+(contados por mes completo) salen de la base de datos junto con sus logs y
+quedan en un archivo JSONL comprimido por mes, en
+``MEDIA_ROOT/archivo_notificaciones/AAAA-MM.jsonl.gz``. Cada línea es una
+notificación con sus logs anidados.
+
+El archivado va por lotes: primero se leen las filas y se agregan al
+archivo del mes (un nuevo miembro gzip, que se lee como parte del mismo
+archivo); luego se borran en una transacción corta por lote, así las
+escrituras de la aplicación nunca esperan más que un lote. Si el proceso
+se interrumpe entre ambos pasos, el lote se vuelve a archivar en la
+siguiente ejecución; la lectura descarta los duplicados por ``id``.
+
+Junto a cada archivo, ``AAAA-MM.jsonl.gz.ok`` guarda cuántos bytes
+corresponden a lotes completos; se reemplaza de forma atómica después de
+forzar el lote a disco. Si el proceso muere a mitad de un miembro gzip, la
+lectura ignora esa cola y la siguiente escritura la trunca antes de agregar.
+"""
+
+import gzip
+import io
+import json
+import os
+import re
+from collections import Counter, defaultdict
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .contadores import sumar_no_leidas
+from .models import Notificacion, NotificacionLog
+
+TAMANO_LOTE = 500
+
+# Filas que la lectura asíncrona descomprime por paso en un hilo
+TAMANO_BLOQUE_LECTURA = 200
+
+CAMPOS_NOTIFICACION = (
+    'id', 'usuario_id', 'actor_id', 'tipo', 'asunto', 'mensaje', 'leida', 'canal_enviado',
+    'fecha_envio', 'fecha_lectura', 'cita_id', 'detalle',
+)
+CAMPOS_LOG = ('id', 'notificacion_id', 'accion', 'usuario_id', 'detalles', 'fecha')
+
+_NOMBRE_ARCHIVO = re.compile(r'^(\d{4})-(\d{2})\.jsonl\.gz$')
+
+
+def directorio_archivo():
+    return Path(settings.MEDIA_ROOT) / 'archivo_notificaciones'
+
+
+def ruta_mes(anio, mes):
+    return directorio_archivo() / f'{anio:04d}-{mes:02d}.jsonl.gz'
+
+
+def ruta_confirmada(ruta):
+    """Archivo con la longitud confirmada (lotes completos) de ``ruta``."""
+    return ruta.with_name(ruta.name + '.ok')
+
+
+def longitud_confirmada(ruta):
+    """
+    Bytes de ``ruta`` que corresponden a lotes completos.
+
+    Un archivo sin longitud confirmada (anterior a ella) se toma completo.
+    """
+    try:
+        return int(ruta_confirmada(ruta).read_text())
+    except FileNotFoundError:
+        return ruta.stat().st_size if ruta.exists() else 0
+
+
+def _confirmar(ruta, longitud):
+    """Guarda la longitud confirmada: escribe un temporal y lo reemplaza de forma atómica."""
+    destino = ruta_confirmada(ruta)
+    temporal = destino.with_name(destino.name + '.tmp')
+    with open(temporal, 'w') as archivo:
+        archivo.write(str(longitud))
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, destino)
+
+
+def meses_retencion():
+    return getattr(settings, 'NOTIFICACIONES_RETENCION_MESES', 12)
+
+
+def fecha_corte(meses=None, momento=None):
+    """Inicio (hora local) del mes más antiguo que se conserva."""
+    meses = meses_retencion() if meses is None else meses
+    local = timezone.localtime(momento or timezone.now())
+    indice = local.year * 12 + local.month - 1 - meses
+    return timezone.make_aware(datetime(indice // 12, indice % 12 + 1, 1))
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    raise TypeError(f'No serializable: {type(valor).__name__}')
+
+
+def _escribir(filas_por_mes):
+    """
+    Agrega las filas al archivo de cada mes como un miembro gzip nuevo, lo
+    fuerza a disco y luego confirma la nueva longitud. Antes de agregar se
+    trunca lo que haya quedado de un lote interrumpido.
+    """
+    directorio_archivo().mkdir(parents=True, exist_ok=True)
+    for (anio, mes), filas in filas_por_mes.items():
+        ruta = ruta_mes(anio, mes)
+        longitud = longitud_confirmada(ruta)
+        if not ruta_confirmada(ruta).exists():
+            _confirmar(ruta, longitud)
+        with open(ruta, 'ab') as crudo:
+            crudo.truncate(longitud)
+            with gzip.GzipFile(fileobj=crudo, mode='ab') as archivo:
+                for fila in filas:
+                    archivo.write(json.dumps(fila, default=_serializar, ensure_ascii=False).encode('utf-8'))
+                    archivo.write(b'\n')
+            crudo.flush()
+            os.fsync(crudo.fileno())
+            longitud = os.fstat(crudo.fileno()).st_size
+        _confirmar(ruta, longitud)
+
+
+def archivar_lote(corte, tamano_lote=TAMANO_LOTE):
+    """
+    Archiva y borra el siguiente lote de notificaciones anteriores a ``corte``.
+
+    Returns:
+        Counter: notificaciones archivadas por (año, mes); vacío si no quedan
+    """
+    filas = list(
+        Notificacion.objects.filter(fecha_envio__lt=corte).order_by('id').values(*CAMPOS_NOTIFICACION)[:tamano_lote]
+    )
+    if not filas:
+        return Counter()
+    ids = [fila['id'] for fila in filas]
+    logs = defaultdict(list)
+    for log in NotificacionLog.objects.filter(notificacion_id__in=ids).order_by('id').values(*CAMPOS_LOG):
+        logs[log.pop('notificacion_id')].append(log)
+
+    por_mes = defaultdict(list)
+    for fila in filas:
+        fila['logs'] = logs[fila['id']]
+        local = timezone.localtime(fila['fecha_envio'])
+        por_mes[(local.year, local.month)].append(fila)
+    _escribir(por_mes)
+
+    with transaction.atomic():
+        no_leidas = Counter(
+            Notificacion.objects.filter(pk__in=ids, leida=False).values_list('usuario_id', flat=True)
+        )
+        # Los logs se borran en cascada
+        Notificacion.objects.filter(pk__in=ids).delete()
+        sumar_no_leidas({usuario_id: -cantidad for usuario_id, cantidad in no_leidas.items()})
+    return Counter({mes: len(grupo) for mes, grupo in por_mes.items()})
+
+
+def archivar(meses=None, tamano_lote=TAMANO_LOTE, momento=None):
+    """
+    Archiva todas las notificaciones fuera del período de retención.
+
+    Returns:
+        Counter: notificaciones archivadas por (año, mes)
+    """
+    corte = fecha_corte(meses, momento)
+    total = Counter()
+    while True:
+        archivadas = archivar_lote(corte, tamano_lote)
+        if not archivadas:
+            return total
+        total.update(archivadas)
+
+
+def meses_archivados():
+    """Meses con archivo, como tuplas (año, mes) en orden."""
+    directorio = directorio_archivo()
+    if not directorio.is_dir():
+        return []
+    meses = []
+    for ruta in directorio.iterdir():
+        coincidencia = _NOMBRE_ARCHIVO.match(ruta.name)
+        if coincidencia:
+            meses.append((int(coincidencia.group(1)), int(coincidencia.group(2))))
+    return sorted(meses)
+
+
+def leer_mes(anio, mes, usuario_id=None):
+    """
+    Notificaciones archivadas de un mes (con sus logs), sin duplicados.
+
+    Args:
+        usuario_id: Solo las de este usuario (opcional)
+
+    Yields:
+        dict: Una notificación por elemento
+    """
+    ruta = ruta_mes(anio, mes)
+    if not ruta.exists():
+        return
+    vistas = set()
+    with open(ruta, 'rb') as crudo:
+        # Solo los lotes completos: se ignora un miembro gzip a medio escribir
+        tramo = io.BufferedReader(_Tramo(crudo, longitud_confirmada(ruta)))
+        with gzip.open(tramo, 'rt', encoding='utf-8') as archivo:
+            for linea in archivo:
+                fila = json.loads(linea)
+                if fila['id'] in vistas or (usuario_id is not None and fila['usuario_id'] != usuario_id):
+                    continue
+                vistas.add(fila['id'])
+                yield fila
+
+
+async def aleer_mes(anio, mes, usuario_id=None, tamano_bloque=TAMANO_BLOQUE_LECTURA):
+    """
+    Versión asíncrona de ``leer_mes`` para respuestas servidas por ASGI.
+
+    Descomprime de a ``tamano_bloque`` filas en un hilo, sin bloquear el
+    event loop ni cargar el mes completo en memoria.
+    """
+    filas = leer_mes(anio, mes, usuario_id)
+    siguiente_bloque = sync_to_async(lambda: list(islice(filas, tamano_bloque)), thread_sensitive=False)
+    try:
+        while bloque := await siguiente_bloque():
+            for fila in bloque:
+                yield fila
+    finally:
+        filas.close()
+
+
+class _Tramo(io.RawIOBase):
+    """Lectura de los primeros ``longitud`` bytes de un archivo abierto."""
+
+    def __init__(self, archivo, longitud):
+        self._archivo = archivo
+        self._restante = longitud
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._restante <= 0:
+            return 0
+        leidos = self._archivo.readinto(memoryview(buffer)[:self._restante])
+        self._restante -= leidos
+        return leidos
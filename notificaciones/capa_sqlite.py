@@ -0,0 +1,345 @@
+"""
+Capa de canales (Django Channels) respaldada por un archivo SQLite local.
+
+``InMemoryChannelLayer`` solo entrega mensajes dentro del mismo proceso:
+con varios workers ASGI (o con el despachador de notificaciones en otro
+proceso) un ``group_send`` no llega a los sockets abiertos en los demás.
+Esta capa comparte los mensajes y grupos en un archivo SQLite (modo WAL)
+que todos los procesos de la máquina abren, sin servicios externos.
+
+Diseño:
+
+- Cada proceso tiene un identificador; sus canales (``new_channel``) son
+  ``specific.<proceso>!<id>``. Un único sondeo por proceso lee y borra en
+  una transacción todos los mensajes de sus canales y los reparte en
+  colas ``asyncio`` locales, así el costo no crece con los sockets abiertos.
+  La cola de un canal que nadie recibe (ej: un socket que se cerró con
+  mensajes en camino) se descarta tras ``expiry`` segundos sin uso, y el
+  sondeo termina cuando no quedan colas.
+- ``group_send`` hace el fan-out dentro de SQLite con un solo
+  ``INSERT ... SELECT`` sobre los miembros del grupo. Los ``group_send``
+  concurrentes del mismo event loop (ej: ``push_usuarios``) se agrupan en
+  una sola transacción.
+- Todo el acceso a SQLite pasa por un hilo dedicado por proceso, de modo
+  que el event loop nunca se bloquea esperando el archivo.
+
+Los mensajes se serializan como JSON (los eventos de la aplicación son
+diccionarios de texto y números). La capacidad por canal se respeta:
+``send`` lanza ``ChannelFull`` y ``group_send`` omite en silencio a los
+miembros con el canal lleno, como la capa de Redis. Los mensajes vencidos
+(``expiry``) se descartan al leer y se purgan periódicamente.
+
+Configuración::
+
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "notificaciones.capa_sqlite.SQLiteChannelLayer",
+            "CONFIG": {"ruta": BASE_DIR / "channels.sqlite3"},
+        }
+    }
+"""
+
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS mensajes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    destino TEXT NOT NULL,
+    canal TEXT NOT NULL,
+    expira REAL NOT NULL,
+    datos TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS mensajes_destino ON mensajes (destino, id);
+CREATE INDEX IF NOT EXISTS mensajes_canal ON mensajes (canal, id);
+CREATE TABLE IF NOT EXISTS grupos (
+    grupo TEXT NOT NULL,
+    canal TEXT NOT NULL,
+    expira REAL NOT NULL,
+    PRIMARY KEY (grupo, canal)
+) WITHOUT ROWID;
+"""
+
+# Destino de un canal: lo que va antes del "!" (o el canal completo)
+_DESTINO_SQL = "CASE instr(canal, '!') WHEN 0 THEN canal ELSE substr(canal, 1, instr(canal, '!') - 1) END"
+
+# Mensajes leídos por sondeo
+LOTE_SONDEO = 1000
+
+# Tope de la espera entre sondeos sin tráfico (múltiplo del intervalo)
+ESPERA_MAXIMA_FACTOR = 5
+
+# Cada cuántos segundos se purgan mensajes y membresías vencidos
+INTERVALO_PURGA = 30
+
+# Cada cuántos segundos el sondeo busca colas locales sin uso
+INTERVALO_COLAS = 1
+
+
+def destino(canal):
+    return canal.split('!', 1)[0]
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    """Capa de canales multiproceso sobre SQLite (ver el docstring del módulo)."""
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, ruta='channels.sqlite3', expiry=60, group_expiry=86400, capacity=100,
+                 channel_capacity=None, intervalo_sondeo=0.01, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.ruta = str(ruta)
+        self.group_expiry = group_expiry
+        self.intervalo_sondeo = intervalo_sondeo
+        self.proceso = uuid.uuid4().hex[:12]
+        self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='capa-sqlite')
+        self._conexion = None
+        self._destinos = set()
+        self._colas = {}
+        self._uso = {}
+        self._receptores = set()
+        self._sondeo = None
+        self._ultima_purga = 0.0
+        self._lote_grupos = None
+
+    # Acceso a SQLite (siempre en el hilo del ejecutor)
+
+    def _db(self):
+        if self._conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=20, isolation_level=None, check_same_thread=False)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            conexion.executescript(ESQUEMA)
+            conexion.create_function('capacidad', 1, self.get_capacity, deterministic=True)
+            self._conexion = conexion
+        return self._conexion
+
+    async def _ejecutar(self, funcion, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._ejecutor, partial(funcion, *args))
+
+    def _insertar(self, canal, datos, capacidad):
+        db = self._db()
+        ahora = time.time()
+        # Conteo e inserción bajo el bloqueo de escritura: dos procesos no
+        # pueden ver el mismo cupo libre
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            lleno = db.execute(
+                'SELECT COUNT(*) FROM mensajes WHERE canal = ? AND expira > ?', (canal, ahora)
+            ).fetchone()[0] >= capacidad
+            if not lleno:
+                db.execute(
+                    'INSERT INTO mensajes (destino, canal, expira, datos) VALUES (?, ?, ?, ?)',
+                    (destino(canal), canal, ahora + self.expiry, datos),
+                )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return not lleno
+
+    def _insertar_grupos(self, envios):
+        db = self._db()
+        ahora = time.time()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            # Los miembros con el canal lleno no reciben el mensaje
+            db.executemany(
+                f'INSERT INTO mensajes (destino, canal, expira, datos) '
+                f'SELECT {_DESTINO_SQL}, canal, ?, ? FROM grupos WHERE grupo = ? AND expira > ? '
+                f'AND (SELECT COUNT(*) FROM mensajes m WHERE m.canal = grupos.canal AND m.expira > ?) < capacidad(canal)',
+                [(ahora + self.expiry, datos, grupo, ahora, ahora) for grupo, datos in envios],
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def _tomar(self, destinos):
+        """Lee y borra los mensajes pendientes de los destinos dados."""
+        db = self._db()
+        ahora = time.time()
+        marcas = ', '.join('?' * len(destinos))
+        consulta = (
+            f'SELECT id, canal, expira, datos FROM mensajes WHERE destino IN ({marcas}) '
+            f'ORDER BY id LIMIT {LOTE_SONDEO}'
+        )
+        # Lectura sin bloqueo (WAL); solo se toma el bloqueo de escritura si hay algo
+        if not db.execute(consulta, tuple(destinos)).fetchone() and ahora - self._ultima_purga < INTERVALO_PURGA:
+            return []
+
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            filas = db.execute(consulta, tuple(destinos)).fetchall()
+            if filas:
+                db.execute(
+                    f'DELETE FROM mensajes WHERE destino IN ({marcas}) AND id <= ?',
+                    (*destinos, filas[-1][0]),
+                )
+            if ahora - self._ultima_purga >= INTERVALO_PURGA:
+                db.execute('DELETE FROM mensajes WHERE expira < ?', (ahora,))
+                db.execute('DELETE FROM grupos WHERE expira < ?', (ahora,))
+                self._ultima_purga = ahora
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return [(canal, datos) for _, canal, expira, datos in filas if expira > ahora]
+
+    def _tomar_uno(self, canal):
+        """Lee y borra el mensaje más antiguo de un canal compartido."""
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            fila = db.execute(
+                'SELECT id, datos FROM mensajes WHERE canal = ? AND expira > ? ORDER BY id LIMIT 1',
+                (canal, time.time()),
+            ).fetchone()
+            if fila:
+                db.execute('DELETE FROM mensajes WHERE id = ?', (fila[0],))
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return fila[1] if fila else None
+
+    # API de canales
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        assert '__asgi_channel__' not in message
+        datos = json.dumps(message)
+        if not await self._ejecutar(self._insertar, channel, datos, self.get_capacity(channel)):
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if '!' not in channel:
+            # Canal compartido (ej: un worker): sondeo directo sobre ese canal
+            while True:
+                datos = await self._ejecutar(self._tomar_uno, channel)
+                if datos is not None:
+                    return json.loads(datos)
+                await asyncio.sleep(self.intervalo_sondeo)
+
+        cola = self._cola(channel)
+        self._receptores.add(channel)
+        self._asegurar_sondeo()
+        try:
+            return await cola.get()
+        finally:
+            self._receptores.discard(channel)
+            if self._colas.get(channel) is cola:
+                if cola.empty():
+                    del self._colas[channel]
+                    del self._uso[channel]
+                else:
+                    self._uso[channel] = time.monotonic()
+
+    async def new_channel(self, prefix='specific'):
+        base = f'{prefix}.{self.proceso}'
+        self._destinos.add(base)
+        return f'{base}!{uuid.uuid4().hex}'
+
+    def _cola(self, canal):
+        cola = self._colas.get(canal)
+        if cola is None:
+            cola = self._colas[canal] = asyncio.Queue()
+            self._uso[canal] = time.monotonic()
+        return cola
+
+    def _descartar_colas_inactivas(self):
+        """Descarta las colas sin receptor que no se usan hace más de ``expiry`` segundos."""
+        limite = time.monotonic() - self.expiry
+        for canal in [canal for canal, uso in self._uso.items() if uso < limite and canal not in self._receptores]:
+            del self._colas[canal]
+            del self._uso[canal]
+
+    def _asegurar_sondeo(self):
+        loop = asyncio.get_running_loop()
+        if self._sondeo is None or self._sondeo.done() or self._sondeo.get_loop() is not loop:
+            self._sondeo = loop.create_task(self._sondear())
+
+    async def _sondear(self):
+        """
+        Reparte los mensajes de los canales del proceso mientras haya
+        receptores. Sin tráfico la espera entre sondeos crece hasta
+        ``ESPERA_MAXIMA_FACTOR`` veces el intervalo.
+        """
+        espera = self.intervalo_sondeo
+        revision = time.monotonic() + INTERVALO_COLAS
+        while self._colas:
+            filas = await self._ejecutar(self._tomar, sorted(self._destinos))
+            for canal, datos in filas:
+                self._cola(canal).put_nowait(json.loads(datos))
+            if time.monotonic() >= revision:
+                self._descartar_colas_inactivas()
+                revision = time.monotonic() + INTERVALO_COLAS
+            if len(filas) >= LOTE_SONDEO:
+                continue
+            espera = self.intervalo_sondeo if filas else min(espera * 2, self.intervalo_sondeo * ESPERA_MAXIMA_FACTOR)
+            await asyncio.sleep(espera)
+
+    # Grupos
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._ejecutar(
+            self._escribir,
+            'INSERT OR REPLACE INTO grupos (grupo, canal, expira) VALUES (?, ?, ?)',
+            (group, channel, time.time() + self.group_expiry),
+        )
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._ejecutar(self._escribir, 'DELETE FROM grupos WHERE grupo = ? AND canal = ?', (group, channel))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_group_name(group)
+        loop = asyncio.get_running_loop()
+        lote = self._lote_grupos
+        if lote is None or lote[1].get_loop() is not loop:
+            lote = self._lote_grupos = ([], loop.create_future())
+            loop.create_task(self._volcar_grupos(lote))
+        lote[0].append((group, json.dumps(message)))
+        await asyncio.shield(lote[1])
+
+    async def _volcar_grupos(self, lote):
+        """Escribe en una transacción los ``group_send`` acumulados en esta vuelta del loop."""
+        envios, futuro = lote
+        await asyncio.sleep(0)
+        if self._lote_grupos is lote:
+            self._lote_grupos = None
+        try:
+            await self._ejecutar(self._insertar_grupos, envios)
+        except Exception as error:
+            futuro.set_exception(error)
+        else:
+            futuro.set_result(None)
+
+    def _escribir(self, sql, parametros=()):
+        self._db().execute(sql, parametros)
+
+    # Extensión flush
+
+    async def flush(self):
+        await self._ejecutar(self._escribir, 'DELETE FROM mensajes')
+        await self._ejecutar(self._escribir, 'DELETE FROM grupos')
+        self._colas.clear()
+        self._uso.clear()
+
+    async def close(self):
+        pass
@@ -1,5 +1,8 @@
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
+from . import presencia
+from .services import GRUPO_CALENDARIO
+
 
 class NotificationConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
@@ -7,6 +10,8 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
         if user and user.is_authenticated:
             self.group_name = f'user_{user.id}'
             await self.channel_layer.group_add(self.group_name, self.channel_name)
+            await presencia.conectar(user.id)
+            self.usuario_id = user.id
             await self.accept()
         else:
             await self.close()
@@ -14,6 +19,28 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
     async def disconnect(self, close_code):
         if hasattr(self, 'group_name'):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if hasattr(self, 'usuario_id'):
+            await presencia.desconectar(self.usuario_id)
 
     async def notify(self, event):
         await self.send_json(event.get('data', {}))
+
+
+class CalendarioConsumer(AsyncJsonWebsocketConsumer):
+    """Cambios de citas en vivo para los calendarios abiertos del staff."""
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user and user.is_authenticated and user.rol != 'PROPIETARIO':
+            await self.channel_layer.group_add(GRUPO_CALENDARIO, self.channel_name)
+            self.group_name = GRUPO_CALENDARIO
+            await self.accept()
+        else:
+            await self.close()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def calendario(self, event):
+        await self.send_json(event.get('data', {}))
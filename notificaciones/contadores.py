@@ -0,0 +1,129 @@
+"""
+Contador desnormalizado de notificaciones no leídas por usuario.
+
+El contexto de cada plantilla muestra el número de no leídas; en lugar de
+un ``COUNT`` por render se lee la fila de ``ContadorNoLeidas`` del usuario
+(una búsqueda por clave única). Quien crea o marca notificaciones como
+leídas llama a ``sumar_no_leidas`` dentro de su transacción y el contador
+se ajusta con ``F()``.
+
+No se usa el caché de Django: sin un backend compartido es un caché por
+proceso, y el despachador de notificaciones (otro proceso) no podría
+invalidar la entrada de los workers web.
+
+Si un usuario no tiene fila se inicializa con un ``COUNT`` la primera vez
+que se consulta. Las diferencias por cambios hechos fuera de estas
+funciones (admin, SQL directo) se corrigen con ``reparar_contadores``.
+"""
+
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from autenticacion.models import Usuario
+from .models import ContadorNoLeidas, Notificacion
+
+def contar_no_leidas(usuario_id):
+    """
+    Notificaciones no leídas del usuario (contador, o ``COUNT`` inicial).
+
+    Returns:
+        int
+    """
+    valor = ContadorNoLeidas.objects.filter(usuario_id=usuario_id).values_list('no_leidas', flat=True).first()
+    if valor is None:
+        valor = _inicializar(usuario_id)
+    return valor
+
+
+async def acontar_no_leidas(usuario_id):
+    """Versión asíncrona de ``contar_no_leidas`` (vistas async bajo ASGI)."""
+    valor = await ContadorNoLeidas.objects.filter(usuario_id=usuario_id).values_list('no_leidas', flat=True).afirst()
+    if valor is None:
+        valor = await sync_to_async(_inicializar)(usuario_id)
+    return valor
+
+
+async def arestar_leida(usuario_id):
+    """
+    Resta una no leída al contador del usuario (autocommit, sin transacción).
+
+    Lo usan las vistas async después de marcar la notificación con un
+    ``UPDATE`` condicional, así que se llama una sola vez por notificación.
+    """
+    await ContadorNoLeidas.objects.filter(usuario_id=usuario_id).aupdate(no_leidas=F('no_leidas') - 1)
+
+
+def _inicializar(usuario_id):
+    # En la misma transacción de escritura que el INSERT, para que ninguna
+    # notificación quede entre el COUNT y la creación del contador
+    try:
+        with transaction.atomic():
+            valor = Notificacion.objects.filter(usuario_id=usuario_id, leida=False).count()
+            contador, _ = ContadorNoLeidas.objects.get_or_create(usuario_id=usuario_id, defaults={'no_leidas': valor})
+    except IntegrityError:
+        # El usuario no existe (o se eliminó); no hay nada que contar
+        return 0
+    return contador.no_leidas
+
+
+def sumar_no_leidas(cambios):
+    """
+    Ajusta los contadores de varios usuarios.
+
+    Hace un ``UPDATE`` por cada valor distinto de cambio (normalmente uno,
+    ej: +1 a todos los destinatarios de un lote). Los usuarios sin fila se
+    omiten: su contador se inicializa desde la tabla al consultarlo.
+
+    Args:
+        cambios: Diccionario {usuario_id: cantidad a sumar (negativa para restar)}
+    """
+    por_valor = defaultdict(list)
+    for usuario_id, cantidad in cambios.items():
+        if cantidad:
+            por_valor[cantidad].append(usuario_id)
+    if not por_valor:
+        return
+    for cantidad, usuario_ids in por_valor.items():
+        ContadorNoLeidas.objects.filter(usuario_id__in=usuario_ids).update(no_leidas=F('no_leidas') + cantidad)
+
+
+def reparar_contadores(aplicar=True):
+    """
+    Recalcula todos los contadores y corrige los que difieren.
+
+    Un solo agregado sobre usuarios y sus notificaciones no leídas, una
+    consulta de contadores, un ``bulk_update`` y un ``bulk_create``.
+
+    Args:
+        aplicar: False para solo reportar las diferencias
+
+    Returns:
+        list: Tuplas (usuario_id, valor guardado o None, valor real) corregidas
+    """
+    with transaction.atomic():
+        reales = dict(
+            Usuario.objects.annotate(
+                total=Count('notificaciones', filter=Q(notificaciones__leida=False))
+            ).values_list('pk', 'total')
+        )
+        guardados = {c.usuario_id: c for c in ContadorNoLeidas.objects.all()}
+
+        diferencias = []
+        actualizar, crear = [], []
+        for usuario_id, total in reales.items():
+            contador = guardados.get(usuario_id)
+            if contador is None:
+                diferencias.append((usuario_id, None, total))
+                crear.append(ContadorNoLeidas(usuario_id=usuario_id, no_leidas=total))
+            elif contador.no_leidas != total:
+                diferencias.append((usuario_id, contador.no_leidas, total))
+                contador.no_leidas = total
+                actualizar.append(contador)
+
+        if aplicar:
+            ContadorNoLeidas.objects.bulk_update(actualizar, ['no_leidas'], batch_size=500)
+            ContadorNoLeidas.objects.bulk_create(crear, batch_size=500)
+    return diferencias
@@ -1,8 +1,7 @@
-from .models import Notificacion
+from .contadores import contar_no_leidas
 
 
 def notificaciones_unread(request):
     if getattr(request, 'user', None) and request.user.is_authenticated:
-        count = Notificacion.objects.filter(usuario=request.user, leida=False).count()
-        return {'notificaciones_unread': count}
+        return {'notificaciones_unread': contar_no_leidas(request.user.id)}
     return {'notificaciones_unread': 0}
@@ -0,0 +1,51 @@
+"""
+Comando de Django que archiva las notificaciones antiguas.
+
+Mueve las notificaciones (y sus logs) con más de
+``NOTIFICACIONES_RETENCION_MESES`` meses a archivos JSONL comprimidos por
+mes en ``MEDIA_ROOT/archivo_notificaciones/`` y las borra por lotes.
+
+Uso:
+    python manage.py archivar_notificaciones
+    python manage.py archivar_notificaciones --meses 6 --lote 1000
+    python manage.py archivar_notificaciones --dry-run
+
+Pensado para ejecutarse una vez al día (cron o systemd timer).
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from notificaciones.archivo import TAMANO_LOTE, archivar, fecha_corte
+from notificaciones.models import Notificacion
+
+
+class Command(BaseCommand):
+    help = 'Archiva en JSONL comprimido por mes las notificaciones fuera del período de retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, help='Meses completos que se conservan (por defecto el de settings)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Notificaciones por lote')
+        parser.add_argument('--dry-run', action='store_true', help='Solo cuenta lo que se archivaría')
+
+    def handle(self, *args, **options):
+        if options['meses'] is not None and options['meses'] < 0:
+            raise CommandError('--meses no puede ser negativo')
+        corte = fecha_corte(options['meses'])
+        self.stdout.write(f'Archivando notificaciones anteriores al {timezone.localtime(corte):%d/%m/%Y}')
+
+        if options['dry_run']:
+            total = Notificacion.objects.filter(fecha_envio__lt=corte).count()
+            self.stdout.write(self.style.WARNING(f'Modo DRY RUN: se archivarían {total} notificaciones'))
+            return
+
+        inicio = time.perf_counter()
+        archivadas = archivar(options['meses'], max(1, options['lote']))
+        duracion = time.perf_counter() - inicio
+        for (anio, mes), cantidad in sorted(archivadas.items()):
+            self.stdout.write(f'  {anio:04d}-{mes:02d}: {cantidad}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Notificaciones archivadas: {sum(archivadas.values())} en {duracion:.2f}s'
+        ))
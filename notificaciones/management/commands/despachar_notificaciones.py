@@ -0,0 +1,68 @@
+"""
+Comando de Django que despacha la bandeja de salida de notificaciones.
+
+Los eventos de cita (creación, cancelación, reprogramación...) se guardan
+en ``EventoSalida`` dentro de la transacción de la petición; este comando
+los convierte en notificaciones, logs y envíos por websocket, en lotes.
+Cuando la bandeja queda vacía también crea los resúmenes de avisos cuya
+ventana ya cerró (``despachar_resumenes``).
+
+Uso:
+    python manage.py despachar_notificaciones              # vacía la bandeja y termina
+    python manage.py despachar_notificaciones --continuo   # trabajador permanente
+    python manage.py despachar_notificaciones --continuo --lote 500 --intervalo 0.5
+
+En producción se ejecuta con ``--continuo`` junto al servidor (systemd,
+supervisor o un contenedor aparte).
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from notificaciones.presencia import estadisticas
+from notificaciones.services import TAMANO_LOTE, despachar_resumenes, despachar_salida
+
+
+class Command(BaseCommand):
+    help = 'Despacha en lotes las notificaciones pendientes de la bandeja de salida'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Eventos por lote')
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='Sigue esperando eventos nuevos en lugar de terminar al vaciar la bandeja',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=1.0,
+            help='Segundos de espera cuando la bandeja está vacía (con --continuo)',
+        )
+
+    def handle(self, *args, **options):
+        lote = max(1, options['lote'])
+        total = resumenes = 0
+        inicio = time.perf_counter()
+        try:
+            while True:
+                procesados = despachar_salida(lote)
+                total += procesados
+                if procesados:
+                    continue
+                resumenes += despachar_resumenes()
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(
+            self.style.SUCCESS(f'Eventos despachados: {total} en {duracion:.2f}s; resúmenes: {resumenes}')
+        )
+        self.stdout.write(
+            f"Envíos por websocket: {estadisticas['enviados']} "
+            f"(omitidos por usuarios sin conexión: {estadisticas['omitidos']})"
+        )
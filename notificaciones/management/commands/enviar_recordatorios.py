@@ -1,31 +1,42 @@
 """
 Comando de Django para enviar recordatorios automáticos de citas.
 
-Este comando debe ejecutarse diariamente (mediante cron o Task Scheduler)
-para enviar recordatorios a los propietarios 24 horas antes de sus citas.
+Genera un recordatorio por cita y horizonte (por defecto 24 y 2 horas
+antes, ver ``RECORDATORIOS_HORIZONTES_HORAS``). Debe ejecutarse con
+frecuencia, por ejemplo cada 15 minutos, para que el recordatorio de 2
+horas llegue a tiempo.
+
+Las citas se procesan en lotes y cada lote guarda un punto de control: si
+el proceso se interrumpe, la siguiente ejecución continúa donde quedó sin
+duplicar recordatorios.
 
 Uso:
     python manage.py enviar_recordatorios
+    python manage.py enviar_recordatorios --horizontes 48 24 2 --batch-size 1000
+    python manage.py enviar_recordatorios --dry-run
+    python manage.py enviar_recordatorios --reiniciar   # descarta una ejecución interrumpida
 
 Configuración recomendada (cron):
-    0 9 * * * cd /path/to/project && python manage.py enviar_recordatorios
-    
+    */15 * * * * cd /path/to/project && python manage.py enviar_recordatorios
+
 Configuración recomendada (Windows Task Scheduler):
-    Ejecutar diariamente a las 9:00 AM
+    Ejecutar cada 15 minutos
     Acción: python manage.py enviar_recordatorios
-    Directorio: C:\path\to\project
+    Directorio: C:\\path\\to\\project
 """
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from datetime import timedelta
-from citas.models import Cita
-from notificaciones.models import Notificacion, PreferenciasNotificacion
-from notificaciones.services import crear_evento_cita
+
+from notificaciones.models import EjecucionRecordatorios
+from notificaciones.presencia import estadisticas
+from notificaciones.recordatorios import (
+    TAMANO_LOTE, finalizar_ejecucion, horizontes_configurados, iniciar_ejecucion, procesar_lote,
+)
 
 
 class Command(BaseCommand):
-    help = 'Envía recordatorios automáticos de citas programadas para mañana'
+    help = 'Envía recordatorios automáticos de las citas próximas (por horizontes, en lotes reanudables)'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -33,158 +44,75 @@ class Command(BaseCommand):
             action='store_true',
             help='Muestra las citas que recibirían recordatorio sin enviarlos',
         )
+        parser.add_argument(
+            '--horizontes',
+            nargs='+',
+            type=int,
+            help='Horas de anticipación de cada recordatorio (por defecto: settings)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TAMANO_LOTE,
+            help='Citas por lote (cada lote es una transacción y un punto de control)',
+        )
+        parser.add_argument(
+            '--reiniciar',
+            action='store_true',
+            help='Descarta la ejecución interrumpida y empieza una nueva',
+        )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
-        
-        # Calcular fecha de mañana
-        hoy = timezone.now().date()
-        manana = hoy + timedelta(days=1)
-        
-        self.stdout.write(
-            self.style.SUCCESS(f'\n=== Enviando recordatorios para citas del {manana} ===\n')
-        )
-        
-        # Buscar citas programadas o confirmadas para mañana
-        citas_manana = Cita.objects.filter(
-            fecha=manana,
-            estado__in=['PROGRAMADA', 'CONFIRMADA']
-        ).select_related('propietario', 'mascota', 'servicio', 'veterinario')
-        
-        total_citas = citas_manana.count()
-        recordatorios_enviados = 0
-        recordatorios_omitidos = 0
-        
-        if total_citas == 0:
-            self.stdout.write(
-                self.style.WARNING('No hay citas programadas para mañana.')
-            )
-            return
-        
-        self.stdout.write(f'Encontradas {total_citas} cita(s) para mañana.\n')
-        
-        for cita in citas_manana:
-            propietario = cita.propietario
-            
-            # Verificar si el propietario tiene usuario asociado
-            if not propietario.usuario_id:
-                self.stdout.write(
-                    self.style.WARNING(
-                        f'  ⚠ Propietario {propietario.nombre} no tiene usuario asociado. '
-                        f'Cita #{cita.id} omitida.'
-                    )
-                )
-                recordatorios_omitidos += 1
-                continue
-            
-            usuario = propietario.usuario
-            
-            # Verificar preferencias de notificación
-            try:
-                preferencias = PreferenciasNotificacion.objects.get(usuario=usuario)
-                if not preferencias.recordatorios:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'  ⚠ {usuario.get_full_name()} tiene recordatorios desactivados. '
-                            f'Cita #{cita.id} omitida.'
-                        )
-                    )
-                    recordatorios_omitidos += 1
-                    continue
-                canal = preferencias.canal_preferido
-            except PreferenciasNotificacion.DoesNotExist:
-                # Si no tiene preferencias, usar EMAIL por defecto y enviar
-                canal = 'EMAIL'
-            
-            # Verificar si ya existe un recordatorio para esta cita
-            recordatorio_existente = Notificacion.objects.filter(
-                usuario=usuario,
-                cita=cita,
-                tipo='RECORDATORIO'
-            ).exists()
-            
-            if recordatorio_existente:
-                self.stdout.write(
-                    self.style.WARNING(
-                        f'  ⚠ Ya existe recordatorio para cita #{cita.id}. Omitida.'
-                    )
-                )
-                recordatorios_omitidos += 1
-                continue
-            
-            # Preparar mensaje del recordatorio
-            asunto = f'Recordatorio: Cita mañana a las {cita.hora.strftime("%H:%M")}'
-            mensaje = (
-                f'Hola {propietario.nombre},\n\n'
-                f'Te recordamos que tienes una cita programada para mañana:\n\n'
-                f'📅 Fecha: {cita.fecha.strftime("%d/%m/%Y")}\n'
-                f'🕐 Hora: {cita.hora.strftime("%H:%M")}\n'
-                f'🐾 Mascota: {cita.mascota.nombre}\n'
-                f'💉 Servicio: {cita.servicio.get_nombre_display()}\n'
-                f'👨‍⚕️ Veterinario: Dr. {cita.veterinario.get_full_name()}\n\n'
-                f'Por favor, llega 10 minutos antes de tu cita.\n\n'
-                f'Si necesitas reprogramar o cancelar, hazlo con al menos 6 horas de anticipación.\n\n'
-                f'¡Te esperamos!\n'
-                f'Equipo MyDOG'
-            )
-            
-            if dry_run:
+        horizontes = sorted(options['horizontes'] or horizontes_configurados())
+        if any(horas <= 0 for horas in horizontes):
+            raise CommandError('Los horizontes deben ser horas positivas')
+        tamano_lote = max(1, options['batch_size'])
+
+        if dry_run:
+            # Sin punto de control persistente
+            ejecucion = EjecucionRecordatorios(fecha_referencia=timezone.now(), horizontes=horizontes)
+        else:
+            ejecucion = iniciar_ejecucion(horizontes, reiniciar=options['reiniciar'])
+            if ejecucion.ultima_cita_id:
+                self.stdout.write(self.style.WARNING(
+                    f'Reanudando la ejecución del {timezone.localtime(ejecucion.fecha_referencia):%d/%m/%Y %H:%M} '
+                    f'desde la cita #{ejecucion.ultima_cita_id}'
+                ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n=== Recordatorios (horizontes: {", ".join(f"{h} h" for h in horizontes)}) ===\n'
+        ))
+
+        leidas = enviados = omitidos = 0
+        while True:
+            cantidad, nuevos, omitidas = procesar_lote(ejecucion, tamano_lote, dry_run=dry_run)
+            if not cantidad:
+                break
+            leidas += cantidad
+            enviados += len(nuevos)
+            omitidos += omitidas
+            for fila, horizonte in nuevos:
+                prefijo = '[DRY RUN] ' if dry_run else ''
                 self.stdout.write(
-                    self.style.SUCCESS(
-                        f'  ✓ [DRY RUN] Recordatorio para {usuario.get_full_name()} - '
-                        f'Cita #{cita.id} ({cita.mascota.nombre} - {cita.servicio.get_nombre_display()})'
-                    )
+                    f"  ✓ {prefijo}Cita #{fila['id']} ({fila['mascota__nombre']}) "
+                    f"{fila['fecha']:%d/%m/%Y} {fila['hora']:%H:%M} - {horizonte} h"
                 )
-                recordatorios_enviados += 1
-            else:
-                # Crear notificación de recordatorio
-                try:
-                    notificacion = Notificacion.objects.create(
-                        usuario=usuario,
-                        actor=usuario,  # El sistema actúa como el usuario
-                        tipo='RECORDATORIO',
-                        asunto=asunto,
-                        mensaje=mensaje,
-                        cita=cita,
-                        canal_enviado=canal
-                    )
-                    
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'  ✓ Recordatorio enviado a {usuario.get_full_name()} - '
-                            f'Cita #{cita.id} ({cita.mascota.nombre} - {cita.servicio.get_nombre_display()}) '
-                            f'[Canal: {canal}]'
-                        )
-                    )
-                    recordatorios_enviados += 1
-                    
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(
-                            f'  ✗ Error al enviar recordatorio para cita #{cita.id}: {str(e)}'
-                        )
-                    )
-                    recordatorios_omitidos += 1
-        
-        # Resumen
+
+        if not dry_run:
+            finalizar_ejecucion(ejecucion)
+
         self.stdout.write('\n' + '=' * 60)
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'\n📊 Resumen:\n'
-                f'  • Total de citas mañana: {total_citas}\n'
-                f'  • Recordatorios enviados: {recordatorios_enviados}\n'
-                f'  • Recordatorios omitidos: {recordatorios_omitidos}\n'
-            )
-        )
-        
+        self.stdout.write(self.style.SUCCESS(
+            f'\n📊 Resumen:\n'
+            f'  • Citas revisadas: {leidas}\n'
+            f'  • Recordatorios enviados: {enviados}\n'
+            f'  • Omitidos (ya enviados o desactivados): {omitidos}\n'
+            f"  • Envíos por websocket: {estadisticas['enviados']} "
+            f"(omitidos sin conexión: {estadisticas['omitidos']})\n"
+        ))
         if dry_run:
-            self.stdout.write(
-                self.style.WARNING(
-                    '\n⚠ Modo DRY RUN: No se enviaron recordatorios reales.\n'
-                    'Ejecuta sin --dry-run para enviar los recordatorios.\n'
-                )
-            )
-        else:
-            self.stdout.write(
-                self.style.SUCCESS('\n✅ Proceso completado exitosamente.\n')
-            )
+            self.stdout.write(self.style.WARNING(
+                '\n⚠ Modo DRY RUN: No se enviaron recordatorios reales.\n'
+                'Ejecuta sin --dry-run para enviar los recordatorios.\n'
+            ))
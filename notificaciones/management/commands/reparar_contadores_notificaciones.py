@@ -0,0 +1,43 @@
+"""
+Comando de Django para reparar los contadores de notificaciones no leídas.
+
+Recalcula en lote el número de no leídas de cada usuario y corrige los
+contadores (``ContadorNoLeidas``) que difieren, por ejemplo tras borrar o
+editar notificaciones desde el admin o directamente en la base de datos.
+
+Uso:
+    python manage.py reparar_contadores_notificaciones
+    python manage.py reparar_contadores_notificaciones --dry-run
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from notificaciones.contadores import reparar_contadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de notificaciones no leídas y corrige los que difieren'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra las diferencias sin corregirlas',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        inicio = time.perf_counter()
+        diferencias = reparar_contadores(aplicar=not dry_run)
+        duracion = time.perf_counter() - inicio
+
+        for usuario_id, guardado, real in diferencias:
+            guardado = 'sin contador' if guardado is None else guardado
+            self.stdout.write(f'  Usuario #{usuario_id}: {guardado} -> {real}')
+
+        accion = 'por corregir' if dry_run else 'corregidos'
+        self.stdout.write(
+            self.style.SUCCESS(f'Contadores {accion}: {len(diferencias)} en {duracion:.2f}s')
+        )
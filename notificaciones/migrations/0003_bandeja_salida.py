@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0006_token_calendario'),
+        ('notificaciones', '0002_remove_notificacion_cita_id_notificacion_actor_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoSalida',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('CONFIRMACION', 'Confirmación'), ('RECORDATORIO', 'Recordatorio'), ('CANCELACION', 'Cancelación'), ('RESULTADO', 'Resultado disponible'), ('SISTEMA', 'Notificación del sistema')], max_length=15, verbose_name='Tipo de notificación')),
+                ('asunto', models.CharField(max_length=200, verbose_name='Asunto')),
+                ('mensaje', models.TextField(verbose_name='Mensaje')),
+                ('destinatarios', models.JSONField(default=list, help_text='IDs de usuario', verbose_name='Destinatarios')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('fecha_despacho', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de despacho')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos fallidos')),
+                ('error', models.TextField(blank=True, verbose_name='Último error')),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Actor')),
+                ('cita', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='citas.cita', verbose_name='Cita relacionada')),
+            ],
+            options={
+                'verbose_name': 'Evento en bandeja de salida',
+                'verbose_name_plural': 'Bandeja de salida',
+                'indexes': [models.Index(condition=models.Q(('fecha_despacho__isnull', True)), fields=['id'], name='salida_pendientes_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autenticacion', '0001_initial'),
+        ('notificaciones', '0003_bandeja_salida'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorNoLeidas',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='contador_no_leidas', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+                ('no_leidas', models.IntegerField(default=0, verbose_name='No leídas')),
+            ],
+            options={
+                'verbose_name': 'Contador de no leídas',
+                'verbose_name_plural': 'Contadores de no leídas',
+            },
+        ),
+    ]
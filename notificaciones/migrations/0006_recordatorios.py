@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0006_token_calendario'),
+        ('notificaciones', '0005_indices_bandeja'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EjecucionRecordatorios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_referencia', models.DateTimeField(verbose_name='Hora de referencia')),
+                ('horizontes', models.JSONField(default=list, verbose_name='Horizontes (horas)')),
+                ('ultima_cita_id', models.PositiveIntegerField(default=0, verbose_name='Última cita procesada')),
+                ('enviados', models.PositiveIntegerField(default=0, verbose_name='Recordatorios enviados')),
+                ('omitidos', models.PositiveIntegerField(default=0, verbose_name='Citas omitidas')),
+                ('fecha_inicio', models.DateTimeField(auto_now_add=True, verbose_name='Inicio')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+            ],
+            options={
+                'verbose_name': 'Ejecución de recordatorios',
+                'verbose_name_plural': 'Ejecuciones de recordatorios',
+                'ordering': ['-fecha_inicio'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecordatorioEnviado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('horizonte_horas', models.PositiveSmallIntegerField(verbose_name='Horizonte (horas)')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de envío')),
+                ('cita', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recordatorios_enviados', to='citas.cita', verbose_name='Cita')),
+                ('notificacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='notificaciones.notificacion', verbose_name='Notificación')),
+            ],
+            options={
+                'verbose_name': 'Recordatorio enviado',
+                'verbose_name_plural': 'Recordatorios enviados',
+                'constraints': [models.UniqueConstraint(fields=('cita', 'horizonte_horas'), name='recordatorio_unico_por_horizonte')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificaciones', '0006_recordatorios'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PresenciaUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('proceso', models.CharField(max_length=100, verbose_name='Proceso')),
+                ('conexiones', models.PositiveIntegerField(default=0, verbose_name='Conexiones')),
+                ('expira', models.DateTimeField(verbose_name='Vence')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='presencias', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Presencia de usuario',
+                'verbose_name_plural': 'Presencias de usuarios',
+                'indexes': [models.Index(fields=['usuario', 'expira'], name='presencia_usuario_expira_idx')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'proceso'), name='presencia_usuario_proceso')],
+            },
+        ),
+    ]
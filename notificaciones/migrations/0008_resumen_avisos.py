@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0006_token_calendario'),
+        ('notificaciones', '0007_presencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacion',
+            name='detalle',
+            field=models.JSONField(blank=True, help_text='Eventos incluidos en el resumen (cita, tipo, asunto y fecha)', null=True, verbose_name='Detalle'),
+        ),
+        migrations.AddField(
+            model_name='preferencianotificacion',
+            name='resumen_minutos',
+            field=models.PositiveIntegerField(choices=[(0, 'Sin agrupar'), (15, 'Cada 15 minutos'), (60, 'Cada hora'), (240, 'Cada 4 horas'), (1440, 'Una vez al día')], default=0, help_text='Agrupa los avisos de citas de cada ventana en una sola notificación', verbose_name='Resumen de avisos de citas'),
+        ),
+        migrations.AlterField(
+            model_name='eventosalida',
+            name='tipo',
+            field=models.CharField(choices=[('CONFIRMACION', 'Confirmación'), ('RECORDATORIO', 'Recordatorio'), ('CANCELACION', 'Cancelación'), ('RESULTADO', 'Resultado disponible'), ('SISTEMA', 'Notificación del sistema'), ('RESUMEN', 'Resumen de avisos')], max_length=15, verbose_name='Tipo de notificación'),
+        ),
+        migrations.AlterField(
+            model_name='notificacion',
+            name='tipo',
+            field=models.CharField(choices=[('CONFIRMACION', 'Confirmación'), ('RECORDATORIO', 'Recordatorio'), ('CANCELACION', 'Cancelación'), ('RESULTADO', 'Resultado disponible'), ('SISTEMA', 'Notificación del sistema'), ('RESUMEN', 'Resumen de avisos')], max_length=15, verbose_name='Tipo de notificación'),
+        ),
+        migrations.CreateModel(
+            name='EventoResumen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=15, verbose_name='Tipo')),
+                ('asunto', models.CharField(max_length=200, verbose_name='Asunto')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+                ('cita', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='citas.cita', verbose_name='Cita')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos_resumen', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Evento en resumen',
+                'verbose_name_plural': 'Eventos en resumen',
+                'indexes': [models.Index(fields=['usuario', 'fecha'], name='evento_resumen_usuario_idx')],
+            },
+        ),
+    ]
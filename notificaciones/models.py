@@ -21,6 +21,14 @@ class PreferenciaNotificacion(models.Model):
         ('SMS', 'SMS'),
         ('WHATSAPP', 'WhatsApp'),
     ]
+
+    RESUMEN_CHOICES = [
+        (0, 'Sin agrupar'),
+        (15, 'Cada 15 minutos'),
+        (60, 'Cada hora'),
+        (240, 'Cada 4 horas'),
+        (1440, 'Una vez al día'),
+    ]
     
     usuario = models.OneToOneField(
         'autenticacion.Usuario',
@@ -61,6 +69,13 @@ class PreferenciaNotificacion(models.Model):
         verbose_name='Resultados',
         help_text='Recibir notificaciones de resultados disponibles'
     )
+
+    resumen_minutos = models.PositiveIntegerField(
+        default=0,
+        choices=RESUMEN_CHOICES,
+        verbose_name='Resumen de avisos de citas',
+        help_text='Agrupa los avisos de citas de cada ventana en una sola notificación'
+    )
     
     class Meta:
         verbose_name = 'Preferencia de notificación'
@@ -83,6 +98,7 @@ class Notificacion(models.Model):
         ('CANCELACION', 'Cancelación'),
         ('RESULTADO', 'Resultado disponible'),
         ('SISTEMA', 'Notificación del sistema'),
+        ('RESUMEN', 'Resumen de avisos'),
     ]
     
     usuario = models.ForeignKey(
@@ -156,11 +172,27 @@ class Notificacion(models.Model):
         related_name='notificaciones',
         verbose_name='Cita relacionada'
     )
+
+    # Eventos agrupados de una notificación RESUMEN
+    detalle = models.JSONField(
+        null=True,
+        blank=True,
+        verbose_name='Detalle',
+        help_text='Eventos incluidos en el resumen (cita, tipo, asunto y fecha)'
+    )
     
     class Meta:
         verbose_name = 'Notificación'
         verbose_name_plural = 'Notificaciones'
         ordering = ['-fecha_envio']
+        indexes = [
+            # Bandejas paginadas por (fecha_envio, id); en SQLite el id (rowid)
+            # va implícito al final de cada índice
+            models.Index(fields=['usuario', 'fecha_envio'], name='notif_usuario_fecha_idx'),
+            models.Index(fields=['usuario', 'leida'], name='notif_usuario_leida_idx'),
+            models.Index(fields=['tipo', 'fecha_envio'], name='notif_tipo_fecha_idx'),
+            models.Index(fields=['fecha_envio'], name='notif_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"{self.usuario.get_full_name()} - {self.get_tipo_display()} - {self.fecha_envio.strftime('%d/%m/%Y %H:%M')}"
@@ -168,10 +200,38 @@ class Notificacion(models.Model):
     def marcar_como_leida(self):
         """Marca la notificación como leída."""
         from django.utils import timezone
+        from .contadores import sumar_no_leidas
         if not self.leida:
             self.leida = True
             self.fecha_lectura = timezone.now()
             self.save()
+            sumar_no_leidas({self.usuario_id: -1})
+
+
+class ContadorNoLeidas(models.Model):
+    """
+    Número de notificaciones no leídas de cada usuario (desnormalizado).
+
+    Evita un ``COUNT`` en cada página renderizada; lo mantienen
+    ``notificaciones.contadores`` y se corrige con el comando
+    ``reparar_contadores_notificaciones``.
+    """
+
+    usuario = models.OneToOneField(
+        'autenticacion.Usuario',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='contador_no_leidas',
+        verbose_name='Usuario'
+    )
+    no_leidas = models.IntegerField(default=0, verbose_name='No leídas')
+
+    class Meta:
+        verbose_name = 'Contador de no leídas'
+        verbose_name_plural = 'Contadores de no leídas'
+
+    def __str__(self):
+        return f"{self.usuario_id}: {self.no_leidas}"
 
 
 class NotificacionLog(models.Model):
@@ -192,3 +252,188 @@ class NotificacionLog(models.Model):
         verbose_name = 'Log de notificación'
         verbose_name_plural = 'Logs de notificaciones'
         ordering = ['-fecha']
+
+
+class EventoSalida(models.Model):
+    """
+    Bandeja de salida (outbox) de eventos de cita.
+
+    Se escribe en la misma transacción que el cambio de la cita; el comando
+    ``despachar_notificaciones`` la vacía en lotes creando las
+    notificaciones, sus logs y los envíos por websocket.
+    """
+
+    actor = models.ForeignKey(
+        'autenticacion.Usuario',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Actor'
+    )
+    cita = models.ForeignKey(
+        'citas.Cita',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Cita relacionada'
+    )
+    tipo = models.CharField(max_length=15, choices=Notificacion.TIPO_CHOICES, verbose_name='Tipo de notificación')
+    asunto = models.CharField(max_length=200, verbose_name='Asunto')
+    mensaje = models.TextField(verbose_name='Mensaje')
+    destinatarios = models.JSONField(default=list, verbose_name='Destinatarios', help_text='IDs de usuario')
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')
+    fecha_despacho = models.DateTimeField(null=True, blank=True, verbose_name='Fecha de despacho')
+    intentos = models.PositiveSmallIntegerField(default=0, verbose_name='Intentos fallidos')
+    error = models.TextField(blank=True, verbose_name='Último error')
+
+    class Meta:
+        verbose_name = 'Evento en bandeja de salida'
+        verbose_name_plural = 'Bandeja de salida'
+        indexes = [
+            # Solo los pendientes: el índice no crece con el historial despachado
+            models.Index(
+                fields=['id'],
+                condition=models.Q(fecha_despacho__isnull=True),
+                name='salida_pendientes_idx',
+            ),
+        ]
+
+    def __str__(self):
+        estado = 'despachado' if self.fecha_despacho else 'pendiente'
+        return f"{self.asunto} ({estado})"
+
+
+class RecordatorioEnviado(models.Model):
+    """
+    Recordatorio de cita ya generado para un horizonte (ej: 24 h, 2 h antes).
+
+    La restricción única evita enviar dos veces el mismo recordatorio,
+    incluso si dos ejecuciones de ``enviar_recordatorios`` se cruzan.
+    """
+
+    cita = models.ForeignKey(
+        'citas.Cita',
+        on_delete=models.CASCADE,
+        related_name='recordatorios_enviados',
+        verbose_name='Cita'
+    )
+    horizonte_horas = models.PositiveSmallIntegerField(verbose_name='Horizonte (horas)')
+    notificacion = models.ForeignKey(
+        Notificacion,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Notificación'
+    )
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de envío')
+
+    class Meta:
+        verbose_name = 'Recordatorio enviado'
+        verbose_name_plural = 'Recordatorios enviados'
+        constraints = [
+            models.UniqueConstraint(fields=['cita', 'horizonte_horas'], name='recordatorio_unico_por_horizonte'),
+        ]
+
+    def __str__(self):
+        return f"Cita #{self.cita_id} - {self.horizonte_horas} h"
+
+
+class EjecucionRecordatorios(models.Model):
+    """
+    Punto de control de una ejecución de ``enviar_recordatorios``.
+
+    Cada lote avanza ``ultima_cita_id`` en la misma transacción que crea sus
+    recordatorios; si el proceso se interrumpe, la siguiente ejecución
+    continúa desde ahí con la misma hora de referencia.
+    """
+
+    fecha_referencia = models.DateTimeField(verbose_name='Hora de referencia')
+    horizontes = models.JSONField(default=list, verbose_name='Horizontes (horas)')
+    ultima_cita_id = models.PositiveIntegerField(default=0, verbose_name='Última cita procesada')
+    enviados = models.PositiveIntegerField(default=0, verbose_name='Recordatorios enviados')
+    omitidos = models.PositiveIntegerField(default=0, verbose_name='Citas omitidas')
+    fecha_inicio = models.DateTimeField(auto_now_add=True, verbose_name='Inicio')
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name='Fin')
+
+    class Meta:
+        verbose_name = 'Ejecución de recordatorios'
+        verbose_name_plural = 'Ejecuciones de recordatorios'
+        ordering = ['-fecha_inicio']
+
+    def __str__(self):
+        estado = 'completa' if self.fecha_fin else f'en curso (cita #{self.ultima_cita_id})'
+        return f"{self.fecha_referencia:%d/%m/%Y %H:%M} - {estado}"
+
+
+class PresenciaUsuario(models.Model):
+    """
+    Sockets de notificaciones abiertos por un usuario en un proceso.
+
+    La mantiene ``notificaciones.presencia`` desde ``NotificationConsumer``;
+    cada proceso renueva ``expira`` con un latido periódico, así que las
+    filas de un proceso que murió sin desconectar dejan de contar solas.
+    """
+
+    usuario = models.ForeignKey(
+        'autenticacion.Usuario',
+        on_delete=models.CASCADE,
+        related_name='presencias',
+        verbose_name='Usuario'
+    )
+    proceso = models.CharField(max_length=100, verbose_name='Proceso')
+    conexiones = models.PositiveIntegerField(default=0, verbose_name='Conexiones')
+    expira = models.DateTimeField(verbose_name='Vence')
+
+    class Meta:
+        verbose_name = 'Presencia de usuario'
+        verbose_name_plural = 'Presencias de usuarios'
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'proceso'], name='presencia_usuario_proceso'),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', 'expira'], name='presencia_usuario_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} @ {self.proceso}: {self.conexiones}"
+
+
+class EventoResumen(models.Model):
+    """
+    Aviso de cita en espera de entrar en el resumen de un usuario.
+
+    El despachador los guarda en lugar de crear una notificación cuando el
+    usuario tiene ``resumen_minutos``; ``despachar_resumenes`` los convierte
+    en una notificación RESUMEN al cerrar la ventana y los borra.
+    """
+
+    usuario = models.ForeignKey(
+        'autenticacion.Usuario',
+        on_delete=models.CASCADE,
+        related_name='eventos_resumen',
+        verbose_name='Usuario'
+    )
+    cita = models.ForeignKey(
+        'citas.Cita',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Cita'
+    )
+    tipo = models.CharField(max_length=15, verbose_name='Tipo')
+    asunto = models.CharField(max_length=200, verbose_name='Asunto')
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name='Fecha')
+
+    class Meta:
+        verbose_name = 'Evento en resumen'
+        verbose_name_plural = 'Eventos en resumen'
+        indexes = [
+            models.Index(fields=['usuario', 'fecha'], name='evento_resumen_usuario_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id}: {self.asunto}"
@@ -0,0 +1,81 @@
+"""
+Paginación por cursor (keyset) de las bandejas de notificaciones.
+
+Las listas se ordenan por (fecha_envio, id) descendente y cada página
+continúa después de la última fila de la anterior, en lugar de usar
+``OFFSET``: con los índices de ``Notificacion`` la página N cuesta lo
+mismo que la primera.
+
+El cursor es opaco para el cliente: ``<microsegundos desde epoch>-<id>``.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+TAMANO_PAGINA = 20
+ORDEN = ('-fecha_envio', '-id')
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def codificar_cursor(notificacion):
+    microsegundos = (notificacion.fecha_envio - _EPOCH) // timedelta(microseconds=1)
+    return f'{microsegundos}-{notificacion.id}'
+
+
+def parsear_cursor(cursor):
+    """
+    Convierte un cursor en (fecha_envio, id).
+
+    Returns:
+        tuple | None: None si el cursor es inválido
+    """
+    try:
+        microsegundos, pk = (int(parte) for parte in cursor.split('-'))
+    except (AttributeError, ValueError):
+        return None
+    if microsegundos < 0 or pk <= 0:
+        return None
+    return _EPOCH + timedelta(microseconds=microsegundos), pk
+
+
+def despues_de(notificaciones, cursor):
+    """Notificaciones ordenadas que siguen al cursor (todas si no hay cursor)."""
+    notificaciones = notificaciones.order_by(*ORDEN)
+    if not cursor:
+        return notificaciones
+    fecha_envio, pk = cursor
+    # El rango sobre fecha_envio permite recorrer el índice desde el cursor
+    return notificaciones.filter(
+        Q(fecha_envio__lt=fecha_envio) | Q(fecha_envio=fecha_envio, id__lt=pk),
+        fecha_envio__lte=fecha_envio,
+    )
+
+
+def pagina(notificaciones, cursor=None, tamano=TAMANO_PAGINA):
+    """
+    Una página de notificaciones, de la más reciente a la más antigua.
+
+    Args:
+        notificaciones: QuerySet filtrado (sin ordenar ni recortar)
+        cursor: Posición devuelta por la página anterior, ya parseada
+        tamano: Filas por página
+
+    Returns:
+        tuple: (lista de notificaciones, cursor de la siguiente página o None)
+    """
+    filas = list(despues_de(notificaciones, cursor)[:tamano + 1])
+    if len(filas) <= tamano:
+        return filas, None
+    filas = filas[:tamano]
+    return filas, codificar_cursor(filas[-1])
+
+
+async def apagina(notificaciones, cursor=None, tamano=TAMANO_PAGINA):
+    """Versión asíncrona de ``pagina`` (vistas async bajo ASGI)."""
+    filas = [n async for n in despues_de(notificaciones, cursor)[:tamano + 1]]
+    if len(filas) <= tamano:
+        return filas, None
+    filas = filas[:tamano]
+    return filas, codificar_cursor(filas[-1])
@@ -0,0 +1,139 @@
+"""
+Registro de presencia de los websockets de notificaciones.
+
+La mayoría de los propietarios nunca tiene un socket abierto, así que un
+``group_send`` por notificación es trabajo perdido. ``NotificationConsumer``
+registra cada conexión aquí y ``push_user``/``push_usuarios`` consultan
+quién está en línea antes de tocar la capa de canales.
+
+Cada proceso lleva en memoria cuántos sockets tiene abiertos por usuario y
+lo refleja en ``PresenciaUsuario`` (una fila por usuario y proceso). Un
+latido renueva el vencimiento de todas sus filas en una sola sentencia
+cada ``INTERVALO_LATIDO`` segundos; si el proceso muere sin desconectar,
+sus filas dejan de contar al vencer (``TTL_PRESENCIA``) y las purga el
+latido de otro proceso. Un latido que falla (ej: SQLite ocupado) se
+registra en el log y se reintenta en el siguiente.
+
+Los envíos hechos y omitidos se acumulan por proceso en ``estadisticas``.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from channels.db import database_sync_to_async
+from django.utils import timezone
+
+from .models import PresenciaUsuario
+
+logger = logging.getLogger('mydog')
+
+# Segundos que una conexión cuenta como activa sin latido
+TTL_PRESENCIA = 90
+
+# Segundos entre latidos de un proceso
+INTERVALO_LATIDO = 30
+
+# Envíos por websocket de este proceso: 'enviados' y 'omitidos' (usuario sin conexión)
+estadisticas = Counter()
+
+_conexiones = Counter()
+_latido = None
+_proceso = None
+
+
+def proceso_actual():
+    """Identificador de este proceso (cambia tras un ``fork``)."""
+    global _proceso
+    pid = os.getpid()
+    if _proceso is None or _proceso[0] != pid:
+        _proceso = (pid, f'{socket.gethostname()}:{pid}:{uuid.uuid4().hex[:8]}')
+    return _proceso[1]
+
+
+def _guardar(conexiones):
+    """Crea o renueva las filas de este proceso para ``{usuario_id: sockets}``."""
+    if not conexiones:
+        return
+    proceso = proceso_actual()
+    expira = timezone.now() + timedelta(seconds=TTL_PRESENCIA)
+    PresenciaUsuario.objects.bulk_create(
+        [
+            PresenciaUsuario(usuario_id=usuario_id, proceso=proceso, conexiones=cantidad, expira=expira)
+            for usuario_id, cantidad in conexiones.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['usuario', 'proceso'],
+        update_fields=['conexiones', 'expira'],
+    )
+
+
+def _quitar(usuario_id):
+    PresenciaUsuario.objects.filter(usuario_id=usuario_id, proceso=proceso_actual()).delete()
+
+
+def _renovar(conexiones):
+    _guardar(conexiones)
+    PresenciaUsuario.objects.filter(expira__lt=timezone.now()).delete()
+
+
+async def conectar(usuario_id):
+    """Registra un socket abierto del usuario en este proceso."""
+    global _latido
+    _conexiones[usuario_id] += 1
+    await database_sync_to_async(_guardar)({usuario_id: _conexiones[usuario_id]})
+
+    loop = asyncio.get_running_loop()
+    if _latido is None or _latido.done() or _latido.get_loop() is not loop:
+        if _latido is not None and _latido.done() and not _latido.cancelled() and _latido.exception():
+            logger.error('El latido de presencia terminó con error; se reinicia', exc_info=_latido.exception())
+        _latido = loop.create_task(_latir())
+
+
+async def desconectar(usuario_id):
+    """Registra el cierre de un socket del usuario en este proceso."""
+    global _latido
+    _conexiones[usuario_id] -= 1
+    if _conexiones[usuario_id] > 0:
+        await database_sync_to_async(_guardar)({usuario_id: _conexiones[usuario_id]})
+    else:
+        del _conexiones[usuario_id]
+        await database_sync_to_async(_quitar)(usuario_id)
+
+    if not _conexiones and _latido is not None:
+        _latido.cancel()
+        _latido = None
+
+
+async def _latir():
+    while _conexiones:
+        await asyncio.sleep(INTERVALO_LATIDO)
+        try:
+            await database_sync_to_async(_renovar)(dict(_conexiones))
+        except Exception:
+            logger.exception('No se pudo renovar la presencia; se reintenta en el siguiente latido')
+
+
+def en_linea(usuario_ids):
+    """
+    Usuarios de ``usuario_ids`` con algún socket abierto en cualquier proceso.
+
+    Returns:
+        set: ids en línea
+    """
+    usuario_ids = set(usuario_ids)
+    if not usuario_ids:
+        return set()
+    return set(
+        PresenciaUsuario.objects.filter(usuario_id__in=usuario_ids, expira__gt=timezone.now())
+        .values_list('usuario_id', flat=True).distinct()
+    )
+
+
+def registrar_envios(enviados, omitidos):
+    estadisticas['enviados'] += enviados
+    estadisticas['omitidos'] += omitidos
@@ -0,0 +1,217 @@
+"""
+Recordatorios automáticos de citas (HU-016).
+
+Cada horizonte (por defecto 24 y 2 horas antes) genera un recordatorio por
+cita. Una cita recibe el recordatorio del horizonte más corto que ya
+alcanzó: una cita agendada con una hora de anticipación recibe solo el de
+2 horas, nunca uno de 24 horas después.
+
+Las citas se procesan en lotes por ``id`` (keyset). Por lote: una consulta
+de citas con propietario, preferencias, mascota, servicio y veterinario;
+una de recordatorios ya enviados; y un ``bulk_create`` por tabla
+(notificaciones, logs, recordatorios enviados). El punto de control de la
+ejecución (``EjecucionRecordatorios``) avanza en la misma transacción que
+el lote, así que una ejecución interrumpida continúa sin duplicar.
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from citas.models import Cita
+from servicios.models import Servicio
+from .contadores import sumar_no_leidas
+from .models import EjecucionRecordatorios, Notificacion, NotificacionLog, RecordatorioEnviado
+from .services import push_usuarios
+
+ESTADOS_CON_RECORDATORIO = ['PROGRAMADA', 'CONFIRMADA']
+TAMANO_LOTE = 500
+
+CAMPOS_CITA = (
+    'id', 'fecha', 'hora',
+    'propietario__nombre', 'propietario__usuario_id',
+    'propietario__usuario__preferencia_notificacion__recordatorios',
+    'propietario__usuario__preferencia_notificacion__canal_preferido',
+    'mascota__nombre', 'servicio__nombre',
+    'veterinario__first_name', 'veterinario__last_name',
+)
+
+_SERVICIOS_DISPLAY = dict(Servicio._meta.get_field('nombre').choices)
+
+
+def horizontes_configurados():
+    """Horizontes en horas, de ``settings.RECORDATORIOS_HORIZONTES_HORAS``."""
+    return sorted(getattr(settings, 'RECORDATORIOS_HORIZONTES_HORAS', [24, 2]))
+
+
+def horizonte_aplicable(inicio, referencia, horizontes):
+    """
+    Horizonte más corto que la cita ya alcanzó.
+
+    Returns:
+        int | None: None si la cita ya pasó o está más lejos que todos
+    """
+    if inicio <= referencia:
+        return None
+    for horas in sorted(horizontes):
+        if inicio <= referencia + timedelta(hours=horas):
+            return horas
+    return None
+
+
+def inicio_cita(fila):
+    return timezone.make_aware(datetime.combine(fila['fecha'], fila['hora']))
+
+
+def _cuando(fecha, referencia):
+    hoy = timezone.localtime(referencia).date()
+    if fecha == hoy:
+        return 'hoy'
+    if fecha == hoy + timedelta(days=1):
+        return 'mañana'
+    return f'el {fecha.strftime("%d/%m/%Y")}'
+
+
+def texto_recordatorio(fila, referencia):
+    """Asunto y mensaje del recordatorio de una cita proyectada con ``CAMPOS_CITA``."""
+    cuando = _cuando(fila['fecha'], referencia)
+    hora = fila['hora'].strftime('%H:%M')
+    servicio = _SERVICIOS_DISPLAY.get(fila['servicio__nombre'], fila['servicio__nombre'])
+    veterinario = f"{fila['veterinario__first_name']} {fila['veterinario__last_name']}".strip()
+    asunto = f'Recordatorio: Cita {cuando} a las {hora}'
+    mensaje = (
+        f"Hola {fila['propietario__nombre']},\n\n"
+        f'Te recordamos que tienes una cita programada {cuando}:\n\n'
+        f'📅 Fecha: {fila["fecha"].strftime("%d/%m/%Y")}\n'
+        f'🕐 Hora: {hora}\n'
+        f"🐾 Mascota: {fila['mascota__nombre']}\n"
+        f'💉 Servicio: {servicio}\n'
+        f'👨‍⚕️ Veterinario: Dr. {veterinario}\n\n'
+        f'Por favor, llega 10 minutos antes de tu cita.\n\n'
+        f'Si necesitas reprogramar o cancelar, hazlo con al menos 6 horas de anticipación.\n\n'
+        f'¡Te esperamos!\n'
+        f'Equipo MyDOG'
+    )
+    return asunto, mensaje
+
+
+def iniciar_ejecucion(horizontes=None, reiniciar=False):
+    """
+    Ejecución a procesar: la última interrumpida (mismos horizontes) o una nueva.
+
+    Args:
+        horizontes: Horizontes en horas (por defecto los de settings)
+        reiniciar: Descarta las ejecuciones interrumpidas
+
+    Returns:
+        EjecucionRecordatorios
+    """
+    horizontes = sorted(horizontes or horizontes_configurados())
+    pendientes = EjecucionRecordatorios.objects.filter(fecha_fin__isnull=True)
+    if reiniciar:
+        pendientes.update(fecha_fin=timezone.now())
+    else:
+        ejecucion = pendientes.filter(horizontes=horizontes).order_by('-fecha_inicio').first()
+        if ejecucion:
+            return ejecucion
+    return EjecucionRecordatorios.objects.create(fecha_referencia=timezone.now(), horizontes=horizontes)
+
+
+def citas_pendientes(ejecucion, tamano_lote):
+    """Siguiente lote de citas de la ventana de la ejecución, después del punto de control."""
+    referencia = ejecucion.fecha_referencia
+    limite = referencia + timedelta(hours=max(ejecucion.horizontes))
+    return list(
+        Cita.objects.filter(
+            estado__in=ESTADOS_CON_RECORDATORIO,
+            fecha__range=[timezone.localtime(referencia).date(), timezone.localtime(limite).date()],
+            id__gt=ejecucion.ultima_cita_id,
+        ).order_by('id').values(*CAMPOS_CITA)[:tamano_lote]
+    )
+
+
+def procesar_lote(ejecucion, tamano_lote=TAMANO_LOTE, dry_run=False):
+    """
+    Genera los recordatorios del siguiente lote y avanza el punto de control.
+
+    Returns:
+        tuple: (citas leídas, lista de (fila, horizonte) a recordar, omitidas)
+    """
+    with transaction.atomic():
+        filas = citas_pendientes(ejecucion, tamano_lote)
+        if not filas:
+            return 0, [], 0
+
+        # Las citas que ya pasaron (ej: al reanudar tarde) no se recuerdan
+        ahora = max(ejecucion.fecha_referencia, timezone.now())
+        candidatas = []
+        omitidas = 0
+        for fila in filas:
+            inicio = inicio_cita(fila)
+            horizonte = horizonte_aplicable(inicio, ejecucion.fecha_referencia, ejecucion.horizontes)
+            if horizonte is None or inicio <= ahora:
+                continue
+            if not fila['propietario__usuario_id'] or \
+                    fila['propietario__usuario__preferencia_notificacion__recordatorios'] is False:
+                omitidas += 1
+                continue
+            candidatas.append((fila, horizonte))
+
+        enviados = set(RecordatorioEnviado.objects.filter(
+            cita_id__in=[fila['id'] for fila, _ in candidatas]
+        ).values_list('cita_id', 'horizonte_horas'))
+        nuevos = [(fila, horizonte) for fila, horizonte in candidatas if (fila['id'], horizonte) not in enviados]
+        omitidas += len(candidatas) - len(nuevos)
+
+        if not dry_run:
+            _crear_recordatorios(nuevos, ejecucion.fecha_referencia)
+            ejecucion.ultima_cita_id = filas[-1]['id']
+            ejecucion.enviados += len(nuevos)
+            ejecucion.omitidos += omitidas
+            ejecucion.save(update_fields=['ultima_cita_id', 'enviados', 'omitidos'])
+        else:
+            # En simulación el punto de control solo avanza en memoria
+            ejecucion.ultima_cita_id = filas[-1]['id']
+    return len(filas), nuevos, omitidas
+
+
+def _crear_recordatorios(nuevos, referencia):
+    if not nuevos:
+        return
+    notificaciones = []
+    for fila, _ in nuevos:
+        asunto, mensaje = texto_recordatorio(fila, referencia)
+        usuario_id = fila['propietario__usuario_id']
+        notificaciones.append(Notificacion(
+            usuario_id=usuario_id,
+            actor_id=usuario_id,  # El sistema actúa como el usuario
+            tipo='RECORDATORIO',
+            asunto=asunto,
+            mensaje=mensaje,
+            cita_id=fila['id'],
+            canal_enviado=fila['propietario__usuario__preferencia_notificacion__canal_preferido'] or 'EMAIL',
+        ))
+    notificaciones = Notificacion.objects.bulk_create(notificaciones)
+    NotificacionLog.objects.bulk_create([
+        NotificacionLog(notificacion=n, accion='CREADA', usuario_id=n.actor_id,
+                        detalles={'cita_id': n.cita_id, 'horizonte_horas': horizonte})
+        for n, (_, horizonte) in zip(notificaciones, nuevos)
+    ])
+    RecordatorioEnviado.objects.bulk_create([
+        RecordatorioEnviado(cita_id=fila['id'], horizonte_horas=horizonte, notificacion=n)
+        for n, (fila, horizonte) in zip(notificaciones, nuevos)
+    ])
+    sumar_no_leidas(Counter(n.usuario_id for n in notificaciones))
+    transaction.on_commit(partial(push_usuarios, [
+        (n.usuario_id, {'id': n.id, 'tipo': n.tipo, 'asunto': n.asunto, 'mensaje': n.mensaje, 'cita_id': n.cita_id})
+        for n in notificaciones
+    ]))
+
+
+def finalizar_ejecucion(ejecucion):
+    ejecucion.fecha_fin = timezone.now()
+    ejecucion.save(update_fields=['fecha_fin'])
@@ -1,6 +1,7 @@
 from django.urls import re_path
-from .consumers import NotificationConsumer
+from .consumers import CalendarioConsumer, NotificationConsumer
 
 websocket_urlpatterns = [
     re_path(r'ws/notificaciones/$', NotificationConsumer.as_asgi()),
+    re_path(r'ws/calendario/$', CalendarioConsumer.as_asgi()),
 ]
@@ -1,41 +1,353 @@
+"""
+Creación y envío de notificaciones de citas.
+
+Los eventos de cita no crean las notificaciones dentro de la petición: se
+guardan en la bandeja de salida (``EventoSalida``) en la misma transacción
+que el cambio de la cita, y el comando ``despachar_notificaciones`` los
+procesa en lotes. Así la latencia de agendar o cancelar no depende de
+cuántos usuarios se notifican, y un evento no se pierde ni se envía si la
+transacción se revierte.
+
+Los usuarios con resumen activado (``PreferenciaNotificacion.resumen_minutos``)
+no reciben una notificación por evento: los eventos esperan en
+``EventoResumen`` y ``despachar_resumenes`` crea una sola notificación
+RESUMEN por ventana, con el detalle de cada evento en JSON.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from datetime import timedelta
+from functools import partial
+from itertools import groupby
+
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from .models import Notificacion, NotificacionLog
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from autenticacion.models import Usuario
+from .contadores import sumar_no_leidas
+from .models import EventoResumen, EventoSalida, Notificacion, NotificacionLog
+from .presencia import en_linea, registrar_envios
+
+logger = logging.getLogger('mydog')
+
+# Eventos por lote del despachador
+TAMANO_LOTE = 200
+
+# Un evento que falla este número de veces deja de reintentarse
+INTENTOS_MAXIMOS = 5
+
+# Grupo de Channels de los calendarios del staff
+GRUPO_CALENDARIO = 'calendario_staff'
 
 
 def push_user(user_id, payload):
+    push_usuarios([(user_id, payload)])
+
+
+def push_usuarios(mensajes):
+    """
+    Envía varias notificaciones por websocket con un solo cambio al event
+    loop (en vez de un ``async_to_sync`` por usuario).
+
+    Solo se envía a los usuarios con un socket abierto (``presencia``); el
+    resto se cuenta como envío omitido.
+
+    Args:
+        mensajes: Lista de tuplas (usuario_id, payload)
+    """
+    if not mensajes:
+        return
+    conectados = en_linea(usuario_id for usuario_id, _ in mensajes)
+    total = len(mensajes)
+    mensajes = [(usuario_id, payload) for usuario_id, payload in mensajes if usuario_id in conectados]
+    registrar_envios(len(mensajes), total - len(mensajes))
+    if not mensajes:
+        return
+    channel_layer = get_channel_layer()
+
+    async def enviar():
+        await asyncio.gather(*(
+            channel_layer.group_send(f'user_{usuario_id}', {'type': 'notify', 'data': payload})
+            for usuario_id, payload in mensajes
+        ))
+
+    async_to_sync(enviar)()
+
+
+def push_calendario(payload):
+    """Envía un cambio de citas a todos los calendarios del staff abiertos."""
     channel_layer = get_channel_layer()
     async_to_sync(channel_layer.group_send)(
-        f'user_{user_id}',
+        GRUPO_CALENDARIO,
         {
-            'type': 'notify',
+            'type': 'calendario',
             'data': payload,
         },
     )
 
 
 def crear_evento_cita(actor, cita, tipo, asunto, mensaje):
-    usuarios_objetivo = []
+    return crear_eventos_cita(actor, [(cita, tipo, asunto, mensaje)])
+
+
+def _destinatarios(cita):
+    """IDs de los usuarios que reciben los eventos de una cita."""
+    destinatarios = []
     if cita.propietario and cita.propietario.usuario_id:
-        usuarios_objetivo.append(cita.propietario.usuario)
-    if cita.veterinario:
-        usuarios_objetivo.append(cita.veterinario)
+        destinatarios.append(cita.propietario.usuario_id)
+    if cita.veterinario_id:
+        destinatarios.append(cita.veterinario_id)
+    return destinatarios
+
 
-    for u in usuarios_objetivo:
-        n = Notificacion.objects.create(
-            usuario=u,
+def crear_eventos_cita(actor, eventos):
+    """
+    Encola en la bandeja de salida las notificaciones de varios eventos de cita.
+
+    Escribe una fila por evento con un solo ``bulk_create``; las
+    notificaciones de cada destinatario las crea el despachador. Debe
+    llamarse dentro de la transacción del cambio de la cita.
+
+    Args:
+        actor: Usuario que origina los eventos
+        eventos: Iterable de tuplas (cita, tipo, asunto, mensaje), o
+            (cita, tipo, asunto, mensaje, destinatarios) para enviar el
+            evento solo a esos IDs de usuario (por defecto, el propietario y
+            el veterinario de la cita). Con destinatarios la cita puede ser
+            None (ej: la oferta de un horario de la lista de espera)
+
+    Returns:
+        list: Eventos encolados
+    """
+    salida = []
+    for cita, tipo, asunto, mensaje, *destinatarios in eventos:
+        salida.append(EventoSalida(
             actor=actor,
+            cita=cita,
             tipo=tipo,
             asunto=asunto,
             mensaje=mensaje,
-            cita=cita,
-            canal_enviado=getattr(getattr(u, 'preferencia_notificacion', None), 'canal_preferido', 'EMAIL'),
+            destinatarios=[d for d in destinatarios[0] if d] if destinatarios else _destinatarios(cita),
+        ))
+    salida = [evento for evento in salida if evento.destinatarios]
+    if not salida:
+        return []
+    salida = EventoSalida.objects.bulk_create(salida)
+    if getattr(settings, 'NOTIFICACIONES_DESPACHO_INMEDIATO', False):
+        transaction.on_commit(despachar_salida)
+    return salida
+
+
+def pendientes():
+    """Eventos de la bandeja de salida por despachar, en orden de llegada."""
+    return EventoSalida.objects.filter(
+        fecha_despacho__isnull=True, intentos__lt=INTENTOS_MAXIMOS
+    ).order_by('id')
+
+
+def despachar_salida(lote=TAMANO_LOTE):
+    """
+    Procesa un lote de la bandeja de salida.
+
+    Por lote: una consulta de eventos, una de destinatarios y canales, un
+    ``bulk_create`` de notificaciones, otro de logs, un ``UPDATE`` de los
+    contadores de no leídas, otro que marca los eventos y, tras confirmar, un solo envío agrupado por websocket.
+    Si el lote falla, los eventos se reintentan uno por uno para aislar el
+    que causa el error.
+
+    Returns:
+        int: Eventos procesados (despachados o fallidos)
+    """
+    with transaction.atomic():
+        # Con varios despachadores cada uno toma filas distintas (PostgreSQL);
+        # en SQLite la transacción ya es exclusiva
+        eventos = list(pendientes().select_for_update(skip_locked=True)[:lote])
+        if not eventos:
+            return 0
+        try:
+            with transaction.atomic():
+                _despachar(eventos)
+            return len(eventos)
+        except Exception as error:
+            if len(eventos) == 1:
+                _registrar_fallo(eventos[0], error)
+                return 1
+            logger.warning('Falló el lote de %s eventos, reintentando uno por uno', len(eventos))
+
+        for evento in eventos:
+            try:
+                with transaction.atomic():
+                    _despachar([evento])
+            except Exception as error:
+                _registrar_fallo(evento, error)
+    return len(eventos)
+
+
+def _registrar_fallo(evento, error):
+    logger.exception('No se pudo despachar el evento de salida #%s', evento.pk)
+    EventoSalida.objects.filter(pk=evento.pk).update(intentos=evento.intentos + 1, error=repr(error)[:1000])
+
+
+def _despachar(eventos):
+    """
+    Crea las notificaciones y logs de los eventos y los marca despachados.
+
+    Los destinatarios con ``resumen_minutos`` reciben el evento como
+    ``EventoResumen``; su notificación la crea ``despachar_resumenes``.
+    """
+    # Destinatarios que aún existen, con su canal preferido y su ventana de resumen
+    preferencias = {
+        usuario_id: (canal or 'EMAIL', resumen or 0)
+        for usuario_id, canal, resumen in Usuario.objects.filter(
+            pk__in={usuario_id for evento in eventos for usuario_id in evento.destinatarios}
+        ).values_list(
+            'pk', 'preferencia_notificacion__canal_preferido', 'preferencia_notificacion__resumen_minutos'
         )
-        NotificacionLog.objects.create(notificacion=n, accion='CREADA', usuario=actor, detalles={'cita_id': cita.id})
-        push_user(u.id, {
-            'id': n.id,
-            'tipo': n.tipo,
-            'asunto': n.asunto,
-            'mensaje': n.mensaje,
-            'cita_id': cita.id,
-        })
+    }
+
+    directas, en_resumen = [], []
+    for evento in eventos:
+        for usuario_id in evento.destinatarios:
+            if usuario_id not in preferencias:
+                continue
+            canal, resumen = preferencias[usuario_id]
+            if resumen:
+                en_resumen.append(EventoResumen(
+                    usuario_id=usuario_id, cita_id=evento.cita_id, tipo=evento.tipo, asunto=evento.asunto,
+                ))
+            else:
+                directas.append(Notificacion(
+                    usuario_id=usuario_id,
+                    actor_id=evento.actor_id,
+                    tipo=evento.tipo,
+                    asunto=evento.asunto,
+                    mensaje=evento.mensaje,
+                    cita_id=evento.cita_id,
+                    canal_enviado=canal,
+                ))
+    EventoResumen.objects.bulk_create(en_resumen)
+    notificaciones = Notificacion.objects.bulk_create(directas)
+    NotificacionLog.objects.bulk_create([
+        NotificacionLog(notificacion=n, accion='CREADA', usuario_id=n.actor_id, detalles={'cita_id': n.cita_id})
+        for n in notificaciones
+    ])
+    sumar_no_leidas(Counter(n.usuario_id for n in notificaciones))
+    EventoSalida.objects.filter(pk__in=[evento.pk for evento in eventos]).update(fecha_despacho=timezone.now())
+
+    # Enviar por websocket solo cuando la transacción se confirme
+    transaction.on_commit(partial(push_usuarios, [(n.usuario_id, _payload(n)) for n in notificaciones]))
+    return notificaciones
+
+
+def _payload(notificacion):
+    return {
+        'id': notificacion.id,
+        'tipo': notificacion.tipo,
+        'asunto': notificacion.asunto,
+        'mensaje': notificacion.mensaje,
+        'cita_id': notificacion.cita_id,
+        'detalle': notificacion.detalle,
+    }
+
+
+def despachar_resumenes(momento=None):
+    """
+    Crea las notificaciones RESUMEN de los usuarios cuya ventana ya cerró.
+
+    La ventana de un usuario empieza con su evento en espera más antiguo y
+    dura ``resumen_minutos``; si el usuario desactivó el resumen, sus
+    eventos en espera salen en la siguiente pasada. Por pasada: una
+    consulta de ventanas, una de eventos, un ``bulk_create`` de
+    notificaciones y otro de logs, el ajuste de contadores, un ``DELETE`` y
+    un solo envío por websocket.
+
+    Args:
+        momento: Hora de referencia (por defecto ahora)
+
+    Returns:
+        int: Resúmenes creados
+    """
+    momento = momento or timezone.now()
+    with transaction.atomic():
+        ventanas = EventoResumen.objects.values(
+            'usuario_id',
+            'usuario__preferencia_notificacion__resumen_minutos',
+            'usuario__preferencia_notificacion__canal_preferido',
+        ).annotate(primero=Min('fecha'))
+        canales = {
+            fila['usuario_id']: fila['usuario__preferencia_notificacion__canal_preferido'] or 'EMAIL'
+            for fila in ventanas
+            if fila['primero'] <= momento - timedelta(
+                minutes=fila['usuario__preferencia_notificacion__resumen_minutos'] or 0
+            )
+        }
+        if not canales:
+            return 0
+
+        eventos = list(EventoResumen.objects.filter(usuario_id__in=canales).order_by('usuario_id', 'id'))
+        notificaciones = []
+        for usuario_id, grupo in groupby(eventos, key=lambda evento: evento.usuario_id):
+            grupo = list(grupo)
+            notificaciones.append(Notificacion(
+                usuario_id=usuario_id,
+                tipo='RESUMEN',
+                asunto=f'Resumen: {len(grupo)} avisos de citas',
+                mensaje='\n'.join(
+                    f'• {timezone.localtime(evento.fecha):%d/%m %H:%M} - {evento.asunto}' for evento in grupo
+                ),
+                detalle=[
+                    {'cita_id': evento.cita_id, 'tipo': evento.tipo, 'asunto': evento.asunto,
+                     'fecha': evento.fecha.isoformat()}
+                    for evento in grupo
+                ],
+                canal_enviado=canales[usuario_id],
+            ))
+        notificaciones = Notificacion.objects.bulk_create(notificaciones)
+        NotificacionLog.objects.bulk_create([
+            NotificacionLog(notificacion=n, accion='CREADA', detalles={'eventos': len(n.detalle)})
+            for n in notificaciones
+        ])
+        sumar_no_leidas(Counter(n.usuario_id for n in notificaciones))
+        EventoResumen.objects.filter(pk__in=[evento.pk for evento in eventos]).delete()
+        transaction.on_commit(partial(push_usuarios, [(n.usuario_id, _payload(n)) for n in notificaciones]))
+    return len(notificaciones)
+
+
+def marcar_todas_leidas(usuario, tipo=None, hasta=None):
+    """
+    Marca como leídas las notificaciones pendientes del usuario.
+
+    Trabaja por conjuntos: una consulta de IDs, un ``UPDATE``, un
+    ``bulk_create`` de logs y el ajuste del contador, sin importar cuántas
+    notificaciones haya sin leer.
+
+    Args:
+        usuario: Dueño de las notificaciones
+        tipo: Solo las de este tipo (opcional)
+        hasta: Solo las enviadas hasta este momento (opcional)
+
+    Returns:
+        int: Notificaciones marcadas
+    """
+    pendientes = Notificacion.objects.filter(usuario=usuario, leida=False)
+    if tipo:
+        pendientes = pendientes.filter(tipo=tipo)
+    if hasta:
+        pendientes = pendientes.filter(fecha_envio__lte=hasta)
+
+    with transaction.atomic():
+        ids = list(pendientes.values_list('id', flat=True))
+        if not ids:
+            return 0
+        Notificacion.objects.filter(pk__in=ids).update(leida=True, fecha_lectura=timezone.now())
+        NotificacionLog.objects.bulk_create([
+            NotificacionLog(notificacion_id=pk, accion='LEIDA', usuario=usuario)
+            for pk in ids
+        ])
+        sumar_no_leidas({usuario.id: -len(ids)})
+    return len(ids)
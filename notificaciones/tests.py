@@ -1,3 +1,744 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import sqlite3
+import tempfile
+from io import StringIO
+from pathlib import Path
+from datetime import date, datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import get_channel_layer
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from channels.exceptions import ChannelFull
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from autenticacion.models import Usuario
+from citas.models import Cita
+from mascotas.models import Mascota
+from propietarios.models import Propietario
+from servicios.models import Servicio
+from .capa_sqlite import SQLiteChannelLayer
+from . import archivo, presencia
+from .consumers import CalendarioConsumer, NotificationConsumer
+from .contadores import acontar_no_leidas, contar_no_leidas, reparar_contadores
+from .paginacion import despues_de, pagina, parsear_cursor
+from .models import (
+    ContadorNoLeidas, EjecucionRecordatorios, EventoResumen, EventoSalida, Notificacion, NotificacionLog,
+    PreferenciaNotificacion, PresenciaUsuario, RecordatorioEnviado,
+)
+from .recordatorios import horizonte_aplicable, iniciar_ejecucion, procesar_lote
+from .services import (
+    crear_evento_cita, crear_eventos_cita, despachar_resumenes, despachar_salida, push_calendario, push_usuarios,
+)
+from .views import crear_notificacion
+
+
+class CalendarioConsumerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recepcion = Usuario.objects.create_user(
+            username='recepcion', password='Rec*12345', rol='ADMINISTRATIVO'
+        )
+        cls.propietario = Usuario.objects.create_user(
+            username='prop', password='Prop*12345', rol='PROPIETARIO'
+        )
+
+    async def conectar(self, usuario):
+        communicator = ApplicationCommunicator(CalendarioConsumer.as_asgi(), {
+            'type': 'websocket', 'path': '/ws/calendario/', 'user': usuario,
+        })
+        await communicator.send_input({'type': 'websocket.connect'})
+        respuesta = await communicator.receive_output()
+        return communicator, respuesta['type'] == 'websocket.accept'
+
+    async def test_staff_recibe_cambios(self):
+        communicator, conectado = await self.conectar(self.recepcion)
+        self.assertTrue(conectado)
+        delta = {'accion': 'confirmar', 'ids': [1], 'eventos': []}
+        await sync_to_async(push_calendario)(delta)
+        mensaje = await communicator.receive_output()
+        self.assertEqual(json.loads(mensaje['text']), delta)
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+    async def test_propietario_no_se_suscribe(self):
+        communicator, conectado = await self.conectar(self.propietario)
+        self.assertFalse(conectado)
+        await communicator.wait()
+
+
+class BandejaSalidaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vet = Usuario.objects.create_user(username='vet', password='Vet*12345', rol='VETERINARIO')
+        cls.usuario_prop = Usuario.objects.create_user(username='prop', password='Prop*12345', rol='PROPIETARIO')
+        PreferenciaNotificacion.objects.create(usuario=cls.usuario_prop, canal_preferido='WHATSAPP')
+        propietario = Propietario.objects.create(
+            usuario=cls.usuario_prop, nombre='Propietario', documento='123456789',
+            telefono='3001234567', correo='prop@example.com'
+        )
+        mascota = Mascota.objects.create(
+            propietario=propietario, nombre='Firulais', especie='PERRO', raza='Criollo', edad=3
+        )
+        servicio = Servicio.objects.create(nombre='CONSULTA', duracion_minutos=30, precio=50000)
+        fecha = date.today() + timedelta(days=7)
+        cls.citas = Cita.objects.bulk_create([
+            Cita(propietario=propietario, mascota=mascota, servicio=servicio, veterinario=cls.vet,
+                 fecha=fecha, hora=time(8 + i // 2, 30 * (i % 2)), usuario_creador=cls.vet)
+            for i in range(20)
+        ])
+
+    def encolar(self, citas):
+        return crear_eventos_cita(self.vet, [(cita, 'CONFIRMACION', 'Nueva cita', f'Cita #{cita.id}') for cita in citas])
+
+    def test_la_peticion_solo_escribe_la_bandeja(self):
+        with self.assertNumQueries(1):
+            self.encolar(self.citas)
+        self.assertEqual(EventoSalida.objects.count(), 20)
+        self.assertFalse(Notificacion.objects.exists())
+
+    def test_rollback_descarta_los_eventos(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                crear_evento_cita(self.vet, self.citas[0], 'CANCELACION', 'Cita cancelada', 'x')
+                raise RuntimeError
+        self.assertFalse(EventoSalida.objects.exists())
+
+    def test_despacho_en_lote_con_consultas_constantes(self):
+        self.encolar(self.citas[:2])
+        with CaptureQueriesContext(connection) as pocos:
+            despachar_salida()
+        self.encolar(self.citas)
+        with CaptureQueriesContext(connection) as muchos:
+            self.assertEqual(despachar_salida(), 20)
+        contar = lambda consultas: len([q for q in consultas.captured_queries if 'SAVEPOINT' not in q['sql']])
+        self.assertEqual(contar(pocos), contar(muchos))
+
+        self.assertEqual(Notificacion.objects.count(), 44)
+        self.assertEqual(NotificacionLog.objects.filter(accion='CREADA').count(), 44)
+        self.assertEqual(
+            set(Notificacion.objects.filter(usuario=self.usuario_prop).values_list('canal_enviado', flat=True)),
+            {'WHATSAPP'}
+        )
+        self.assertFalse(EventoSalida.objects.filter(fecha_despacho__isnull=True).exists())
+        self.assertEqual(despachar_salida(), 0)
+
+    def test_websocket_tras_confirmar(self):
+        layer = get_channel_layer()
+        canal = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f'user_{self.vet.id}', canal)
+        PresenciaUsuario.objects.create(
+            usuario=self.vet, proceso='prueba', conexiones=1, expira=timezone.now() + timedelta(minutes=1)
+        )
+        self.encolar(self.citas[:1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            despachar_salida()
+        mensaje = async_to_sync(layer.receive)(canal)
+        self.assertEqual(mensaje['data']['cita_id'], self.citas[0].id)
+        async_to_sync(layer.group_discard)(f'user_{self.vet.id}', canal)
+
+    def test_destinatario_eliminado_se_omite(self):
+        otro = Usuario.objects.create_user(username='temporal', password='Tmp*12345', rol='VETERINARIO')
+        evento = self.encolar(self.citas[:1])[0]
+        EventoSalida.objects.filter(pk=evento.pk).update(destinatarios=[otro.id, self.vet.id])
+        otro.delete()
+        despachar_salida()
+        self.assertEqual(list(Notificacion.objects.values_list('usuario_id', flat=True)), [self.vet.id])
+
+    def test_resumen_agrupa_los_avisos_de_la_ventana(self):
+        PreferenciaNotificacion.objects.filter(usuario=self.usuario_prop).update(resumen_minutos=60)
+        self.encolar(self.citas)
+        despachar_salida()
+
+        # El veterinario recibe una notificación por evento; el propietario espera el resumen
+        self.assertEqual(Notificacion.objects.filter(usuario=self.vet).count(), 20)
+        self.assertFalse(Notificacion.objects.filter(usuario=self.usuario_prop).exists())
+        self.assertEqual(EventoResumen.objects.filter(usuario=self.usuario_prop).count(), 20)
+        self.assertEqual(despachar_resumenes(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertEqual(despachar_resumenes(timezone.now() + timedelta(minutes=61)), 1)
+        self.assertEqual(len([q for q in consultas.captured_queries if 'SAVEPOINT' not in q['sql']]), 6)
+        resumen = Notificacion.objects.get(usuario=self.usuario_prop)
+        self.assertEqual(resumen.tipo, 'RESUMEN')
+        self.assertEqual(resumen.canal_enviado, 'WHATSAPP')
+        self.assertEqual([item['cita_id'] for item in resumen.detalle], [cita.id for cita in self.citas])
+        self.assertEqual(resumen.mensaje.count('\n'), 19)
+        self.assertEqual(NotificacionLog.objects.filter(notificacion=resumen).count(), 1)
+        self.assertEqual(contar_no_leidas(self.usuario_prop.id), 1)
+        self.assertFalse(EventoResumen.objects.exists())
+
+    def test_resumen_desactivado_sale_en_la_siguiente_pasada(self):
+        PreferenciaNotificacion.objects.filter(usuario=self.usuario_prop).update(resumen_minutos=1440)
+        self.encolar(self.citas[:3])
+        despachar_salida()
+        PreferenciaNotificacion.objects.filter(usuario=self.usuario_prop).update(resumen_minutos=0)
+        self.assertEqual(despachar_resumenes(), 1)
+        self.assertEqual(len(Notificacion.objects.get(usuario=self.usuario_prop).detalle), 3)
+
+    def test_comando_vacia_la_bandeja(self):
+        self.encolar(self.citas)
+        call_command('despachar_notificaciones', lote=7, stdout=StringIO())
+        self.assertFalse(EventoSalida.objects.filter(fecha_despacho__isnull=True).exists())
+        self.assertEqual(Notificacion.objects.count(), 40)
+
+
+class ContadorNoLeidasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='prop', password='Prop*12345', rol='PROPIETARIO')
+        cls.otro = Usuario.objects.create_user(username='otro', password='Otro*12345', rol='PROPIETARIO')
+
+    def notificar(self, usuario, cantidad=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(cantidad):
+                crear_notificacion(usuario=usuario, actor=None, tipo='SISTEMA', asunto='Aviso', mensaje='x')
+
+    def test_se_inicializa_y_se_mantiene(self):
+        self.notificar(self.usuario, 3)
+        self.assertEqual(contar_no_leidas(self.usuario.id), 3)
+        self.notificar(self.usuario)
+        self.assertEqual(contar_no_leidas(self.usuario.id), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notificacion.objects.filter(usuario=self.usuario).first().marcar_como_leida()
+        self.assertEqual(contar_no_leidas(self.usuario.id), 3)
+        self.assertEqual(ContadorNoLeidas.objects.get(usuario=self.usuario).no_leidas, 3)
+
+        self.client.force_login(self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('notificaciones:api_marcar_todas'))
+        self.assertEqual(contar_no_leidas(self.usuario.id), 0)
+
+    def test_ve_los_cambios_de_otro_proceso(self):
+        self.notificar(self.usuario, 2)
+        self.assertEqual(contar_no_leidas(self.usuario.id), 2)
+        # El despachador (otro proceso) suma al contador sin pasar por este proceso
+        ContadorNoLeidas.objects.filter(usuario=self.usuario).update(no_leidas=F('no_leidas') + 1)
+        self.assertEqual(contar_no_leidas(self.usuario.id), 3)
+
+    def test_render_sin_count(self):
+        self.notificar(self.usuario, 2)
+        contar_no_leidas(self.usuario.id)
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('notificaciones:api_mis'))
+        self.assertEqual(response.json()['unread'], 2)
+        self.assertFalse([q for q in consultas.captured_queries if 'COUNT' in q['sql'].upper()])
+
+    async def test_api_async(self):
+        await sync_to_async(self.notificar)(self.usuario, 2)
+        await self.async_client.aforce_login(self.usuario)
+        respuesta = await self.async_client.get(reverse('notificaciones:api_mis'), {'limite': 1})
+        datos = respuesta.json()
+        self.assertEqual((datos['unread'], len(datos['items'])), (2, 1))
+        respuesta = await self.async_client.get(reverse('notificaciones:api_mis'), {'cursor': datos['siguiente']})
+        self.assertEqual(len(respuesta.json()['items']), 1)
+
+        # Marcar dos veces la misma notificación resta una sola vez
+        url = reverse('notificaciones:api_marcar_leida', args=[datos['items'][0]['id']])
+        await asyncio.gather(self.async_client.post(url), self.async_client.post(url))
+        self.assertEqual(await acontar_no_leidas(self.usuario.id), 1)
+        self.assertEqual(await NotificacionLog.objects.filter(accion='LEIDA').acount(), 2)
+
+        await self.async_client.aforce_login(self.otro)
+        self.assertEqual((await self.async_client.post(url)).status_code, 404)
+
+    def test_reparar_corrige_diferencias(self):
+        self.notificar(self.usuario, 2)
+        contar_no_leidas(self.usuario.id)
+        Notificacion.objects.filter(usuario=self.usuario).update(leida=True)
+        self.notificar(self.otro, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            diferencias = reparar_contadores()
+        self.assertIn((self.usuario.id, 2, 0), diferencias)
+        self.assertIn((self.otro.id, None, 1), diferencias)
+        self.assertEqual(contar_no_leidas(self.usuario.id), 0)
+        self.assertEqual(contar_no_leidas(self.otro.id), 1)
+
+        salida = StringIO()
+        call_command('reparar_contadores_notificaciones', stdout=salida)
+        self.assertIn('corregidos: 0', salida.getvalue())
+
+
+class MarcarTodasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='prop', password='Prop*12345', rol='PROPIETARIO')
+
+    def crear(self, cantidad, tipo='SISTEMA'):
+        Notificacion.objects.bulk_create([
+            Notificacion(usuario=self.usuario, tipo=tipo, asunto='Aviso', mensaje='x', canal_enviado='EMAIL')
+            for _ in range(cantidad)
+        ])
+
+    def marcar(self, **datos):
+        self.client.force_login(self.usuario)
+        return self.client.post(
+            reverse('notificaciones:api_marcar_todas'), datos, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+
+    def test_consultas_constantes(self):
+        self.crear(5)
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as pocas:
+            self.marcar()
+        self.crear(150)
+        with CaptureQueriesContext(connection) as muchas:
+            response = self.marcar()
+        self.assertEqual(response.json(), {'ok': True, 'marked': 150})
+        self.assertEqual(len(pocas.captured_queries), len(muchas.captured_queries))
+        self.assertFalse(Notificacion.objects.filter(leida=False).exists())
+        self.assertFalse(Notificacion.objects.filter(fecha_lectura__isnull=True).exists())
+        self.assertEqual(NotificacionLog.objects.filter(accion='LEIDA', usuario=self.usuario).count(), 155)
+
+    def test_filtro_por_tipo_y_fecha(self):
+        self.crear(3, tipo='RECORDATORIO')
+        self.crear(2)
+        self.assertEqual(self.marcar(tipo='RECORDATORIO').json()['marked'], 3)
+        self.assertEqual(Notificacion.objects.filter(leida=False, tipo='SISTEMA').count(), 2)
+
+        Notificacion.objects.filter(usuario=self.usuario).update(fecha_envio='2020-01-01T00:00:00Z')
+        self.crear(1)
+        self.assertEqual(self.marcar(hasta='2021-01-01T00:00:00').json()['marked'], 2)
+        self.assertEqual(Notificacion.objects.filter(leida=False).count(), 1)
+
+    def test_parametros_invalidos(self):
+        self.crear(1)
+        self.assertEqual(self.marcar(tipo='OTRO').status_code, 400)
+        self.assertEqual(self.marcar(hasta='ayer').status_code, 400)
+        response = self.marcar(hasta='2021-13-01T00:00:00')
+        self.assertEqual((response.status_code, response.json()['error']), (400, 'Fecha inválida'))
+        self.assertEqual(Notificacion.objects.filter(leida=False).count(), 1)
+
+
+class PaginacionBandejaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='vet', password='Vet*12345', rol='VETERINARIO')
+        cls.admin = Usuario.objects.create_user(username='admin', password='Admin*12345', rol='ADMIN')
+        Notificacion.objects.bulk_create([
+            Notificacion(usuario=cls.usuario, tipo='SISTEMA', asunto=f'Aviso {i}', mensaje='x', canal_enviado='EMAIL')
+            for i in range(45)
+        ])
+        # Varias con la misma fecha para probar el desempate por id
+        Notificacion.objects.filter(usuario=cls.usuario, id__lte=Notificacion.objects.order_by('id')[9].id).update(
+            fecha_envio='2025-01-01T12:00:00Z'
+        )
+
+    def test_recorrido_completo_sin_repetir(self):
+        vistos, cursor = [], None
+        while True:
+            filas, siguiente = pagina(Notificacion.objects.filter(usuario=self.usuario), cursor, 7)
+            vistos.extend(n.id for n in filas)
+            if not siguiente:
+                break
+            cursor = parsear_cursor(siguiente)
+        esperado = list(
+            Notificacion.objects.filter(usuario=self.usuario).order_by('-fecha_envio', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(vistos, esperado)
+
+    def test_api_con_cursor(self):
+        self.client.force_login(self.usuario)
+        url = reverse('notificaciones:api_mis')
+        primera = self.client.get(url, {'limite': 40}).json()
+        self.assertEqual(len(primera['items']), 40)
+        segunda = self.client.get(url, {'limite': 40, 'cursor': primera['siguiente']}).json()
+        self.assertEqual(len(segunda['items']), 5)
+        self.assertIsNone(segunda['siguiente'])
+        self.assertEqual(self.client.get(url, {'cursor': 'abc'}).status_code, 400)
+
+    def test_vistas_html_paginadas(self):
+        self.client.force_login(self.usuario)
+        response = self.client.get(reverse('notificaciones:veterinario'))
+        self.assertEqual(len(response.context['notificaciones']), 20)
+        self.assertIn('cursor=', response.context['siguiente_url'])
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('notificaciones:admin'), {'tipo': 'SISTEMA', 'usuario': self.usuario.id})
+        self.assertEqual(len(response.context['notificaciones']), 20)
+        siguiente = self.client.get(reverse('notificaciones:admin') + response.context['siguiente_url'])
+        self.assertEqual(len(siguiente.context['notificaciones']), 20)
+        self.assertTrue(siguiente.context['primera_url'])
+
+    def test_pagina_profunda_usa_el_indice(self):
+        ultima = Notificacion.objects.order_by('id').first()
+        cursor = (ultima.fecha_envio, ultima.id + 1)
+        for consulta in (
+            Notificacion.objects.filter(usuario=self.usuario),
+            Notificacion.objects.filter(tipo='SISTEMA'),
+        ):
+            sql = despues_de(consulta, cursor)[:21].explain()
+            self.assertNotIn('TEMP B-TREE', sql)
+            self.assertIn('USING INDEX notif_', sql)
+
+
+class RecordatoriosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vet = Usuario.objects.create_user(username='vet', password='Vet*12345', rol='VETERINARIO')
+        cls.servicio = Servicio.objects.create(nombre='CONSULTA', duracion_minutos=30, precio=50000)
+        cls.mascotas = []
+        for i in range(3):
+            usuario = Usuario.objects.create_user(username=f'prop{i}', password='Prop*12345', rol='PROPIETARIO')
+            propietario = Propietario.objects.create(
+                usuario=usuario, nombre=f'Propietario {i}', documento=f'10{i}',
+                telefono='3001234567', correo=f'prop{i}@example.com'
+            )
+            cls.mascotas.append(Mascota.objects.create(
+                propietario=propietario, nombre=f'Mascota {i}', especie='PERRO', raza='Criollo', edad=3
+            ))
+
+    def cita_en(self, horas, mascota=None, minutos=0):
+        inicio = timezone.localtime() + timedelta(hours=horas, minutes=minutos)
+        mascota = mascota or self.mascotas[0]
+        return Cita.objects.create(
+            propietario=mascota.propietario, mascota=mascota, servicio=self.servicio, veterinario=self.vet,
+            fecha=inicio.date(), hora=inicio.time().replace(second=0, microsecond=0), usuario_creador=self.vet,
+        )
+
+    def enviar(self, **opciones):
+        call_command('enviar_recordatorios', stdout=StringIO(), **opciones)
+
+    def test_horizonte_mas_corto_alcanzado(self):
+        ahora = timezone.now()
+        self.assertEqual(horizonte_aplicable(ahora + timedelta(hours=1), ahora, [24, 2]), 2)
+        self.assertEqual(horizonte_aplicable(ahora + timedelta(hours=20), ahora, [24, 2]), 24)
+        self.assertIsNone(horizonte_aplicable(ahora + timedelta(hours=30), ahora, [24, 2]))
+        self.assertIsNone(horizonte_aplicable(ahora - timedelta(hours=1), ahora, [24, 2]))
+
+    def test_un_recordatorio_por_horizonte_sin_duplicar(self):
+        cercana = self.cita_en(1)
+        manana = self.cita_en(20, mascota=self.mascotas[1])
+        lejana = self.cita_en(30, mascota=self.mascotas[2])
+        self.enviar()
+        self.enviar()
+        self.assertEqual(
+            set(RecordatorioEnviado.objects.values_list('cita_id', 'horizonte_horas')),
+            {(cercana.id, 2), (manana.id, 24)}
+        )
+        self.assertFalse(RecordatorioEnviado.objects.filter(cita=lejana).exists())
+        self.assertEqual(Notificacion.objects.filter(tipo='RECORDATORIO').count(), 2)
+        self.assertFalse(EjecucionRecordatorios.objects.filter(fecha_fin__isnull=True).exists())
+
+    def test_respeta_preferencia_desactivada(self):
+        PreferenciaNotificacion.objects.create(
+            usuario=self.mascotas[0].propietario.usuario, canal_preferido='SMS', recordatorios=False
+        )
+        PreferenciaNotificacion.objects.create(usuario=self.mascotas[1].propietario.usuario, canal_preferido='SMS')
+        self.cita_en(5)
+        self.cita_en(6, mascota=self.mascotas[1])
+        self.enviar()
+        notificaciones = Notificacion.objects.filter(tipo='RECORDATORIO')
+        self.assertEqual([n.usuario_id for n in notificaciones], [self.mascotas[1].propietario.usuario_id])
+        self.assertEqual(notificaciones[0].canal_enviado, 'SMS')
+
+    def test_consultas_por_lote_constantes(self):
+        for i in range(3):
+            self.cita_en(3, mascota=self.mascotas[i], minutos=i)
+        ejecucion = iniciar_ejecucion([24, 2])
+        with CaptureQueriesContext(connection) as pocas:
+            procesar_lote(ejecucion, tamano_lote=1)
+        with CaptureQueriesContext(connection) as muchas:
+            procesar_lote(ejecucion, tamano_lote=100)
+        contar = lambda consultas: len([q for q in consultas.captured_queries if 'SAVEPOINT' not in q['sql']])
+        self.assertEqual(contar(pocas), contar(muchas))
+
+    def test_reanuda_desde_el_punto_de_control(self):
+        citas = [self.cita_en(3, mascota=self.mascotas[i], minutos=i) for i in range(3)]
+        # Una ejecución que se interrumpió después del primer lote
+        ejecucion = iniciar_ejecucion([24, 2])
+        procesar_lote(ejecucion, tamano_lote=1)
+        self.assertEqual(RecordatorioEnviado.objects.count(), 1)
+
+        self.enviar(batch_size=1)
+        ejecucion.refresh_from_db()
+        self.assertIsNotNone(ejecucion.fecha_fin)
+        self.assertEqual(ejecucion.enviados, 3)
+        self.assertEqual(ejecucion.ultima_cita_id, citas[-1].id)
+        self.assertEqual(Notificacion.objects.filter(tipo='RECORDATORIO').count(), 3)
+        self.assertEqual(EjecucionRecordatorios.objects.count(), 1)
+
+    def test_dry_run_no_escribe(self):
+        self.cita_en(3)
+        self.enviar(dry_run=True)
+        self.assertFalse(Notificacion.objects.exists())
+        self.assertFalse(EjecucionRecordatorios.objects.exists())
+
+
+class CapaSQLiteTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ruta = Path(self.directorio.name) / 'channels.sqlite3'
+
+    def tearDown(self):
+        self.directorio.cleanup()
+
+    def capa(self, **config):
+        # Cada instancia tiene su propio identificador, como un proceso distinto
+        return SQLiteChannelLayer(ruta=self.ruta, intervalo_sondeo=0.002, **config)
+
+    async def test_group_send_llega_a_todos_los_procesos(self):
+        web, worker_a, worker_b = self.capa(), self.capa(), self.capa()
+        canal_a = await worker_a.new_channel()
+        canal_b = await worker_b.new_channel()
+        await worker_a.group_add('user_7', canal_a)
+        await worker_b.group_add('user_7', canal_b)
+
+        await web.group_send('user_7', {'type': 'notify', 'data': {'id': 1}})
+        recibidos = await asyncio.wait_for(asyncio.gather(worker_a.receive(canal_a), worker_b.receive(canal_b)), 5)
+        self.assertEqual(recibidos, [{'type': 'notify', 'data': {'id': 1}}] * 2)
+
+        await worker_b.group_discard('user_7', canal_b)
+        await web.group_send('user_7', {'type': 'notify', 'data': {'id': 2}})
+        self.assertEqual((await asyncio.wait_for(worker_a.receive(canal_a), 5))['data'], {'id': 2})
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(worker_b.receive(canal_b), 0.1)
+
+    async def test_orden_y_canal_compartido(self):
+        emisor, receptor = self.capa(), self.capa()
+        canal = await receptor.new_channel()
+        for numero in range(5):
+            await emisor.send(canal, {'type': 'x', 'n': numero})
+        self.assertEqual([(await receptor.receive(canal))['n'] for _ in range(5)], list(range(5)))
+
+        await emisor.send('tareas', {'type': 'x', 'n': 1})
+        await emisor.send('tareas', {'type': 'x', 'n': 2})
+        self.assertEqual((await receptor.receive('tareas'))['n'], 1)
+        self.assertEqual((await emisor.receive('tareas'))['n'], 2)
+
+    async def test_capacidad_y_vencimiento(self):
+        capa = self.capa(capacity=2, expiry=1)
+        await capa.send('tareas', {'type': 'x'})
+        await capa.send('tareas', {'type': 'x'})
+        with self.assertRaises(ChannelFull):
+            await capa.send('tareas', {'type': 'x'})
+        await asyncio.sleep(1.1)
+        await capa.send('tareas', {'type': 'x', 'n': 3})
+        self.assertEqual((await capa.receive('tareas'))['n'], 3)
+
+    async def test_send_concurrente_respeta_la_capacidad(self):
+        # Cada capa tiene su hilo y su conexión, como procesos distintos
+        capas = [self.capa(capacity=5) for _ in range(8)]
+
+        async def enviar(capa):
+            try:
+                await capa.send('tareas', {'type': 'x'})
+                return True
+            except ChannelFull:
+                return False
+
+        enviados = await asyncio.gather(*(enviar(capa) for capa in capas for _ in range(3)))
+        self.assertEqual(sum(enviados), 5)
+        with sqlite3.connect(self.ruta) as db:
+            self.assertEqual(db.execute('SELECT COUNT(*) FROM mensajes').fetchone()[0], 5)
+
+    async def test_group_send_omite_canales_llenos(self):
+        capa = self.capa(capacity=2)
+        canal = await capa.new_channel()
+        await capa.group_add('staff', canal)
+        for numero in range(3):
+            await capa.group_send('staff', {'type': 'x', 'n': numero})
+        self.assertEqual([(await capa.receive(canal))['n'] for _ in range(2)], [0, 1])
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(capa.receive(canal), 0.1)
+
+    async def test_descarta_colas_de_canales_sin_receptor(self):
+        emisor, receptor = self.capa(), self.capa(expiry=1)
+        activo = await receptor.new_channel()
+        cerrado = await receptor.new_channel()
+        await receptor.group_add('staff', activo)
+        await receptor.group_add('staff', cerrado)
+
+        await emisor.group_send('staff', {'type': 'x'})
+        await asyncio.wait_for(receptor.receive(activo), 5)
+        self.assertEqual(set(receptor._colas), {cerrado})
+
+        await asyncio.sleep(2.5)
+        self.assertEqual(receptor._colas, {})
+        self.assertTrue(receptor._sondeo.done())
+
+
+class PresenciaTests(TransactionTestCase):
+    # TransactionTestCase: database_sync_to_async cierra la conexión de la
+    # prueba, lo que rompería la transacción envolvente de TestCase
+
+    def setUp(self):
+        self.conectado = Usuario.objects.create_user(username='vet', password='Vet*12345', rol='VETERINARIO')
+        self.desconectado = Usuario.objects.create_user(username='prop', password='Prop*12345', rol='PROPIETARIO')
+
+    async def conectar(self, usuario):
+        communicator = ApplicationCommunicator(NotificationConsumer.as_asgi(), {
+            'type': 'websocket', 'path': '/ws/notificaciones/', 'user': usuario,
+        })
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await communicator.receive_output())['type'], 'websocket.accept')
+        return communicator
+
+    async def desconectar(self, communicator):
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+    async def test_conexiones_por_usuario(self):
+        en_linea = sync_to_async(presencia.en_linea)
+        primero = await self.conectar(self.conectado)
+        segundo = await self.conectar(self.conectado)
+        fila = await PresenciaUsuario.objects.aget(usuario=self.conectado)
+        self.assertEqual(fila.conexiones, 2)
+        self.assertEqual(await en_linea([self.conectado.id, self.desconectado.id]), {self.conectado.id})
+
+        await self.desconectar(primero)
+        self.assertEqual(await en_linea([self.conectado.id]), {self.conectado.id})
+        await self.desconectar(segundo)
+        self.assertEqual(await en_linea([self.conectado.id]), set())
+        self.assertFalse(await PresenciaUsuario.objects.aexists())
+
+    async def test_push_omite_usuarios_sin_conexion(self):
+        communicator = await self.conectar(self.conectado)
+        antes = dict(presencia.estadisticas)
+        await sync_to_async(push_usuarios)([
+            (self.conectado.id, {'id': 1}),
+            (self.desconectado.id, {'id': 2}),
+        ])
+        mensaje = await communicator.receive_output()
+        self.assertEqual(json.loads(mensaje['text']), {'id': 1})
+        self.assertEqual(presencia.estadisticas['enviados'] - antes.get('enviados', 0), 1)
+        self.assertEqual(presencia.estadisticas['omitidos'] - antes.get('omitidos', 0), 1)
+        await self.desconectar(communicator)
+
+    async def test_latido_sigue_tras_un_error(self):
+        renovaciones = []
+
+        def renovar(conexiones):
+            renovaciones.append(conexiones)
+            if len(renovaciones) == 1:
+                raise OperationalError('database is locked')
+
+        with mock.patch.object(presencia, 'INTERVALO_LATIDO', 0.01), \
+                mock.patch.object(presencia, '_renovar', renovar), self.assertLogs('mydog', 'ERROR'):
+            communicator = await self.conectar(self.conectado)
+            await asyncio.sleep(0.2)
+            self.assertGreater(len(renovaciones), 1)
+            self.assertFalse(presencia._latido.done())
+            await self.desconectar(communicator)
+
+    async def test_conectar_reinicia_un_latido_caido(self):
+        async def caido():
+            raise OperationalError('database is locked')
+
+        presencia._latido = asyncio.get_running_loop().create_task(caido())
+        await asyncio.sleep(0)
+        with self.assertLogs('mydog', 'ERROR'):
+            communicator = await self.conectar(self.conectado)
+        self.assertFalse(presencia._latido.done())
+        await self.desconectar(communicator)
+
+    def test_presencia_vencida_no_cuenta(self):
+        PresenciaUsuario.objects.create(
+            usuario=self.conectado, proceso='caido', conexiones=1, expira=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(presencia.en_linea([self.conectado.id]), set())
+
+
+class ArchivoNotificacionesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Usuario.objects.create_user(username='recepcion', password='Rec*12345', rol='ADMINISTRATIVO')
+        cls.propietario = Usuario.objects.create_user(username='prop', password='Prop*12345', rol='PROPIETARIO')
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        configuracion = override_settings(MEDIA_ROOT=directorio.name)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def crear(self, usuario, fecha, leida=False, cantidad=1):
+        for numero in range(cantidad):
+            crear_notificacion(usuario, self.staff, 'SISTEMA', f'Aviso {numero}', 'Mensaje')
+        ids = list(Notificacion.objects.filter(usuario=usuario).order_by('-id').values_list('id', flat=True)[:cantidad])
+        Notificacion.objects.filter(pk__in=ids).update(fecha_envio=fecha, leida=leida)
+        return ids
+
+    def test_archiva_por_mes_y_borra_por_lotes(self):
+        referencia = timezone.make_aware(datetime(2026, 10, 15, 12))
+        viejas = self.crear(self.propietario, timezone.make_aware(datetime(2025, 3, 10, 9)), cantidad=5)
+        self.crear(self.staff, timezone.make_aware(datetime(2025, 9, 30, 23)), leida=True, cantidad=2)
+        recientes = self.crear(self.propietario, timezone.make_aware(datetime(2025, 10, 1, 0, 30)), cantidad=1)
+        ContadorNoLeidas.objects.all().delete()
+        self.assertEqual(contar_no_leidas(self.propietario.id), 6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            archivadas = archivo.archivar(meses=12, tamano_lote=3, momento=referencia)
+        self.assertEqual(archivadas, {(2025, 3): 5, (2025, 9): 2})
+        self.assertEqual(list(Notificacion.objects.values_list('id', flat=True)), recientes)
+        self.assertFalse(NotificacionLog.objects.exclude(notificacion_id__in=recientes).exists())
+        self.assertEqual(contar_no_leidas(self.propietario.id), 1)
+
+        self.assertEqual(archivo.meses_archivados(), [(2025, 3), (2025, 9)])
+        filas = list(archivo.leer_mes(2025, 3))
+        self.assertEqual(sorted(fila['id'] for fila in filas), sorted(viejas))
+        self.assertEqual(filas[0]['logs'][0]['accion'], 'CREADA')
+        self.assertEqual(list(archivo.leer_mes(2025, 9, usuario_id=self.propietario.id)), [])
+
+    def test_lectura_descarta_lotes_repetidos(self):
+        fila = {'id': 1, 'usuario_id': self.propietario.id, 'asunto': 'Aviso', 'logs': []}
+        archivo._escribir({(2024, 1): [fila]})
+        archivo._escribir({(2024, 1): [fila, {**fila, 'id': 2}]})
+        self.assertEqual([f['id'] for f in archivo.leer_mes(2024, 1)], [1, 2])
+
+    async def leer(self, respuesta):
+        return b''.join([parte async for parte in respuesta.streaming_content])
+
+    def test_lote_interrumpido_no_corrompe_el_archivo(self):
+        fila = {'id': 1, 'usuario_id': self.propietario.id, 'asunto': 'Aviso', 'logs': []}
+        archivo._escribir({(2024, 1): [fila]})
+        ruta = archivo.ruta_mes(2024, 1)
+        confirmada = ruta.stat().st_size
+        # El proceso muere a mitad del siguiente miembro gzip
+        with open(ruta, 'ab') as crudo:
+            crudo.write(gzip.compress(b'{"id": 2}\n')[:15])
+
+        self.assertEqual([f['id'] for f in archivo.leer_mes(2024, 1)], [1])
+        archivo._escribir({(2024, 1): [{**fila, 'id': 3}]})
+        self.assertEqual([f['id'] for f in archivo.leer_mes(2024, 1)], [1, 3])
+        self.assertEqual(archivo.longitud_confirmada(ruta), ruta.stat().st_size)
+        self.assertGreater(ruta.stat().st_size, confirmada)
+
+    def test_api_de_lectura(self):
+        archivo._escribir({(2024, 1): [
+            {'id': 1, 'usuario_id': self.propietario.id, 'asunto': 'Propia', 'logs': []},
+            {'id': 2, 'usuario_id': self.staff.id, 'asunto': 'Ajena', 'logs': []},
+        ]})
+
+        self.client.force_login(self.propietario)
+        self.assertEqual(self.client.get(reverse('notificaciones:api_archivo_meses')).json(), {'meses': ['2024-01']})
+        respuesta = self.client.get(reverse('notificaciones:api_archivo_mes', args=[2024, 1]), {'usuario': self.staff.id})
+        self.assertTrue(respuesta.is_async)
+        lineas = [json.loads(linea) for linea in async_to_sync(self.leer)(respuesta).splitlines()]
+        self.assertEqual([fila['asunto'] for fila in lineas], ['Propia'])
+        self.assertEqual(self.client.get(reverse('notificaciones:api_archivo_mes', args=[2024, 2])).status_code, 404)
+
+        self.client.force_login(self.staff)
+        respuesta = self.client.get(reverse('notificaciones:api_archivo_mes', args=[2024, 1]), {'usuario': self.staff.id})
+        self.assertEqual([json.loads(l)['asunto'] for l in async_to_sync(self.leer)(respuesta).splitlines()], ['Ajena'])
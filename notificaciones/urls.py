@@ -11,4 +11,6 @@ urlpatterns = [
     path('api/mis/', views.api_mis_notificaciones, name='api_mis'),
     path('api/marcar-leida/<int:pk>/', views.api_marcar_leida, name='api_marcar_leida'),
     path('api/marcar-todas/', views.api_marcar_todas, name='api_marcar_todas'),
+    path('api/archivo/', views.api_archivo_meses, name='api_archivo_meses'),
+    path('api/archivo/<int:anio>/<int:mes>/', views.api_archivo_mes, name='api_archivo_mes'),
 ]
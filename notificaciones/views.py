@@ -1,20 +1,58 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from .archivo import aleer_mes, meses_archivados
+from .contadores import acontar_no_leidas, arestar_leida, sumar_no_leidas
 from .models import Notificacion, NotificacionLog
-from django.http import JsonResponse, HttpResponseForbidden
+from .paginacion import TAMANO_PAGINA, apagina, pagina, parsear_cursor
+from .services import marcar_todas_leidas
+from django.http import Http404, JsonResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+from django.db import transaction
 from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from autenticacion.decorators import staff_required
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import ensure_csrf_cookie
-from django.shortcuts import get_object_or_404
+from django.shortcuts import aget_object_or_404
+import json
+
+# Máximo de notificaciones por página en la API
+LIMITE_API = 100
+
+
+def _bandeja(request, notificaciones, plantilla, contexto=None):
+    """
+    Renderiza una página de notificaciones (paginación por cursor).
+
+    Un cursor inválido muestra la primera página.
+    """
+    cursor = parsear_cursor(request.GET.get('cursor'))
+    filas, siguiente = pagina(notificaciones, cursor, TAMANO_PAGINA)
+    siguiente_url = None
+    if siguiente:
+        parametros = request.GET.copy()
+        parametros['cursor'] = siguiente
+        siguiente_url = f'?{parametros.urlencode()}'
+    primera_url = None
+    if cursor:
+        parametros = request.GET.copy()
+        parametros.pop('cursor')
+        primera_url = f'?{parametros.urlencode()}'
+    return render(request, plantilla, {
+        'notificaciones': filas,
+        'siguiente_url': siguiente_url,
+        'primera_url': primera_url,
+        **(contexto or {}),
+    })
+
 
 @login_required
 @ensure_csrf_cookie
 def lista_notificaciones(request):
     """Listar notificaciones del usuario actual."""
-    notificaciones = Notificacion.objects.filter(usuario=request.user).order_by('-fecha_envio')
-    return render(request, 'notificaciones/lista.html', {'notificaciones': notificaciones})
+    notificaciones = Notificacion.objects.filter(usuario=request.user)
+    return _bandeja(request, notificaciones, 'notificaciones/lista.html')
 
 def crear_notificacion(usuario, actor, tipo, asunto, mensaje, cita=None):
     """
@@ -22,16 +60,18 @@ def crear_notificacion(usuario, actor, tipo, asunto, mensaje, cita=None):
     Puede ser llamada desde otras apps (ej: al agendar cita).
     """
     try:
-        n = Notificacion.objects.create(
-            usuario=usuario,
-            actor=actor,
-            tipo=tipo,
-            asunto=asunto,
-            mensaje=mensaje,
-            cita=cita,
-            canal_enviado=getattr(getattr(usuario, 'preferencia_notificacion', None), 'canal_preferido', 'EMAIL')
-        )
-        NotificacionLog.objects.create(notificacion=n, accion='CREADA', usuario=actor, detalles={'cita_id': getattr(cita, 'id', None)})
+        with transaction.atomic():
+            n = Notificacion.objects.create(
+                usuario=usuario,
+                actor=actor,
+                tipo=tipo,
+                asunto=asunto,
+                mensaje=mensaje,
+                cita=cita,
+                canal_enviado=getattr(getattr(usuario, 'preferencia_notificacion', None), 'canal_preferido', 'EMAIL')
+            )
+            NotificacionLog.objects.create(notificacion=n, accion='CREADA', usuario=actor, detalles={'cita_id': getattr(cita, 'id', None)})
+            sumar_no_leidas({n.usuario_id: 1})
         return True
     except Exception:
         return False
@@ -41,13 +81,17 @@ def crear_notificacion(usuario, actor, tipo, asunto, mensaje, cita=None):
 @staff_required
 def admin_notificaciones(request):
     tipo = request.GET.get('tipo')
-    usuario_id = request.GET.get('usuario')
-    qs = Notificacion.objects.all()
+    usuario_id = request.GET.get('usuario', '').strip()
+    qs = Notificacion.objects.select_related('usuario', 'actor')
     if tipo:
         qs = qs.filter(tipo=tipo)
-    if usuario_id:
+    if usuario_id.isdigit():
         qs = qs.filter(usuario_id=usuario_id)
-    return render(request, 'notificaciones/admin_lista.html', {'notificaciones': qs})
+    return _bandeja(request, qs, 'notificaciones/admin_lista.html', {
+        'tipos': Notificacion.TIPO_CHOICES,
+        'tipo': tipo,
+        'usuario_id': usuario_id,
+    })
 
 
 @login_required
@@ -55,8 +99,8 @@ def admin_notificaciones(request):
 def veterinario_notificaciones(request):
     if request.user.rol != 'VETERINARIO':
         return HttpResponseForbidden()
-    qs = Notificacion.objects.filter(usuario=request.user)
-    return render(request, 'notificaciones/vet_lista.html', {'notificaciones': qs})
+    qs = Notificacion.objects.filter(usuario=request.user).select_related('cita__mascota')
+    return _bandeja(request, qs, 'notificaciones/vet_lista.html')
 
 
 @login_required
@@ -65,12 +109,30 @@ def propietario_notificaciones(request):
     if request.user.rol != 'PROPIETARIO':
         return HttpResponseForbidden()
     qs = Notificacion.objects.filter(usuario=request.user)
-    return render(request, 'notificaciones/prop_lista.html', {'notificaciones': qs})
+    return _bandeja(request, qs, 'notificaciones/prop_lista.html')
 
 
 @login_required
-def api_mis_notificaciones(request):
-    qs = Notificacion.objects.filter(usuario=request.user)
+async def api_mis_notificaciones(request):
+    """
+    Notificaciones del usuario, de la más reciente a la más antigua.
+
+    Parámetros: ``cursor`` (el ``siguiente`` de la respuesta anterior) y
+    ``limite`` (máximo 100). Es una vista async: bajo ASGI los sondeos de
+    la bandeja no ocupan el hilo de las vistas síncronas.
+    """
+    cursor = None
+    if request.GET.get('cursor'):
+        cursor = parsear_cursor(request.GET['cursor'])
+        if cursor is None:
+            return HttpResponseBadRequest('Cursor inválido')
+    try:
+        limite = min(max(int(request.GET.get('limite', LIMITE_API)), 1), LIMITE_API)
+    except ValueError:
+        return HttpResponseBadRequest('Límite inválido')
+
+    usuario = await request.auser()
+    filas, siguiente = await apagina(Notificacion.objects.filter(usuario=usuario), cursor, limite)
     datos = [{
         'id': n.id,
         'tipo': n.tipo,
@@ -79,27 +141,95 @@ def api_mis_notificaciones(request):
         'leida': n.leida,
         'fecha_envio': n.fecha_envio.isoformat(),
         'cita_id': n.cita_id,
-    } for n in qs[:100]]
-    return JsonResponse({'unread': qs.filter(leida=False).count(), 'items': datos})
+        'detalle': n.detalle,
+    } for n in filas]
+    return JsonResponse({'unread': await acontar_no_leidas(usuario.id), 'items': datos, 'siguiente': siguiente})
 
 
 @login_required
-def api_marcar_leida(request, pk):
-    n = get_object_or_404(Notificacion, pk=pk, usuario=request.user)
-    n.marcar_como_leida()
-    NotificacionLog.objects.create(notificacion=n, accion='LEIDA', usuario=request.user)
+async def api_marcar_leida(request, pk):
+    """
+    Marca una notificación como leída (vista async).
+
+    El ``UPDATE`` condicional sobre ``leida`` hace que dos peticiones
+    simultáneas resten una sola vez del contador.
+    """
+    usuario = await request.auser()
+    n = await aget_object_or_404(Notificacion, pk=pk, usuario=usuario)
+    marcadas = await Notificacion.objects.filter(pk=n.pk, leida=False).aupdate(
+        leida=True, fecha_lectura=timezone.now()
+    )
+    if marcadas:
+        await arestar_leida(usuario.id)
+    await NotificacionLog.objects.acreate(notificacion=n, accion='LEIDA', usuario=usuario)
     return JsonResponse({'ok': True})
 
 
 @login_required
 @require_POST
 def api_marcar_todas(request):
-    qs = Notificacion.objects.filter(usuario=request.user, leida=False)
-    total = qs.count()
-    for n in qs:
-        n.marcar_como_leida()
-        NotificacionLog.objects.create(notificacion=n, accion='LEIDA', usuario=request.user)
-    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        return JsonResponse({'ok': True, 'marked': total})
+    """
+    Marca como leídas todas las notificaciones del usuario.
+
+    Acepta ``tipo`` (ej: RECORDATORIO) y ``hasta`` (fecha/hora ISO) para
+    marcar solo una parte.
+    """
+    es_ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
+    tipo = request.POST.get('tipo') or None
+    hasta = request.POST.get('hasta') or None
+    error = None
+    if tipo and tipo not in dict(Notificacion.TIPO_CHOICES):
+        error = 'Tipo de notificación inválido'
+    if hasta:
+        try:
+            hasta = parse_datetime(hasta)
+        except ValueError:
+            # Bien formada pero fuera de rango (ej: mes 13)
+            hasta = None
+        if hasta is None:
+            error = 'Fecha inválida'
+        elif timezone.is_naive(hasta):
+            hasta = timezone.make_aware(hasta)
+
+    if error:
+        if es_ajax:
+            return JsonResponse({'ok': False, 'error': error}, status=400)
+        messages.error(request, error)
+    else:
+        total = marcar_todas_leidas(request.user, tipo=tipo, hasta=hasta)
+        if es_ajax:
+            return JsonResponse({'ok': True, 'marked': total})
     referer = request.META.get('HTTP_REFERER') or '/'
     return redirect(referer)
+
+
+@login_required
+def api_archivo_meses(request):
+    """Meses con notificaciones archivadas (``AAAA-MM``)."""
+    return JsonResponse({'meses': [f'{anio:04d}-{mes:02d}' for anio, mes in meses_archivados()]})
+
+
+@login_required
+def api_archivo_mes(request, anio, mes):
+    """
+    Notificaciones archivadas de un mes, una por línea (JSON Lines).
+
+    Los propietarios ven las suyas; el staff (como en la bandeja de
+    administración) ve las de todos o las de ``?usuario=<id>``.
+    """
+    if not 1 <= mes <= 12 or (anio, mes) not in meses_archivados():
+        raise Http404
+    if request.user.rol == 'PROPIETARIO':
+        usuario_id = request.user.id
+    else:
+        usuario_id = request.GET.get('usuario', '').strip()
+        if usuario_id and not usuario_id.isdigit():
+            return HttpResponseBadRequest('Usuario inválido')
+        usuario_id = int(usuario_id) if usuario_id else None
+
+    # Iterador asíncrono: bajo ASGI se envía por bloques, sin cargar el mes en memoria
+    async def lineas():
+        async for fila in aleer_mes(anio, mes, usuario_id):
+            yield json.dumps(fila, ensure_ascii=False) + '\n'
+
+    return StreamingHttpResponse(lineas(), content_type='application/x-ndjson; charset=utf-8')
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Pago, Factura
+from .models import Pago, Factura, SaldoPropietario, SolicitudPago
 
 class FacturaInline(admin.StackedInline):
     model = Factura
@@ -14,3 +14,18 @@ class PagoAdmin(admin.ModelAdmin):
 @admin.register(Factura)
 class FacturaAdmin(admin.ModelAdmin):
     list_display = ('numero_factura', 'fecha_emision', 'propietario', 'total')
+
+@admin.register(SaldoPropietario)
+class SaldoPropietarioAdmin(admin.ModelAdmin):
+    list_display = ('propietario', 'pendientes', 'pendiente_total', 'pagado_total', 'ultimo_pago', 'facturas_abiertas')
+    list_select_related = ('propietario',)
+    search_fields = ('propietario__nombre', 'propietario__documento')
+    # Lo mantienen las señales de pagos y citas (pagos/saldos.py)
+    readonly_fields = ('propietario', 'pendientes', 'pendiente_total', 'pagos_completados', 'pagado_total', 'ultimo_pago', 'facturas_abiertas')
+
+@admin.register(SolicitudPago)
+class SolicitudPagoAdmin(admin.ModelAdmin):
+    list_display = ('fecha_creacion', 'usuario', 'clave', 'pago', 'codigo_respuesta')
+    list_select_related = ('usuario',)
+    search_fields = ('clave',)
+    readonly_fields = ('usuario', 'clave', 'huella', 'pago', 'codigo_respuesta', 'ubicacion', 'fecha_creacion')
@@ -5,3 +5,6 @@ class PagosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pagos'
     verbose_name = 'Pagos y Facturación'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,148 @@
+"""
+Generación de los PDF de las facturas fuera de la petición.
+
+``registrar_pago`` crea la ``Factura`` sin PDF; las facturas con ``pdf``
+vacío forman la cola que vacía el comando ``generar_facturas_pdf`` (como
+trabajador permanente con ``--continuo`` o de una vez para rellenar las
+facturas antiguas).
+
+Cada lote se lee en una consulta y se convierte a diccionarios; el dibujo
+(``pagos.pdf.renderizar_factura``) corre en un ``ProcessPoolExecutor`` cuyos
+procesos no tocan la base de datos y cargan fuentes y logo una sola vez.
+El proceso principal guarda los archivos en el storage y asigna las rutas
+con un solo ``bulk_update`` por lote.
+"""
+
+import logging
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from . import pdf
+from .models import Factura
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 200
+
+# Facturas por tarea enviada al pool
+TAMANO_TAREA = 25
+
+
+def ruta_logo():
+    ruta = getattr(settings, 'FACTURAS_LOGO', None)
+    return str(ruta) if ruta else None
+
+
+def crear_ejecutor(procesos):
+    """
+    Pool de procesos para dibujar facturas.
+
+    Usa ``spawn``: los procesos hijos no heredan conexiones ni hilos del
+    proceso de Django y solo importan ``pagos.pdf``.
+    """
+    return ProcessPoolExecutor(
+        max_workers=procesos,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=pdf.inicializar,
+        initargs=(ruta_logo(),),
+    )
+
+
+def datos_factura(factura):
+    """Datos de la factura que necesita el PDF, como tipos simples (pickle)."""
+    cita = factura.pago.cita
+    if cita is not None and cita.servicio_id:
+        descripcion = f'Servicio Veterinario: {cita.servicio.get_nombre_display()}'
+    else:
+        descripcion = 'Servicios Veterinarios Generales'
+    propietario = factura.propietario
+    return {
+        'id': factura.id,
+        'numero': factura.numero_factura,
+        'fecha': timezone.localtime(factura.fecha_emision).strftime('%d/%m/%Y'),
+        'cliente': propietario.nombre,
+        'documento': propietario.documento,
+        'direccion': propietario.direccion,
+        'telefono': propietario.telefono,
+        'descripcion': descripcion,
+        'subtotal': str(factura.subtotal),
+        'impuestos': str(factura.impuestos),
+        'total': str(factura.total),
+        'ruta_logo': ruta_logo(),
+    }
+
+
+def nombre_pdf(factura):
+    return timezone.localtime(factura.fecha_emision).strftime(f'facturas/%Y/%m/{factura.numero_factura}.pdf')
+
+
+def _dibujar(ejecutor, datos):
+    """Dibuja los ``datos`` en el pool (o aquí si no hay pool); ``None`` si falla."""
+    if ejecutor is None:
+        resultados = pdf.renderizar_lote(datos)
+    else:
+        trozos = [datos[i:i + TAMANO_TAREA] for i in range(0, len(datos), TAMANO_TAREA)]
+        resultados = [r for trozo in ejecutor.map(pdf.renderizar_lote, trozos) for r in trozo]
+    for d, resultado in zip(datos, resultados):
+        if isinstance(resultado, str):
+            logger.error('No se pudo generar el PDF de la factura %s: %s', d['numero'], resultado)
+            yield None
+        else:
+            yield resultado
+
+
+def generar_lote(ejecutor=None, tamano_lote=TAMANO_LOTE, desde_id=0):
+    """
+    Genera los PDF del siguiente lote de facturas sin PDF con ``id > desde_id``.
+
+    Las que fallan quedan sin PDF (se reintentan en la siguiente ejecución);
+    ``desde_id`` permite a quien llama saltarlas dentro de la misma.
+
+    Returns:
+        tuple: (Counter con 'facturas', 'paginas' y 'fallidas', último id
+        procesado o ``None`` si no quedan)
+    """
+    facturas = list(
+        Factura.objects.filter(pdf='', id__gt=desde_id)
+        .select_related('propietario', 'pago__cita__servicio')
+        .order_by('id')[:tamano_lote]
+    )
+    if not facturas:
+        return Counter(), None
+
+    resultado = Counter()
+    generadas = []
+    for factura, dibujo in zip(facturas, _dibujar(ejecutor, [datos_factura(f) for f in facturas])):
+        if dibujo is None:
+            resultado['fallidas'] += 1
+            continue
+        contenido, paginas = dibujo
+        factura.pdf.name = default_storage.save(nombre_pdf(factura), ContentFile(contenido))
+        generadas.append(factura)
+        resultado['paginas'] += paginas
+
+    Factura.objects.bulk_update(generadas, ['pdf'])
+    resultado['facturas'] = len(generadas)
+    return resultado, facturas[-1].id
+
+
+def generar_pendientes(ejecutor=None, tamano_lote=TAMANO_LOTE):
+    """
+    Genera los PDF de todas las facturas que no lo tienen.
+
+    Returns:
+        Counter: 'facturas', 'paginas' y 'fallidas'
+    """
+    total = Counter()
+    ultimo_id = 0
+    while True:
+        resultado, ultimo_id = generar_lote(ejecutor, tamano_lote, ultimo_id)
+        if ultimo_id is None:
+            return total
+        total.update(resultado)
@@ -1,6 +1,7 @@
 from django import forms
 from .models import Pago
 from citas.models import Cita
+from propietarios.models import Propietario
 
 class PagoForm(forms.ModelForm):
     """Formulario para registrar un pago."""
@@ -30,3 +31,33 @@ class PagoForm(forms.ModelForm):
             self.fields['cita'].disabled = True
             self.fields['propietario'].disabled = True
             self.fields['monto'].widget.attrs['readonly'] = True
+
+
+class FiltroPagosForm(forms.Form):
+    """Filtros del historial de pagos (todos opcionales)."""
+
+    desde = forms.DateField(
+        required=False, label='Desde', widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    hasta = forms.DateField(
+        required=False, label='Hasta', widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    tipo_pago = forms.ChoiceField(
+        required=False, label='Método', choices=[('', 'Todos')] + Pago.TIPO_PAGO_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    estado = forms.ChoiceField(
+        required=False, label='Estado', choices=[('', 'Todos')] + Pago.ESTADO_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    propietario = forms.ModelChoiceField(
+        required=False, label='Propietario', empty_label='Todos',
+        queryset=Propietario.objects.only('id', 'nombre', 'documento').order_by('nombre'),
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+
+    def clean(self):
+        datos = super().clean()
+        if datos.get('desde') and datos.get('hasta') and datos['desde'] > datos['hasta']:
+            raise forms.ValidationError('La fecha inicial no puede ser posterior a la final.')
+        return datos
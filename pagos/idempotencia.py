@@ -0,0 +1,118 @@
+"""
+Claves de idempotencia para el registro de pagos.
+
+El formulario de pago lleva una clave aleatoria (campo oculto
+``clave_idempotencia`` o encabezado ``Idempotency-Key``). La vista la
+reclama con un ``INSERT`` en ``SolicitudPago`` dentro de la misma
+transacción que registra el pago, y al final guarda en esa fila el pago y
+la respuesta:
+
+- Una repetición que llega después de confirmar encuentra la fila y
+  devuelve la respuesta guardada sin volver a ejecutar la transacción.
+- Una repetición simultánea espera el bloqueo de escritura (en SQLite la
+  transacción IMMEDIATE; en otros motores el índice único) y luego choca
+  con la clave ya confirmada, así que el pago se registra una sola vez.
+- Si la transacción se revierte, la clave se libera con ella.
+
+La clave es por usuario y obligatoria: un ``POST`` sin clave devuelve 400
+(no habría cómo reconocer su reenvío). Reusarla con otros datos o en otra
+ruta devuelve 409. Las solicitudes viejas se purgan con ``purgar_solicitudes_pago``.
+"""
+
+import hashlib
+import re
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils import timezone
+
+from .models import SolicitudPago
+
+CAMPO_CLAVE = 'clave_idempotencia'
+DIAS_RETENCION = 7
+
+_FORMATO_CLAVE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+_CAMPOS_IGNORADOS = {CAMPO_CLAVE, 'csrfmiddlewaretoken'}
+
+
+def nueva_clave():
+    return uuid.uuid4().hex
+
+
+def clave_de(request):
+    """
+    Clave de idempotencia de la solicitud.
+
+    Returns:
+        str | None: La clave, '' si no se envió ninguna, o None si es inválida
+    """
+    clave = request.headers.get('Idempotency-Key') or request.POST.get(CAMPO_CLAVE, '')
+    if clave and not _FORMATO_CLAVE.match(clave):
+        return None
+    return clave
+
+
+def huella(request):
+    """SHA-256 de la ruta y los datos enviados (sin la clave ni el token CSRF)."""
+    datos = sorted(
+        (campo, valor) for campo, valores in request.POST.lists()
+        if campo not in _CAMPOS_IGNORADOS for valor in valores
+    )
+    return hashlib.sha256(repr((request.path, datos)).encode()).hexdigest()
+
+
+def reclamar(request, clave):
+    """
+    Reclama la clave para esta solicitud.
+
+    Debe llamarse dentro de la transacción que registra el pago: el
+    ``INSERT`` se revierte con ella.
+
+    Returns:
+        tuple: (SolicitudPago, True si la solicitud es nueva; False si la
+        clave ya se había usado)
+    """
+    datos = {'usuario': request.user, 'clave': clave}
+    try:
+        with transaction.atomic():
+            return SolicitudPago.objects.create(huella=huella(request), **datos), True
+    except IntegrityError:
+        return SolicitudPago.objects.get(**datos), False
+
+
+def guardar_respuesta(solicitud, pago, respuesta):
+    """Guarda el pago y la respuesta (código y redirección) de la solicitud."""
+    solicitud.pago = pago
+    solicitud.codigo_respuesta = respuesta.status_code
+    solicitud.ubicacion = respuesta.get('Location', '')
+    solicitud.save(update_fields=['pago', 'codigo_respuesta', 'ubicacion'])
+
+
+def repetir_respuesta(request, solicitud):
+    """
+    Respuesta para una clave ya usada: la guardada si los datos coinciden,
+    409 si la clave se reusó con otros datos.
+    """
+    if solicitud.huella != huella(request):
+        return HttpResponse('La clave de idempotencia ya se usó con otros datos.', status=409)
+    if solicitud.ubicacion:
+        respuesta = HttpResponseRedirect(solicitud.ubicacion)
+        respuesta.status_code = solicitud.codigo_respuesta or respuesta.status_code
+    else:
+        respuesta = HttpResponse(status=solicitud.codigo_respuesta or 200)
+    respuesta['Idempotent-Replayed'] = 'true'
+    return respuesta
+
+
+def purgar(dias=DIAS_RETENCION):
+    """
+    Borra las solicitudes con más de ``dias`` días.
+
+    Returns:
+        int: Solicitudes borradas
+    """
+    corte = timezone.now() - timedelta(days=dias)
+    borradas, _ = SolicitudPago.objects.filter(fecha_creacion__lt=corte).delete()
+    return borradas
@@ -0,0 +1,168 @@
+"""
+Historial de pagos: filtros, paginación por cursor, totales y exportación.
+
+La lista se ordena por (fecha_pago, id) descendente y cada página sigue
+después de la última fila de la anterior (sin ``OFFSET``), igual que las
+bandejas de notificaciones. Los totales del período filtrado salen de una
+sola consulta con agregación condicional (``Sum(..., filter=Q(...))``), y
+la exportación CSV recorre la tabla con ``.iterator()`` por bloques, así
+que la memoria no crece con el número de pagos. El generador es asíncrono
+porque la aplicación se sirve por ASGI, donde Django junta en una lista
+todo lo que entrega un generador síncrono antes de enviarlo.
+"""
+
+import csv
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from servicios.models import Servicio
+from .models import Pago
+
+TAMANO_PAGINA = 50
+TAMANO_BLOQUE_CSV = 2000
+ORDEN = ('-fecha_pago', '-id')
+
+COLUMNAS_CSV = (
+    'ID', 'Fecha', 'Propietario', 'Documento', 'Concepto', 'Monto', 'Método', 'Estado', 'Referencia',
+)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def filtrar(pagos, filtros):
+    """
+    Aplica los filtros del historial.
+
+    Args:
+        filtros: ``cleaned_data`` de ``FiltroPagosForm`` (desde, hasta,
+            tipo_pago, estado, propietario); los vacíos se ignoran
+    """
+    # Rangos sobre fecha_pago (no __date) para que se use el índice
+    if filtros.get('desde'):
+        pagos = pagos.filter(fecha_pago__gte=timezone.make_aware(datetime.combine(filtros['desde'], time.min)))
+    if filtros.get('hasta'):
+        siguiente_dia = filtros['hasta'] + timedelta(days=1)
+        pagos = pagos.filter(fecha_pago__lt=timezone.make_aware(datetime.combine(siguiente_dia, time.min)))
+    if filtros.get('tipo_pago'):
+        pagos = pagos.filter(tipo_pago=filtros['tipo_pago'])
+    if filtros.get('estado'):
+        pagos = pagos.filter(estado=filtros['estado'])
+    if filtros.get('propietario'):
+        pagos = pagos.filter(propietario=filtros['propietario'])
+    return pagos
+
+
+def codificar_cursor(pago):
+    microsegundos = (pago.fecha_pago - _EPOCH) // timedelta(microseconds=1)
+    return f'{microsegundos}-{pago.id}'
+
+
+def parsear_cursor(cursor):
+    """
+    Convierte un cursor en (fecha_pago, id).
+
+    Returns:
+        tuple | None: None si el cursor es inválido
+    """
+    try:
+        microsegundos, pk = (int(parte) for parte in cursor.split('-'))
+    except (AttributeError, ValueError):
+        return None
+    if microsegundos < 0 or pk <= 0:
+        return None
+    return _EPOCH + timedelta(microseconds=microsegundos), pk
+
+
+def pagina(pagos, cursor=None, tamano=TAMANO_PAGINA):
+    """
+    Una página del historial, del pago más reciente al más antiguo.
+
+    Args:
+        pagos: QuerySet filtrado (sin ordenar ni recortar)
+        cursor: Posición devuelta por la página anterior, ya parseada
+
+    Returns:
+        tuple: (lista de pagos, cursor de la siguiente página o None)
+    """
+    pagos = pagos.order_by(*ORDEN)
+    if cursor:
+        fecha_pago, pk = cursor
+        pagos = pagos.filter(
+            Q(fecha_pago__lt=fecha_pago) | Q(fecha_pago=fecha_pago, id__lt=pk),
+            fecha_pago__lte=fecha_pago,
+        )
+    filas = list(pagos[:tamano + 1])
+    if len(filas) <= tamano:
+        return filas, None
+    filas = filas[:tamano]
+    return filas, codificar_cursor(filas[-1])
+
+
+def totales(pagos):
+    """
+    Totales de los pagos filtrados, en una sola consulta.
+
+    Returns:
+        dict: cantidad y total generales, ``por_estado`` como
+        (etiqueta, cantidad, total) y ``por_tipo`` (recaudado por método,
+        solo pagos completados) como (etiqueta, total)
+    """
+    campos = {'cantidad': Count('id'), 'total': Sum('monto', default=0)}
+    for estado, _ in Pago.ESTADO_CHOICES:
+        campos[f'cantidad_{estado}'] = Count('id', filter=Q(estado=estado))
+        campos[f'total_{estado}'] = Sum('monto', filter=Q(estado=estado), default=0)
+    for tipo, _ in Pago.TIPO_PAGO_CHOICES:
+        campos[f'recaudado_{tipo}'] = Sum('monto', filter=Q(tipo_pago=tipo, estado='COMPLETADO'), default=0)
+    valores = pagos.order_by().aggregate(**campos)
+    return {
+        'cantidad': valores['cantidad'],
+        'total': valores['total'],
+        'por_estado': [
+            (etiqueta, valores[f'cantidad_{estado}'], valores[f'total_{estado}'])
+            for estado, etiqueta in Pago.ESTADO_CHOICES
+        ],
+        'por_tipo': [(etiqueta, valores[f'recaudado_{tipo}']) for tipo, etiqueta in Pago.TIPO_PAGO_CHOICES],
+    }
+
+
+class _Eco:
+    """Archivo falso para ``csv.writer``: devuelve cada línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+async def lineas_csv(pagos, tamano_bloque=TAMANO_BLOQUE_CSV):
+    """
+    CSV de los pagos filtrados como iterador asíncrono: el encabezado y
+    luego un fragmento con las líneas de cada bloque.
+
+    Lee tuplas con ``values_list`` (sin instanciar modelos) por bloques de
+    ``tamano_bloque`` filas, cada bloque en el hilo de la base de datos. No
+    se usa ``.aiterator()``: con ``values_list`` de varias columnas Django
+    ejecuta la consulta dentro del event loop (``SynchronousOnlyOperation``).
+    """
+    tipos = dict(Pago.TIPO_PAGO_CHOICES)
+    estados = dict(Pago.ESTADO_CHOICES)
+    servicios = dict(Servicio.TIPO_CHOICES)
+    escritor = csv.writer(_Eco())
+    # BOM: Excel abre el archivo como UTF-8 (tildes y eñes)
+    yield '\ufeff' + escritor.writerow(COLUMNAS_CSV)
+    filas = pagos.order_by(*ORDEN).values_list(
+        'id', 'fecha_pago', 'propietario__nombre', 'propietario__documento', 'cita__servicio__nombre',
+        'monto', 'tipo_pago', 'estado', 'referencia',
+    ).iterator(tamano_bloque)
+    siguiente_bloque = sync_to_async(lambda: list(islice(filas, tamano_bloque)))
+    while bloque := await siguiente_bloque():
+        # Un fragmento por bloque: bajo ASGI cada fragmento es un envío
+        yield ''.join(
+            escritor.writerow((
+                pk, timezone.localtime(fecha).strftime('%Y-%m-%d %H:%M'), nombre, documento,
+                servicios.get(servicio, servicio) or 'Pago General', monto, tipos.get(tipo, tipo), estados.get(estado, estado), referencia,
+            ))
+            for pk, fecha, nombre, documento, servicio, monto, tipo, estado, referencia in bloque
+        )
@@ -0,0 +1 @@
+# Archivo vacío para que Python reconozca el directorio como paquete
@@ -0,0 +1,80 @@
+"""
+Comando de Django que genera los PDF de las facturas que no lo tienen.
+
+``registrar_pago`` crea la factura sin PDF; este comando los dibuja en un
+pool de procesos (``pagos/facturas.py``) y los guarda en
+``MEDIA_ROOT/facturas/AAAA/MM/``. Sirve tanto de trabajador permanente
+como para rellenar de una vez las facturas antiguas.
+
+Uso:
+    python manage.py generar_facturas_pdf                  # rellena las pendientes y termina
+    python manage.py generar_facturas_pdf --procesos 8 --lote 500
+    python manage.py generar_facturas_pdf --continuo       # trabajador permanente
+    python manage.py generar_facturas_pdf --procesos 0     # sin pool, en este proceso
+
+En producción se ejecuta con ``--continuo`` junto al servidor (systemd,
+supervisor o un contenedor aparte).
+"""
+
+import os
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pagos.facturas import TAMANO_LOTE, crear_ejecutor, generar_lote
+
+
+class Command(BaseCommand):
+    help = 'Genera en paralelo los PDF de las facturas pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Procesos que dibujan PDF (0 = en este proceso)',
+        )
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Facturas por lote')
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='Sigue esperando facturas nuevas en lugar de terminar al vaciar la cola',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera cuando no hay facturas pendientes (con --continuo)',
+        )
+
+    def handle(self, *args, **options):
+        if options['procesos'] < 0:
+            raise CommandError('--procesos no puede ser negativo')
+        lote = max(1, options['lote'])
+        ejecutor = crear_ejecutor(options['procesos']) if options['procesos'] else None
+        total = Counter()
+        inicio = time.perf_counter()
+        ultimo_id = 0
+        try:
+            while True:
+                resultado, ultimo_id = generar_lote(ejecutor, lote, ultimo_id or 0)
+                total.update(resultado)
+                if ultimo_id is not None:
+                    continue
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if ejecutor is not None:
+                ejecutor.shutdown(cancel_futures=True)
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"Facturas generadas: {total['facturas']} ({total['paginas']} páginas) en {duracion:.2f}s; "
+            f"{total['paginas'] / duracion if duracion else 0:.1f} páginas/s"
+        ))
+        if total['fallidas']:
+            self.stdout.write(self.style.WARNING(f"Facturas con error (quedan pendientes): {total['fallidas']}"))
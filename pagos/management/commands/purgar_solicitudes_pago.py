@@ -0,0 +1,32 @@
+"""
+Comando de Django que purga las claves de idempotencia de pagos antiguas.
+
+Borra las ``SolicitudPago`` con más de ``--dias`` días: pasado ese tiempo
+ya no se esperan reenvíos del mismo formulario.
+
+Uso:
+    python manage.py purgar_solicitudes_pago
+    python manage.py purgar_solicitudes_pago --dias 30
+
+Pensado para ejecutarse una vez al día (cron o systemd timer).
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pagos.idempotencia import DIAS_RETENCION, purgar
+
+
+class Command(BaseCommand):
+    help = 'Borra las claves de idempotencia de pagos más antiguas que el período de retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=DIAS_RETENCION,
+            help=f'Días que se conservan las solicitudes (por defecto {DIAS_RETENCION})',
+        )
+
+    def handle(self, *args, **options):
+        if options['dias'] < 0:
+            raise CommandError('--dias no puede ser negativo')
+        borradas = purgar(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f'Solicitudes de pago purgadas: {borradas}'))
@@ -0,0 +1,47 @@
+"""
+Comando de Django para verificar los saldos de pagos por propietario.
+
+Recalcula todos los saldos (``SaldoPropietario``) con un único agregado
+agrupado por propietario y reporta los que difieren de los guardados, por
+ejemplo tras editar pagos o citas con ``update()`` o directamente en la
+base de datos. Con ``--reparar`` también los corrige.
+
+Uso:
+    python manage.py verificar_saldos
+    python manage.py verificar_saldos --reparar
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from pagos.saldos import verificar_saldos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los saldos de pagos por propietario y reporta (o corrige) los que difieren'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reparar',
+            action='store_true',
+            help='Corrige los saldos que difieren',
+        )
+
+    def handle(self, *args, **options):
+        reparar = options['reparar']
+        inicio = time.perf_counter()
+        diferencias = verificar_saldos(aplicar=reparar)
+        duracion = time.perf_counter() - inicio
+
+        for propietario_id, guardado, real in diferencias:
+            if guardado is None:
+                self.stdout.write(f'  Propietario #{propietario_id}: sin saldo')
+                continue
+            for campo, valor in real.items():
+                if guardado[campo] != valor:
+                    self.stdout.write(f'  Propietario #{propietario_id}: {campo} {guardado[campo]} -> {valor}')
+
+        accion = 'corregidos' if reparar else 'con diferencias'
+        estilo = self.style.SUCCESS if reparar or not diferencias else self.style.WARNING
+        self.stdout.write(estilo(f'Saldos {accion}: {len(diferencias)} en {duracion:.2f}s'))
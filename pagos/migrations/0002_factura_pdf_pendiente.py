@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0001_initial'),
+        ('propietarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='factura',
+            name='pdf',
+            field=models.FileField(blank=True, upload_to='facturas/%Y/%m/', verbose_name='Factura PDF'),
+        ),
+        migrations.AlterField(
+            model_name='pago',
+            name='tipo_pago',
+            field=models.CharField(choices=[('EFECTIVO', 'Efectivo'), ('TARJETA', 'Tarjeta'), ('TRANSFERENCIA', 'Transferencia'), ('PENDIENTE', 'Pendiente')], max_length=15, verbose_name='Tipo de pago'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(condition=models.Q(('pdf', '')), fields=['id'], name='factura_sin_pdf_idx'),
+        ),
+    ]
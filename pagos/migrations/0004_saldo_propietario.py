@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0003_indices_historial'),
+        ('propietarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoPropietario',
+            fields=[
+                ('propietario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='saldo', serialize=False, to='propietarios.propietario', verbose_name='Propietario')),
+                ('pendientes', models.IntegerField(default=0, verbose_name='Pagos pendientes')),
+                ('pendiente_total', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Total pendiente')),
+                ('pagos_completados', models.IntegerField(default=0, verbose_name='Pagos completados')),
+                ('pagado_total', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Total pagado')),
+                ('ultimo_pago', models.DateTimeField(blank=True, null=True, verbose_name='Último pago')),
+                ('facturas_abiertas', models.IntegerField(default=0, help_text='Citas completadas que aún no se han pagado', verbose_name='Facturas abiertas')),
+            ],
+            options={
+                'verbose_name': 'Saldo de propietario',
+                'verbose_name_plural': 'Saldos de propietarios',
+            },
+        ),
+    ]
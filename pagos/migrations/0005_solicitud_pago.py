@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0004_saldo_propietario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolicitudPago',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64, verbose_name='Clave de idempotencia')),
+                ('huella', models.CharField(help_text='SHA-256 de la ruta y los datos enviados', max_length=64, verbose_name='Huella de la solicitud')),
+                ('codigo_respuesta', models.PositiveSmallIntegerField(default=0, verbose_name='Código de respuesta')),
+                ('ubicacion', models.CharField(blank=True, max_length=255, verbose_name='Redirección de la respuesta')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Fecha de la solicitud')),
+                ('pago', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='solicitudes', to='pagos.pago', verbose_name='Pago registrado')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solicitudes_pago', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Solicitud de pago',
+                'verbose_name_plural': 'Solicitudes de pago',
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'clave'), name='solicitud_pago_clave_unica')],
+            },
+        ),
+    ]
@@ -5,9 +5,10 @@ Este módulo contiene los modelos para el sistema de pagos simulados
 y generación de facturas en PDF.
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, RegexValidator
-import uuid
+
+from administracion.secuencias import siguiente_numero
 
 
 class Pago(models.Model):
@@ -110,10 +111,25 @@ class Pago(models.Model):
         verbose_name = 'Pago'
         verbose_name_plural = 'Pagos'
         ordering = ['-fecha_pago']
+        indexes = [
+            # Historial paginado por cursor (fecha_pago, id), con y sin filtro de estado
+            models.Index(fields=['fecha_pago', 'id'], name='pago_fecha_idx'),
+            models.Index(fields=['estado', 'fecha_pago', 'id'], name='pago_estado_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"Pago {self.id} - {self.propietario.nombre} - ${self.monto} ({self.get_tipo_pago_display()})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Guarda los datos del saldo del propietario cargados para detectar cambios al guardar."""
+        instancia = super().from_db(db, field_names, values)
+        datos = instancia.__dict__
+        instancia._saldo_original = (
+            datos.get('propietario_id'), datos.get('estado'), datos.get('monto'), datos.get('fecha_pago')
+        )
+        return instancia
+    
     def marcar_como_completado(self):
         """Marca el pago como completado."""
         self.estado = 'COMPLETADO'
@@ -170,8 +186,10 @@ class Factura(models.Model):
         verbose_name='Total'
     )
     
+    # Vacío hasta que el comando generar_facturas_pdf la genera (pagos/facturas.py)
     pdf = models.FileField(
         upload_to='facturas/%Y/%m/',
+        blank=True,
         verbose_name='Factura PDF'
     )
     
@@ -184,12 +202,148 @@ class Factura(models.Model):
         verbose_name = 'Factura'
         verbose_name_plural = 'Facturas'
         ordering = ['-fecha_emision']
+        indexes = [
+            # Cola de facturas pendientes de PDF
+            models.Index(fields=['id'], condition=models.Q(pdf=''), name='factura_sin_pdf_idx'),
+        ]
     
     def __str__(self):
         return f"Factura {self.numero_factura} - {self.propietario.nombre} - ${self.total}"
     
     def save(self, *args, **kwargs):
-        """Genera número de factura único si no existe."""
-        if not self.numero_factura:
-            self.numero_factura = f"FACT-{uuid.uuid4().hex[:8].upper()}"
-        super().save(*args, **kwargs)
+        """
+        Asigna el siguiente número de factura si no existe.
+
+        El número se toma en la misma transacción del guardado (ver
+        administracion/secuencias.py): si falla, se devuelve.
+        """
+        if self.numero_factura:
+            return super().save(*args, **kwargs)
+        try:
+            with transaction.atomic():
+                self.numero_factura = siguiente_numero('factura')
+                super().save(*args, **kwargs)
+        except Exception:
+            self.numero_factura = ''
+            raise
+
+
+class SaldoPropietario(models.Model):
+    """
+    Saldo de pagos de cada propietario.
+    
+    Proyección de los pagos y las citas del propietario: pendientes y
+    pagados (cantidad y total), fecha del último pago y citas atendidas sin
+    pagar. Se mantiene de forma incremental (ver ``pagos/saldos.py``) y se
+    verifica con ``python manage.py verificar_saldos``.
+    """
+    
+    propietario = models.OneToOneField(
+        'propietarios.Propietario',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='saldo',
+        verbose_name='Propietario'
+    )
+    
+    pendientes = models.IntegerField(default=0, verbose_name='Pagos pendientes')
+    
+    pendiente_total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Total pendiente'
+    )
+    
+    pagos_completados = models.IntegerField(default=0, verbose_name='Pagos completados')
+    
+    pagado_total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Total pagado'
+    )
+    
+    ultimo_pago = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Último pago'
+    )
+    
+    facturas_abiertas = models.IntegerField(
+        default=0,
+        verbose_name='Facturas abiertas',
+        help_text='Citas completadas que aún no se han pagado'
+    )
+    
+    class Meta:
+        verbose_name = 'Saldo de propietario'
+        verbose_name_plural = 'Saldos de propietarios'
+    
+    def __str__(self):
+        return f"Saldo de {self.propietario_id}: pendiente ${self.pendiente_total}"
+
+
+class SolicitudPago(models.Model):
+    """
+    Solicitud de registro de pago ya atendida, por clave de idempotencia.
+    
+    Cada formulario de pago lleva una clave única; la primera solicitud con
+    esa clave guarda aquí el pago y la respuesta, y las repeticiones (doble
+    clic, reenvíos) devuelven la misma respuesta sin volver a registrar el
+    pago (ver ``pagos/idempotencia.py``).
+    """
+    
+    usuario = models.ForeignKey(
+        'autenticacion.Usuario',
+        on_delete=models.CASCADE,
+        related_name='solicitudes_pago',
+        verbose_name='Usuario'
+    )
+    
+    clave = models.CharField(
+        max_length=64,
+        verbose_name='Clave de idempotencia'
+    )
+    
+    huella = models.CharField(
+        max_length=64,
+        verbose_name='Huella de la solicitud',
+        help_text='SHA-256 de la ruta y los datos enviados'
+    )
+    
+    pago = models.ForeignKey(
+        Pago,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='solicitudes',
+        verbose_name='Pago registrado'
+    )
+    
+    codigo_respuesta = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Código de respuesta'
+    )
+    
+    ubicacion = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Redirección de la respuesta'
+    )
+    
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Fecha de la solicitud'
+    )
+    
+    class Meta:
+        verbose_name = 'Solicitud de pago'
+        verbose_name_plural = 'Solicitudes de pago'
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'clave'], name='solicitud_pago_clave_unica'),
+        ]
+    
+    def __str__(self):
+        return f"Solicitud {self.clave} - Pago {self.pago_id}"
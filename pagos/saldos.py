@@ -0,0 +1,217 @@
+"""
+Saldo de pagos por propietario (SaldoPropietario).
+
+El detalle del propietario lee esta proyección (una fila por propietario)
+en lugar de contar y sumar todo su historial de pagos. Se mantiene de
+forma incremental:
+
+- Las señales de ``Pago`` y ``Cita`` (``pagos/signals.py``) ajustan el
+  saldo en cada ``save``/``delete`` comparando la huella cargada de la base
+  de datos con la nueva.
+- Las operaciones en lote (``bulk_create``, ``update``) no disparan señales
+  y deben llamar a ``ajustar_saldos`` explícitamente.
+
+Un propietario sin fila se inicializa desde sus pagos y citas la primera
+vez que se consulta o que cambia. ``verificar_saldos`` recalcula todos los
+saldos con un único agregado, reporta las diferencias y, si se pide, las
+corrige.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Count, DateTimeField, DecimalField, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from citas.models import Cita
+from propietarios.models import Propietario
+from .models import Pago, SaldoPropietario
+
+# Columnas (cantidad, total) del saldo que cuenta cada concepto
+CAMPOS_POR_CONCEPTO = {
+    'PENDIENTE': ('pendientes', 'pendiente_total'),
+    'COMPLETADO': ('pagos_completados', 'pagado_total'),
+    'CITA_ABIERTA': ('facturas_abiertas', None),
+}
+CAMPOS_SALDO = ['pendientes', 'pendiente_total', 'pagos_completados', 'pagado_total', 'ultimo_pago', 'facturas_abiertas']
+
+_CERO = Value(Decimal('0'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def huella_pago(pago):
+    """
+    Datos de un pago que afectan el saldo.
+
+    Returns:
+        tuple: (propietario_id, estado, monto, fecha_pago)
+    """
+    monto = Pago._meta.get_field('monto').to_python(pago.monto)
+    return (pago.propietario_id, pago.estado, monto, pago.fecha_pago)
+
+
+def huella_cita(propietario_id, estado, pagado):
+    """
+    Huella de una cita en el saldo: cuenta como factura abierta si ya se
+    atendió y no se ha pagado.
+
+    Returns:
+        tuple | None: (propietario_id, 'CITA_ABIERTA', 0, None), o None si
+        la cita no afecta el saldo
+    """
+    if estado == 'COMPLETADA' and not pagado:
+        return (propietario_id, 'CITA_ABIERTA', 0, None)
+    return None
+
+
+def _deltas(quitar, agregar):
+    """
+    Cambios por propietario.
+
+    Returns:
+        dict: {propietario_id: (cambios por columna, fecha del último pago
+        agregado o None, True si se quitó un pago completado)}
+    """
+    deltas = defaultdict(lambda: [defaultdict(int), None, False])
+    for signo, grupo in ((-1, quitar), (1, agregar)):
+        for propietario_id, concepto, monto, fecha in filter(None, grupo):
+            if concepto not in CAMPOS_POR_CONCEPTO:
+                continue
+            cambios = deltas[propietario_id]
+            campo_cantidad, campo_total = CAMPOS_POR_CONCEPTO[concepto]
+            cambios[0][campo_cantidad] += signo
+            if campo_total:
+                cambios[0][campo_total] += signo * monto
+            if concepto == 'COMPLETADO':
+                if signo < 0:
+                    cambios[2] = True
+                elif cambios[1] is None or fecha > cambios[1]:
+                    cambios[1] = fecha
+
+    resultado = {}
+    for propietario_id, (cambios, ultimo, recalcular) in deltas.items():
+        cambios = {campo: valor for campo, valor in cambios.items() if valor}
+        if cambios or ultimo or recalcular:
+            resultado[propietario_id] = (cambios, ultimo, recalcular)
+    return resultado
+
+
+def ajustar_saldos(quitar=(), agregar=()):
+    """
+    Aplica a los saldos el cambio de un grupo de pagos o citas.
+
+    Hace un ``UPDATE`` con expresiones ``F()`` por propietario afectado (en
+    la práctica uno: las señales y las series de citas son de un solo
+    propietario). El último pago se compara con ``Greatest``; si se quita un
+    pago completado se recalcula con una subconsulta. Un propietario sin
+    fila se inicializa desde sus pagos y citas, que ya incluyen el cambio.
+
+    Args:
+        quitar: Huellas que dejan de contar (estado/monto anterior)
+        agregar: Huellas que pasan a contar
+    """
+    for propietario_id, (cambios, ultimo, recalcular) in _deltas(quitar, agregar).items():
+        valores = {campo: F(campo) + valor for campo, valor in cambios.items()}
+        if recalcular:
+            valores['ultimo_pago'] = Subquery(
+                Pago.objects.filter(propietario_id=OuterRef('propietario_id'), estado='COMPLETADO')
+                .order_by('-fecha_pago').values('fecha_pago')[:1]
+            )
+        elif ultimo:
+            fecha = Value(ultimo, output_field=DateTimeField())
+            valores['ultimo_pago'] = Greatest(Coalesce('ultimo_pago', fecha), fecha)
+
+        filas = SaldoPropietario.objects.filter(propietario_id=propietario_id)
+        if filas.update(**valores):
+            continue
+        try:
+            with transaction.atomic():
+                SaldoPropietario.objects.create(**_filas_saldos(Propietario.objects.filter(pk=propietario_id)).get())
+        except IntegrityError:
+            # Otro proceso creó la fila en paralelo
+            filas.update(**valores)
+
+
+def _filas_saldos(propietarios):
+    """
+    Saldo calculado de un QuerySet de propietarios, en una sola consulta:
+    agregados condicionales sobre los pagos y una subconsulta para las
+    citas atendidas sin pagar.
+    """
+    pendiente = Q(pagos__estado='PENDIENTE')
+    completado = Q(pagos__estado='COMPLETADO')
+    abiertas = Cita.objects.filter(
+        propietario_id=OuterRef('pk'), estado='COMPLETADA', pagado=False
+    ).order_by().values('propietario_id').annotate(total=Count('id')).values('total')
+    return propietarios.order_by().annotate(
+        calc_pendientes=Count('pagos', filter=pendiente),
+        calc_pendiente_total=Coalesce(Sum('pagos__monto', filter=pendiente), _CERO),
+        calc_pagos_completados=Count('pagos', filter=completado),
+        calc_pagado_total=Coalesce(Sum('pagos__monto', filter=completado), _CERO),
+        calc_ultimo_pago=Max('pagos__fecha_pago', filter=completado),
+        calc_facturas_abiertas=Coalesce(Subquery(abiertas, output_field=IntegerField()), 0),
+    ).values(propietario_id=F('pk'), **{campo: F(f'calc_{campo}') for campo in CAMPOS_SALDO})
+
+
+def verificar_saldos(aplicar=False):
+    """
+    Recalcula todos los saldos y reporta (y opcionalmente corrige) los que
+    difieren de los guardados.
+
+    Un solo agregado agrupado por propietario, una consulta de saldos
+    guardados, un ``bulk_update`` y un ``bulk_create``. Un propietario sin
+    fila y sin pagos ni citas abiertas no cuenta como diferencia.
+
+    Args:
+        aplicar: True para corregir las diferencias
+
+    Returns:
+        list: Tuplas (propietario_id, saldo guardado o None, saldo real),
+        con cada saldo como diccionario de columnas
+    """
+    with transaction.atomic():
+        guardados = {saldo.propietario_id: saldo for saldo in SaldoPropietario.objects.all()}
+        vacio = {campo: SaldoPropietario._meta.get_field(campo).get_default() for campo in CAMPOS_SALDO}
+
+        diferencias = []
+        actualizar, crear = [], []
+        for real in _filas_saldos(Propietario.objects.all()).iterator(chunk_size=2000):
+            propietario_id = real.pop('propietario_id')
+            saldo = guardados.get(propietario_id)
+            if saldo is None:
+                if real != vacio:
+                    diferencias.append((propietario_id, None, real))
+                    crear.append(SaldoPropietario(propietario_id=propietario_id, **real))
+                continue
+            guardado = {campo: getattr(saldo, campo) for campo in CAMPOS_SALDO}
+            if guardado != real:
+                diferencias.append((propietario_id, guardado, real))
+                for campo, valor in real.items():
+                    setattr(saldo, campo, valor)
+                actualizar.append(saldo)
+
+        if aplicar:
+            SaldoPropietario.objects.bulk_update(actualizar, CAMPOS_SALDO, batch_size=500)
+            SaldoPropietario.objects.bulk_create(crear, batch_size=500)
+    return diferencias
+
+
+def saldo_de(propietario):
+    """
+    Saldo guardado del propietario.
+
+    Si aún no tiene fila (propietarios anteriores al saldo) se inicializa
+    desde sus pagos y citas la primera vez que se consulta.
+    """
+    try:
+        return SaldoPropietario.objects.get(propietario_id=propietario.pk)
+    except SaldoPropietario.DoesNotExist:
+        pass
+    try:
+        with transaction.atomic():
+            return SaldoPropietario.objects.create(**_filas_saldos(Propietario.objects.filter(pk=propietario.pk)).get())
+    except IntegrityError:
+        # Otro proceso la creó en paralelo
+        return SaldoPropietario.objects.get(propietario_id=propietario.pk)
@@ -0,0 +1,53 @@
+"""
+Señales de la app de pagos.
+
+Mantienen el saldo de cada propietario cuando un pago o una cita (estado o
+marca de pagada) se guarda o se elimina, sin importar desde dónde se haga
+el cambio.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from citas.models import Cita
+from .models import Pago
+from .saldos import ajustar_saldos, huella_cita, huella_pago
+
+
+@receiver(post_save, sender=Pago)
+def pago_guardado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_saldo_original', None)
+    actual = huella_pago(instance)
+    if anterior != actual:
+        ajustar_saldos(quitar=[anterior], agregar=[actual])
+    instance._saldo_original = actual
+
+
+@receiver(post_delete, sender=Pago)
+def pago_eliminado(sender, instance, **kwargs):
+    ajustar_saldos(quitar=[getattr(instance, '_saldo_original', None) or huella_pago(instance)])
+
+
+def _datos_cita(cita):
+    return (cita.propietario_id, cita.estado, cita.pagado)
+
+
+@receiver(post_save, sender=Cita)
+def cita_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_saldo_original', None)
+    actual = _datos_cita(instance)
+    if anterior != actual:
+        ajustar_saldos(
+            quitar=[huella_cita(*anterior) if anterior else None],
+            agregar=[huella_cita(*actual)],
+        )
+    instance._saldo_original = actual
+
+
+@receiver(post_delete, sender=Cita)
+def cita_eliminada(sender, instance, **kwargs):
+    ajustar_saldos(quitar=[huella_cita(*(getattr(instance, '_saldo_original', None) or _datos_cita(instance)))])
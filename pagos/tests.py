@@ -1,3 +1,460 @@
-from django.test import TestCase
+import csv
+import tempfile
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from autenticacion.models import Usuario
+from citas.models import Cita
+from citas.services import reservar_serie
+from mascotas.models import Mascota
+from propietarios.models import Propietario
+from servicios.models import Servicio
+from . import listado
+from .facturas import datos_factura, generar_pendientes
+from .forms import FiltroPagosForm
+from .idempotencia import CAMPO_CLAVE
+from .models import Factura, Pago, SaldoPropietario, SolicitudPago
+from .pdf import pesos, renderizar_factura
+from .saldos import saldo_de, verificar_saldos
+
+
+class PagosTestMixin:
+    """Datos base compartidos por las pruebas de pagos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Usuario.objects.create_user(username='recepcion', password='Rec*12345', rol='ADMINISTRATIVO')
+        cls.usuario_prop = Usuario.objects.create_user(username='prop', password='Prop*12345', rol='PROPIETARIO')
+        cls.propietario = Propietario.objects.create(
+            usuario=cls.usuario_prop, nombre='Propietaria Peña',
+            documento='123456789', telefono='3001234567', correo='prop@example.com',
+            direccion='Calle 1 # 2-3',
+        )
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        configuracion = override_settings(MEDIA_ROOT=directorio.name)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def crear_factura(self, monto=50000):
+        pago = Pago.objects.create(
+            propietario=self.propietario, monto=monto, tipo_pago='EFECTIVO',
+            estado='COMPLETADO', usuario_registro=self.staff,
+        )
+        return Factura.objects.create(
+            pago=pago, propietario=self.propietario, subtotal=monto, impuestos=0, total=monto,
+        )
+
+
+class FacturaPdfTests(PagosTestMixin, TestCase):
+
+    def test_renderiza_pdf_con_logo(self):
+        factura = self.crear_factura(1234567.5)
+        datos = datos_factura(factura)
+        self.assertEqual(datos['descripcion'], 'Servicios Veterinarios Generales')
+        self.assertEqual(datos['ruta_logo'], str(settings.FACTURAS_LOGO))
+
+        contenido, paginas = renderizar_factura(datos)
+        self.assertTrue(contenido.startswith(b'%PDF'))
+        self.assertEqual(paginas, 1)
+        self.assertIn(b'/Subtype /Image', contenido)
+        self.assertEqual(pesos('1234567.50'), '$ 1.234.567,50')
+
+    def test_registrar_pago_deja_la_factura_pendiente(self):
+        self.client.force_login(self.staff)
+        respuesta = self.client.post(reverse('pagos:registrar'), {
+            'propietario': self.propietario.pk, 'monto': '80000', 'tipo_pago': 'EFECTIVO',
+            CAMPO_CLAVE: 'factura-pendiente',
+        })
+        factura = Factura.objects.get()
+        self.assertRedirects(respuesta, reverse('pagos:detalle', args=[factura.pago_id]))
+        self.assertFalse(factura.pdf)
+        self.assertRedirects(
+            self.client.get(reverse('pagos:factura_pdf', args=[factura.pk])),
+            reverse('pagos:factura_print', args=[factura.pk]),
+        )
+
+    def test_generar_pendientes_y_descargar(self):
+        facturas = [self.crear_factura(10000 * (i + 1)) for i in range(5)]
+        ya_generada = facturas[0]
+        Factura.objects.filter(pk=ya_generada.pk).update(pdf='facturas/existente.pdf')
+
+        with self.assertNumQueries(3):
+            resultado = generar_pendientes(tamano_lote=10)
+        self.assertEqual(resultado['facturas'], 4)
+        self.assertEqual(resultado['paginas'], 4)
+        self.assertFalse(Factura.objects.filter(pdf='').exists())
+
+        factura = Factura.objects.get(pk=facturas[1].pk)
+        self.assertTrue(factura.pdf.name.endswith(f'{factura.numero_factura}.pdf'))
+        self.assertTrue(Path(settings.MEDIA_ROOT, factura.pdf.name).exists())
+        self.assertEqual(Factura.objects.get(pk=ya_generada.pk).pdf.name, 'facturas/existente.pdf')
+
+        self.client.force_login(self.usuario_prop)
+        respuesta = self.client.get(reverse('pagos:factura_pdf', args=[factura.pk]))
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(respuesta.streaming_content).startswith(b'%PDF'))
+
+        otro = Usuario.objects.create_user(username='otro', password='Otro*12345', rol='PROPIETARIO')
+        self.client.force_login(otro)
+        self.assertRedirects(
+            self.client.get(reverse('pagos:factura_pdf', args=[factura.pk])), reverse('home'),
+            fetch_redirect_response=False,
+        )
+
+    def test_comando_con_pool_de_procesos(self):
+        for i in range(3):
+            self.crear_factura(20000 + i)
+        salida = StringIO()
+        call_command('generar_facturas_pdf', procesos=2, lote=2, stdout=salida)
+        self.assertIn('Facturas generadas: 3 (3 páginas)', salida.getvalue())
+        self.assertIn('páginas/s', salida.getvalue())
+        self.assertFalse(Factura.objects.filter(pdf='').exists())
+
+
+class HistorialPagosTests(PagosTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.staff)
+        inicio = timezone.make_aware(datetime(2026, 3, 1, 10))
+        combinaciones = [('EFECTIVO', 'COMPLETADO'), ('TARJETA', 'COMPLETADO'), ('TRANSFERENCIA', 'PENDIENTE')]
+        pagos = Pago.objects.bulk_create([
+            Pago(propietario=self.propietario, monto=1000 * (i + 1), tipo_pago=tipo, estado=estado,
+                 usuario_registro=self.staff)
+            for i, (tipo, estado) in enumerate(combinaciones * 5)
+        ])
+        # Dos pagos por día, con fechas repetidas para probar el desempate por id
+        for i, pago in enumerate(pagos):
+            pago.fecha_pago = inicio + timedelta(days=i // 2)
+        Pago.objects.bulk_update(pagos, ['fecha_pago'])
+        self.pagos = pagos
+
+    async def leer(self, respuesta):
+        return b''.join([parte async for parte in respuesta.streaming_content])
+
+    def recorrer(self, filtros):
+        ids, cursor = [], None
+        while True:
+            filas, siguiente = listado.pagina(listado.filtrar(Pago.objects.all(), filtros), cursor, tamano=4)
+            ids += [pago.id for pago in filas]
+            if siguiente is None:
+                return ids
+            cursor = listado.parsear_cursor(siguiente)
+
+    def test_paginacion_por_cursor_y_filtros(self):
+        ordenados = sorted(self.pagos, key=lambda p: (p.fecha_pago, p.id), reverse=True)
+        self.assertEqual(self.recorrer({}), [p.id for p in ordenados])
+
+        form = FiltroPagosForm({'estado': 'COMPLETADO', 'desde': '2026-03-02', 'hasta': '2026-03-05'})
+        self.assertTrue(form.is_valid())
+        esperados = [
+            p.id for p in ordenados
+            if p.estado == 'COMPLETADO' and 2 <= timezone.localtime(p.fecha_pago).day <= 5
+        ]
+        self.assertEqual(self.recorrer(form.cleaned_data), esperados)
+
+        respuesta = self.client.get(reverse('pagos:lista'), {'estado': 'COMPLETADO', 'desde': '2026-03-02', 'hasta': '2026-03-05'})
+        self.assertEqual([p.id for p in respuesta.context['pagos']], esperados)
+        self.assertEqual(respuesta.context['totales']['cantidad'], len(esperados))
+        self.assertIsNone(respuesta.context['siguiente'])
+        self.assertEqual(self.client.get(reverse('pagos:lista'), {'cursor': 'x'}).status_code, 400)
+        self.assertFalse(FiltroPagosForm({'desde': '2026-03-05', 'hasta': '2026-03-01'}).is_valid())
+
+    def test_totales_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            resultado = listado.totales(Pago.objects.all())
+        self.assertEqual(resultado['cantidad'], 15)
+        self.assertEqual(resultado['total'], Decimal(sum(1000 * (i + 1) for i in range(15))))
+        por_estado = {etiqueta: (cantidad, total) for etiqueta, cantidad, total in resultado['por_estado']}
+        self.assertEqual(por_estado['Pendiente'], (5, Decimal(sum(1000 * (i + 1) for i in range(2, 15, 3)))))
+        self.assertEqual(por_estado['Fallido'], (0, 0))
+        por_tipo = dict(resultado['por_tipo'])
+        self.assertEqual(por_tipo['Transferencia'], 0)
+        self.assertEqual(por_tipo['Efectivo'], Decimal(sum(1000 * (i + 1) for i in range(0, 15, 3))))
+
+    def test_consultas_de_la_lista_no_crecen_con_los_pagos(self):
+        def contar():
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.client.get(reverse('pagos:lista'))
+            return len(consultas), respuesta
+
+        # La primera petición inicializa el contador de no leídas del usuario
+        contar()
+        antes, _ = contar()
+        Pago.objects.bulk_create([
+            Pago(propietario=self.propietario, monto=10, tipo_pago='EFECTIVO', usuario_registro=self.staff)
+            for _ in range(60)
+        ])
+        despues, respuesta = contar()
+        self.assertEqual(despues, antes)
+        self.assertEqual(len(respuesta.context['pagos']), listado.TAMANO_PAGINA)
+        self.assertIsNotNone(respuesta.context['siguiente'])
+
+    def test_exportar_csv_en_streaming(self):
+        respuesta = self.client.get(reverse('pagos:exportar_csv'), {'tipo_pago': 'EFECTIVO'})
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertTrue(respuesta.is_async)
+        contenido = async_to_sync(self.leer)(respuesta).decode('utf-8-sig')
+        filas = list(csv.reader(StringIO(contenido)))
+        self.assertEqual(filas[0][:3], ['ID', 'Fecha', 'Propietario'])
+        self.assertEqual(len(filas), 6)
+        self.assertEqual({fila[6] for fila in filas[1:]}, {'Efectivo'})
+        self.assertEqual(filas[1][2], 'Propietaria Peña')
+        self.assertEqual(filas[1][4], 'Pago General')
+
+        self.assertEqual(self.client.get(reverse('pagos:exportar_csv'), {'desde': 'x'}).status_code, 400)
+        self.client.force_login(self.usuario_prop)
+        self.assertNotEqual(self.client.get(reverse('pagos:exportar_csv')).status_code, 200)
+
+
+class CitaPagoMixin(PagosTestMixin):
+    """Agrega una cita (veterinario, mascota y servicio) a los datos base."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.vet = Usuario.objects.create_user(username='vet', password='Vet*12345', rol='VETERINARIO')
+        cls.mascota = Mascota.objects.create(
+            propietario=cls.propietario, nombre='Firulais', especie='PERRO', raza='Criollo', edad=3,
+        )
+        cls.consulta = Servicio.objects.create(
+            nombre='CONSULTA', duracion_minutos=30, precio=50000, color_calendario='#1E90FF',
+        )
+        cls.fecha = date.today() + timedelta(days=7)
+        if cls.fecha.weekday() == 6:
+            cls.fecha += timedelta(days=1)
+
+    def nueva_cita(self, hora=time(9, 0)):
+        return Cita(
+            propietario=self.propietario, mascota=self.mascota, servicio=self.consulta,
+            veterinario=self.vet, fecha=self.fecha, hora=hora, usuario_creador=self.staff,
+        )
+
+    def cita_por_pagar(self):
+        """Cita atendida con su pago pendiente, como la deja la agenda."""
+        cita = self.nueva_cita()
+        cita.estado = 'COMPLETADA'
+        cita.save()
+        Pago.objects.create(
+            cita=cita, propietario=self.propietario, monto=50000, tipo_pago='PENDIENTE',
+            usuario_registro=self.staff,
+        )
+        return cita
+
+
+class SaldoPropietarioTests(CitaPagoMixin, TestCase):
+
+    def saldo(self):
+        return SaldoPropietario.objects.get(propietario=self.propietario)
+
+    def test_saldo_sigue_pagos_y_citas(self):
+        cita = self.nueva_cita()
+        cita.save()
+        Pago.objects.create(
+            cita=cita, propietario=self.propietario, monto=50000, tipo_pago='PENDIENTE',
+            usuario_registro=self.staff,
+        )
+        saldo = self.saldo()
+        self.assertEqual((saldo.pendientes, saldo.pendiente_total, saldo.facturas_abiertas), (1, 50000, 0))
+
+        cita = Cita.objects.get(pk=cita.pk)
+        cita.estado = 'COMPLETADA'
+        cita.save()
+        self.assertEqual(self.saldo().facturas_abiertas, 1)
+
+        self.client.force_login(self.staff)
+        self.client.post(reverse('pagos:registrar_cita', args=[cita.pk]), {
+            'monto': '50000', 'tipo_pago': 'EFECTIVO', CAMPO_CLAVE: 'saldo-cita-0001',
+        })
+        pago = Pago.objects.get(cita=cita)
+        saldo = self.saldo()
+        self.assertEqual((saldo.pendientes, saldo.pendiente_total), (0, 0))
+        self.assertEqual((saldo.pagos_completados, saldo.pagado_total, saldo.facturas_abiertas), (1, 50000, 0))
+        self.assertEqual(saldo.ultimo_pago, pago.fecha_pago)
+
+        # Quitar el último pago completado recalcula la fecha del último pago
+        posterior = Pago.objects.create(
+            propietario=self.propietario, monto=1000, tipo_pago='EFECTIVO', estado='COMPLETADO',
+            usuario_registro=self.staff,
+        )
+        self.assertEqual(self.saldo().ultimo_pago, posterior.fecha_pago)
+        posterior.estado = 'FALLIDO'
+        posterior.save()
+        saldo = self.saldo()
+        self.assertEqual((saldo.pagos_completados, saldo.pagado_total, saldo.ultimo_pago), (1, 50000, pago.fecha_pago))
+        posterior.delete()
+        self.assertEqual(verificar_saldos(), [])
+
+    def test_serie_en_lote_ajusta_el_saldo(self):
+        citas = reservar_serie(self.nueva_cita(), self.staff, intervalo_dias=7, dosis=4)
+        saldo = self.saldo()
+        self.assertEqual((saldo.pendientes, saldo.pendiente_total), (4, 200000))
+
+        # delete() sobre el QuerySet también pasa por las señales
+        Pago.objects.filter(cita=citas[0]).delete()
+        self.assertEqual(self.saldo().pendientes, 3)
+        self.assertEqual(verificar_saldos(), [])
+
+    def test_verificar_reporta_y_corrige(self):
+        for monto in (1000, 2000, 3000):
+            Pago.objects.create(
+                propietario=self.propietario, monto=monto, tipo_pago='EFECTIVO', estado='COMPLETADO',
+                usuario_registro=self.staff,
+            )
+        # update() no dispara señales: el saldo queda desfasado
+        Pago.objects.filter(monto=3000).update(estado='PENDIENTE')
+        salida = StringIO()
+        call_command('verificar_saldos', stdout=salida)
+        self.assertIn(f'Propietario #{self.propietario.pk}: pendientes 0 -> 1', salida.getvalue())
+        self.assertIn('Saldos con diferencias: 1', salida.getvalue())
+        self.assertEqual(self.saldo().pendientes, 0)
+
+        call_command('verificar_saldos', reparar=True, stdout=StringIO())
+        saldo = self.saldo()
+        self.assertEqual((saldo.pendientes, saldo.pendiente_total), (1, 3000))
+        self.assertEqual((saldo.pagos_completados, saldo.pagado_total), (2, 3000))
+        self.assertEqual(verificar_saldos(), [])
+
+    def test_detalle_lee_el_saldo(self):
+        # Propietario anterior al saldo: se inicializa al consultarlo
+        Pago.objects.create(
+            propietario=self.propietario, monto=1000, tipo_pago='EFECTIVO', estado='COMPLETADO',
+            usuario_registro=self.staff,
+        )
+        SaldoPropietario.objects.all().delete()
+        self.assertEqual(saldo_de(self.propietario).pagado_total, 1000)
+
+        self.client.force_login(self.staff)
+        url = reverse('propietarios:detalle', args=[self.propietario.pk])
+
+        def contar():
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.client.get(url)
+            return len(consultas), respuesta
+
+        # La primera petición inicializa el contador de no leídas del usuario
+        contar()
+        antes, _ = contar()
+        for _ in range(30):
+            Pago.objects.create(
+                propietario=self.propietario, monto=1000, tipo_pago='EFECTIVO', estado='COMPLETADO',
+                usuario_registro=self.staff,
+            )
+        despues, respuesta = contar()
+        self.assertEqual(despues, antes)
+        self.assertEqual(respuesta.context['saldo'].pagos_completados, 31)
+        self.assertEqual(len(respuesta.context['pagos_completados']), 10)
+        self.assertContains(respuesta, '31 pago(s) por $31000')
+
+
+class RegistroIdempotenteTests(CitaPagoMixin, TestCase):
+
+    def test_repeticion_devuelve_la_respuesta_guardada(self):
+        cita = self.cita_por_pagar()
+        self.client.force_login(self.staff)
+        url = reverse('pagos:registrar_cita', args=[cita.pk])
+        clave = self.client.get(url).context['clave_idempotencia']
+        datos = {'monto': '50000', 'tipo_pago': 'EFECTIVO', CAMPO_CLAVE: clave}
+
+        primera = self.client.post(url, datos)
+        pago = Pago.objects.get(cita=cita)
+        self.assertRedirects(primera, reverse('pagos:detalle', args=[pago.pk]), fetch_redirect_response=False)
+
+        with CaptureQueriesContext(connection) as consultas:
+            repetida = self.client.post(url, datos)
+        self.assertEqual(repetida['Location'], primera['Location'])
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+        self.assertFalse([q for q in consultas.captured_queries if 'INSERT INTO "pagos_factura"' in q['sql']])
+        self.assertEqual(Factura.objects.count(), 1)
+        self.assertEqual(SolicitudPago.objects.get().pago, pago)
+        self.assertEqual(SaldoPropietario.objects.get(propietario=self.propietario).pagos_completados, 1)
+
+        # La misma clave con otros datos, o una clave mal formada, no registra nada
+        self.assertEqual(self.client.post(url, {**datos, 'tipo_pago': 'TARJETA'}).status_code, 409)
+        self.assertEqual(self.client.post(url, {**datos, CAMPO_CLAVE: 'x' * 100}).status_code, 400)
+        self.assertEqual(Factura.objects.count(), 1)
+
+    def test_registrar_sin_clave_responde_400(self):
+        cita = self.cita_por_pagar()
+        self.client.force_login(self.staff)
+        url = reverse('pagos:registrar_cita', args=[cita.pk])
+        # Sin clave un reenvío cobraría dos veces: no se registra nada
+        for _ in range(2):
+            self.assertEqual(self.client.post(url, {'monto': '50000', 'tipo_pago': 'EFECTIVO'}).status_code, 400)
+        self.assertFalse(Pago.objects.filter(cita=cita, estado='COMPLETADO').exists())
+        self.assertFalse(Factura.objects.exists())
+
+    def test_formulario_con_errores_no_consume_la_clave(self):
+        self.client.force_login(self.staff)
+        url = reverse('pagos:registrar')
+        datos = {'propietario': self.propietario.pk, 'monto': '0', 'tipo_pago': 'EFECTIVO', CAMPO_CLAVE: 'clave-de-prueba'}
+        respuesta = self.client.post(url, datos)
+        self.assertEqual(respuesta.context['clave_idempotencia'], 'clave-de-prueba')
+        self.assertFalse(SolicitudPago.objects.exists())
+
+        self.client.post(url, {**datos, 'monto': '20000'})
+        self.client.post(url, {**datos, 'monto': '20000'})
+        self.assertEqual(Factura.objects.count(), 1)
+
+        SolicitudPago.objects.update(fecha_creacion=timezone.now() - timedelta(days=8))
+        salida = StringIO()
+        call_command('purgar_solicitudes_pago', stdout=salida)
+        self.assertIn('Solicitudes de pago purgadas: 1', salida.getvalue())
+
+
+class RegistroIdempotenteConcurrenciaTests(CitaPagoMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.setUpTestData()
+
+    def test_misma_clave_desde_muchos_hilos(self):
+        cita = self.cita_por_pagar()
+        url = reverse('pagos:registrar_cita', args=[cita.pk])
+        datos = {'monto': '50000', 'tipo_pago': 'EFECTIVO', CAMPO_CLAVE: 'doble-clic-0001'}
+        hilos = 8
+        respuestas, errores = [], []
+        barrera = threading.Barrier(hilos)
+
+        def enviar():
+            try:
+                cliente = Client()
+                cliente.force_login(self.staff)
+                barrera.wait()
+                respuesta = cliente.post(url, datos)
+                respuestas.append((respuesta.status_code, respuesta['Location']))
+            except Exception as error:
+                errores.append(error)
+            finally:
+                connections.close_all()
+
+        trabajadores = [threading.Thread(target=enviar) for _ in range(hilos)]
+        for hilo in trabajadores:
+            hilo.start()
+        for hilo in trabajadores:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        pago = Pago.objects.get(cita=cita)
+        self.assertEqual(pago.estado, 'COMPLETADO')
+        self.assertEqual(set(respuestas), {(302, reverse('pagos:detalle', args=[pago.pk]))})
+        self.assertEqual(len(respuestas), hilos)
+        self.assertEqual(Factura.objects.filter(pago=pago).count(), 1)
+        self.assertEqual(SolicitudPago.objects.get().pago, pago)
+        saldo = SaldoPropietario.objects.get(propietario=self.propietario)
+        self.assertEqual((saldo.pendientes, saldo.pagos_completados, saldo.facturas_abiertas), (0, 1, 0))
@@ -5,8 +5,10 @@ app_name = 'pagos'
 
 urlpatterns = [
     path('', views.lista_pagos, name='lista'),
+    path('exportar/', views.exportar_pagos_csv, name='exportar_csv'),
     path('registrar/', views.registrar_pago, name='registrar'),
     path('registrar/cita/<int:cita_id>/', views.registrar_pago, name='registrar_cita'),
     path('<int:pk>/', views.detalle_pago, name='detalle'),
     path('factura/<int:pk>/print/', views.ver_factura, name='factura_print'),
+    path('factura/<int:pk>/pdf/', views.descargar_factura, name='factura_pdf'),
 ]
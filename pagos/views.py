@@ -1,8 +1,11 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import FileResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.utils import timezone
+from . import idempotencia, listado
 from .models import Pago, Factura
-from .forms import PagoForm
+from .forms import FiltroPagosForm, PagoForm
 from citas.models import Cita
 from django.db import transaction
 from autenticacion.decorators import staff_required
@@ -10,9 +13,42 @@ from autenticacion.decorators import staff_required
 @login_required
 @staff_required
 def lista_pagos(request):
-    """Listar historial de pagos (solo staff)."""
-    pagos = Pago.objects.all().order_by('-fecha_pago')
-    return render(request, 'pagos/lista.html', {'pagos': pagos})
+    """Historial de pagos con filtros, totales del período y paginación por cursor (solo staff)."""
+    form = FiltroPagosForm(request.GET or None)
+    filtros = form.cleaned_data if form.is_valid() else {}
+    cursor = listado.parsear_cursor(request.GET.get('cursor'))
+    if request.GET.get('cursor') and cursor is None:
+        return HttpResponseBadRequest('Cursor inválido')
+
+    pagos = listado.filtrar(Pago.objects.all(), filtros)
+    filas, siguiente = listado.pagina(pagos.select_related('propietario', 'cita__servicio'), cursor)
+
+    parametros = request.GET.copy()
+    parametros.pop('cursor', None)
+    context = {
+        'form': form,
+        'pagos': filas,
+        'totales': listado.totales(pagos),
+        'filtros_query': parametros.urlencode(),
+        'siguiente': siguiente,
+        'es_primera': cursor is None,
+    }
+    return render(request, 'pagos/lista.html', context)
+
+@login_required
+@staff_required
+def exportar_pagos_csv(request):
+    """Exportar a CSV los pagos filtrados, en streaming (solo staff)."""
+    form = FiltroPagosForm(request.GET or None)
+    if request.GET and not form.is_valid():
+        return HttpResponseBadRequest('Filtros inválidos')
+    filtros = form.cleaned_data if request.GET else {}
+
+    # Iterador asíncrono: bajo ASGI se envía por bloques, sin juntar el CSV en memoria
+    lineas = listado.lineas_csv(listado.filtrar(Pago.objects.all(), filtros))
+    response = StreamingHttpResponse(lineas, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="pagos_{timezone.localdate():%Y%m%d}.csv"'
+    return response
 
 @login_required
 def registrar_pago(request, cita_id=None):
@@ -31,9 +67,20 @@ def registrar_pago(request, cita_id=None):
         pago_pendiente = Pago.objects.filter(cita=cita, estado='PENDIENTE').first()
     
     if request.method == 'POST':
+        # Doble clic o reenvío: la misma clave devuelve la respuesta guardada.
+        # Sin clave no hay cómo reconocer un reenvío, así que es obligatoria
+        clave = idempotencia.clave_de(request)
+        if clave == '':
+            return HttpResponseBadRequest('Falta la clave de idempotencia')
+        if clave is None:
+            return HttpResponseBadRequest('Clave de idempotencia inválida')
         form = PagoForm(request.POST, cita_id=cita_id, instance=pago_pendiente)
         if form.is_valid():
             with transaction.atomic():
+                solicitud, nueva = idempotencia.reclamar(request, clave)
+                if not nueva:
+                    return idempotencia.repetir_respuesta(request, solicitud)
+
                 pago = form.save(commit=False)
                 if cita:
                     pago.cita = cita
@@ -66,13 +113,18 @@ def registrar_pago(request, cita_id=None):
                 else:
                     messages.success(request, 'Pago registrado y factura generada exitosamente.')
                 
-                return redirect('pagos:detalle', pk=pago.pk)
+                respuesta = redirect('pagos:detalle', pk=pago.pk)
+                idempotencia.guardar_respuesta(solicitud, pago, respuesta)
+                return respuesta
     else:
+        clave = ''
         form = PagoForm(cita_id=cita_id, instance=pago_pendiente)
     
     context = {
         'form': form,
         'cita': cita,
+        # Se conserva al re-mostrar el formulario con errores (aún no se usó)
+        'clave_idempotencia': clave or idempotencia.nueva_clave(),
         'titulo': f'Pagar {cita.servicio.get_nombre_display()} - {cita.mascota.nombre}' if cita else 'Registrar Pago'
     }
     return render(request, 'pagos/formulario.html', context)
@@ -89,3 +141,23 @@ def ver_factura(request, pk):
     """Vista de impresión de factura."""
     factura = get_object_or_404(Factura, pk=pk)
     return render(request, 'pagos/factura_print.html', {'factura': factura})
+
+@login_required
+def descargar_factura(request, pk):
+    """
+    Descargar el PDF de la factura.
+
+    El PDF lo genera el comando generar_facturas_pdf; mientras no exista se
+    muestra la vista de impresión.
+    """
+    factura = get_object_or_404(Factura.objects.select_related('propietario'), pk=pk)
+    if request.user.rol == 'PROPIETARIO' and factura.propietario.usuario_id != request.user.id:
+        messages.error(request, 'No tienes permisos para ver esta factura.')
+        return redirect('home')
+    if not factura.pdf:
+        return redirect('pagos:factura_print', pk=factura.pk)
+    return FileResponse(
+        factura.pdf.open('rb'),
+        content_type='application/pdf',
+        filename=f'{factura.numero_factura}.pdf',
+    )
@@ -5,6 +5,10 @@ from .models import Propietario
 from .forms import PropietarioForm
 from autenticacion.models import Usuario
 from autenticacion.decorators import staff_required
+from pagos.saldos import saldo_de
+
+# Pagos pendientes y completados listados en el detalle; los totales salen del saldo
+PAGOS_EN_DETALLE = 10
 
 @login_required
 @staff_required
@@ -65,18 +69,21 @@ def detalle_propietario(request, pk):
     if request.user.rol == 'PROPIETARIO' and propietario.usuario_id != request.user.id:
         return redirect('home')
     
-    # Obtener pagos pendientes (incluye citas programadas y completadas)
+    # Pagos pendientes más recientes (incluye citas programadas y completadas)
     pagos_pendientes = propietario.pagos.filter(
         estado='PENDIENTE'
-    ).select_related('cita', 'cita__mascota', 'cita__servicio').order_by('-fecha_pago')
+    ).select_related(
+        'cita', 'cita__mascota', 'cita__servicio', 'cita__veterinario'
+    ).order_by('-fecha_pago', '-id')[:PAGOS_EN_DETALLE]
 
-    # Obtener historial de pagos completados
+    # Últimos pagos completados
     pagos_completados = propietario.pagos.filter(
         estado='COMPLETADO'
-    ).select_related('cita', 'cita__mascota', 'cita__servicio').order_by('-fecha_pago')
+    ).select_related('cita', 'cita__mascota', 'cita__servicio').order_by('-fecha_pago', '-id')[:PAGOS_EN_DETALLE]
     
     return render(request, 'propietarios/detalle.html', {
         'propietario': propietario,
+        'saldo': saldo_de(propietario),
         'pagos_pendientes': pagos_pendientes,
         'pagos_completados': pagos_completados
     })
@@ -2,7 +2,7 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import HttpResponse
 from .forms import ReporteForm
-from citas.models import Cita
+from citas.resumen import citas_por_dia
 from pagos.models import Pago
 from mascotas.models import Mascota
 from django.db.models import Count, Sum
@@ -50,7 +50,7 @@ def generar_pdf(tipo, inicio, fin):
     p.setFont("Helvetica", 10)
     
     if tipo == 'citas_mes':
-        data = Cita.objects.filter(fecha__range=[inicio, fin]).values('fecha').annotate(total=Count('id')).order_by('fecha')
+        data = citas_por_dia(inicio, fin)
         for item in data:
             p.drawString(50, y, f"Fecha: {item['fecha']} - Total Citas: {item['total']}")
             y -= 20
@@ -85,7 +85,7 @@ def generar_excel(tipo, inicio, fin):
     
     if tipo == 'citas_mes':
         ws.append(['Fecha', 'Total Citas'])
-        data = Cita.objects.filter(fecha__range=[inicio, fin]).values('fecha').annotate(total=Count('id')).order_by('fecha')
+        data = citas_por_dia(inicio, fin)
         for item in data:
             ws.append([item['fecha'], item['total']])
             
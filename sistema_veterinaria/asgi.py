@@ -16,6 +16,8 @@ import notificaciones.routing
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "sistema_veterinaria.settings")
 
+# HTTP: las vistas async (ej: la API de notificaciones) corren en el event
+# loop; las síncronas pasan por el hilo compartido de sync_to_async
 django_app = get_asgi_application()
 
 application = ProtocolTypeRouter({
@@ -84,6 +84,17 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Tomar el bloqueo de escritura al iniciar cada transacción para que
+            # dos reservas simultáneas no fallen al escalar de lectura a escritura
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,  # Segundos de espera por el bloqueo antes de fallar
+            # WAL: las lecturas no esperan a que termine una escritura
+            "init_command": "PRAGMA journal_mode=WAL;",
+        },
+        # Base de pruebas en archivo (no en memoria compartida) para que las
+        # pruebas de concurrencia esperen el bloqueo como en producción
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
@@ -229,9 +240,27 @@ HORARIO_LABORAL = {
     "hora_fin": "18:00",
     "dias_laborales": [0, 1, 2, 3, 4, 5],  # Lunes (0) a Sábado (5)
 }
-# Canal de mensajes en memoria para desarrollo
+# Al cancelar o reprogramar, agendar el hueco a la lista de espera (True)
+# o solo ofrecerlo al propietario por notificación (False) (HU-032)
+LISTA_ESPERA_AUTOAGENDAR = True
+# Las notificaciones de citas se encolan en la bandeja de salida y las crea
+# el comando despachar_notificaciones. Con True se despachan al confirmar la
+# transacción de la propia petición (útil en desarrollo, sin trabajador).
+NOTIFICACIONES_DESPACHO_INMEDIATO = False
+# Meses completos de notificaciones que se conservan en la base de datos; las
+# anteriores se archivan en MEDIA_ROOT (comando archivar_notificaciones)
+NOTIFICACIONES_RETENCION_MESES = 12
+# Logo de los PDF de facturas (comando generar_facturas_pdf)
+FACTURAS_LOGO = MEDIA_ROOT / "LOGO" / "1Recurso 32BOTONES.png"
+# Horas de anticipación de los recordatorios de citas (enviar_recordatorios)
+RECORDATORIOS_HORIZONTES_HORAS = [24, 2]
+# Capa de canales compartida entre procesos (workers ASGI y despachador de
+# notificaciones) en un archivo SQLite local; ver notificaciones/capa_sqlite.py
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "BACKEND": "notificaciones.capa_sqlite.SQLiteChannelLayer",
+        "CONFIG": {"ruta": BASE_DIR / "channels.sqlite3"},
     }
 }
+# Las pruebas usan una capa de canales en un archivo temporal
+TEST_RUNNER = "sistema_veterinaria.test_runner.EjecutorPruebas"
@@ -0,0 +1,33 @@
+"""
+Ejecutor de pruebas del proyecto.
+
+Igual al de Django, pero la capa de canales usa un archivo SQLite temporal:
+así las pruebas no escriben en el ``channels.sqlite3`` que sondea el
+servidor de desarrollo.
+"""
+
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class EjecutorPruebas(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._directorio_canales = tempfile.TemporaryDirectory()
+        directorio = Path(self._directorio_canales.name)
+        capas = {
+            alias: {**capa, 'CONFIG': {**capa.get('CONFIG', {}), 'ruta': directorio / f'{alias}.sqlite3'}}
+            for alias, capa in settings.CHANNEL_LAYERS.items()
+        }
+        self._capas_temporales = override_settings(CHANNEL_LAYERS=capas)
+        self._capas_temporales.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._capas_temporales.disable()
+        self._directorio_canales.cleanup()
+        super().teardown_test_environment(**kwargs)
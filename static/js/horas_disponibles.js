@@ -0,0 +1,52 @@
+// Horas disponibles según servicio, fecha y veterinario (HU-012).
+// Uso: <script src=".../horas_disponibles.js" data-url="{% url 'citas:api_disponibilidad' %}"></script>
+(function() {
+    const urlDisponibilidad = document.currentScript.dataset.url;
+
+    document.addEventListener('DOMContentLoaded', function() {
+        const campoFecha = document.getElementById('id_fecha');
+        const campoHora = document.getElementById('id_hora');
+        const campoServicio = document.getElementById('id_servicio');
+        const campoVeterinario = document.getElementById('id_veterinario');
+        if (!campoFecha || !campoHora || !campoServicio) {
+            return;
+        }
+        const contenedorHoras = document.createElement('div');
+        contenedorHoras.className = 'mt-2 d-flex flex-wrap gap-1';
+        campoHora.parentNode.appendChild(contenedorHoras);
+
+        function cargarHorasDisponibles() {
+            contenedorHoras.innerHTML = '';
+            if (!campoFecha.value || !campoServicio.value) {
+                return;
+            }
+            const params = new URLSearchParams({fecha: campoFecha.value, servicio: campoServicio.value});
+            if (campoVeterinario && campoVeterinario.value) {
+                params.append('veterinario', campoVeterinario.value);
+            }
+            fetch(`${urlDisponibilidad}?${params}`)
+                .then(response => response.json())
+                .then(data => {
+                    const horas = new Set();
+                    (data.veterinarios || []).forEach(vet => vet.horas.forEach(hora => horas.add(hora)));
+                    if (!horas.size) {
+                        contenedorHoras.innerHTML = '<small class="text-danger">No hay horarios disponibles para este día</small>';
+                        return;
+                    }
+                    Array.from(horas).sort().forEach(hora => {
+                        const boton = document.createElement('button');
+                        boton.type = 'button';
+                        boton.className = 'btn btn-outline-secondary btn-sm';
+                        boton.textContent = hora;
+                        boton.addEventListener('click', () => { campoHora.value = hora; });
+                        contenedorHoras.appendChild(boton);
+                    });
+                });
+        }
+
+        [campoFecha, campoServicio, campoVeterinario].filter(Boolean).forEach(campo => {
+            campo.addEventListener('change', cargarHorasDisponibles);
+        });
+        cargarHorasDisponibles();
+    });
+})();